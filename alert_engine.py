@@ -0,0 +1,437 @@
+# ==============================================================================
+# ALERT_ENGINE.PY - Потоковые тревоги, вычисляемые в момент записи замера
+# ==============================================================================
+# Сервисы передают каждый замер в AlertEngine.ingest() сразу после получения.
+# Каждое правило хранит несколько чисел на (правило, установка/станция), поэтому
+# проверка замера - O(1) и не обращается к БД. Переходы (raised / cleared)
+# уходят в AlertSink: фоновый поток записывает их в таблицу alerts и отправляет
+# UDP-датаграмму в GUI, который показывает тревогу без опроса базы.
+# Правило collector_silent дублирует SilenceWatcher вне коллектора (в GUI): он
+# смотрит на время последнего валидного замера в mikrotik_log и замечает и
+# остановленный или зависший коллектор.
+# ==============================================================================
+import json
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+STATE_RAISED = "raised"
+STATE_CLEARED = "cleared"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Настройки по умолчанию (перекрываются разделом alerts в config.json)
+DEFAULT_ALERTS = {
+    "enabled": True,
+    "notify_host": "127.0.0.1",
+    "notify_port": 9199,          # UDP-порт, который слушает GUI
+    "rules": {
+        # RSSI ниже порога дольше hold_sec; снимается при RSSI >= порог + гистерезис
+        "rssi_low": {"enabled": True, "threshold_dbm": -80, "hysteresis_db": 3, "hold_sec": 120},
+        # TxRate упал ниже drop_ratio от скользящего среднего (EWMA)
+        "txrate_collapse": {"enabled": True, "drop_ratio": 0.3, "recover_ratio": 0.6,
+                            "min_baseline_mbps": 12, "ewma_alpha": 0.1, "hold_sec": 60},
+        # Поток RTCM остановлен (статус ERROR от анализатора или watchdog). Анализатор
+        # поднимает тревогу, если нет данных дольше stall_sec (таймаут чтения сокета)
+        "rtcm_stall": {"enabled": True, "stall_sec": 3.0},
+        # Доля сообщений RTCM с верной CRC ниже порога, %
+        "rtcm_quality": {"enabled": True, "threshold_pct": 95.0, "hysteresis_pct": 2.0, "hold_sec": 0},
+        # Нет ни одного валидного замера установки дольше silence_sec
+        "collector_silent": {"enabled": True, "silence_sec": 300}
+    }
+}
+
+
+def resolve_alerts_config(config_section):
+    """Объединяет настройки тревог из config.json со значениями по умолчанию (по каждому правилу)."""
+    config_section = config_section or {}
+    alerts_config = dict(DEFAULT_ALERTS)
+    alerts_config.update({k: v for k, v in config_section.items() if k != "rules"})
+    rules = {}
+    for name, defaults in DEFAULT_ALERTS["rules"].items():
+        rules[name] = dict(defaults)
+        rules[name].update(config_section.get("rules", {}).get(name, {}))
+    alerts_config["rules"] = rules
+    return alerts_config
+
+# ------------------------------------------------------------------------------
+# 1. ПРАВИЛА
+# ------------------------------------------------------------------------------
+# evaluate(key, sample, now) возвращает None или (новое состояние, значение, сообщение).
+
+class ThresholdRule:
+    """Значение поля ниже порога дольше hold_sec; снятие - при возврате выше порога + гистерезис."""
+
+    def __init__(self, name, field, threshold, hysteresis, hold_sec, unit, severity="warning"):
+        self.name, self.field, self.severity = name, field, severity
+        self.threshold, self.hysteresis, self.hold_sec, self.unit = threshold, hysteresis, hold_sec, unit
+        self._state = {}   # key -> [начало нарушения или None, активна ли тревога]
+
+    def evaluate(self, key, sample, now):
+        value = sample.get(self.field)
+        if value is None:
+            return None
+        state = self._state.setdefault(key, [None, False])
+        if value < self.threshold:
+            if state[0] is None:
+                state[0] = now
+            if not state[1] and now - state[0] >= self.hold_sec:
+                state[1] = True
+                return STATE_RAISED, value, f"{self.field} {value}{self.unit} < {self.threshold}{self.unit}"
+        else:
+            state[0] = None
+            if state[1] and value >= self.threshold + self.hysteresis:
+                state[1] = False
+                return STATE_CLEARED, value, f"{self.field} восстановлен: {value}{self.unit}"
+        return None
+
+
+class CollapseRule:
+    """Резкое падение значения относительно скользящего среднего (EWMA) дольше hold_sec."""
+
+    def __init__(self, name, field, drop_ratio, recover_ratio, min_baseline, alpha, hold_sec, severity="warning"):
+        self.name, self.field, self.severity = name, field, severity
+        self.drop_ratio, self.recover_ratio = drop_ratio, recover_ratio
+        self.min_baseline, self.alpha, self.hold_sec = min_baseline, alpha, hold_sec
+        self._state = {}   # key -> [базовое среднее, начало падения, активна ли тревога]
+
+    def evaluate(self, key, sample, now):
+        value = sample.get(self.field)
+        if value is None:
+            return None
+        state = self._state.get(key)
+        if state is None:
+            self._state[key] = [value, None, False]
+            return None
+        baseline = state[0]
+        collapsed = baseline >= self.min_baseline and value < baseline * self.drop_ratio
+        if collapsed:
+            if state[1] is None:
+                state[1] = now
+            if not state[2] and now - state[1] >= self.hold_sec:
+                state[2] = True
+                return STATE_RAISED, value, f"{self.field} упал до {value:g} (обычно {baseline:.0f})"
+            return None   # Базовое среднее не портим значениями во время падения
+        state[1] = None
+        if state[2]:
+            if value < baseline * self.recover_ratio:
+                return None
+            state[2] = False
+            state[0] += self.alpha * (value - state[0])
+            return STATE_CLEARED, value, f"{self.field} восстановлен: {value:g}"
+        state[0] += self.alpha * (value - state[0])
+        return None
+
+
+class StatusRule:
+    """Тревога по статусу: ERROR - поднять, любой другой статус - снять."""
+
+    def __init__(self, name, field, severity="critical"):
+        self.name, self.field, self.severity = name, field, severity
+        self._active = {}
+
+    def evaluate(self, key, sample, now):
+        status = sample.get(self.field)
+        if status is None:
+            return None
+        failed = status == "ERROR"
+        if failed != self._active.get(key, False):
+            self._active[key] = failed
+            message = sample.get("message") or status
+            return (STATE_RAISED if failed else STATE_CLEARED), None, message
+        return None
+
+
+class SilenceRule:
+    """Нет валидных замеров (поле field не None) дольше silence_sec; проверяется в tick()."""
+
+    def __init__(self, name, field, silence_sec, severity="critical"):
+        self.name, self.field, self.severity = name, field, severity
+        self.silence_sec = silence_sec
+        self._state = {}   # key -> [время последнего валидного замера, активна ли тревога]
+
+    def evaluate(self, key, sample, now):
+        if self.field not in sample:
+            return None
+        state = self._state.setdefault(key, [now, False])
+        if sample[self.field] is None:
+            return None
+        state[0] = now
+        if state[1]:
+            state[1] = False
+            return STATE_CLEARED, None, "Замеры возобновились"
+        return None
+
+    def check(self, now):
+        """Установки, замолчавшие дольше silence_sec: [(key, сообщение)]."""
+        raised = []
+        for key, state in self._state.items():
+            if not state[1] and now - state[0] >= self.silence_sec:
+                state[1] = True
+                raised.append((key, f"Нет валидных замеров {now - state[0]:.0f} с"))
+        return raised
+
+
+def build_rules(alerts_config):
+    """Правила из настроек (отключенные правила пропускаются)."""
+    rules_config = alerts_config["rules"]
+    rules = []
+    c = rules_config["rssi_low"]
+    if c["enabled"]:
+        rules.append(ThresholdRule("rssi_low", "rssi", c["threshold_dbm"], c["hysteresis_db"], c["hold_sec"], " дБм"))
+    c = rules_config["txrate_collapse"]
+    if c["enabled"]:
+        rules.append(CollapseRule("txrate_collapse", "tx_mbps", c["drop_ratio"], c["recover_ratio"],
+                                  c["min_baseline_mbps"], c["ewma_alpha"], c["hold_sec"]))
+    c = rules_config["rtcm_stall"]
+    if c["enabled"]:
+        rules.append(StatusRule("rtcm_stall", "rtk_status"))
+    c = rules_config["rtcm_quality"]
+    if c["enabled"]:
+        rules.append(ThresholdRule("rtcm_quality", "rtcm_quality", c["threshold_pct"], c["hysteresis_pct"],
+                                   c["hold_sec"], "%"))
+    c = rules_config["collector_silent"]
+    if c["enabled"]:
+        rules.append(SilenceRule("collector_silent", "rssi", c["silence_sec"]))
+    return rules
+
+# ------------------------------------------------------------------------------
+# 2. ДВИЖОК
+# ------------------------------------------------------------------------------
+
+class AlertEngine:
+    """Проверяет замеры по правилам и передает переходы состояний в sink."""
+
+    def __init__(self, service, rules, sink=None):
+        self.service = service
+        self.rules = rules
+        self.sink = sink
+        self._silence_rules = [rule for rule in rules if isinstance(rule, SilenceRule)]
+
+    def ingest(self, key, sample, now=None):
+        """
+        Учитывает замер установки/станции key.
+
+        sample - dict с любыми из полей: rssi, tx_mbps, rtk_status, rtcm_quality,
+        message. Правило, поля которого нет в замере, не вызывается.
+        """
+        if now is None:
+            now = time.monotonic()
+        for rule in self.rules:
+            result = rule.evaluate(key, sample, now)
+            if result is not None:
+                self._emit(rule, key, *result)
+
+    def tick(self, now=None):
+        """Проверка правил по времени (молчание установки). Вызывается раз в тик."""
+        if now is None:
+            now = time.monotonic()
+        for rule in self._silence_rules:
+            for key, message in rule.check(now):
+                self._emit(rule, key, STATE_RAISED, None, message)
+
+    def _emit(self, rule, key, state, value, message):
+        alert = {
+            "timestamp": datetime.now().strftime(TIMESTAMP_FORMAT),
+            "service": self.service, "rule": rule.name, "key": str(key), "state": state,
+            "severity": rule.severity, "value": value, "message": message
+        }
+        print(f"[ALERT] {alert['key']}: {rule.name} {state} - {message}")
+        if self.sink is not None:
+            self.sink.emit(alert)
+
+# ------------------------------------------------------------------------------
+# 3. ДОСТАВКА: ТАБЛИЦА alerts И УВЕДОМЛЕНИЕ GUI
+# ------------------------------------------------------------------------------
+
+ALERT_FIELDS = ("timestamp", "service", "rule", "key", "state", "severity", "value", "message")
+
+
+def initialize_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            service TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            severity TEXT,
+            value REAL,
+            message TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_key ON alerts (rule, key, timestamp)")
+    conn.commit()
+
+
+class AlertSink:
+    """
+    Фоновая доставка тревог: запись в alerts и UDP-уведомление GUI.
+
+    emit() только кладет тревогу в очередь, поэтому цикл сбора не ждет
+    ни диск, ни сеть. Если БД занята, запись повторяется со следующей тревогой.
+    """
+
+    def __init__(self, db_path, notify_host=None, notify_port=None):
+        self.db_path = db_path
+        self.notify = (notify_host, notify_port) if notify_host and notify_port else None
+        self._queue = queue.SimpleQueue()
+        self._pending = []
+        self._thread = threading.Thread(target=self._run, name="alert-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, alert):
+        self._queue.put(alert)
+
+    def _run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        while True:
+            alert = self._queue.get()
+            if self.notify is not None:
+                try:
+                    sock.sendto(json.dumps(alert, ensure_ascii=False).encode('utf-8'), self.notify)
+                except OSError:
+                    pass    # GUI не запущен - тревога все равно попадет в таблицу
+            self._pending.append(alert)
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=5)
+                try:
+                    initialize_table(conn)
+                    conn.executemany(
+                        f"INSERT INTO alerts ({', '.join(ALERT_FIELDS)}) VALUES ({', '.join('?' * len(ALERT_FIELDS))})",
+                        [tuple(a[field] for field in ALERT_FIELDS) for a in self._pending]
+                    )
+                    conn.commit()
+                    self._pending = []
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"[ALERT] Тревога не записана в {self.db_path} (повтор позже): {e}")
+
+
+def create_engine(service, db_path, config_section):
+    """Движок с правилами и доставкой по настройкам alerts из config.json (None, если отключен)."""
+    alerts_config = resolve_alerts_config(config_section)
+    if not alerts_config["enabled"]:
+        return None
+    sink = AlertSink(db_path, alerts_config["notify_host"], alerts_config["notify_port"])
+    return AlertEngine(service, build_rules(alerts_config), sink)
+
+# ------------------------------------------------------------------------------
+# 4. ПРИЕМ В GUI
+# ------------------------------------------------------------------------------
+
+class AlertListener:
+    """UDP-приемник тревог для GUI: фоновый поток складывает их в очередь, drain() забирает."""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_ALERTS["notify_port"]):
+        self._queue = queue.SimpleQueue()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        threading.Thread(target=self._run, name="alert-listener", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(65535)
+                self._queue.put(json.loads(data.decode('utf-8')))
+            except (OSError, ValueError):
+                continue
+
+    def drain(self):
+        alerts = []
+        while True:
+            try:
+                alerts.append(self._queue.get_nowait())
+            except queue.Empty:
+                return alerts
+
+
+def read_active(conn):
+    """Активные тревоги (последнее состояние raised) - для начального заполнения GUI."""
+    try:
+        cursor = conn.execute(f"""
+            SELECT {', '.join('a.' + f for f in ALERT_FIELDS)}
+            FROM alerts a
+            JOIN (SELECT service, rule, key, MAX(id) AS last_id FROM alerts GROUP BY service, rule, key) last
+              ON a.id = last.last_id
+            WHERE a.state = ?
+            ORDER BY a.timestamp
+        """, (STATE_RAISED,))
+        return [dict(zip(ALERT_FIELDS, row)) for row in cursor]
+    except sqlite3.OperationalError:
+        return []
+
+# ------------------------------------------------------------------------------
+# 5. МОЛЧАНИЕ УСТАНОВОК ВНЕ КОЛЛЕКТОРА
+# ------------------------------------------------------------------------------
+
+def read_last_valid(conn, rig_ids):
+    """
+    Время последнего валидного замера (RSSI не NULL) каждой установки:
+    {rig_id: 'YYYY-MM-DD HH:MM:SS' или None}. Для сжатых строк - last_timestamp.
+    """
+    last_valid = {}
+    for rig_id in rig_ids:
+        row = conn.execute(
+            """SELECT COALESCE(last_timestamp, timestamp) FROM mikrotik_log
+               WHERE rig_id = ? AND COALESCE(rssi_sum, rssi) IS NOT NULL
+               ORDER BY timestamp DESC, id DESC LIMIT 1""",
+            (rig_id,)
+        ).fetchone()
+        last_valid[rig_id] = row[0] if row else None
+    return last_valid
+
+
+class LocalSink:
+    """Доставка тревог в том же процессе: каждая тревога передается в callback (например, в GUI)."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, alert):
+        self.callback(alert)
+
+
+class SilenceWatcher:
+    """
+    Правило collector_silent по записанным данным, а не по потоку замеров.
+
+    SilenceRule внутри коллектора не сработает, если сам коллектор остановлен
+    или завис. Наблюдатель раз в тик получает время последнего валидного
+    замера каждой установки (read_last_valid): тревога поднимается, если оно
+    старше silence_sec, и снимается, когда в базе появляется новый замер.
+    Установка без замеров отсчитывает молчание от первой проверки.
+    """
+
+    SERVICE = "silence_watch"
+
+    def __init__(self, silence_sec, sink=None):
+        self.rule = SilenceRule("collector_silent", "rssi", silence_sec)
+        self.engine = AlertEngine(self.SERVICE, [self.rule], sink)
+        self._seen = {}   # rig_id -> последнее переданное в правило время замера
+
+    def check(self, last_valid, now=None):
+        """last_valid - {rig_id: время последнего валидного замера или None}."""
+        if now is None:
+            now = time.time()
+        for rig_id, timestamp in last_valid.items():
+            if timestamp is None:
+                self.engine.ingest(rig_id, {"rssi": None}, now)
+            elif self._seen.get(rig_id) != timestamp:
+                self._seen[rig_id] = timestamp
+                seen_at = datetime.strptime(timestamp[:19], TIMESTAMP_FORMAT).timestamp()
+                self.engine.ingest(rig_id, {"rssi": timestamp}, seen_at)
+        self.engine.tick(now)
+
+
+def create_silence_watcher(config_section, sink=None):
+    """Наблюдатель молчания по настройкам alerts (None, если тревоги или правило отключены)."""
+    alerts_config = resolve_alerts_config(config_section)
+    rule_config = alerts_config["rules"]["collector_silent"]
+    if not alerts_config["enabled"] or not rule_config["enabled"]:
+        return None
+    return SilenceWatcher(rule_config["silence_sec"], sink)
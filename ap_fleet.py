@@ -0,0 +1,183 @@
+# ==============================================================================
+# AP_FLEET.PY - Опрос нескольких точек доступа и объединение с учетом роуминга
+# ==============================================================================
+# Все точки доступа из mikrotik_aps опрашиваются параллельно в одном тике
+# (registration-table целиком). Установка в зоне перекрытия видна в нескольких
+# таблицах сразу; снимки объединяются по MAC, и для каждого клиента остается
+# ассоциация с самым сильным сигналом и идентификатор обслуживающей AP (ap_id).
+# ap_id пишется в mikrotik_log, поэтому покрытие по точкам доступа и число
+# переключений между ними считаются по уже записанным данным
+# (mikrotik_storage.query_ap_coverage / query_handovers).
+# ==============================================================================
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import routeros_api
+import snmp_poller
+
+SUPPORTED_BACKENDS = ("api", "snmp")
+
+# Настройки по умолчанию (перекрываются script_collector.ap_fleet в config.json)
+DEFAULT_FLEET = {
+    "cache_sec": 5.0,        # Один опрос всех AP обслуживает все CPE в пределах этого времени
+    "deadline_sec": None     # Срок ответа AP в режиме api (None - api_timeout)
+}
+
+
+def resolve_fleet_config(config_section):
+    """Объединяет настройки опроса точек доступа из config.json со значениями по умолчанию."""
+    fleet_config = dict(DEFAULT_FLEET)
+    fleet_config.update(config_section or {})
+    return fleet_config
+
+
+def normalize_aps(config):
+    """
+    Список точек доступа из config.json.
+
+    mikrotik_aps - список {"ap_id", "ip", "user", "password"}; если его нет,
+    используется одиночная mikrotik_ap (ap_id = ее ip). Недостающие учетные
+    данные берутся из script_collector.
+    """
+    collector = config.get("script_collector", {})
+    aps = config.get("mikrotik_aps") or ([config["mikrotik_ap"]] if "mikrotik_ap" in config else [])
+    normalized = []
+    for ap in aps:
+        normalized.append({
+            "ap_id": ap.get("ap_id") or ap["ip"],
+            "ip": ap["ip"],
+            "user": ap.get("user", collector.get("user")),
+            "password": ap.get("password", collector.get("password")),
+        })
+    return normalized
+
+# ------------------------------------------------------------------------------
+# 1. ОБЪЕДИНЕНИЕ СНИМКОВ
+# ------------------------------------------------------------------------------
+
+def _signal_key(metrics):
+    rssi = metrics.get("RSSI")
+    return rssi if rssi is not None else float('-inf')
+
+
+def merge_snapshots(snapshots):
+    """
+    {ap_id: {MAC: метрики}} -> {MAC: метрики самой сильной ассоциации}.
+
+    К метрикам добавляются ap_id (обслуживающая AP) и seen_by (в скольких
+    таблицах виден клиент). При равном сигнале побеждает AP, идущая раньше
+    в конфигурации, чтобы ap_id не "мигал" между тиками.
+    """
+    merged = {}
+    for ap_id, clients in snapshots.items():
+        for mac, metrics in clients.items():
+            current = merged.get(mac)
+            if current is None or _signal_key(metrics) > _signal_key(current):
+                seen_by = current["seen_by"] + 1 if current else 1
+                merged[mac] = dict(metrics, ap_id=ap_id, seen_by=seen_by)
+            else:
+                current["seen_by"] += 1
+    return merged
+
+# ------------------------------------------------------------------------------
+# 2. ПАРАЛЛЕЛЬНЫЙ ОПРОС
+# ------------------------------------------------------------------------------
+
+class APFleet:
+    """
+    Точки доступа, опрашиваемые одним расписанием.
+
+    snmp - один параллельный GETBULK-обход всех AP (snmp_poller.bulk_walk);
+    api  - по постоянной сессии RouterOS API на AP, запросы в пуле потоков.
+    Снимок кэшируется на cache_sec (fleet_config), так что все CPE одного тика
+    используют один и тот же опрос. В режиме api ответы ждут не дольше
+    deadline_sec (по умолчанию - api_timeout): AP, не уложившаяся в срок,
+    пропускается в этом тике и не опрашивается повторно, пока ее запрос не
+    завершится.
+    """
+
+    def __init__(self, aps, backend="api", snmp_config=None, api_config=None, fleet_config=None):
+        if backend not in SUPPORTED_BACKENDS:
+            print(f"   [WARN] Несколько AP поддерживаются для {SUPPORTED_BACKENDS}; '{backend}' заменен на api.")
+            backend = "api"
+        self.aps = aps
+        self.backend = backend
+        self.snmp_config = snmp_poller.resolve_snmp_config(snmp_config)
+        fleet_config = resolve_fleet_config(fleet_config)
+        self.cache_sec = fleet_config["cache_sec"]
+        api_config = api_config or {}
+        self.deadline_sec = fleet_config["deadline_sec"] or api_config.get("api_timeout", 5)
+        self.clients = {}
+        self._in_flight = {}
+        if backend == "api":
+            self.clients = {
+                ap["ap_id"]: routeros_api.RouterOSApiClient(
+                    ap["ip"], ap["user"], ap["password"], port=api_config.get("api_port"),
+                    use_ssl=api_config.get("api_ssl", False), timeout=api_config.get("api_timeout", 5)
+                )
+                for ap in aps
+            }
+            self._executor = ThreadPoolExecutor(max_workers=max(1, len(aps)), thread_name_prefix="ap-fleet")
+        self._merged = None
+        self._taken_at = 0.0
+        self.last_snapshots = {}
+
+    def _snapshot_api(self, ap_id):
+        try:
+            rows = self.clients[ap_id].registration_table()
+        except (OSError, routeros_api.RouterOSApiError) as e:
+            print(f"   [WARN] AP {ap_id}: {e}")
+            return None
+        return {(row.get('mac-address') or '').upper(): routeros_api.registration_to_metrics(row)
+                for row in rows if row.get('mac-address')}
+
+    def snapshots(self):
+        """Registration-table всех AP: {ap_id: {MAC: метрики}} (AP без ответа пропускаются)."""
+        if self.backend == "snmp":
+            by_host = snmp_poller.registration_snapshots([ap["ip"] for ap in self.aps], self.snmp_config)
+            result = {}
+            for ap in self.aps:
+                snapshot = by_host.get(ap["ip"])
+                if isinstance(snapshot, snmp_poller.SnmpError):
+                    print(f"   [WARN] AP {ap['ap_id']}: {snapshot}")
+                elif snapshot is not None:
+                    result[ap["ap_id"]] = snapshot
+            return result
+
+        futures = {}
+        for ap in self.aps:
+            previous = self._in_flight.get(ap["ap_id"])
+            if previous is not None and not previous.done():
+                print(f"   [WARN] AP {ap['ap_id']}: предыдущий запрос еще не завершен.")
+                continue
+            futures[self._executor.submit(self._snapshot_api, ap["ap_id"])] = ap["ap_id"]
+
+        done, _ = wait(futures, timeout=self.deadline_sec)
+
+        result = {}
+        for future, ap_id in futures.items():
+            self._in_flight[ap_id] = future
+            if future not in done:
+                print(f"   [WARN] AP {ap_id}: нет ответа за {self.deadline_sec} с.")
+                continue
+            snapshot = future.result()
+            if snapshot is not None:
+                result[ap_id] = snapshot
+        return result
+
+    def merged(self):
+        """Объединенный снимок с учетом роуминга (кэшируется на cache_sec)."""
+        if self._merged is None or time.monotonic() - self._taken_at >= self.cache_sec:
+            self.last_snapshots = self.snapshots()
+            self._merged, self._taken_at = merge_snapshots(self.last_snapshots), time.monotonic()
+        return self._merged
+
+    def lookup(self, client_mac):
+        """Метрики клиента {"RSSI", "TxRate", "RxRate", "ap_id", "seen_by"} или None."""
+        return self.merged().get(client_mac.upper())
+
+    def close(self):
+        if self.backend == "api":
+            self._executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
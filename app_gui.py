@@ -6,70 +6,82 @@ import sys
 import json
 import sqlite3 # Новый импорт для работы с БД
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from PIL import Image, ImageTk
+import alert_engine
+import archive_catalog
+import coverage_holes
+import data_access
+import mikrotik_storage
+import perf_metrics
+import rtk_storage
+import shift_calendar
+import spatial_index
+import timeseries
 
 # --- Константы Файлов и Баз Данных ---
 CONFIG_FILE = 'config.json'
 COLLECTOR_SCRIPT = 'data_collector.py' # Для запуска сбора Mikrotik
 VISUALIZATION_SCRIPT = 'visualization.py'
+HOLES_SCRIPT = 'coverage_holes.py' # Rollup смены и поиск зон слабого сигнала
 LOG_DIR = 'logs'
 HEATMAP_FILE = 'coverage_heatmap.png'
-
-# Константы для SQLite Баз Данных
-RTK_DB = 'rtk_log.db' 
-MIKROTIK_DB = 'mikrotik_log.db' 
+HEATMAP_EXTENT_FILE = 'coverage_heatmap.json' # Привязка пикселей карты к координатам (visualization.py)
+INSPECT_RADIUS_M = 50 # Радиус выборки замеров при клике по карте
+TREND_RANGES = (("1 ч", 3600), ("Смена", None), ("24 ч", 86400), ("7 сут", 7 * 86400), ("30 сут", 30 * 86400))
+TREND_MIN_SPAN_SEC = 60 # Максимальное увеличение графика тренда
+# Журнал замеров во вкладке GPS: в таблице не больше LOG_WINDOW_ROWS строк,
+# остальное догружается из БД страницами по LOG_PAGE_ROWS при прокрутке
+LOG_PAGE_ROWS = 200
+LOG_WINDOW_ROWS = 1000
+LOG_ALL_RIGS = "Все установки"
+# Фильтр качества: (rssi_above, rssi_at_most) - те же пороги, что в сводке Wi-Fi
+LOG_QUALITY_FILTERS = {
+    "Любое качество": (None, None),
+    "Отлично (> -65)": (-65, None),
+    "Хорошо (-75..-65)": (-75, -65),
+    "Плохо (<= -75)": (None, -75),
+}
+
+# Пути к базам SQLite берутся из config.json (data_access.resolve_db_paths)
 
 # ==============================================================================
 # УТИЛИТЫ ДЛЯ СМЕН И ФАЙЛОВ
 # ==============================================================================
 
+# Границы рабочих дней и смен задает календарь площадки (shift_calendar)
+
 def get_log_file_path(now=None):
-    """Определяет имя лог-файла на основе рабочего дня (с 20:00 до 20:00). 
+    """Определяет имя лог-файла на основе рабочего дня.
     
     Примечание: Это утилита из старой логики CSV, сохранена для совместимости.
     """
-    if now is None:
-        now = datetime.now()
-    if now.hour >= 20:
-        log_date = now.date() + timedelta(days=1)
-    else:
-        log_date = now.date()
+    log_date = shift_calendar.get_calendar().work_day(now or datetime.now())
     # Возвращаем путь, который использовался в CSV-логике
-    return os.path.join(LOG_DIR, f"coverage_log_{log_date.strftime('%Y-%m-%d')}.csv")
+    return os.path.join(LOG_DIR, f"coverage_log_{log_date}.csv")
 
 def get_shift_period_by_date(log_date_str):
     """
-    Определяет период данных по дате лог-файла (который заканчивается в 20:00 этого дня).
+    Определяет период данных по дате лог-файла (рабочий день календаря смен):
+    (описание, начало, конец, (первый, последний shift_id) для выборок из БД).
     """
+    calendar = shift_calendar.get_calendar()
     try:
-        end_day = datetime.strptime(log_date_str, '%Y-%m-%d').date()
-        
-        # Период с 20:00 предыдущего дня до 20:00 текущего дня
-        start_time = datetime.combine(end_day - timedelta(days=1), datetime.min.time().replace(hour=20))
-        end_time = datetime.combine(end_day, datetime.min.time().replace(hour=20))
-        
-        shift_info = f"С {start_time.strftime('%Y-%m-%d %H:%M')} по {end_time.strftime('%Y-%m-%d %H:%M')}"
-        return shift_info, start_time, end_time
+        start_time, end_time = calendar.day_bounds(log_date_str)
+        return calendar.describe_day(log_date_str), start_time, end_time, calendar.day_id_range(log_date_str)
     except ValueError:
-        return "Неверный формат даты", None, None
+        return "Неверный формат даты", None, None, None
 
 def get_current_shift_period():
-    """Возвращает информацию и период для текущего рабочего дня."""
-    now = datetime.now()
-    current_log_date_str = get_log_file_path(now).split('_')[-1].replace('.csv', '')
-    
-    # Используем логику get_shift_period_by_date для получения точного периода
-    shift_info, start_time, end_time = get_shift_period_by_date(current_log_date_str)
-    
-    # Уточнение информации о смене (Дневная/Ночная)
-    if now.hour >= 8 and now.hour < 20:
-        shift_type = "Дневная"
-    else:
-        shift_type = "Ночная"
-        
-    shift_info = f"{shift_type} Смена ({shift_info.split('С ')[-1]})"
-    return shift_info, start_time, end_time
+    """Возвращает информацию и период для текущего рабочего дня (с названием текущей смены)."""
+    calendar = shift_calendar.get_calendar()
+    shift_id = calendar.current()
+    work_day = calendar.day_of(shift_id)
+    start_time, end_time = calendar.day_bounds(work_day)
+    shift_name = calendar.shifts[shift_id % 10]["name"]
+    shift_info = f"{shift_name} Смена ({start_time.strftime('%Y-%m-%d %H:%M')} по {end_time.strftime('%Y-%m-%d %H:%M')})"
+    return shift_info, start_time, end_time, calendar.day_id_range(work_day)
 
 
 # ==============================================================================
@@ -84,6 +96,10 @@ class MikrotikMonitorApp:
 
         # --- Хранилище данных ---
         self.config = self._load_config()
+        # Чтение из БД: пул соединений только для чтения и кэш результатов на цикл обновления
+        self.data = data_access.DataAccess(self.config)
+        self.mikrotik_db = self.data.path(data_access.DB_MIKROTIK)
+        self.rtk_db = self.data.path(data_access.DB_RTK)
         self.rig_processes = {} # {Rig_ID: subprocess.Popen object}
         # ИСПОЛЬЗУЕМ НОВУЮ СТРУКТУРУ JSON: mikrotik_cpelist
         self.rig_ids = [rig['rig_id'] for rig in self.config.get('mikrotik_cpelist', [])] 
@@ -100,7 +116,7 @@ class MikrotikMonitorApp:
             self.selected_rig_id.set(self.rig_ids[0])
             
         # --- Инициализация интерфейса ---
-        self._get_available_log_dates() 
+        self._get_available_log_dates(rescan_csv=True) 
         
         self._create_top_frame()
         self._create_status_overview_frame() 
@@ -121,27 +137,40 @@ class MikrotikMonitorApp:
         with open(CONFIG_FILE, 'r') as f:
             return json.load(f)
 
-    def _get_available_log_dates(self):
-        """Сканирует папку logs и возвращает список дат."""
+    def _get_available_log_dates(self, rescan_csv=False):
+        """Читает список дат из каталога архива (archive_catalog) одним запросом."""
         self.archive_dates_list = ["Текущий день"]
-        if not os.path.exists(LOG_DIR):
-            return
-            
-        temp_dates = []
-        for filename in os.listdir(LOG_DIR):
-            if filename.startswith("coverage_log_") and filename.endswith(".csv"):
-                try:
-                    date_part = filename.split('_')[-1].replace('.csv', '')
-                    temp_dates.append(date_part)
-                except:
-                    continue
-                    
-        self.archive_dates = sorted(list(set(temp_dates)), reverse=True)
+        try:
+            conn = archive_catalog.open_catalog(self.mikrotik_db)
+            try:
+                if rescan_csv:
+                    # Новые/измененные CSV-файлы в logs (остальные уже в каталоге)
+                    archive_catalog.scan_csv_dir(conn, LOG_DIR)
+                self.archive_dates = archive_catalog.list_shift_dates(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            self.archive_dates = []
+
         self.archive_dates_list.extend(self.archive_dates)
         
         if hasattr(self, 'date_selector'):
             self.date_selector.config(values=self.archive_dates_list)
 
+    def _get_archive_csv_path(self, date_str):
+        """Путь к CSV-логу рабочего дня по каталогу (или по старому шаблону имени)."""
+        try:
+            conn = archive_catalog.open_catalog(self.mikrotik_db)
+            try:
+                for entry in archive_catalog.get_entries(conn, date_str):
+                    if entry['location'] == archive_catalog.LOCATION_CSV:
+                        return entry['source']
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+        return os.path.join(LOG_DIR, f"coverage_log_{date_str}.csv")
+
     # ----------------------------------------------------------------------
     # II. ФОРМИРОВАНИЕ ИНТЕРФЕЙСА
     # ----------------------------------------------------------------------
@@ -159,7 +188,8 @@ class MikrotikMonitorApp:
         
         # 2. Селектор Даты/Архива
         tk.Label(top_frame, text="Период Данных:", font=self.font_main).pack(side=tk.LEFT, padx=(20, 5))
-        self.date_selector = ttk.Combobox(top_frame, textvariable=self.selected_archive_date, values=self.archive_dates_list, state="readonly", width=15, font=self.font_main)
+        self.date_selector = ttk.Combobox(top_frame, textvariable=self.selected_archive_date, values=self.archive_dates_list, state="readonly", width=15, font=self.font_main,
+                                          postcommand=self._get_available_log_dates)
         self.date_selector.bind("<<ComboboxSelected>>", self._on_archive_date_select)
         self.date_selector.pack(side=tk.LEFT, padx=5)
 
@@ -213,6 +243,8 @@ class MikrotikMonitorApp:
         self._setup_heatmap_tab()
         self._setup_gps_status_tab()
         self._setup_rtk_status_tab() # !!! НОВЫЙ ВЫЗОВ !!!
+        self._setup_diagnostics_tab()
+        self._setup_alerts_tab()
 
     def _setup_control_tab(self):
         tk.Label(self.tab_control, text="Управление Сбором Данных", font=self.font_header).pack(pady=10)
@@ -234,24 +266,377 @@ class MikrotikMonitorApp:
         self.avg_rssi_label.pack(pady=5)
         self.avg_rate_label = tk.Label(self.summary_frame, text="Средний Tx/Rx Rate: -", font=('Arial', 16), fg='gray')
         self.avg_rate_label.pack(pady=5)
-        tk.Label(self.tab_wifi, text="[Здесь будет отображаться график RSSI/TxRate за смену]", fg='blue').pack(pady=50)
+        self._setup_trend_panel()
 
 
+    def _setup_trend_panel(self):
+        """
+        График RSSI/TxRate выбранной установки. Ряд прореживается до ширины
+        холста (timeseries: LTTB + огибающая min/max), длинные окна читаются из
+        rollup. Колесо мыши - масштаб вокруг курсора, перетаскивание - прокрутка.
+        """
+        trend_frame = tk.LabelFrame(self.tab_wifi, text="Тренд RSSI / TxRate", font=self.font_main)
+        trend_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        buttons = tk.Frame(trend_frame); buttons.pack(fill='x', padx=5, pady=2)
+        for title, seconds in TREND_RANGES:
+            tk.Button(buttons, text=title, command=lambda s=seconds: self._trend_set_range(s), font=self.font_main).pack(side=tk.LEFT, padx=2)
+        self.trend_info_label = tk.Label(buttons, text="", font=self.font_main, fg='gray'); self.trend_info_label.pack(side=tk.LEFT, padx=10)
+        self.trend_canvas = tk.Canvas(trend_frame, bg='white', height=260, highlightthickness=0)
+        self.trend_canvas.pack(fill='both', expand=True, padx=5, pady=5)
+
+        self.trend_cache = timeseries.SeriesCache(self.mikrotik_db)
+        self.trend_live = True # Окно следует за текущим временем
+        self.trend_span = (0.0, 0.0)
+        self.trend_drag_x = None
+        self.trend_redraw_job = None
+        self.trend_canvas.bind("<Configure>", lambda e: self._trend_schedule_redraw())
+        self.trend_canvas.bind("<MouseWheel>", lambda e: self._on_trend_zoom(e.x, 0.8 if e.delta > 0 else 1.25))
+        self.trend_canvas.bind("<Button-4>", lambda e: self._on_trend_zoom(e.x, 0.8))
+        self.trend_canvas.bind("<Button-5>", lambda e: self._on_trend_zoom(e.x, 1.25))
+        self.trend_canvas.bind("<ButtonPress-1>", self._on_trend_press)
+        self.trend_canvas.bind("<B1-Motion>", self._on_trend_drag)
+        self._trend_set_range(None)
+        self.master.after(10000, self._trend_follow)
+
+    def _trend_plot_area(self):
+        """Область построения на холсте: (left, right, width)."""
+        width = max(self.trend_canvas.winfo_width(), 200)
+        return 55, width - 10, width - 65
+
+    def _trend_set_range(self, seconds):
+        """Окно графика: последние seconds секунд или смена (None), выбранная в архиве или текущая."""
+        selected_date_str = self.selected_archive_date.get()
+        if seconds is None:
+            if selected_date_str and selected_date_str != "Текущий день":
+                _, start_time, end_time, _ = get_shift_period_by_date(selected_date_str)
+            else:
+                _, start_time, end_time, _ = get_current_shift_period()
+            self.trend_live = end_time > datetime.now()
+            end_time = min(end_time, datetime.now())
+        else:
+            end_time = datetime.now()
+            start_time = end_time - timedelta(seconds=seconds)
+            self.trend_live = True
+        self.trend_span = (timeseries.to_epoch(start_time), timeseries.to_epoch(end_time))
+        self._trend_schedule_redraw()
+
+    def _on_trend_zoom(self, x, factor):
+        left, _, plot_width = self._trend_plot_area()
+        start, end = self.trend_span
+        anchor = start + min(max((x - left) / plot_width, 0.0), 1.0) * (end - start)
+        span = max((end - start) * factor, TREND_MIN_SPAN_SEC)
+        self.trend_span = (anchor - (anchor - start) * span / (end - start), anchor + (end - anchor) * span / (end - start))
+        self.trend_live = self.trend_span[1] >= timeseries.to_epoch(datetime.now())
+        self._trend_schedule_redraw()
+
+    def _on_trend_press(self, event):
+        self.trend_drag_x = event.x
+
+    def _on_trend_drag(self, event):
+        if self.trend_drag_x is None:
+            return
+        _, _, plot_width = self._trend_plot_area()
+        start, end = self.trend_span
+        shift = (self.trend_drag_x - event.x) / plot_width * (end - start)
+        self.trend_drag_x = event.x
+        self.trend_span = (start + shift, end + shift)
+        self.trend_live = self.trend_span[1] >= timeseries.to_epoch(datetime.now())
+        self._trend_schedule_redraw()
+
+    def _trend_follow(self):
+        """Сдвигает окно к текущему времени, пока график в режиме 'live'."""
+        if self.trend_live:
+            start, end = self.trend_span
+            now = timeseries.to_epoch(datetime.now())
+            self.trend_span = (start + now - end, now)
+            self._trend_schedule_redraw()
+        self.master.after(10000, self._trend_follow)
+
+    def _trend_schedule_redraw(self):
+        # События колеса и перетаскивания идут пачками - рисуем один раз после паузы
+        if self.trend_redraw_job is not None:
+            self.master.after_cancel(self.trend_redraw_job)
+        self.trend_redraw_job = self.master.after(30, self._trend_redraw)
+
+    def _trend_redraw(self):
+        self.trend_redraw_job = None
+        canvas = self.trend_canvas
+        canvas.delete("all")
+        rig_id = self.selected_rig_id.get()
+        left, right, plot_width = self._trend_plot_area()
+        height = max(canvas.winfo_height(), 120)
+        start, end = self.trend_span
+        if not rig_id or not os.path.exists(self.mikrotik_db) or end <= start:
+            canvas.create_text(left + plot_width / 2, height / 2, text="Нет данных", fill='gray')
+            return
+        try:
+            data = self.trend_cache.get(rig_id, start, end, int(plot_width))
+        except sqlite3.Error as e:
+            canvas.create_text(left + plot_width / 2, height / 2, text=f"Ошибка чтения БД: {e}", fill='red')
+            return
+
+        level = data["level"]
+        self.trend_info_label.config(text=(
+            f"{timeseries.from_epoch(start):%d.%m %H:%M} - {timeseries.from_epoch(end):%d.%m %H:%M}, "
+            f"{'сырые замеры' if level == timeseries.LEVEL_RAW else f'rollup {level // 60} мин'}"
+        ))
+
+        def to_x(t):
+            return left + (t - start) / (end - start) * plot_width
+
+        panel_height = (height - 30) / 2
+        panels = (("rssi", "RSSI, дБм", 5, '#1f77b4', '#c6dbef'),
+                  ("tx", "TxRate, Мбит/с", 5 + panel_height + 10, '#2ca02c', '#c7e9c0'))
+        for field, title, top, line_color, band_color in panels:
+            bottom = top + panel_height
+            canvas.create_rectangle(left, top, right, bottom, outline='#999999')
+            canvas.create_text(left + 5, top + 2, text=title, anchor='nw', fill='#555555')
+            band_x, low, high = data[field + "_band"]
+            line_x, line_y = data[field]
+            values = np.concatenate([low, high, line_y[~np.isnan(line_y)]])
+            if not len(values):
+                continue
+            y_min, y_max = float(values.min()), float(values.max())
+            if field == "rssi":
+                y_min, y_max = min(y_min, -85.0), max(y_max, -55.0)
+            else:
+                y_min = 0.0
+            y_max = y_max if y_max > y_min else y_min + 1.0
+
+            def to_y(v, top=top, bottom=bottom, y_min=y_min, y_max=y_max):
+                return bottom - (v - y_min) / (y_max - y_min) * (bottom - top)
+
+            for value in np.linspace(y_min, y_max, 4):
+                canvas.create_text(left - 4, to_y(value), text=f"{value:.0f}", anchor='e', fill='#555555', font=('Arial', 8))
+            if field == "rssi":
+                for threshold in (-65, -75):
+                    if y_min < threshold < y_max:
+                        canvas.create_line(left, to_y(threshold), right, to_y(threshold), fill='#ff9999', dash=(4, 2))
+            # Огибающая min/max - один многоугольник (верхняя граница туда, нижняя обратно)
+            if len(band_x) > 1:
+                xs = to_x(band_x)
+                polygon = np.concatenate([np.column_stack([xs, to_y(high)]), np.column_stack([xs, to_y(low)])[::-1]])
+                canvas.create_polygon(*polygon.ravel().tolist(), fill=band_color, outline='')
+            valid = ~np.isnan(line_y)
+            if valid.sum() > 1:
+                points = np.column_stack([to_x(line_x[valid]), to_y(line_y[valid])])
+                points[:, 0] = np.clip(points[:, 0], left, right)
+                canvas.create_line(*points.ravel().tolist(), fill=line_color, width=1)
+
+        for t in np.linspace(start, end, 5):
+            label = f"{timeseries.from_epoch(t):%d.%m %H:%M}" if end - start > 86400 else f"{timeseries.from_epoch(t):%H:%M:%S}"
+            canvas.create_text(to_x(t), height - 12, text=label, fill='#555555', font=('Arial', 8))
+
     def _setup_heatmap_tab(self):
         tk.Label(self.tab_map, text="Карта Покрытия Карьера (Общая)", font=self.font_header).pack(pady=10)
         control_frame = tk.Frame(self.tab_map); control_frame.pack(pady=5)
         tk.Button(control_frame, text="🔄 Обновить Карту", command=self._generate_and_reload_map, font=self.font_main).pack(side=tk.LEFT, padx=10)
         self.map_time_label = tk.Label(control_frame, text="Карта создана: -", font=self.font_main, fg='gray'); self.map_time_label.pack(side=tk.LEFT, padx=10)
+        self.map_inspect_label = tk.Label(self.tab_map, text="Щелкните по карте, чтобы посмотреть замеры рядом с точкой.", font=self.font_main, fg='gray', justify=tk.LEFT)
+        self.map_inspect_label.pack(fill='x', padx=20)
         self.map_canvas = tk.Label(self.tab_map, bd=2, relief=tk.SUNKEN); self.map_canvas.pack(fill='both', expand=True, padx=20, pady=10)
+        self.map_canvas.bind("<Button-1>", self._on_map_click)
+        self.map_scale = None
         self._load_heatmap_image()
 
+        holes_frame = tk.LabelFrame(self.tab_map, text="Зоны слабого сигнала (текущая смена)", font=self.font_main)
+        holes_frame.pack(fill='x', padx=20, pady=(0, 10))
+        tk.Button(holes_frame, text="🔍 Найти зоны", command=self._run_hole_detection, font=self.font_main).pack(anchor='w', padx=5, pady=2)
+        columns = ("hole", "area", "center", "rssi", "samples", "trend")
+        headers = ("Зона", "Площадь, м²", "Центр (lon, lat)", "RSSI, дБм", "Замеров", "Тренд")
+        self.holes_tree = ttk.Treeview(holes_frame, columns=columns, show="headings", height=5)
+        for column, header in zip(columns, headers):
+            self.holes_tree.heading(column, text=header)
+            self.holes_tree.column(column, width=200 if column == "center" else 100, anchor="w")
+        self.holes_tree.pack(fill='x', padx=5, pady=5)
+        self._update_holes_list()
+
 
     def _setup_gps_status_tab(self):
         tk.Label(self.tab_gps, text="Статус GPS и Логи Выбранной Установки", font=self.font_header).pack(pady=10)
         self.gps_status_frame = tk.LabelFrame(self.tab_gps, text="Статус GPS", font=self.font_main, padx=10, pady=10); self.gps_status_frame.pack(fill='x', padx=20, pady=5)
         self.gps_info_label = tk.Label(self.gps_status_frame, justify=tk.LEFT, text="Статус: Неизвестен\nПоследняя координата: -", font=self.font_main); self.gps_info_label.pack(fill='x')
-        tk.Label(self.tab_gps, text=f"Последние 10 записей из лога:", font=self.font_main).pack(pady=(10, 5))
-        self.log_text = tk.Text(self.tab_gps, height=15, width=80, state=tk.DISABLED); self.log_text.pack(fill='both', expand=True, padx=20)
+
+        filter_frame = tk.Frame(self.tab_gps); filter_frame.pack(fill='x', padx=20, pady=(10, 5))
+        tk.Label(filter_frame, text="Журнал замеров за период:", font=self.font_main).pack(side=tk.LEFT)
+        self.log_rig_filter = tk.StringVar(self.master, value=LOG_ALL_RIGS)
+        rig_filter = ttk.Combobox(filter_frame, textvariable=self.log_rig_filter, values=[LOG_ALL_RIGS] + self.rig_ids, state="readonly", width=18)
+        rig_filter.pack(side=tk.LEFT, padx=5)
+        self.log_quality_filter = tk.StringVar(self.master, value=next(iter(LOG_QUALITY_FILTERS)))
+        quality_filter = ttk.Combobox(filter_frame, textvariable=self.log_quality_filter, values=list(LOG_QUALITY_FILTERS), state="readonly", width=18)
+        quality_filter.pack(side=tk.LEFT, padx=5)
+        rig_filter.bind("<<ComboboxSelected>>", lambda e: self._reset_log_view())
+        quality_filter.bind("<<ComboboxSelected>>", lambda e: self._reset_log_view())
+        self.log_status_label = tk.Label(filter_frame, text="", font=self.font_main, fg='gray'); self.log_status_label.pack(side=tk.LEFT, padx=10)
+
+        log_frame = tk.Frame(self.tab_gps); log_frame.pack(fill='both', expand=True, padx=20, pady=(0, 10))
+        columns = ("time", "rig", "rssi", "tx", "rx", "lon", "lat", "samples")
+        headers = ("Время", "Установка", "RSSI, дБм", "TxRate", "RxRate", "Долгота", "Широта", "Замеров")
+        self.log_tree = ttk.Treeview(log_frame, columns=columns, show="headings", height=15)
+        for column, header in zip(columns, headers):
+            self.log_tree.heading(column, text=header)
+            self.log_tree.column(column, width=140 if column == "time" else 90, anchor="w")
+        self.log_tree.tag_configure("excellent", foreground="green")
+        self.log_tree.tag_configure("good", foreground="orange")
+        self.log_tree.tag_configure("poor", foreground="red")
+        self.log_scrollbar = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_tree.yview)
+        self.log_tree.configure(yscrollcommand=self._on_log_scroll)
+        self.log_scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.log_tree.pack(side=tk.LEFT, fill='both', expand=True)
+
+        self.log_period = None       # (first_shift, last_shift) журнала
+        self.log_view_key = None     # Период и фильтры, по которым заполнена таблица
+        self.log_following = True    # Таблица показывает конец журнала и дописывается новыми строками
+        self.log_has_older = False
+        self.log_page_job = None
+
+    def _log_query_args(self):
+        rig_id = self.log_rig_filter.get()
+        rssi_above, rssi_at_most = LOG_QUALITY_FILTERS[self.log_quality_filter.get()]
+        return {"rig_id": None if rig_id == LOG_ALL_RIGS else rig_id,
+                "rssi_above": rssi_above, "rssi_at_most": rssi_at_most}
+
+    def _log_row_values(self, row):
+        def fmt(value, digits):
+            return "-" if value is None else f"{value:.{digits}f}"
+        return (row["timestamp"], row["rig_id"], fmt(row["rssi"], 1), row["tx_rate"] or "-", row["rx_rate"] or "-",
+                fmt(row["longitude"], 5), fmt(row["latitude"], 5), row["sample_count"])
+
+    def _log_row_tag(self, row):
+        if row["rssi"] is None:
+            return ()
+        return ("excellent",) if row["rssi"] > -65 else ("good",) if row["rssi"] > -75 else ("poor",)
+
+    def _log_insert(self, rows, index):
+        """Вставляет строки журнала (iid = id строки) в начало (0) или в конец ('end') таблицы."""
+        for row in (reversed(rows) if index == 0 else rows):
+            iid = str(row["id"])
+            if self.log_tree.exists(iid):
+                continue
+            self.log_tree.insert("", index, iid=iid, values=self._log_row_values(row), tags=self._log_row_tag(row))
+
+    def _log_trim(self, from_top):
+        """Удаляет лишние строки с противоположного прокрутке края: размер таблицы постоянен."""
+        items = self.log_tree.get_children()
+        extra = len(items) - LOG_WINDOW_ROWS
+        if extra > 0:
+            self.log_tree.delete(*(items[:extra] if from_top else items[-extra:]))
+            if from_top:
+                self.log_has_older = True
+            else:
+                self.log_following = False
+
+    def _log_key(self, iid):
+        """Ключ постраничного чтения (timestamp, id) строки таблицы."""
+        return self.log_tree.set(iid, "time"), int(iid)
+
+    def _log_connect(self):
+        """Соединение из пула data_access (не закрывается после запроса)."""
+        return self.data.connection(data_access.DB_MIKROTIK)
+
+    def _reset_log_view(self):
+        """Заполняет таблицу последней страницей периода с текущими фильтрами."""
+        self.log_tree.delete(*self.log_tree.get_children())
+        self.log_view_key = None
+        self.log_following = True
+        if self.log_period is None:
+            return
+        conn = self._log_connect()
+        if conn is None:
+            self.log_status_label.config(text="БД не найдена")
+            return
+        try:
+            first_shift, last_shift = self.log_period
+            rows = mikrotik_storage.query_log_page(conn, first_shift, last_shift, limit=LOG_PAGE_ROWS,
+                                                   **self._log_query_args())
+        except sqlite3.Error as e:
+            self.log_status_label.config(text=f"Ошибка чтения БД: {e}")
+            return
+        self._log_insert(rows, "end")
+        self.log_has_older = len(rows) == LOG_PAGE_ROWS
+        self.log_view_key = (self.log_period, self.log_rig_filter.get(), self.log_quality_filter.get())
+        if rows:
+            self.log_tree.see(str(rows[-1]["id"]))
+
+    def _update_log_view(self, first_shift, last_shift):
+        """
+        Раз в секунду: дописывает новые строки в конец (если таблица показывает
+        конец журнала) и обновляет открытые строки deadband, которые сборщик
+        еще продлевает. Вся таблица не перерисовывается.
+        """
+        self.log_period = (first_shift, last_shift)
+        if self.log_view_key is None or self.log_view_key[0] != self.log_period:
+            self._reset_log_view()
+            return
+        if not self.log_following:
+            return
+        items = self.log_tree.get_children()
+        conn = self._log_connect()
+        if conn is None:
+            return
+        try:
+            # Последняя строка каждой установки может еще меняться (sample_count, RSSI)
+            open_ids = {}
+            for iid in reversed(items[-LOG_PAGE_ROWS:]):
+                open_ids.setdefault(self.log_tree.set(iid, "rig"), int(iid))
+            for row in mikrotik_storage.query_log_rows(conn, list(open_ids.values())):
+                self.log_tree.item(str(row["id"]), values=self._log_row_values(row), tags=self._log_row_tag(row))
+            after_key = self._log_key(items[-1]) if items else None
+            rows = mikrotik_storage.query_log_page(conn, first_shift, last_shift, after_key=after_key,
+                                                   limit=LOG_PAGE_ROWS, **self._log_query_args())
+        except sqlite3.Error:
+            return
+        if not rows:
+            return
+        at_bottom = self.log_tree.yview()[1] >= 0.999
+        self._log_insert(rows, "end")
+        self._log_trim(from_top=True)
+        self.log_following = True
+        if at_bottom:
+            self.log_tree.see(str(rows[-1]["id"]))
+
+    def _on_log_scroll(self, first, last):
+        """Догружает страницу при прокрутке к краю таблицы."""
+        self.log_scrollbar.set(first, last)
+        if self.log_page_job is not None or not self.log_tree.get_children():
+            return
+        if float(first) <= 0.0 and self.log_has_older:
+            self.log_page_job = self.master.after_idle(self._log_load_page, True)
+        elif float(last) >= 1.0 and not self.log_following:
+            self.log_page_job = self.master.after_idle(self._log_load_page, False)
+
+    def _log_load_page(self, older):
+        self.log_page_job = None
+        if self.log_period is None:
+            return
+        items = self.log_tree.get_children()
+        if not items:
+            return
+        conn = self._log_connect()
+        if conn is None:
+            return
+        try:
+            first_shift, last_shift = self.log_period
+            if older:
+                key = {"before_key": self._log_key(items[0])}
+            else:
+                key = {"after_key": self._log_key(items[-1])}
+            rows = mikrotik_storage.query_log_page(conn, first_shift, last_shift, limit=LOG_PAGE_ROWS,
+                                                   **key, **self._log_query_args())
+        except sqlite3.Error:
+            return
+        anchor = items[0] if older else items[-1]
+        if older:
+            self.log_has_older = len(rows) == LOG_PAGE_ROWS
+            self._log_insert(rows, 0)
+            self._log_trim(from_top=False)
+        else:
+            self._log_insert(rows, "end")
+            self._log_trim(from_top=True)
+            # Дошли до конца журнала - таблица снова дописывается новыми строками
+            self.log_following = len(rows) < LOG_PAGE_ROWS
+        self.log_tree.see(anchor)
+        self.log_status_label.config(text=f"Строк в таблице: {len(self.log_tree.get_children())}")
         
     # --- НОВЫЙ МЕТОД ДЛЯ ВКЛАДКИ RTK ---
     def _setup_rtk_status_tab(self):
@@ -293,15 +678,133 @@ class MikrotikMonitorApp:
         self.check_and_update_rtk_status()
 
 
+    def _setup_diagnostics_tab(self):
+        """Вкладка диагностики: длительности этапов циклов сбора из таблиц perf_metrics."""
+        self.tab_diag = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_diag, text="⏱️ Диагностика")
+        tk.Label(self.tab_diag, text="Длительность этапов сервисов (последнее окно)", font=self.font_header).pack(pady=10)
+
+        columns = ("service", "stage", "count", "mean", "p50", "p95", "max", "time")
+        headers = ("Сервис", "Этап", "Кол-во", "Сред., мс", "p50, мс", "p95, мс", "Макс., мс", "Выгрузка")
+        self.diag_tree = ttk.Treeview(self.tab_diag, columns=columns, show="headings", height=15)
+        for column, header in zip(columns, headers):
+            self.diag_tree.heading(column, text=header)
+            self.diag_tree.column(column, width=150 if column in ("service", "stage", "time") else 80, anchor="w")
+        self.diag_tree.pack(fill="both", expand=True, padx=20, pady=5)
+        self._update_diagnostics_tab()
+
+    def _update_diagnostics_tab(self):
+        rows = []
+        for db_key in (data_access.DB_MIKROTIK, data_access.DB_RTK):
+            try:
+                rows.extend(self.data.query("perf_latest", db=db_key) or [])
+            except sqlite3.Error:
+                continue
+
+        def fmt(value):
+            return "-" if value is None else f"{value:.1f}"
+
+        self.diag_tree.delete(*self.diag_tree.get_children())
+        for service, stage, count, mean_ms, p50_ms, p95_ms, max_ms, timestamp in rows:
+            self.diag_tree.insert("", "end", values=(
+                service, stage, count, fmt(mean_ms), fmt(p50_ms), fmt(p95_ms), fmt(max_ms), timestamp[11:]
+            ))
+        self.master.after(10000, self._update_diagnostics_tab)
+
+    def _setup_alerts_tab(self):
+        """
+        Вкладка тревог. Активные тревоги при запуске читаются из таблиц alerts,
+        дальше переходы приходят UDP-уведомлениями от сервисов (alert_engine)
+        и забираются из очереди в памяти - база данных не опрашивается.
+        """
+        self.tab_alerts = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_alerts, text="🚨 Тревоги")
+        tk.Label(self.tab_alerts, text="Активные тревоги", font=self.font_header).pack(pady=10)
+
+        columns = ("time", "service", "rule", "key", "severity", "message")
+        headers = ("Время", "Сервис", "Правило", "Объект", "Уровень", "Сообщение")
+        self.alerts_tree = ttk.Treeview(self.tab_alerts, columns=columns, show="headings", height=8)
+        for column, header in zip(columns, headers):
+            self.alerts_tree.heading(column, text=header)
+            self.alerts_tree.column(column, width=300 if column == "message" else 120, anchor="w")
+        self.alerts_tree.tag_configure("critical", foreground="red")
+        self.alerts_tree.tag_configure("warning", foreground="darkorange")
+        self.alerts_tree.pack(fill="x", padx=20, pady=5)
+
+        tk.Label(self.tab_alerts, text="Журнал переходов", font=self.font_main).pack(pady=(10, 0))
+        self.alerts_log = tk.Text(self.tab_alerts, height=10, state="disabled", font=('Courier', 9))
+        self.alerts_log.pack(fill="both", expand=True, padx=20, pady=5)
+
+        self.alert_rows = {}   # (service, rule, key) -> id строки Treeview
+        for db_key in (data_access.DB_MIKROTIK, data_access.DB_RTK):
+            try:
+                for alert in self.data.query("active_alerts", db=db_key) or []:
+                    self._apply_alert(alert, log=False)
+            except sqlite3.Error:
+                continue
+
+        alerts_config = alert_engine.resolve_alerts_config(self.config.get("data_storage", {}).get("alerts"))
+        try:
+            self.alert_listener = alert_engine.AlertListener(alerts_config["notify_host"], alerts_config["notify_port"])
+        except OSError as e:
+            # Порт занят (например, второй экземпляр GUI) - остается история из БД
+            self.alert_listener = None
+            print(f"[WARN] Прием тревог на порту {alerts_config['notify_port']} недоступен: {e}")
+        # Молчание установок проверяется и здесь: остановленный коллектор сам тревогу не поднимет
+        self.silence_watcher = alert_engine.create_silence_watcher(
+            self.config.get("data_storage", {}).get("alerts"), alert_engine.LocalSink(self._apply_alert))
+        self._drain_alerts()
+        self._check_silence()
+
+    def _apply_alert(self, alert, log=True):
+        """Добавляет/снимает тревогу в таблице активных и пишет переход в журнал вкладки."""
+        row_key = (alert["service"], alert["rule"], alert["key"])
+        row_id = self.alert_rows.pop(row_key, None)
+        if row_id is not None:
+            self.alerts_tree.delete(row_id)
+        if alert["state"] == alert_engine.STATE_RAISED:
+            self.alert_rows[row_key] = self.alerts_tree.insert("", 0, values=(
+                alert["timestamp"][11:], alert["service"], alert["rule"], alert["key"],
+                alert["severity"], alert["message"]
+            ), tags=(alert["severity"],))
+        if log:
+            self.alerts_log.config(state="normal")
+            self.alerts_log.insert("1.0", f"{alert['timestamp']} {alert['state']:8} {alert['key']:12} "
+                                          f"{alert['rule']}: {alert['message']}\n")
+            self.alerts_log.config(state="disabled")
+        count = len(self.alert_rows)
+        self.notebook.tab(self.tab_alerts, text=f"🚨 Тревоги ({count})" if count else "🚨 Тревоги")
+
+    def _drain_alerts(self):
+        if self.alert_listener is not None:
+            for alert in self.alert_listener.drain():
+                self._apply_alert(alert)
+        self.master.after(500, self._drain_alerts)
+
+    def _check_silence(self):
+        """Тревога collector_silent по времени последнего валидного замера в mikrotik_log."""
+        if self.silence_watcher is None or not self.rig_ids:
+            return
+        try:
+            last_valid = self.data.query("last_valid_per_rig", tuple(self.rig_ids)) or {}
+        except sqlite3.Error as e:
+            print(f"[WARN] Проверка молчания установок: {e}")
+        else:
+            self.silence_watcher.check({rig_id: last_valid.get(rig_id) for rig_id in self.rig_ids})
+        self.master.after(10000, self._check_silence)
+
+
     # ----------------------------------------------------------------------
     # III. ЛОГИКА УПРАВЛЕНИЯ И ОБНОВЛЕНИЯ ДАННЫХ
     # ----------------------------------------------------------------------
 
     def _on_rig_select(self, event=None):
+        self._trend_schedule_redraw()
         self._update_all_dynamic_data()
         
     def _on_archive_date_select(self, event=None):
-        self._get_available_log_dates() 
+        # Список дат обновляется из каталога при открытии списка (postcommand)
+        self._trend_set_range(None)
         self._update_all_dynamic_data()
 
     def _update_all_dynamic_data(self):
@@ -312,11 +815,11 @@ class MikrotikMonitorApp:
 
         # Определяем период и путь к лог-файлу (для CSV-логики)
         if selected_date_str == "Текущий день":
-            shift_info, start_time, end_time = get_current_shift_period()
+            shift_info, start_time, end_time, shift_range = get_current_shift_period()
             log_file_path = get_log_file_path()
         else:
-            shift_info, start_time, end_time = get_shift_period_by_date(selected_date_str)
-            log_file_path = os.path.join(LOG_DIR, f"coverage_log_{selected_date_str}.csv")
+            shift_info, start_time, end_time, shift_range = get_shift_period_by_date(selected_date_str)
+            log_file_path = self._get_archive_csv_path(selected_date_str)
         
         # 1. Обновить информацию о периоде
         self.shift_label.config(text=f"Период: {shift_info}")
@@ -329,10 +832,11 @@ class MikrotikMonitorApp:
         self._update_status_overview() 
         
         # 4. Обновить Статус Wi-Fi (Вкладка 2) - ВРЕМЕННО ОСТАВЛЯЕМ НА CSV
-        self._update_wifi_status_tab(rig_id, start_time, end_time, log_file_path)
+        self._update_wifi_status_tab(rig_id, start_time, end_time, shift_range, log_file_path)
 
-        # 5. Обновить GPS и Логи (Вкладка 4) - ВРЕМЕННО ОСТАВЛЯЕМ НА CSV
-        self._update_gps_status_tab(rig_id, log_file_path)
+        # 5. Обновить GPS (Вкладка 4) - ВРЕМЕННО ОСТАВЛЯЕМ НА CSV; журнал замеров - из БД
+        self._update_gps_status_tab(rig_id, start_time, end_time, log_file_path)
+        self._update_log_view(*shift_range)
         
         # NOTE: RTK обновляется автоматически в методе check_and_update_rtk_status.
         
@@ -378,13 +882,24 @@ class MikrotikMonitorApp:
                 
             label.config(text=status_text, fg=color)
 
-    def _update_wifi_status_tab(self, rig_id, start_time, end_time, log_file_path):
-        # NOTE: Эта функция пока остается на старой логике CSV-файлов
+    def _update_wifi_status_tab(self, rig_id, start_time, end_time, shift_range, log_file_path):
+        # Сводка из БД (кэш data_access, выборка по shift_id); CSV - для периодов, которых нет в БД
+        try:
+            stats = self.data.query("wifi_stats", rig_id, *shift_range)
+        except sqlite3.Error:
+            stats = None
+        if stats and stats["samples"] and stats["rssi_avg"] is not None:
+            self._show_wifi_summary(stats["rssi_avg"], stats["tx_avg"])
+            return
         try:
-            df = pd.read_csv(log_file_path)
-            df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-            df['RSSI'] = pd.to_numeric(df['RSSI'], errors='coerce')
-            df['TxRate'] = pd.to_numeric(df['TxRate'].astype(str).str.replace('Mbps', ''), errors='coerce') 
+            # Кэшированный DataFrame общий для вкладок - колонки не перезаписываются
+            df = self.data.read_csv(log_file_path)
+            df = pd.DataFrame({
+                'Rig_ID': df['Rig_ID'],
+                'Timestamp': pd.to_datetime(df['Timestamp']),
+                'RSSI': pd.to_numeric(df['RSSI'], errors='coerce'),
+                'TxRate': pd.to_numeric(df['TxRate'].astype(str).str.replace('Mbps', ''), errors='coerce'),
+            })
 
             df_rig = df[df['Rig_ID'] == rig_id]
             df_filtered = df_rig[(df_rig['Timestamp'] >= start_time) & (df_rig['Timestamp'] < end_time)].dropna(subset=['RSSI', 'TxRate'])
@@ -394,21 +909,7 @@ class MikrotikMonitorApp:
                 self.avg_rate_label.config(text="Средний Tx/Rx Rate: -", fg='gray')
                 return
 
-            avg_rssi = df_filtered['RSSI'].mean()
-            avg_tx_rate = df_filtered['TxRate'].mean()
-            
-            if avg_rssi > -65:
-                color = 'green'
-                quality = "Отлично"
-            elif avg_rssi > -75:
-                color = 'orange'
-                quality = "Хорошо"
-            else:
-                color = 'red'
-                quality = "Плохо"
-
-            self.avg_rssi_label.config(text=f"Средний RSSI: {avg_rssi:.2f} дБм ({quality})", fg=color)
-            self.avg_rate_label.config(text=f"Средний TxRate/RxRate: {avg_tx_rate:.1f} Mbps", fg='black')
+            self._show_wifi_summary(df_filtered['RSSI'].mean(), df_filtered['TxRate'].mean())
 
         except FileNotFoundError:
             self.avg_rssi_label.config(text="Средний RSSI: Лог-файл не найден", fg='gray')
@@ -417,58 +918,70 @@ class MikrotikMonitorApp:
             self.avg_rssi_label.config(text="Средний RSSI: Ошибка обработки данных", fg='gray')
             self.avg_rate_label.config(text="Средний Tx/Rx Rate: -", fg='gray')
 
+    def _show_wifi_summary(self, avg_rssi, avg_tx_rate):
+        if avg_rssi > -65:
+            color = 'green'
+            quality = "Отлично"
+        elif avg_rssi > -75:
+            color = 'orange'
+            quality = "Хорошо"
+        else:
+            color = 'red'
+            quality = "Плохо"
+
+        self.avg_rssi_label.config(text=f"Средний RSSI: {avg_rssi:.2f} дБм ({quality})", fg=color)
+        tx_text = "-" if avg_tx_rate is None else f"{avg_tx_rate:.1f} Mbps"
+        self.avg_rate_label.config(text=f"Средний TxRate/RxRate: {tx_text}", fg='black')
+
 
-    def _update_gps_status_tab(self, rig_id, log_file_path):
-        # NOTE: Эта функция пока остается на старой логике CSV-файлов
+    def _update_gps_status_tab(self, rig_id, start_time, end_time, log_file_path):
+        # Последняя строка установки из БД (кэш data_access), если она в выбранном периоде; иначе - CSV
         try:
-            df = pd.read_csv(log_file_path)
+            latest = (self.data.query("latest_per_rig", tuple(self.rig_ids)) or {}).get(rig_id)
+        except sqlite3.Error:
+            latest = None
+        period = (start_time.strftime("%Y-%m-%d %H:%M:%S"), end_time.strftime("%Y-%m-%d %H:%M:%S"))
+        if latest is not None and period[0] <= latest['timestamp'] < period[1]:
+            self._show_gps_info(latest['last_timestamp'] or latest['timestamp'], latest['longitude'], latest['latitude'])
+            return
+        try:
+            df = self.data.read_csv(log_file_path)
             df_rig = df[df['Rig_ID'] == rig_id]
             
             if df_rig.empty:
                 self.gps_info_label.config(text="Статус: Офлайн\nНет данных в логе.")
-                self.log_text.config(state=tk.NORMAL); self.log_text.delete('1.0', tk.END); self.log_text.config(state=tk.DISABLED)
                 return
 
             last_entry = df_rig.iloc[-1]
             # Предполагаем, что колонки для GPS-данных существуют
-            lon = f"{last_entry.get('Longitude_X', 0.0):.5f}" 
-            lat = f"{last_entry.get('Latitude_Y', 0.0):.5f}"
-            
-            last_timestamp = last_entry['Timestamp']
-            
-            # Фиктивные данные для примера
-            gps_status = "Онлайн (Отлично)" 
-            hdop = "1.2"
-            
-            info = (f"Статус: {gps_status} (Обновлено: {last_timestamp})\n"
-                            f"Последняя координата: Lon {lon}, Lat {lat}\n"
-                            f"Примерная точность (HDOP): {hdop}")
-            self.gps_info_label.config(text=info)
-
-            # Обновление лога
-            self.log_text.config(state=tk.NORMAL)
-            self.log_text.delete('1.0', tk.END)
-            
-            logs = df_rig.tail(10)[['Timestamp', 'RSSI', 'TxRate', 'RxRate']].to_string(index=False, header=True)
-            self.log_text.insert(tk.END, logs)
-            self.log_text.config(state=tk.DISABLED)
+            self._show_gps_info(last_entry['Timestamp'], last_entry.get('Longitude_X', 0.0), last_entry.get('Latitude_Y', 0.0))
 
         except Exception:
             self.gps_info_label.config(text="Статус: Ошибка обработки лога GPS.")
 
+    def _show_gps_info(self, last_timestamp, lon, lat):
+        lon = "-" if lon is None else f"{lon:.5f}"
+        lat = "-" if lat is None else f"{lat:.5f}"
+
+        # Фиктивные данные для примера
+        gps_status = "Онлайн (Отлично)" 
+        hdop = "1.2"
+        
+        info = (f"Статус: {gps_status} (Обновлено: {last_timestamp})\n"
+                        f"Последняя координата: Lon {lon}, Lat {lat}\n"
+                        f"Примерная точность (HDOP): {hdop}")
+        self.gps_info_label.config(text=info)
+
     # --- МЕТОД МОНИТОРИНГА RTK (ЧТЕНИЕ ИЗ БД) ---
     def check_and_update_rtk_status(self):
         """
-        Читает последний статус RTK из базы данных RTK_DB и обновляет метки.
+        Читает текущий статус RTK (таблица rtk_latest) из базы данных RTK и обновляет метки.
         Вызывается автоматически.
         """
         try:
-            conn = sqlite3.connect(RTK_DB)
-            cursor = conn.cursor()
-            # Выбираем последнюю запись статуса
-            cursor.execute("SELECT timestamp, status, message FROM rtk_status ORDER BY timestamp DESC LIMIT 1")
-            last_entry = cursor.fetchone()
-            conn.close()
+            # Текущий статус станции - одна строка rtk_latest по первичному ключу
+            station = rtk_storage.station_key(self.config.get('rtk_base_station', {}))
+            last_entry = self.data.query("rtk_latest", station)
 
             if not last_entry:
                 self.rtk_status_label.config(text="🟡 СТАТУС: Нет данных в БД", foreground="gray")
@@ -476,7 +989,7 @@ class MikrotikMonitorApp:
                 self.master.after(5000, self.check_and_update_rtk_status)
                 return
 
-            timestamp_str, status, message = last_entry
+            timestamp_str, status, message = last_entry['timestamp'], last_entry['status'], last_entry['message']
             # Форматируем время для отображения
             last_check_time_str = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S").strftime("%H:%M:%S")
 
@@ -499,7 +1012,7 @@ class MikrotikMonitorApp:
                 )
 
         except sqlite3.OperationalError:
-            self.rtk_status_label.config(text=f"🔴 ОШИБКА: Нет доступа к базе {RTK_DB}", foreground="red")
+            self.rtk_status_label.config(text=f"🔴 ОШИБКА: Нет доступа к базе {self.rtk_db}", foreground="red")
         except Exception as e:
             self.rtk_status_label.config(text=f"🔴 ОШИБКА ЧТЕНИЯ: {e}", foreground="red")
 
@@ -552,6 +1065,32 @@ class MikrotikMonitorApp:
             messagebox.showerror("Ошибка", f"Файл {VISUALIZATION_SCRIPT} не найден.")
         
 
+    def _run_hole_detection(self):
+        try:
+            subprocess.run([sys.executable, HOLES_SCRIPT], check=True, capture_output=True)
+            self._update_holes_list()
+        except subprocess.CalledProcessError:
+            messagebox.showerror("Ошибка", f"Скрипт {HOLES_SCRIPT} вернул ошибку.")
+        except FileNotFoundError:
+            messagebox.showerror("Ошибка", f"Файл {HOLES_SCRIPT} не найден.")
+
+    def _update_holes_list(self):
+        """Зоны слабого сигнала текущей смены из таблицы coverage_holes."""
+        try:
+            holes = self.data.query("coverage_holes", archive_catalog.shift_date_for(datetime.now())) or []
+        except sqlite3.Error:
+            holes = []
+        trends = {coverage_holes.TREND_NEW: "новая", coverage_holes.TREND_GROWING: "растет",
+                  coverage_holes.TREND_SHRINKING: "сокращается", coverage_holes.TREND_STABLE: "без изменений"}
+        self.holes_tree.delete(*self.holes_tree.get_children())
+        for hole in holes:
+            self.holes_tree.insert("", "end", values=(
+                f"#{hole['hole_id']}", f"{hole['area_m2']:.0f}",
+                f"{hole['centroid_lon']:.5f}, {hole['centroid_lat']:.5f}",
+                "-" if hole["rssi_mean"] is None else f"{hole['rssi_mean']:.1f}",
+                hole["samples"], trends.get(hole["trend"], hole["trend"])
+            ))
+
     def _load_heatmap_image(self):
         try:
             img = Image.open(HEATMAP_FILE)
@@ -559,6 +1098,7 @@ class MikrotikMonitorApp:
             new_width = 700 
             new_height = int(new_width * height / width)
             
+            self.map_scale = new_width / width
             img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
             self.tk_img = ImageTk.PhotoImage(img)
 
@@ -569,6 +1109,56 @@ class MikrotikMonitorApp:
         except Exception:
             self.map_canvas.config(text="Ошибка загрузки изображения карты.", image='')
         
+    def _map_click_to_coords(self, event):
+        """Пиксель на виджете карты -> (lon, lat, extent) или None вне области графика."""
+        if self.map_scale is None or not os.path.exists(HEATMAP_EXTENT_FILE):
+            return None
+        with open(HEATMAP_EXTENT_FILE, 'r') as f:
+            extent = json.load(f)
+        # Label центрирует картинку внутри себя
+        shown_w = extent["image_size"][0] * self.map_scale
+        shown_h = extent["image_size"][1] * self.map_scale
+        img_x = (event.x - (self.map_canvas.winfo_width() - shown_w) / 2) / self.map_scale
+        img_y = (event.y - (self.map_canvas.winfo_height() - shown_h) / 2) / self.map_scale
+        x0, y0, x1, y1 = extent["axes_px"]
+        if not (x0 <= img_x <= x1 and y0 <= img_y <= y1):
+            return None
+        (lon_min, lon_max), (lat_min, lat_max) = extent["xlim"], extent["ylim"]
+        lon = lon_min + (img_x - x0) / (x1 - x0) * (lon_max - lon_min)
+        lat = lat_max - (img_y - y0) / (y1 - y0) * (lat_max - lat_min)
+        return lon, lat, extent
+
+    def _on_map_click(self, event):
+        """Сводка замеров в радиусе INSPECT_RADIUS_M от точки клика (за период карты)."""
+        try:
+            point = self._map_click_to_coords(event)
+            if point is None:
+                return
+            lon, lat, extent = point
+            start_time = datetime.strptime(extent["start"], "%Y-%m-%d %H:%M:%S")
+            end_time = datetime.strptime(extent["end"], "%Y-%m-%d %H:%M:%S")
+            conn = self.data.connection(data_access.DB_MIKROTIK)
+            if conn is None:
+                self.map_inspect_label.config(text=f"База {self.mikrotik_db} не найдена", fg='red')
+                return
+            samples = spatial_index.query_radius(conn, lon, lat, INSPECT_RADIUS_M, start_time, end_time)
+            nearest = samples[:1] or spatial_index.query_nearest(conn, lon, lat, 1, start_time, end_time)
+        except (sqlite3.Error, OSError, ValueError, KeyError) as e:
+            self.map_inspect_label.config(text=f"Ошибка запроса замеров: {e}", fg='red')
+            return
+
+        text = f"Точка {lon:.6f}, {lat:.6f}: "
+        if samples:
+            summary = spatial_index.summarize(samples)
+            rssi = "-" if summary["rssi_avg"] is None else f"{summary['rssi_avg']:.1f} дБм (мин. {summary['rssi_min']}, макс. {summary['rssi_max']})"
+            text += f"{summary['count']} замеров в радиусе {INSPECT_RADIUS_M} м, RSSI {rssi}, установки: {', '.join(summary['rigs'])}"
+        else:
+            text += f"в радиусе {INSPECT_RADIUS_M} м замеров нет"
+        if nearest:
+            sample = nearest[0]
+            text += f"\nБлижайший замер: {sample['timestamp']} {sample['rig_id']}, RSSI {sample['rssi']} дБм, {sample['distance_m']:.0f} м"
+        self.map_inspect_label.config(text=text, fg='black')
+
     def _open_config(self):
         try:
             os.startfile(CONFIG_FILE)
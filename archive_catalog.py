@@ -0,0 +1,205 @@
+# ==============================================================================
+# ARCHIVE_CATALOG.PY - Каталог доступных смен (архива) по установкам
+# ==============================================================================
+# Таблица archive_catalog хранит по одной строке на (рабочий день, установка,
+# место хранения): число замеров, первое/последнее время и источник (файл CSV
+# или БД). Каталог обновляется при записи (mikrotik_storage),
+# при импорте CSV (csv_importer) и при сканировании папки logs, поэтому GUI
+# получает список дат одним запросом без обхода каталога с файлами.
+# ==============================================================================
+import os
+import sqlite3
+from datetime import datetime
+
+import shift_calendar
+
+# --- Файлы проекта ---
+CATALOG_DB = 'mikrotik_log.db'
+LOG_DIR = 'logs'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# --- Места хранения ---
+LOCATION_DB = 'db'
+LOCATION_CSV = 'csv'
+
+# Источник строк 'db' по умолчанию - файл БД, в которую пишет соединение
+MAIN_DB_FILE_SQL = "(SELECT file FROM pragma_database_list WHERE name = 'main')"
+
+
+# ------------------------------------------------------------------------------
+# 1. СХЕМА И УТИЛИТЫ
+# ------------------------------------------------------------------------------
+
+def initialize_catalog(cursor):
+    """Создает таблицы каталога (вызывается из mikrotik_storage.initialize_db)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archive_catalog (
+            shift_date TEXT NOT NULL,
+            rig_id TEXT NOT NULL,
+            location TEXT NOT NULL,
+            source TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            first_ts TEXT,
+            last_ts TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (shift_date, rig_id, location)
+        )
+    """)
+    # Просканированные CSV-файлы: повторно читаются только измененные
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archive_files (
+            path TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            file_mtime REAL NOT NULL
+        )
+    """)
+
+
+# Рабочий день (shift_date каталога) определяется календарем смен площадки
+# (shift_calendar, по умолчанию с 20:00 предыдущего дня до 20:00 - как имена CSV-логов)
+
+def shift_date_for(timestamp):
+    """Дата рабочего дня (строка YYYY-MM-DD) для времени замера."""
+    return shift_calendar.get_calendar().work_day(timestamp)
+
+
+def shift_bounds(shift_date):
+    """Границы рабочего дня (start, end) для строки YYYY-MM-DD."""
+    return shift_calendar.get_calendar().day_bounds(shift_date)
+
+
+def shift_date_sql(col):
+    """То же правило в SQL: выражение даты рабочего дня для колонки времени."""
+    return shift_calendar.get_calendar().day_sql(col)
+
+
+def _now():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+# ------------------------------------------------------------------------------
+# 2. ОБНОВЛЕНИЕ КАТАЛОГА
+# ------------------------------------------------------------------------------
+
+def record_sample(cursor, rig_id, timestamp, source=None, count=1, shift_date=None):
+    """
+    Учитывает записанный в БД замер (в той же транзакции, что и сама запись).
+    shift_date - рабочий день, если вызывающий код его уже вычислил;
+    source по умолчанию - путь к файлу БД соединения.
+    """
+    cursor.execute(
+        f"""INSERT INTO archive_catalog
+               (shift_date, rig_id, location, source, row_count, first_ts, last_ts, updated_at)
+           VALUES (?, ?, ?, COALESCE(?, {MAIN_DB_FILE_SQL}), ?, ?, ?, ?)
+           ON CONFLICT(shift_date, rig_id, location) DO UPDATE SET
+               row_count = row_count + excluded.row_count,
+               first_ts = min(first_ts, excluded.first_ts),
+               last_ts = max(last_ts, excluded.last_ts),
+               updated_at = excluded.updated_at""",
+        (shift_date or shift_date_for(timestamp), rig_id, LOCATION_DB, source, count, timestamp, timestamp, _now())
+    )
+
+
+def upsert_entry(cursor, shift_date, rig_id, location, source, row_count, first_ts, last_ts):
+    """Записывает (заменяет) строку каталога целиком (CSV-файлы из scan_csv_dir)."""
+    cursor.execute(
+        """INSERT OR REPLACE INTO archive_catalog
+               (shift_date, rig_id, location, source, row_count, first_ts, last_ts, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (shift_date, rig_id, location, source, row_count, first_ts, last_ts, _now())
+    )
+
+
+def refresh_db_entries(conn, shift_dates, source=None):
+    """
+    Пересчитывает строки каталога 'db' для указанных дат по таблице mikrotik_log
+    (выборка по индексу shift_id: все смены рабочего дня). source по умолчанию -
+    путь к файлу БД соединения.
+    """
+    cursor = conn.cursor()
+    calendar = shift_calendar.get_calendar()
+    for shift_date in shift_dates:
+        first_id, last_id = calendar.day_id_range(shift_date)
+        cursor.execute("DELETE FROM archive_catalog WHERE shift_date = ? AND location = ?",
+                       (shift_date, LOCATION_DB))
+        cursor.execute(
+            f"""INSERT INTO archive_catalog
+                   (shift_date, rig_id, location, source, row_count, first_ts, last_ts, updated_at)
+               SELECT ?, rig_id, ?, COALESCE(?, {MAIN_DB_FILE_SQL}), SUM(sample_count), MIN(timestamp), MAX(last_timestamp), ?
+               FROM mikrotik_log
+               WHERE shift_id BETWEEN ? AND ?
+               GROUP BY rig_id""",
+            (shift_date, LOCATION_DB, source, _now(), first_id, last_id)
+        )
+    conn.commit()
+
+
+def scan_csv_dir(conn, log_dir=LOG_DIR):
+    """
+    Регистрирует в каталоге CSV-логи из log_dir.
+
+    Читаются только новые или измененные файлы (по размеру и mtime).
+    Возвращает число обработанных файлов.
+    """
+    if not os.path.isdir(log_dir):
+        return 0
+
+    import pandas as pd
+
+    cursor = conn.cursor()
+    known = {path: (size, mtime) for path, size, mtime in
+             cursor.execute("SELECT path, file_size, file_mtime FROM archive_files")}
+    scanned = 0
+    for entry in os.scandir(log_dir):
+        if not (entry.name.startswith("coverage_log_") and entry.name.endswith(".csv")):
+            continue
+        stat = entry.stat()
+        if known.get(entry.path) == (stat.st_size, stat.st_mtime):
+            continue
+
+        try:
+            df = pd.read_csv(entry.path, usecols=['Timestamp', 'Rig_ID'])
+        except (ValueError, pd.errors.EmptyDataError):
+            continue
+        shift_date = entry.name[len("coverage_log_"):-len(".csv")]
+        cursor.execute("DELETE FROM archive_catalog WHERE source = ?", (entry.path,))
+        for rig_id, group in df.groupby('Rig_ID'):
+            upsert_entry(cursor, shift_date, str(rig_id), LOCATION_CSV, entry.path,
+                         len(group), group['Timestamp'].min(), group['Timestamp'].max())
+        cursor.execute("INSERT OR REPLACE INTO archive_files VALUES (?, ?, ?)",
+                       (entry.path, stat.st_size, stat.st_mtime))
+        scanned += 1
+    conn.commit()
+    return scanned
+
+# ------------------------------------------------------------------------------
+# 3. ЧТЕНИЕ КАТАЛОГА
+# ------------------------------------------------------------------------------
+
+def list_shift_dates(conn, rig_id=None):
+    """Даты рабочих дней, для которых есть данные (новые сначала)."""
+    if rig_id is None:
+        rows = conn.execute("SELECT DISTINCT shift_date FROM archive_catalog ORDER BY shift_date DESC")
+    else:
+        rows = conn.execute("SELECT DISTINCT shift_date FROM archive_catalog WHERE rig_id = ? ORDER BY shift_date DESC",
+                            (rig_id,))
+    return [row[0] for row in rows]
+
+
+def get_entries(conn, shift_date, rig_id=None):
+    """Строки каталога за рабочий день: [{rig_id, location, source, row_count, first_ts, last_ts}]."""
+    sql = """SELECT rig_id, location, source, row_count, first_ts, last_ts
+             FROM archive_catalog WHERE shift_date = ?"""
+    params = [shift_date]
+    if rig_id is not None:
+        sql += " AND rig_id = ?"
+        params.append(rig_id)
+    keys = ('rig_id', 'location', 'source', 'row_count', 'first_ts', 'last_ts')
+    return [dict(zip(keys, row)) for row in conn.execute(sql, params)]
+
+
+def open_catalog(db_path=CATALOG_DB):
+    """Открывает БД каталога (создавая таблицы при необходимости)."""
+    conn = sqlite3.connect(db_path)
+    initialize_catalog(conn.cursor())
+    conn.commit()
+    return conn
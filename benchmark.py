@@ -0,0 +1,493 @@
+# ==============================================================================
+# BENCHMARK.PY - Сквозной бенчмарк на синтетической нагрузке (synthetic_load)
+# ==============================================================================
+# Прогон во временной папке (рабочие БД и config.json не затрагиваются):
+#
+#   1. ingest   - запись замеров парка установок через mikrotik_storage.write_sample
+#                 (commit на тик), замеров в секунду;
+#   2. storage  - размер БД и байт на замер;
+#   3. rollup   - сетка покрытия и зоны по всем сменам, rollup рядов (как
+#                 подготовка shift_reports);
+#   4. gui      - цикл обновления GUI по текущей смене через data_access
+#                 (последние строки, сводка Wi-Fi, журнал, тревоги, зоны, тренд):
+#                 после записи нового тика (кэш сброшен) и без записи (из кэша);
+#   5. heatmap  - поверхность IDW смены с нуля, инкрементальное обновление после
+#                 тика и отрисовка карты (visualization.draw_surface, если есть
+#                 matplotlib);
+#   6. archive  - открытие прошлого рабочего дня в архиве: каталог, запросы
+#                 вкладок, тренд за день и растр покрытия из кэша;
+#   7. analyzer - разбор потока RTCM3 (pyrtcm), декодирование MSM и запись
+#                 статистики в БД RTK, сообщений в секунду.
+#
+# Результат - JSON (benchmarks/<профиль>_<время>.json). --compare сравнивает
+# с прошлым прогоном и завершается с кодом 1, если какая-то метрика ухудшилась
+# больше порога:
+#
+#   python benchmark.py --profile smoke
+#   python benchmark.py --profile full --compare latest --threshold 15
+# ==============================================================================
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from pyrtcm import RTCMReader
+
+import alert_engine
+import archive_catalog
+import coverage_diff
+import coverage_grid
+import coverage_holes
+import data_access
+import mikrotik_storage
+import msm_decoder
+import perf_metrics
+import rtk_storage
+import shift_calendar
+import synthetic_load
+import timeseries
+
+CONFIG_FILE = 'config.json'
+RESULTS_DIR = 'benchmarks'
+DEFAULT_THRESHOLD_PCT = 10.0
+
+# Профили нагрузки: установки, сутки истории, секунд потока RTCM, повторов замеров задержки
+PROFILES = {
+    "smoke": {"rigs": 3, "days": 2, "rtcm_sec": 120, "refreshes": 10, "archive_days": 1},
+    "default": {"rigs": 10, "days": 7, "rtcm_sec": 600, "refreshes": 30, "archive_days": 3},
+    "full": {"rigs": 50, "days": 90, "rtcm_sec": 3600, "refreshes": 50, "archive_days": 5},
+}
+
+HIGHER = "higher"
+LOWER = "lower"
+
+# Метрики: имя -> (единица, какое значение лучше)
+METRICS = {
+    "ingest_samples_per_sec": ("1/s", HIGHER),
+    "db_size_mb": ("MB", LOWER),
+    "db_bytes_per_sample": ("B", LOWER),
+    "rollup_sec": ("s", LOWER),
+    "gui_refresh_ms": ("ms", LOWER),          # Медиана после записи тика
+    "gui_refresh_p95_ms": ("ms", LOWER),
+    "gui_refresh_cached_ms": ("ms", LOWER),   # Медиана без записи (из кэша)
+    "heatmap_surface_sec": ("s", LOWER),      # Поверхность смены с нуля
+    "heatmap_update_ms": ("ms", LOWER),       # Обновление после тика
+    "heatmap_render_sec": ("s", LOWER),
+    "archive_load_ms": ("ms", LOWER),
+    "analyzer_msgs_per_sec": ("1/s", HIGHER),
+}
+
+# Ширина графика тренда при замерах (как по умолчанию в отчетах)
+TREND_WIDTH_PX = 1200
+
+# Окно накопления статистики MSM перед записью (как LOG_INTERVAL_SEC анализатора)
+MSM_FLUSH_EPOCHS = 60
+
+
+def _load_config(config_file=CONFIG_FILE):
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000.0, 3) if samples else None
+
+
+class Context:
+    """Состояние прогона: пути во временной папке, настройки и генератор новых тиков."""
+
+    def __init__(self, work_dir, profile, config):
+        self.work_dir = work_dir
+        self.profile = profile
+        self.db = os.path.join(work_dir, "mikrotik_log.db")
+        self.rtk_db = os.path.join(work_dir, "rtk_status.db")
+        self.data_config = {"data_storage": {"mikrotik_log_db": self.db, "db_name": self.rtk_db}}
+        self.grid_config = coverage_grid.resolve_grid_config(config.get("data_storage", {}).get("coverage_grid"))
+        self.grid_config["cache_dir"] = os.path.join(work_dir, "cache")
+        self.deadband = mikrotik_storage.resolve_deadband(config.get("data_storage", {}).get("deadband"))
+
+        self.synthetic = synthetic_load.load_synthetic_config()
+        self.synthetic["rigs"] = profile["rigs"]
+        self.start, self.end = synthetic_load.default_period(profile["days"], self.synthetic["interval_sec"])
+        self.calendar = shift_calendar.get_calendar()
+        self.rig_ids = synthetic_load.rig_names(profile["rigs"])
+        self.live = None
+        self.info = {}
+
+    def current_day(self):
+        return self.calendar.work_day(self.end - timedelta(seconds=1))
+
+    def next_tick(self):
+        """Пишет следующий тик после периода истории (как работающий сборщик)."""
+        if self.live is None:
+            live_end = self.end + timedelta(seconds=self.synthetic["interval_sec"] * (4 * self.profile["refreshes"] + 10))
+            self.live = synthetic_load.SyntheticFleet(self.synthetic, self.end, live_end).ticks()
+        _, rows = next(self.live)
+        conn = sqlite3.connect(self.db)
+        try:
+            cursor = conn.cursor()
+            for row in rows:
+                mikrotik_storage.write_sample(cursor, row, self.deadband)
+            conn.commit()
+        finally:
+            conn.close()
+
+# ------------------------------------------------------------------------------
+# 1. ЗАПИСЬ И ХРАНЕНИЕ
+# ------------------------------------------------------------------------------
+
+def bench_ingest(ctx):
+    fleet = synthetic_load.SyntheticFleet(ctx.synthetic, ctx.start, ctx.end)
+    result = synthetic_load.load_db(ctx.db, fleet, ctx.deadband)
+    conn = sqlite3.connect(ctx.db)
+    try:
+        # Таблицы, которые GUI читает каждый цикл (в рабочей БД их создают сервисы)
+        alert_engine.initialize_table(conn)
+        perf_metrics.initialize_table(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    ctx.info.update(samples=result["samples"], ticks=result["ticks"])
+    return {"ingest_samples_per_sec": result["samples"] / result["write_sec"]}
+
+
+def bench_storage(ctx):
+    size = sum(os.path.getsize(path) for path in (ctx.db, ctx.db + "-wal") if os.path.exists(path))
+    conn = sqlite3.connect(ctx.db)
+    try:
+        ctx.info["db_rows"] = conn.execute("SELECT COUNT(*) FROM mikrotik_log").fetchone()[0]
+    finally:
+        conn.close()
+    return {"db_size_mb": size / (1024 * 1024), "db_bytes_per_sample": size / max(ctx.info["samples"], 1)}
+
+
+def bench_rollup(ctx):
+    conn = sqlite3.connect(ctx.db)
+    try:
+        days = sorted(archive_catalog.list_shift_dates(conn))
+        started = time.perf_counter()
+        for day in days:
+            coverage_holes.analyze_shift(conn, day, ctx.grid_config)
+        for rig_id in ctx.rig_ids:
+            timeseries.refresh_rollup(conn, rig_id)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    ctx.info["work_days"] = len(days)
+    return {"rollup_sec": elapsed}
+
+# ------------------------------------------------------------------------------
+# 2. GUI, КАРТА, АРХИВ
+# ------------------------------------------------------------------------------
+
+def _refresh(data, trend, rig_ids, period, work_day):
+    """
+    Запросы одного цикла обновления вкладок GUI (app_gui._update_all_dynamic_data и др.).
+    period - (start_time, end_time, first_shift, last_shift).
+    """
+    start_time, end_time, first_shift, last_shift = period
+    rig_id = rig_ids[0]
+    data.query("latest_per_rig", tuple(rig_ids))
+    data.query("wifi_stats", rig_id, first_shift, last_shift)
+    data.query("active_alerts")
+    data.query("perf_latest")
+    data.query("coverage_holes", work_day)
+    conn = data.connection(data_access.DB_MIKROTIK)
+    mikrotik_storage.query_log_page(conn, first_shift, last_shift)
+    trend.get(rig_id, timeseries.to_epoch(start_time), timeseries.to_epoch(end_time), TREND_WIDTH_PX)
+
+
+def bench_gui(ctx):
+    data = data_access.DataAccess(ctx.data_config)
+    trend = timeseries.SeriesCache(ctx.db)
+    shift_id = ctx.calendar.shift_id(ctx.end - timedelta(seconds=1))
+    period = ctx.calendar.shift_bounds(shift_id) + (shift_id, shift_id)
+    work_day = ctx.current_day()
+    try:
+        _refresh(data, trend, ctx.rig_ids, period, work_day)
+        after_write, cached = [], []
+        for _ in range(ctx.profile["refreshes"]):
+            ctx.next_tick()
+            started = time.perf_counter()
+            _refresh(data, trend, ctx.rig_ids, period, work_day)
+            after_write.append(time.perf_counter() - started)
+        for _ in range(ctx.profile["refreshes"]):
+            started = time.perf_counter()
+            _refresh(data, trend, ctx.rig_ids, period, work_day)
+            cached.append(time.perf_counter() - started)
+    finally:
+        data.close()
+    return {"gui_refresh_ms": _percentile_ms(after_write, 50), "gui_refresh_p95_ms": _percentile_ms(after_write, 95),
+            "gui_refresh_cached_ms": _percentile_ms(cached, 50)}
+
+
+def bench_heatmap(ctx, skipped):
+    work_day = ctx.current_day()
+    cache_path = coverage_grid._cache_path(work_day, ctx.grid_config)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    conn = sqlite3.connect(ctx.db)
+    try:
+        started = time.perf_counter()
+        raster = coverage_grid.get_surface(conn, work_day, ctx.grid_config)
+        surface_sec = time.perf_counter() - started
+
+        updates = []
+        for _ in range(min(ctx.profile["refreshes"], 10)):
+            ctx.next_tick()
+            started = time.perf_counter()
+            raster = coverage_grid.get_surface(conn, work_day, ctx.grid_config)
+            updates.append(time.perf_counter() - started)
+        holes = coverage_holes.read_holes(conn, work_day)
+    finally:
+        conn.close()
+    metrics = {"heatmap_surface_sec": surface_sec, "heatmap_update_ms": _percentile_ms(updates, 50)}
+
+    try:
+        import visualization
+    except ImportError as e:
+        skipped["heatmap_render_sec"] = f"нет matplotlib ({e})"
+        return metrics
+    started = time.perf_counter()
+    visualization.draw_surface(raster, holes, ctx.grid_config, work_day, os.path.join(ctx.work_dir, "surface.png"))
+    metrics["heatmap_render_sec"] = time.perf_counter() - started
+    return metrics
+
+
+def bench_archive(ctx, skipped):
+    conn = sqlite3.connect(ctx.db)
+    try:
+        days = [day for day in sorted(archive_catalog.list_shift_dates(conn)) if day != ctx.current_day()]
+    finally:
+        conn.close()
+    if not days:
+        skipped["archive_load_ms"] = "в профиле нет закрытых рабочих дней"
+        return {}
+    picks = [days[int(i)] for i in np.linspace(0, len(days) - 1, min(ctx.profile["archive_days"], len(days)))]
+
+    timings = []
+    for day in picks:
+        # Первое открытие дня: кэши GUI пустые
+        data = data_access.DataAccess(ctx.data_config)
+        trend = timeseries.SeriesCache(ctx.db)
+        conn = sqlite3.connect(ctx.db)
+        try:
+            started = time.perf_counter()
+            catalog = data.connection(data_access.DB_MIKROTIK)
+            archive_catalog.list_shift_dates(catalog)
+            archive_catalog.get_entries(catalog, day)
+            period = ctx.calendar.day_bounds(day) + ctx.calendar.day_id_range(day)
+            _refresh(data, trend, ctx.rig_ids, period, day)
+            coverage_diff.shift_raster(conn, day, ctx.grid_config)
+            timings.append(time.perf_counter() - started)
+        finally:
+            conn.close()
+            data.close()
+    return {"archive_load_ms": _percentile_ms(timings, 50)}
+
+# ------------------------------------------------------------------------------
+# 3. АНАЛИЗАТОР RTCM
+# ------------------------------------------------------------------------------
+
+def bench_analyzer(ctx):
+    """
+    Шаги rtcm_analyzer.rtk_analyzer_loop на каждое сообщение (разбор pyrtcm,
+    система, декодирование MSM) и запись статистики MSM раз в
+    MSM_FLUSH_EPOCHS эпох. Поток генерируется заранее и читается из памяти.
+    """
+    rtcm_config = ctx.synthetic["rtcm"]
+    stream = synthetic_load.rtcm_stream(rtcm_config, ctx.end, ctx.profile["rtcm_sec"], ctx.synthetic["seed"])
+    station = f"SIM-{rtcm_config['station_id']}"
+    rtk_storage.initialize_db(ctx.rtk_db, station)
+
+    reader = RTCMReader(io.BytesIO(stream))
+    # pyrtcm: readmessage() в версиях, под которые написан анализатор, read() - в новых
+    read = getattr(reader, "readmessage", None) or reader.read
+    accumulator = msm_decoder.MsmAccumulator(station)
+    messages = parsed_ok = 0
+    constellations, epochs = set(), set()
+    station_id = None
+    started = time.perf_counter()
+    while True:
+        raw_data, parsed = read()
+        if raw_data is None:
+            break
+        messages += 1
+        if parsed is None:
+            continue
+        parsed_ok += 1
+        msg_type = int(parsed.identity)
+        if msm_decoder.is_msm(msg_type):
+            constellations.add(msm_decoder.MSM_CONSTELLATIONS[msg_type // 10])
+            decoded = msm_decoder.decode_msm(msm_decoder.frame_payload(raw_data))
+            station_id = decoded["station_id"]
+            accumulator.add(decoded)
+            epochs.add(decoded["epoch_ms"])
+            if len(epochs) >= MSM_FLUSH_EPOCHS:
+                rtk_storage.write_msm_batch(accumulator.epoch_rows, accumulator.satellite_rows(), ctx.rtk_db)
+                accumulator.reset()
+                epochs.clear()
+    if accumulator.epoch_rows:
+        rtk_storage.write_msm_batch(accumulator.epoch_rows, accumulator.satellite_rows(), ctx.rtk_db)
+    elapsed = time.perf_counter() - started
+
+    ctx.info.update(rtcm_bytes=len(stream), rtcm_messages=messages, rtcm_parsed=parsed_ok,
+                    rtcm_station_id=station_id, rtcm_constellations=sorted(constellations))
+    return {"analyzer_msgs_per_sec": messages / elapsed}
+
+# ------------------------------------------------------------------------------
+# 4. ПРОГОН, РЕЗУЛЬТАТ, СРАВНЕНИЕ
+# ------------------------------------------------------------------------------
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(profile_name, overrides=None, work_dir=None, keep=False):
+    """Прогон всех этапов. Возвращает результат (dict для JSON)."""
+    profile = dict(PROFILES[profile_name])
+    profile.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    config = _load_config()
+    work_dir = work_dir or tempfile.mkdtemp(prefix="benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    ctx = Context(work_dir, profile, config)
+
+    values, skipped, stages = {}, {}, {}
+    steps = (("ingest", lambda: bench_ingest(ctx)), ("storage", lambda: bench_storage(ctx)),
+             ("rollup", lambda: bench_rollup(ctx)), ("gui", lambda: bench_gui(ctx)),
+             ("heatmap", lambda: bench_heatmap(ctx, skipped)), ("archive", lambda: bench_archive(ctx, skipped)),
+             ("analyzer", lambda: bench_analyzer(ctx)))
+    try:
+        for name, step in steps:
+            started = time.perf_counter()
+            values.update(step())
+            stages[name] = round(time.perf_counter() - started, 3)
+            print(f"[BENCH] {name}: {stages[name]:.1f} с")
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "profile": profile_name,
+            "params": profile,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "git_rev": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpu_count": os.cpu_count(),
+            "deadband": ctx.deadband["enabled"],
+            "work_dir": work_dir if keep else None,
+        },
+        "metrics": {name: {"value": round(value, 3), "unit": METRICS[name][0], "better": METRICS[name][1]}
+                    for name, value in values.items() if value is not None},
+        "skipped": skipped,
+        "stages_sec": stages,
+        "info": ctx.info,
+    }
+
+
+def save_result(result, path=None):
+    if path is None:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{result['meta']['profile']}_{stamp}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def latest_result(profile_name, exclude=None):
+    """Последний сохраненный результат профиля (путь) или None."""
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, f"{profile_name}_*.json")))
+    paths = [path for path in paths if exclude is None or os.path.abspath(path) != os.path.abspath(exclude)]
+    return paths[-1] if paths else None
+
+
+def compare_results(baseline, current, threshold_pct=DEFAULT_THRESHOLD_PCT):
+    """
+    Сравнение метрик с базовым прогоном: список dict (name, base, value,
+    change_pct, status). change_pct > 0 - улучшение (с учетом направления
+    метрики); status - "regression", если ухудшение больше threshold_pct.
+    """
+    rows = []
+    for name, metric in current["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if base is None or not base["value"]:
+            rows.append({"name": name, "base": None, "value": metric["value"], "change_pct": None, "status": "new"})
+            continue
+        change = (metric["value"] - base["value"]) / abs(base["value"]) * 100.0
+        if metric["better"] == LOWER:
+            change = -change
+        status = "regression" if change < -threshold_pct else "improved" if change > threshold_pct else "ok"
+        rows.append({"name": name, "base": base["value"], "value": metric["value"],
+                     "change_pct": round(change, 1), "status": status})
+    return rows
+
+
+def print_comparison(rows, baseline_path):
+    print(f"[BENCH] Сравнение с {baseline_path}:")
+    for row in rows:
+        base = "-" if row["base"] is None else f"{row['base']:g}"
+        change = "" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        mark = "  <-- РЕГРЕССИЯ" if row["status"] == "regression" else ""
+        print(f"  {row['name']:26} {base:>12} -> {row['value']:<12g} {change:>8}{mark}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк на синтетической нагрузке")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default="default")
+    parser.add_argument('--rigs', type=int, help="Число установок (вместо значения профиля)")
+    parser.add_argument('--days', type=int, help="Суток истории (вместо значения профиля)")
+    parser.add_argument('--out', help="Файл результата (по умолчанию benchmarks/<профиль>_<время>.json)")
+    parser.add_argument('--compare', help="Базовый результат: путь к JSON или latest (последний прогон профиля)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD_PCT,
+                        help="Допустимое ухудшение метрики, %%")
+    parser.add_argument('--work-dir', help="Папка для БД прогона (по умолчанию временная)")
+    parser.add_argument('--keep', action='store_true', help="Не удалять БД прогона")
+    args = parser.parse_args()
+
+    baseline_path = None
+    if args.compare:
+        baseline_path = latest_result(args.profile) if args.compare == "latest" else args.compare
+        if baseline_path is None:
+            print(f"[WARN] Нет сохраненных результатов профиля {args.profile}, сравнение пропущено.")
+
+    result = run_benchmark(args.profile, {"rigs": args.rigs, "days": args.days}, args.work_dir, args.keep)
+    path = save_result(result, args.out)
+    for name, metric in result["metrics"].items():
+        print(f"[BENCH] {name:26} {metric['value']:>12g} {metric['unit']}")
+    for name, reason in result["skipped"].items():
+        print(f"[BENCH] {name:26} пропущено: {reason}")
+    print(f"[BENCH] Результат: {path}")
+
+    if baseline_path is not None:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("params") != result["meta"]["params"]:
+            print(f"[WARN] Параметры прогона отличаются от базового ({baseline.get('meta', {}).get('params')}), "
+                  f"размеры и времена сравнимы только приблизительно.")
+        comparison = compare_results(baseline, result, args.threshold)
+        print_comparison(comparison, baseline_path)
+        regressions = [row["name"] for row in comparison if row["status"] == "regression"]
+        if regressions:
+            print(f"[ERROR] Регрессия больше {args.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,249 @@
+# ==============================================================================
+# COVERAGE_DIFF.PY - Сравнение покрытия двух рабочих дней/периодов по сетке (прирост/потеря)
+# ==============================================================================
+# После перестановки или перенаправления сектора AP нужно увидеть, что
+# изменилось. Сравнение идет по уже посчитанным растрам coverage_grid (кэш
+# поверхности по рабочим дням и coverage_cells), а не по сырым замерам: ячейка
+# (ix, iy) одинакова во всех днях, поэтому растры вычитаются поячеечно.
+#
+# Период - один рабочий день "YYYY-MM-DD" или диапазон "YYYY-MM-DD..YYYY-MM-DD"
+# (отдельные смены внутри дня не сравниваются - см. coverage_grid). Закрытые
+# дни берутся прямо из кэша .npz (coverage_cells не читается), для нескольких
+# дней count и сумма RSSI по ячейкам складываются.
+#
+# Разница считается между средними RSSI по замерам в окрестности ячейки
+# (support_radius_m) - это те же замеры, по числу которых оценивается
+# значимость. Изменение значимо, если с обеих сторон в окрестности не меньше
+# min_samples замеров, |delta| >= min_delta_db и |delta| больше
+# z * noise_db * sqrt(1/n_before + 1/n_after) (noise_db - разброс RSSI
+# отдельного замера). Поверхность IDW в местах без замеров не сравнивается:
+# она лишь повторяет соседние ячейки и дала бы ложные прирост/потерю.
+# ==============================================================================
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import archive_catalog
+import coverage_grid
+
+MIKROTIK_DB = 'mikrotik_log.db'
+
+# Настройки по умолчанию (перекрываются data_storage.coverage_grid.diff в config.json)
+DEFAULT_DIFF = {
+    "support_radius_m": 30.0,  # Окрестность ячейки, в которой считаются замеры для значимости
+    "min_samples": 10,         # Минимум замеров в окрестности с каждой стороны
+    "min_delta_db": 3.0,       # Меньшие изменения не показываются как прирост/потеря
+    "noise_db": 4.0,           # Разброс RSSI отдельного замера, дБ
+    "z": 2.5                   # Порог значимости в стандартных ошибках
+}
+
+# Смен в периоде не больше (защита от опечатки в диапазоне)
+MAX_PERIOD_SHIFTS = 366
+
+
+def resolve_diff_config(config_section):
+    """Объединяет настройки сравнения из config.json со значениями по умолчанию."""
+    diff_config = dict(DEFAULT_DIFF)
+    diff_config.update(config_section or {})
+    return diff_config
+
+
+def period_shifts(spec):
+    """'YYYY-MM-DD' или 'YYYY-MM-DD..YYYY-MM-DD' -> список рабочих дней."""
+    first, _, last = spec.partition("..")
+    start = datetime.strptime(first.strip(), '%Y-%m-%d')
+    end = datetime.strptime(last.strip(), '%Y-%m-%d') if last else start
+    if end < start:
+        start, end = end, start
+    days = (end - start).days + 1
+    if days > MAX_PERIOD_SHIFTS:
+        raise ValueError(f"Период {spec} длиннее {MAX_PERIOD_SHIFTS} смен.")
+    return [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+# ------------------------------------------------------------------------------
+# 1. РАСТР ПЕРИОДА
+# ------------------------------------------------------------------------------
+
+def _needs_rollup(conn, shift_date):
+    """Rollup нужен для текущей смены и для смен, которые еще ни разу не сворачивались."""
+    if shift_date == archive_catalog.shift_date_for(datetime.now()):
+        return True
+    try:
+        return conn.execute("SELECT 1 FROM coverage_rollup WHERE shift_date = ?", (shift_date,)).fetchone() is None
+    except sqlite3.OperationalError:
+        return True
+
+
+def _union_bounds(rasters):
+    """Общие границы растров в индексах сетки: (x0, y0, (height, width))."""
+    x0 = min(r.x0 for r in rasters)
+    y0 = min(r.y0 for r in rasters)
+    x1 = max(r.x0 + r.shape[1] for r in rasters)
+    y1 = max(r.y0 + r.shape[0] for r in rasters)
+    return x0, y0, (y1 - y0, x1 - x0)
+
+
+def shift_raster(conn, shift_date, grid_config):
+    """
+    Растр смены: для закрытой смены - из кэша, если он сохранен после
+    последнего rollup; иначе через coverage_grid.get_surface (с обновлением кэша).
+    """
+    if _needs_rollup(conn, shift_date):
+        return coverage_grid.get_surface(conn, shift_date, grid_config)
+    updated_at = conn.execute("SELECT updated_at FROM coverage_rollup WHERE shift_date = ?", (shift_date,)).fetchone()[0]
+    try:
+        cached_at = datetime.fromtimestamp(os.path.getmtime(coverage_grid._cache_path(shift_date, grid_config)))
+    except OSError:
+        cached_at = None
+    if cached_at is not None and cached_at.strftime(coverage_grid.TIMESTAMP_FORMAT) >= updated_at:
+        cached = coverage_grid.load_cached(shift_date, grid_config)
+        if cached is not None:
+            return cached
+    return coverage_grid.get_surface(conn, shift_date, grid_config, rollup=False)
+
+
+def period_raster(conn, shifts, grid_config=None):
+    """
+    Растр периода (count и mean по ячейкам). Для одной смены - растр смены
+    как есть (с поверхностью IDW); для нескольких - сумма ячеек смен.
+    """
+    grid_config = coverage_grid.resolve_grid_config(grid_config)
+    rasters = []
+    for shift_date in shifts:
+        raster = shift_raster(conn, shift_date, grid_config)
+        if raster.count.size:
+            rasters.append(raster)
+    if not rasters:
+        return coverage_grid.CoverageRaster(0, 0, np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)))
+    if len(rasters) == 1:
+        return rasters[0]
+
+    x0, y0, shape = _union_bounds(rasters)
+    count = np.zeros(shape, dtype=np.int64)
+    rssi_sum = np.zeros(shape)
+    for raster in rasters:
+        rows = slice(raster.y0 - y0, raster.y0 - y0 + raster.shape[0])
+        cols = slice(raster.x0 - x0, raster.x0 - x0 + raster.shape[1])
+        count[rows, cols] += raster.count
+        rssi_sum[rows, cols] += np.where(raster.count > 0, raster.mean, 0.0) * raster.count
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, rssi_sum / np.maximum(count, 1), np.nan)
+    return coverage_grid.CoverageRaster(x0, y0, count, mean)
+
+# ------------------------------------------------------------------------------
+# 2. РАЗНИЦА И ЗНАЧИМОСТЬ
+# ------------------------------------------------------------------------------
+
+class CoverageDiff:
+    """
+    Разница after - before на общей сетке (строка = iy - y0, столбец = ix - x0):
+    delta средних RSSI в окрестности (NaN - нет замеров с одной из сторон), число
+    замеров в окрестности ячейки с каждой стороны и маска значимых изменений.
+    """
+
+    def __init__(self, x0, y0, delta, support_before, support_after, significant):
+        self.x0, self.y0 = int(x0), int(y0)
+        self.delta = delta
+        self.support_before = support_before
+        self.support_after = support_after
+        self.significant = significant
+
+    @property
+    def shape(self):
+        return self.delta.shape
+
+    def extent(self, grid_config):
+        """Границы растра (lon_min, lon_max, lat_min, lat_max) - для imshow."""
+        dlon, dlat = coverage_grid._cell_deg(grid_config)
+        height, width = self.shape
+        lon_min = grid_config["origin_lon"] + self.x0 * dlon
+        lat_min = grid_config["origin_lat"] + self.y0 * dlat
+        return lon_min, lon_min + width * dlon, lat_min, lat_min + height * dlat
+
+    def summary(self, grid_config):
+        """Итог сравнения: ячейки и площадь прироста/потери, среднее значимое изменение."""
+        area_cell = grid_config["cell_m"] ** 2
+        gain = self.significant & (self.delta > 0)
+        loss = self.significant & (self.delta < 0)
+        compared = ~np.isnan(self.delta)
+        return {
+            "compared_cells": int(compared.sum()),
+            "gain_cells": int(gain.sum()),
+            "loss_cells": int(loss.sum()),
+            "gain_area_m2": float(gain.sum() * area_cell),
+            "loss_area_m2": float(loss.sum() * area_cell),
+            "gain_mean_db": float(self.delta[gain].mean()) if gain.any() else None,
+            "loss_mean_db": float(self.delta[loss].mean()) if loss.any() else None,
+        }
+
+
+def _disk_sums(raster, grid_config, diff_config):
+    """Число замеров и сумма RSSI в круге support_radius_m вокруг каждой ячейки."""
+    radius = max(0, int(round(diff_config["support_radius_m"] / grid_config["cell_m"])))
+    count = raster.count.astype(float)
+    rssi_sum = np.where(raster.count > 0, raster.mean, 0.0) * count
+    if not radius:
+        return count, rssi_sum
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    disk = (np.hypot(dx, dy) <= radius).astype(float)
+    # Свертка FFT дает шум ~1e-12 вместо нулей: число замеров округляется до целых
+    support = np.rint(coverage_grid._convolve_same(count, disk))
+    return support, np.where(support > 0, coverage_grid._convolve_same(rssi_sum, disk), 0.0)
+
+
+def diff_rasters(before, after, grid_config=None, diff_config=None):
+    """Разница средних RSSI в окрестности каждой ячейки (after - before) с маской значимости."""
+    grid_config = coverage_grid.resolve_grid_config(grid_config)
+    diff_config = resolve_diff_config(diff_config if diff_config is not None else grid_config.get("diff"))
+    present = [r for r in (before, after) if r.count.size]
+    if not present:
+        empty = np.zeros((0, 0))
+        return CoverageDiff(0, 0, empty, empty, empty, empty.astype(bool))
+
+    x0, y0, shape = _union_bounds(present)
+    support_before, sum_before = _disk_sums(coverage_grid._align(before, x0, y0, shape), grid_config, diff_config)
+    support_after, sum_after = _disk_sums(coverage_grid._align(after, x0, y0, shape), grid_config, diff_config)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = np.where((support_before > 0) & (support_after > 0),
+                         sum_after / support_after - sum_before / support_before, np.nan)
+        standard_error = diff_config["noise_db"] * np.sqrt(1.0 / support_before + 1.0 / support_after)
+        significant = ((support_before >= diff_config["min_samples"])
+                       & (support_after >= diff_config["min_samples"])
+                       & (np.abs(delta) >= diff_config["min_delta_db"])
+                       & (np.abs(delta) > diff_config["z"] * standard_error))
+    return CoverageDiff(x0, y0, delta, support_before, support_after, significant)
+
+
+def compare_periods(conn, before_spec, after_spec, grid_config=None, diff_config=None):
+    """Сравнение двух периодов ('YYYY-MM-DD' или 'A..B'): CoverageDiff."""
+    grid_config = coverage_grid.resolve_grid_config(grid_config)
+    before = period_raster(conn, period_shifts(before_spec), grid_config)
+    after = period_raster(conn, period_shifts(after_spec), grid_config)
+    return diff_rasters(before, after, grid_config, diff_config)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение покрытия двух смен или периодов по сетке")
+    parser.add_argument('before', help="Смена YYYY-MM-DD или период YYYY-MM-DD..YYYY-MM-DD (до изменений)")
+    parser.add_argument('after', help="Смена или период после изменений")
+    parser.add_argument('--db', default=MIKROTIK_DB)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    try:
+        started = datetime.now()
+        grid = coverage_grid.load_grid_config()
+        result = compare_periods(connection, args.before, args.after, grid)
+        summary = result.summary(grid)
+        print(f"{args.before} -> {args.after}: сравнено {summary['compared_cells']} ячеек "
+              f"за {(datetime.now() - started).total_seconds():.3f} с.")
+        print(f"  Прирост: {summary['gain_area_m2']:.0f} м2"
+              + (f" (в среднем {summary['gain_mean_db']:+.1f} дБ)" if summary['gain_mean_db'] is not None else ""))
+        print(f"  Потеря:  {summary['loss_area_m2']:.0f} м2"
+              + (f" (в среднем {summary['loss_mean_db']:+.1f} дБ)" if summary['loss_mean_db'] is not None else ""))
+    finally:
+        connection.close()
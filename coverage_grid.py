@@ -0,0 +1,474 @@
+# ==============================================================================
+# COVERAGE_GRID.PY - Сетка покрытия по рабочим дням и интерполированная поверхность (IDW)
+# ==============================================================================
+# Единица сетки, кэша и зон слабого сигнала - рабочий день календаря смен
+# (shift_calendar), а не отдельная смена: rollup читает все смены дня
+# (shift_id BETWEEN day_id_range), shift_date в coverage_cells/coverage_rollup
+# и имя файла кэша - имя рабочего дня. Так же по рабочим дням устроены архив,
+# отчеты и вкладки GUI; за одну смену покрытие без соседней смены неполное.
+#
+# Замеры рабочего дня раскладываются по ячейкам фиксированной сетки площадки:
+# cell_m метров, начало в origin_lon/origin_lat, поэтому ячейка (ix, iy)
+# означает одно и то же место во всех днях. Итоги по ячейкам хранятся в
+# таблице coverage_cells (rollup рабочего дня).
+#
+# Поверхность RSSI между замерами оценивается обратно-взвешенным расстоянием
+# (IDW) по ячейкам в радиусе idw_radius_m. На регулярной сетке вес зависит
+# только от смещения ячеек, поэтому IDW - это две свертки (значения * маска и
+# маска) с одним ядром 1/d^p; свертки считаются через FFT целиком в NumPy.
+#
+# Поверхность кэшируется на рабочий день (cache_dir/<день>.npz). При обновлении
+# пересчитываются только тайлы вокруг ячеек, в которых появились замеры.
+# ==============================================================================
+import argparse
+import json
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import archive_catalog
+import shift_calendar
+
+CONFIG_FILE = 'config.json'
+MIKROTIK_DB = 'mikrotik_log.db'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Метров в градусе (то же приближение, что и mikrotik_storage.distance_m)
+METERS_PER_DEG_LAT = 110540.0
+METERS_PER_DEG_LON = 111320.0
+
+# Настройки по умолчанию (перекрываются data_storage.coverage_grid в config.json)
+DEFAULT_GRID = {
+    "cell_m": 10.0,              # Размер ячейки, м
+    "origin_lon": 67.45,         # Начало сетки площадки (юго-западный угол)
+    "origin_lat": 51.85,
+    "idw_power": 2.0,            # Степень IDW: вес = 1 / d^p
+    "idw_radius_m": 150.0,       # Дальше этого расстояния замеры не влияют на оценку
+    "cache_dir": "cache/coverage"
+}
+
+# Сторона тайла при частичном пересчете, ячеек
+TILE_CELLS = 32
+
+
+def resolve_grid_config(config_section):
+    """Объединяет настройки сетки из config.json со значениями по умолчанию."""
+    grid_config = dict(DEFAULT_GRID)
+    grid_config.update(config_section or {})
+    return grid_config
+
+
+def load_grid_config(config_file=CONFIG_FILE):
+    """Настройки сетки из config.json (data_storage.coverage_grid) для запуска вне сервисов."""
+    try:
+        with open(config_file, 'r') as f:
+            return resolve_grid_config(json.load(f).get("data_storage", {}).get("coverage_grid"))
+    except (OSError, ValueError):
+        return resolve_grid_config(None)
+
+# ------------------------------------------------------------------------------
+# 1. ГЕОМЕТРИЯ СЕТКИ
+# ------------------------------------------------------------------------------
+
+def _cell_deg(grid_config):
+    """Размер ячейки в градусах (долгота, широта) на широте начала сетки."""
+    cell_m = grid_config["cell_m"]
+    cos_lat = math.cos(math.radians(grid_config["origin_lat"]))
+    return cell_m / (METERS_PER_DEG_LON * cos_lat), cell_m / METERS_PER_DEG_LAT
+
+
+def to_cells(lon, lat, grid_config):
+    """Массивы координат -> индексы ячеек (ix, iy)."""
+    dlon, dlat = _cell_deg(grid_config)
+    ix = np.floor((np.asarray(lon, dtype=float) - grid_config["origin_lon"]) / dlon).astype(np.int64)
+    iy = np.floor((np.asarray(lat, dtype=float) - grid_config["origin_lat"]) / dlat).astype(np.int64)
+    return ix, iy
+
+
+def cell_center(ix, iy, grid_config):
+    """Индексы ячеек -> координаты их центров (lon, lat)."""
+    dlon, dlat = _cell_deg(grid_config)
+    lon = grid_config["origin_lon"] + (np.asarray(ix) + 0.5) * dlon
+    lat = grid_config["origin_lat"] + (np.asarray(iy) + 0.5) * dlat
+    return lon, lat
+
+# ------------------------------------------------------------------------------
+# 2. ROLLUP СМЕНЫ: ТАБЛИЦА coverage_cells
+# ------------------------------------------------------------------------------
+
+# Строка mikrotik_log может дописываться (deadband), пока она последняя у установки.
+# Последние строки установок, свежее OPEN_ROW_SEC относительно самого нового замера
+# смены, считаются открытыми: их вклад в ячейки (tail_*) при следующем rollup
+# вычитается и считается заново. Остальные строки учтены окончательно.
+OPEN_ROW_SEC = 3600
+
+
+def initialize_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS coverage_cells (
+            shift_date TEXT NOT NULL,
+            ix INTEGER NOT NULL,
+            iy INTEGER NOT NULL,
+            sample_count INTEGER NOT NULL,
+            rssi_sum REAL NOT NULL,
+            rssi_min INTEGER,
+            rssi_max INTEGER,
+            tail_count INTEGER NOT NULL DEFAULT 0,
+            tail_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (shift_date, ix, iy)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS coverage_rollup (
+            shift_date TEXT PRIMARY KEY,
+            tail_start_id INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def bin_samples(lon, lat, rssi_sum, count, rssi_min, rssi_max, grid_config):
+    """
+    Группирует замеры по ячейкам. Возвращает dict массивов
+    ix, iy, sample_count, rssi_sum, rssi_min, rssi_max (по одной записи на ячейку).
+    """
+    ix, iy = to_cells(lon, lat, grid_config)
+    if not len(ix):
+        empty = np.zeros(0, dtype=np.int64)
+        return {"ix": empty, "iy": empty, "sample_count": empty, "rssi_sum": empty.astype(float),
+                "rssi_min": empty, "rssi_max": empty}
+    # Один целочисленный ключ на ячейку: np.unique по 1-D массиву заметно быстрее, чем по строкам
+    x0, y0 = ix.min(), iy.min()
+    height = iy.max() - y0 + 1
+    keys, inverse = np.unique((ix - x0) * height + (iy - y0), return_inverse=True)
+    inverse = inverse.ravel()
+    n = len(keys)
+    rssi_min_cells = np.full(n, np.iinfo(np.int64).max)
+    rssi_max_cells = np.full(n, np.iinfo(np.int64).min)
+    np.minimum.at(rssi_min_cells, inverse, np.asarray(rssi_min, dtype=np.int64))
+    np.maximum.at(rssi_max_cells, inverse, np.asarray(rssi_max, dtype=np.int64))
+    return {
+        "ix": keys // height + x0, "iy": keys % height + y0,
+        "sample_count": np.bincount(inverse, weights=count, minlength=n).astype(np.int64),
+        "rssi_sum": np.bincount(inverse, weights=rssi_sum, minlength=n),
+        "rssi_min": rssi_min_cells, "rssi_max": rssi_max_cells,
+    }
+
+
+def _open_rows_start(rows):
+    """id первой открытой строки среди прочитанных (None - открытых нет)."""
+    last = {}
+    for row_id, rig_id, last_timestamp in rows:
+        if rig_id not in last or row_id > last[rig_id][0]:
+            last[rig_id] = (row_id, last_timestamp)
+    if not last:
+        return None
+    newest = datetime.strptime(max(ts for _, ts in last.values()), TIMESTAMP_FORMAT)
+    open_after = (newest - timedelta(seconds=OPEN_ROW_SEC)).strftime(TIMESTAMP_FORMAT)
+    open_ids = [row_id for row_id, ts in last.values() if ts >= open_after]
+    return min(open_ids) if open_ids else None
+
+
+def rollup_shift(conn, shift_date, grid_config=None, rebuild=False):
+    """
+    Обновляет coverage_cells рабочего дня shift_date по строкам mikrotik_log всех
+    его смен, появившимся или изменившимся с прошлого rollup (rebuild=True - пересчет дня целиком,
+    например после удаления строк). Возвращает (ix, iy) затронутых ячеек.
+    """
+    grid_config = resolve_grid_config(grid_config)
+    initialize_table(conn)
+    if rebuild:
+        conn.execute("DELETE FROM coverage_cells WHERE shift_date = ?", (shift_date,))
+        conn.execute("DELETE FROM coverage_rollup WHERE shift_date = ?", (shift_date,))
+    state = conn.execute("SELECT tail_start_id FROM coverage_rollup WHERE shift_date = ?", (shift_date,)).fetchone()
+    tail_start = state[0] if state else 0
+
+    # Строки рабочего дня - по индексу shift_id: "+id" не дает планировщику
+    # выбрать обход по первичному ключу от tail_start до конца таблицы, id проверяется по индексу
+    first_id, last_id = shift_calendar.get_calendar().day_id_range(shift_date)
+    rows = conn.execute(
+        """SELECT id, rig_id, COALESCE(last_timestamp, timestamp), longitude, latitude, rssi_sum, sample_count, rssi
+           FROM mikrotik_log
+           WHERE shift_id BETWEEN ? AND ? AND +id >= ?
+             AND longitude IS NOT NULL AND latitude IS NOT NULL AND rssi_sum IS NOT NULL
+           ORDER BY id""",
+        (first_id, last_id, tail_start)
+    ).fetchall()
+    if not rows and state:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    new_tail_start = _open_rows_start([row[:3] for row in rows])
+    data = np.array([row[3:] for row in rows], dtype=float).reshape(-1, 5)
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lon, lat, rssi_sum, count, rssi = data.T
+    cells = bin_samples(lon, lat, rssi_sum, count, rssi, rssi, grid_config)
+    # Вклад открытых строк в те же ячейки (вычитается при следующем rollup)
+    tail = ids >= new_tail_start if new_tail_start is not None else np.zeros(len(ids), dtype=bool)
+    tail_cells = bin_samples(lon[tail], lat[tail], rssi_sum[tail], count[tail], rssi[tail], rssi[tail], grid_config)
+    tail_values = {(x, y): (c, s) for x, y, c, s in zip(tail_cells["ix"].tolist(), tail_cells["iy"].tolist(),
+                                                      tail_cells["sample_count"].tolist(), tail_cells["rssi_sum"].tolist())}
+
+    conn.execute(
+        """UPDATE coverage_cells
+           SET sample_count = sample_count - tail_count, rssi_sum = rssi_sum - tail_sum,
+               tail_count = 0, tail_sum = 0
+           WHERE shift_date = ? AND tail_count != 0""",
+        (shift_date,)
+    )
+    updates = []
+    for x, y, c, s, low, high in zip(cells["ix"].tolist(), cells["iy"].tolist(), cells["sample_count"].tolist(),
+                                     cells["rssi_sum"].tolist(), cells["rssi_min"].tolist(), cells["rssi_max"].tolist()):
+        tail_count, tail_sum = tail_values.get((x, y), (0, 0.0))
+        updates.append((shift_date, x, y, c, s, low, high, tail_count, tail_sum))
+    conn.executemany(
+        """INSERT INTO coverage_cells (shift_date, ix, iy, sample_count, rssi_sum, rssi_min, rssi_max, tail_count, tail_sum)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (shift_date, ix, iy) DO UPDATE SET
+               sample_count = sample_count + excluded.sample_count,
+               rssi_sum = rssi_sum + excluded.rssi_sum,
+               rssi_min = MIN(rssi_min, excluded.rssi_min),
+               rssi_max = MAX(rssi_max, excluded.rssi_max),
+               tail_count = excluded.tail_count,
+               tail_sum = excluded.tail_sum""",
+        updates
+    )
+    conn.execute("DELETE FROM coverage_cells WHERE shift_date = ? AND sample_count <= 0", (shift_date,))
+    next_start = new_tail_start if new_tail_start is not None else (int(ids.max()) + 1 if len(ids) else tail_start)
+    conn.execute(
+        """INSERT INTO coverage_rollup (shift_date, tail_start_id, updated_at) VALUES (?, ?, ?)
+           ON CONFLICT (shift_date) DO UPDATE SET tail_start_id = excluded.tail_start_id, updated_at = excluded.updated_at""",
+        (shift_date, next_start, datetime.now().strftime(TIMESTAMP_FORMAT))
+    )
+    conn.commit()
+    return cells["ix"], cells["iy"]
+
+
+def load_cells(conn, shift_date):
+    """Ячейки смены из coverage_cells: dict массивов (как bin_samples)."""
+    rows = conn.execute(
+        "SELECT ix, iy, sample_count, rssi_sum, rssi_min, rssi_max FROM coverage_cells WHERE shift_date = ?",
+        (shift_date,)
+    ).fetchall()
+    data = np.array(rows, dtype=float).reshape(-1, 6)
+    return {
+        "ix": data[:, 0].astype(np.int64), "iy": data[:, 1].astype(np.int64),
+        "sample_count": data[:, 2].astype(np.int64), "rssi_sum": data[:, 3],
+        "rssi_min": data[:, 4], "rssi_max": data[:, 5],
+    }
+
+# ------------------------------------------------------------------------------
+# 3. РАСТР И IDW
+# ------------------------------------------------------------------------------
+
+class CoverageRaster:
+    """
+    Растр смены: count и mean по ячейкам (строка = iy - y0, столбец = ix - x0)
+    и поверхность IDW той же формы (NaN - нет замеров в радиусе).
+    """
+
+    def __init__(self, x0, y0, count, mean, surface=None):
+        self.x0, self.y0 = int(x0), int(y0)
+        self.count = count
+        self.mean = mean
+        self.surface = surface if surface is not None else np.full(mean.shape, np.nan)
+
+    @property
+    def shape(self):
+        return self.count.shape
+
+    @classmethod
+    def from_cells(cls, cells, margin=0):
+        if not len(cells["ix"]):
+            return cls(0, 0, np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)))
+        x0 = cells["ix"].min() - margin
+        y0 = cells["iy"].min() - margin
+        width = cells["ix"].max() + margin + 1 - x0
+        height = cells["iy"].max() + margin + 1 - y0
+        count = np.zeros((height, width), dtype=np.int64)
+        rssi_sum = np.zeros((height, width))
+        count[cells["iy"] - y0, cells["ix"] - x0] = cells["sample_count"]
+        rssi_sum[cells["iy"] - y0, cells["ix"] - x0] = cells["rssi_sum"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, rssi_sum / np.maximum(count, 1), np.nan)
+        return cls(x0, y0, count, mean)
+
+    def extent(self, grid_config):
+        """Границы растра (lon_min, lon_max, lat_min, lat_max) - для imshow."""
+        dlon, dlat = _cell_deg(grid_config)
+        height, width = self.shape
+        lon_min = grid_config["origin_lon"] + self.x0 * dlon
+        lat_min = grid_config["origin_lat"] + self.y0 * dlat
+        return lon_min, lon_min + width * dlon, lat_min, lat_min + height * dlat
+
+
+def idw_kernel(radius_cells, power):
+    """Ядро весов 1/d^p (d в ячейках) в круге радиуса radius_cells; центр = 0."""
+    r = int(radius_cells)
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    distance = np.hypot(dx, dy)
+    with np.errstate(divide="ignore"):
+        kernel = np.where((distance > 0) & (distance <= radius_cells), distance ** -power, 0.0)
+    return kernel
+
+
+def _convolve_same(values, kernel):
+    """Свертка 'same' через FFT (ядро симметрично)."""
+    r = kernel.shape[0] // 2
+    shape = (values.shape[0] + kernel.shape[0] - 1, values.shape[1] + kernel.shape[1] - 1)
+    result = np.fft.irfft2(np.fft.rfft2(values, shape) * np.fft.rfft2(kernel, shape), shape)
+    return result[r:r + values.shape[0], r:r + values.shape[1]]
+
+
+def idw(mean, count, kernel):
+    """
+    IDW по растру: в ячейках с замерами - их среднее, в остальных -
+    взвешенное среднее ячеек в радиусе ядра, NaN если таких нет.
+    """
+    mask = (count > 0).astype(float)
+    values = np.where(count > 0, mean, 0.0)
+    numerator = _convolve_same(values * mask, kernel)
+    denominator = _convolve_same(mask, kernel)
+    # Порог отсекает шум FFT: минимальный ненулевой вес ядра заметно больше
+    threshold = 0.5 * kernel[kernel > 0].min() if kernel.any() else np.inf
+    with np.errstate(invalid="ignore", divide="ignore"):
+        surface = np.where(denominator > threshold, numerator / denominator, np.nan)
+    return np.where(count > 0, mean, surface)
+
+
+def _radius_cells(grid_config):
+    return max(1, int(round(grid_config["idw_radius_m"] / grid_config["cell_m"])))
+
+
+def compute_surface(raster, grid_config):
+    """Полный расчет поверхности растра."""
+    if raster.count.size:
+        kernel = idw_kernel(_radius_cells(grid_config), grid_config["idw_power"])
+        raster.surface = idw(raster.mean, raster.count, kernel)
+    return raster
+
+
+def update_surface(raster, dirty_rows, dirty_cols, grid_config):
+    """
+    Пересчитывает поверхность только вокруг измененных ячеек (индексы в растре).
+
+    Растр делится на тайлы TILE_CELLS x TILE_CELLS; для каждого тайла с
+    изменениями поверхность пересчитывается в тайле, расширенном на радиус
+    (область влияния), по ячейкам в пределах еще одного радиуса.
+    Возвращает число пересчитанных тайлов.
+    """
+    r = _radius_cells(grid_config)
+    kernel = idw_kernel(r, grid_config["idw_power"])
+    height, width = raster.shape
+    tiles = set(zip(np.asarray(dirty_rows) // TILE_CELLS, np.asarray(dirty_cols) // TILE_CELLS))
+    for tile_row, tile_col in tiles:
+        # Область пересчета и область источников
+        t0, t1 = max(0, tile_row * TILE_CELLS - r), min(height, (tile_row + 1) * TILE_CELLS + r)
+        l0, l1 = max(0, tile_col * TILE_CELLS - r), min(width, (tile_col + 1) * TILE_CELLS + r)
+        s0, s1 = max(0, t0 - r), min(height, t1 + r)
+        c0, c1 = max(0, l0 - r), min(width, l1 + r)
+        window = idw(raster.mean[s0:s1, c0:c1], raster.count[s0:s1, c0:c1], kernel)
+        raster.surface[t0:t1, l0:l1] = window[t0 - s0:t1 - s0, l0 - c0:l1 - c0]
+    return len(tiles)
+
+# ------------------------------------------------------------------------------
+# 4. КЭШ ПОВЕРХНОСТИ ПО СМЕНАМ
+# ------------------------------------------------------------------------------
+
+def _cache_path(shift_date, grid_config):
+    return os.path.join(grid_config["cache_dir"], f"{shift_date}.npz")
+
+
+def _fingerprint(grid_config):
+    return np.array([grid_config[key] for key in ("cell_m", "origin_lon", "origin_lat", "idw_power", "idw_radius_m")],
+                    dtype=float)
+
+
+def load_cached(shift_date, grid_config):
+    """Растр смены из кэша или None (нет файла или изменились настройки сетки)."""
+    path = _cache_path(shift_date, grid_config)
+    try:
+        with np.load(path) as data:
+            if not np.array_equal(data["fingerprint"], _fingerprint(grid_config)):
+                return None
+            return CoverageRaster(data["origin"][0], data["origin"][1], data["count"], data["mean"], data["surface"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_cached(shift_date, raster, grid_config):
+    os.makedirs(grid_config["cache_dir"], exist_ok=True)
+    path = _cache_path(shift_date, grid_config)
+    temp_path = path + ".tmp.npz"
+    np.savez(temp_path, fingerprint=_fingerprint(grid_config), origin=np.array([raster.x0, raster.y0]),
+             count=raster.count, mean=raster.mean, surface=raster.surface)
+    os.replace(temp_path, path)
+
+
+def _align(cached, x0, y0, shape):
+    """Переносит кэшированный растр в новые границы (если сетка смены расширилась)."""
+    height, width = shape
+    count = np.zeros(shape, dtype=np.int64)
+    mean = np.full(shape, np.nan)
+    surface = np.full(shape, np.nan)
+    if cached.count.size:
+        r0, c0 = cached.y0 - y0, cached.x0 - x0
+        h, w = cached.shape
+        count[r0:r0 + h, c0:c0 + w] = cached.count
+        mean[r0:r0 + h, c0:c0 + w] = cached.mean
+        surface[r0:r0 + h, c0:c0 + w] = cached.surface
+    return CoverageRaster(x0, y0, count, mean, surface)
+
+
+def get_surface(conn, shift_date, grid_config=None, rollup=True):
+    """
+    Растр рабочего дня с поверхностью IDW (из кэша, с пересчетом только измененных мест).
+
+    rollup=True сначала обновляет coverage_cells по mikrotik_log. Растр
+    расширен на радиус IDW, чтобы поверхность не обрезалась по крайним замерам.
+    """
+    grid_config = resolve_grid_config(grid_config)
+    if rollup:
+        rollup_shift(conn, shift_date, grid_config)
+    cells = load_cells(conn, shift_date)
+    current = CoverageRaster.from_cells(cells, margin=_radius_cells(grid_config))
+
+    cached = load_cached(shift_date, grid_config)
+    if cached is None or not current.count.size:
+        raster = compute_surface(current, grid_config)
+    else:
+        x0, y0 = min(current.x0, cached.x0), min(current.y0, cached.y0)
+        x1 = max(current.x0 + current.shape[1], cached.x0 + cached.shape[1])
+        y1 = max(current.y0 + current.shape[0], cached.y0 + cached.shape[0])
+        raster = _align(cached, x0, y0, (y1 - y0, x1 - x0))
+        fresh = _align(current, x0, y0, raster.shape)
+        changed = (raster.count != fresh.count) | ~np.isclose(raster.mean, fresh.mean, equal_nan=True)
+        raster.count, raster.mean = fresh.count, fresh.mean
+        if changed.any():
+            rows, cols = np.nonzero(changed)
+            update_surface(raster, rows, cols, grid_config)
+        else:
+            return raster
+    save_cached(shift_date, raster, grid_config)
+    return raster
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обновление сетки покрытия и поверхности IDW рабочего дня")
+    parser.add_argument('shift', nargs='?', help="Рабочий день YYYY-MM-DD (по умолчанию текущий)")
+    parser.add_argument('--db', default=MIKROTIK_DB)
+    args = parser.parse_args()
+
+    shift = args.shift or archive_catalog.shift_date_for(datetime.now())
+    connection = sqlite3.connect(args.db)
+    try:
+        started = datetime.now()
+        result = get_surface(connection, shift, load_grid_config())
+        covered = int(np.count_nonzero(~np.isnan(result.surface)))
+        print(f"Смена {shift}: ячеек с замерами {int(np.count_nonzero(result.count))}, "
+              f"оценено {covered} ячеек за {(datetime.now() - started).total_seconds():.2f} с.")
+    finally:
+        connection.close()
@@ -0,0 +1,304 @@
+# ==============================================================================
+# COVERAGE_HOLES.PY - Поиск зон слабого сигнала (связные области на сетке покрытия)
+# ==============================================================================
+# После rollup рабочего дня (coverage_grid.get_surface) поверхность RSSI
+# сравнивается с порогом, и слабые ячейки объединяются в связные области
+# (8-связность). Для каждой области считаются площадь, центр, опора на замеры
+# (сколько ячеек и замеров реально измерено внутри) и средний/минимальный RSSI.
+# Области сопоставляются с зонами предыдущего рабочего дня (не предыдущей
+# смены: сетка покрытия ведется по рабочим дням, см. coverage_grid) по
+# перекрытию ячеек, что дает тренд: новая, растет, сокращается, без изменений.
+#
+# Результаты пишутся в таблицу coverage_holes (mikrotik_log.db) - GUI и
+# отчеты читают их оттуда без повторного анализа.
+# ==============================================================================
+import argparse
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import archive_catalog
+import coverage_grid
+
+MIKROTIK_DB = 'mikrotik_log.db'
+
+TREND_NEW = "new"
+TREND_GROWING = "growing"
+TREND_SHRINKING = "shrinking"
+TREND_STABLE = "stable"
+
+# Настройки по умолчанию (перекрываются data_storage.coverage_grid.holes в config.json)
+DEFAULT_HOLES = {
+    "threshold_dbm": -80,     # Ячейка слабая, если оценка RSSI ниже порога
+    "min_cells": 3,           # Области меньше этого числа ячеек не считаются зонами
+    "trend_ratio": 0.2        # Изменение площади больше 20% - рост/сокращение
+}
+
+
+def resolve_holes_config(config_section):
+    """Объединяет настройки поиска зон из config.json со значениями по умолчанию."""
+    holes_config = dict(DEFAULT_HOLES)
+    holes_config.update(config_section or {})
+    return holes_config
+
+# ------------------------------------------------------------------------------
+# 1. СВЯЗНЫЕ ОБЛАСТИ
+# ------------------------------------------------------------------------------
+
+def label_components(mask):
+    """
+    Метки 8-связных областей маски: (labels, n), 0 - фон, области 1..n.
+
+    Объединение множеств на массивах: ребра - пары соседних слабых ячеек
+    (вправо, вниз и по двум диагоналям). На каждом шаге корень с большим
+    номером подвешивается к меньшему, затем пути сжимаются перескоком по
+    указателю. Шагов - единицы даже для длинных извилистых областей.
+    """
+    height, width = mask.shape
+    index = np.arange(height * width).reshape(height, width)
+    pairs = (
+        (mask[:, :-1] & mask[:, 1:], index[:, :-1], index[:, 1:]),
+        (mask[:-1, :] & mask[1:, :], index[:-1, :], index[1:, :]),
+        (mask[:-1, :-1] & mask[1:, 1:], index[:-1, :-1], index[1:, 1:]),
+        (mask[:-1, 1:] & mask[1:, :-1], index[:-1, 1:], index[1:, :-1]),
+    )
+    u = np.concatenate([a[both] for both, a, _ in pairs])
+    v = np.concatenate([b[both] for both, _, b in pairs])
+
+    parent = np.arange(height * width)
+    while True:
+        root_u, root_v = parent[u], parent[v]
+        differ = root_u != root_v
+        if not differ.any():
+            break
+        u, v, root_u, root_v = u[differ], v[differ], root_u[differ], root_v[differ]
+        np.minimum.at(parent, np.maximum(root_u, root_v), np.minimum(root_u, root_v))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    roots = parent.reshape(height, width)
+    _, inverse = np.unique(roots[mask], return_inverse=True)
+    labels = np.zeros(mask.shape, dtype=np.int64)
+    labels[mask] = inverse.ravel() + 1
+    return labels, int(inverse.max()) + 1 if inverse.size else 0
+
+# ------------------------------------------------------------------------------
+# 2. ЗОНЫ СЛАБОГО СИГНАЛА
+# ------------------------------------------------------------------------------
+
+def detect_holes(raster, grid_config, holes_config=None):
+    """
+    Зоны слабого сигнала растра смены.
+
+    Возвращает (labels, holes): labels - растр номеров зон (0 - нет зоны),
+    holes - список dict, отсортированный по площади: hole_id, cells, area_m2,
+    centroid_lon, centroid_lat, sampled_cells, samples, rssi_mean, rssi_min,
+    bbox (lon_min, lat_min, lon_max, lat_max).
+    """
+    holes_config = resolve_holes_config(holes_config)
+    if not raster.count.size:
+        return np.zeros(raster.shape, dtype=np.int64), []
+    with np.errstate(invalid="ignore"):
+        weak = raster.surface < holes_config["threshold_dbm"]
+    labels, n = label_components(weak)
+    if not n:
+        return labels, []
+
+    flat = labels.ravel()
+    rows, cols = np.indices(raster.shape)
+    sampled = raster.count.ravel() > 0
+    counts = raster.count.ravel()
+    sums = np.where(sampled, raster.mean.ravel(), 0.0) * counts
+    surface = np.where(weak.ravel(), raster.surface.ravel(), 0.0)
+
+    cells = np.bincount(flat, minlength=n + 1)
+    row_sum = np.bincount(flat, weights=rows.ravel(), minlength=n + 1)
+    col_sum = np.bincount(flat, weights=cols.ravel(), minlength=n + 1)
+    sampled_cells = np.bincount(flat, weights=sampled, minlength=n + 1)
+    samples = np.bincount(flat, weights=counts, minlength=n + 1)
+    rssi_sum = np.bincount(flat, weights=sums, minlength=n + 1)
+    surface_sum = np.bincount(flat, weights=surface, minlength=n + 1)
+    surface_min = np.full(n + 1, np.inf)
+    np.minimum.at(surface_min, flat, np.where(weak.ravel(), raster.surface.ravel(), np.inf))
+    row_min = np.full(n + 1, np.iinfo(np.int64).max)
+    row_max = np.full(n + 1, -1)
+    col_min = np.full(n + 1, np.iinfo(np.int64).max)
+    col_max = np.full(n + 1, -1)
+    np.minimum.at(row_min, flat, rows.ravel())
+    np.maximum.at(row_max, flat, rows.ravel())
+    np.minimum.at(col_min, flat, cols.ravel())
+    np.maximum.at(col_max, flat, cols.ravel())
+
+    # Мелкие области - не зоны
+    small = cells < holes_config["min_cells"]
+    small[0] = False
+    labels[small[labels]] = 0
+
+    area_cell = grid_config["cell_m"] ** 2
+    kept = np.nonzero(~small[1:])[0] + 1
+    centroid_lon, centroid_lat = coverage_grid.cell_center(
+        raster.x0 + col_sum[kept] / cells[kept], raster.y0 + row_sum[kept] / cells[kept], grid_config)
+    # Границы: от левого/нижнего края первой ячейки до правого/верхнего края последней
+    lon_min, lat_min = coverage_grid.cell_center(raster.x0 + col_min[kept] - 0.5, raster.y0 + row_min[kept] - 0.5, grid_config)
+    lon_max, lat_max = coverage_grid.cell_center(raster.x0 + col_max[kept] + 0.5, raster.y0 + row_max[kept] + 0.5, grid_config)
+    holes = []
+    for i, label in enumerate(kept.tolist()):
+        holes.append({
+            "hole_id": label,
+            "cells": int(cells[label]),
+            "area_m2": float(cells[label] * area_cell),
+            "centroid_lon": float(centroid_lon[i]), "centroid_lat": float(centroid_lat[i]),
+            "sampled_cells": int(sampled_cells[label]),
+            "samples": int(samples[label]),
+            # Среднее по замерам, если они есть; иначе - по оценке поверхности
+            "rssi_mean": float(rssi_sum[label] / samples[label]) if samples[label]
+                         else float(surface_sum[label] / cells[label]),
+            "rssi_min": float(surface_min[label]),
+            "bbox": (float(lon_min[i]), float(lat_min[i]), float(lon_max[i]), float(lat_max[i])),
+        })
+    holes.sort(key=lambda hole: -hole["cells"])
+    return labels, holes
+
+
+def match_previous(raster, labels, holes, prev_raster, prev_labels, prev_holes, holes_config=None):
+    """
+    Сопоставляет зоны с зонами предыдущей смены по наибольшему перекрытию ячеек
+    и добавляет к ним prev_hole_id, area_change_m2, rssi_change_db и trend.
+    """
+    holes_config = resolve_holes_config(holes_config)
+    previous = {hole["hole_id"]: hole for hole in prev_holes}
+    overlap = {}
+    if previous and prev_raster.count.size:
+        # Общая область двух растров в индексах сетки
+        x0, y0 = max(raster.x0, prev_raster.x0), max(raster.y0, prev_raster.y0)
+        x1 = min(raster.x0 + raster.shape[1], prev_raster.x0 + prev_raster.shape[1])
+        y1 = min(raster.y0 + raster.shape[0], prev_raster.y0 + prev_raster.shape[0])
+        if x1 > x0 and y1 > y0:
+            current = labels[y0 - raster.y0:y1 - raster.y0, x0 - raster.x0:x1 - raster.x0].ravel()
+            before = prev_labels[y0 - prev_raster.y0:y1 - prev_raster.y0,
+                                 x0 - prev_raster.x0:x1 - prev_raster.x0].ravel()
+            both = (current > 0) & (before > 0)
+            pairs, pair_counts = np.unique(np.stack([current[both], before[both]]), axis=1, return_counts=True)
+            for (label, prev_label), count in zip(pairs.T.tolist(), pair_counts.tolist()):
+                if count > overlap.get(label, (None, 0))[1]:
+                    overlap[label] = (prev_label, count)
+
+    for hole in holes:
+        match = overlap.get(hole["hole_id"])
+        if match is None:
+            hole.update(prev_hole_id=None, area_change_m2=None, rssi_change_db=None, trend=TREND_NEW)
+            continue
+        prev_hole = previous[match[0]]
+        change = hole["area_m2"] - prev_hole["area_m2"]
+        if change > holes_config["trend_ratio"] * prev_hole["area_m2"]:
+            trend = TREND_GROWING
+        elif change < -holes_config["trend_ratio"] * prev_hole["area_m2"]:
+            trend = TREND_SHRINKING
+        else:
+            trend = TREND_STABLE
+        hole.update(prev_hole_id=prev_hole["hole_id"], area_change_m2=change,
+                    rssi_change_db=hole["rssi_mean"] - prev_hole["rssi_mean"], trend=trend)
+    return holes
+
+# ------------------------------------------------------------------------------
+# 3. ХРАНЕНИЕ И ЗАПУСК ПОСЛЕ ROLLUP
+# ------------------------------------------------------------------------------
+
+HOLE_FIELDS = ("hole_id", "cells", "area_m2", "centroid_lon", "centroid_lat", "sampled_cells", "samples",
+               "rssi_mean", "rssi_min", "prev_hole_id", "area_change_m2", "rssi_change_db", "trend")
+
+
+def initialize_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS coverage_holes (
+            shift_date TEXT NOT NULL,
+            hole_id INTEGER NOT NULL,
+            cells INTEGER NOT NULL,
+            area_m2 REAL NOT NULL,
+            centroid_lon REAL NOT NULL,
+            centroid_lat REAL NOT NULL,
+            sampled_cells INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            rssi_mean REAL,
+            rssi_min REAL,
+            prev_hole_id INTEGER,
+            area_change_m2 REAL,
+            rssi_change_db REAL,
+            trend TEXT,
+            lon_min REAL, lat_min REAL, lon_max REAL, lat_max REAL,
+            detected_at TEXT NOT NULL,
+            PRIMARY KEY (shift_date, hole_id)
+        )
+    """)
+    conn.commit()
+
+
+def store_holes(conn, shift_date, holes):
+    """Заменяет зоны смены в coverage_holes."""
+    initialize_table(conn)
+    detected_at = datetime.now().strftime(coverage_grid.TIMESTAMP_FORMAT)
+    conn.execute("DELETE FROM coverage_holes WHERE shift_date = ?", (shift_date,))
+    conn.executemany(
+        f"""INSERT INTO coverage_holes (shift_date, {', '.join(HOLE_FIELDS)}, lon_min, lat_min, lon_max, lat_max, detected_at)
+            VALUES ({', '.join('?' * (len(HOLE_FIELDS) + 6))})""",
+        [(shift_date,) + tuple(hole.get(field) for field in HOLE_FIELDS) + hole["bbox"] + (detected_at,)
+         for hole in holes]
+    )
+    conn.commit()
+
+
+def read_holes(conn, shift_date):
+    """Зоны смены из coverage_holes (список dict, по убыванию площади, как detect_holes)."""
+    try:
+        cursor = conn.execute(
+            f"""SELECT {', '.join(HOLE_FIELDS)}, lon_min, lat_min, lon_max, lat_max
+                FROM coverage_holes WHERE shift_date = ? ORDER BY area_m2 DESC""",
+            (shift_date,)
+        )
+        return [dict(zip(HOLE_FIELDS, row), bbox=tuple(row[len(HOLE_FIELDS):])) for row in cursor]
+    except sqlite3.OperationalError:
+        return []
+
+
+def analyze_shift(conn, shift_date, grid_config=None, holes_config=None):
+    """
+    Rollup рабочего дня, поверхность, поиск зон, сравнение с предыдущим рабочим
+    днем и запись в coverage_holes. Возвращает (raster, labels, holes).
+    """
+    grid_config = coverage_grid.resolve_grid_config(grid_config)
+    holes_config = resolve_holes_config(holes_config if holes_config is not None else grid_config.get("holes"))
+    raster = coverage_grid.get_surface(conn, shift_date, grid_config)
+    labels, holes = detect_holes(raster, grid_config, holes_config)
+
+    prev_date = (datetime.strptime(shift_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+    # Для закрытой смены rollup почти ничего не читает, а поверхность берется из кэша
+    prev_raster = coverage_grid.get_surface(conn, prev_date, grid_config)
+    prev_labels, prev_holes = detect_holes(prev_raster, grid_config, holes_config)
+    match_previous(raster, labels, holes, prev_raster, prev_labels, prev_holes, holes_config)
+
+    store_holes(conn, shift_date, holes)
+    return raster, labels, holes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск зон слабого сигнала по сетке покрытия рабочего дня")
+    parser.add_argument('shift', nargs='?', help="Рабочий день YYYY-MM-DD (по умолчанию текущий)")
+    parser.add_argument('--db', default=MIKROTIK_DB)
+    args = parser.parse_args()
+
+    shift = args.shift or archive_catalog.shift_date_for(datetime.now())
+    connection = sqlite3.connect(args.db)
+    try:
+        started = datetime.now()
+        _, _, found = analyze_shift(connection, shift, coverage_grid.load_grid_config())
+        print(f"Смена {shift}: зон слабого сигнала {len(found)} "
+              f"(анализ {(datetime.now() - started).total_seconds():.2f} с).")
+        for hole in found[:10]:
+            print(f"  #{hole['hole_id']}: {hole['area_m2']:.0f} м2, центр {hole['centroid_lon']:.5f}, "
+                  f"{hole['centroid_lat']:.5f}, RSSI {hole['rssi_mean']:.1f} дБм, замеров {hole['samples']}, {hole['trend']}")
+    finally:
+        connection.close()
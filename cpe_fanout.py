@@ -0,0 +1,178 @@
+# ==============================================================================
+# CPE_FANOUT.PY - Параллельный опрос CPE по их собственным IP (RouterOS API)
+# ==============================================================================
+# Каждая CPE из mikrotik_cpelist опрашивается напрямую: уровень сигнала со
+# стороны клиента, CCQ, скорости и счетчики байт беспроводного интерфейса.
+# Все CPE опрашиваются одновременно; тик ограничен общим сроком (deadline),
+# поэтому недоступная установка не задерживает остальные - ее результат
+# в этом тике просто отсутствует. Результаты объединяются с данными точки
+# доступа в один замер на установку.
+# ==============================================================================
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import routeros_api
+
+# Настройки по умолчанию (перекрываются script_collector.fanout в config.json)
+DEFAULT_FANOUT = {
+    "deadline_sec": 3.0,     # Срок на опрос всех CPE в одном тике
+    "api_port": None,        # None - 8728 (или 8729 при api_ssl)
+    "api_ssl": False
+}
+
+CPE_REGISTRATION_PROPLIST = "mac-address,signal-strength,tx-ccq,tx-rate,rx-rate"
+
+
+def resolve_fanout_config(config_section):
+    """Объединяет настройки fan-out из config.json со значениями по умолчанию."""
+    fanout_config = dict(DEFAULT_FANOUT)
+    fanout_config.update(config_section or {})
+    return fanout_config
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+# ------------------------------------------------------------------------------
+# 1. ОПРОС ОДНОЙ CPE
+# ------------------------------------------------------------------------------
+
+def query_cpe(client):
+    """
+    Читает состояние беспроводного интерфейса CPE через открытую сессию API.
+
+    Возвращает dict: mac (MAC интерфейса CPE), ap_mac (MAC точки доступа, к
+    которой подключена CPE), cpe_rssi, ccq, TxRate, RxRate, tx_bytes, rx_bytes.
+    Если CPE ни к кому не подключена, поля связи равны None.
+    """
+    result = {"mac": None, "ap_mac": None, "cpe_rssi": None, "ccq": None,
+              "TxRate": None, "RxRate": None, "tx_bytes": None, "rx_bytes": None}
+
+    interfaces = client.talk(['/interface/wireless/print', '=.proplist=name,mac-address'])
+    if not interfaces:
+        return result
+    iface = interfaces[0].get('name')
+    result["mac"] = (interfaces[0].get('mac-address') or '').upper() or None
+
+    links = client.talk(['/interface/wireless/registration-table/print',
+                         f'=.proplist={CPE_REGISTRATION_PROPLIST}', f'?interface={iface}'])
+    if links:
+        link = links[0]
+        result["ap_mac"] = (link.get('mac-address') or '').upper() or None
+        result["cpe_rssi"] = routeros_api.parse_signal(link.get('signal-strength'))
+        result["ccq"] = _to_int(link.get('tx-ccq'))
+        result["TxRate"] = routeros_api.parse_rate(link.get('tx-rate'))
+        result["RxRate"] = routeros_api.parse_rate(link.get('rx-rate'))
+
+    stats = client.talk(['/interface/print', '=.proplist=tx-byte,rx-byte', f'?name={iface}'])
+    if stats:
+        result["tx_bytes"] = _to_int(stats[0].get('tx-byte'))
+        result["rx_bytes"] = _to_int(stats[0].get('rx-byte'))
+    return result
+
+# ------------------------------------------------------------------------------
+# 2. ПАРАЛЛЕЛЬНЫЙ ОПРОС ВСЕХ CPE
+# ------------------------------------------------------------------------------
+
+class FanoutPoller:
+    """
+    Опрашивает все CPE одновременно с общим сроком на тик.
+
+    Сессии API к CPE постоянные (по одной на установку). Если опрос установки
+    не уложился в срок, он продолжается в фоне, а в следующем тике эта
+    установка пропускается, пока запрос не завершится - зависшие CPE не
+    накапливают потоки.
+    """
+
+    def __init__(self, rigs, user, password, fanout_config=None):
+        self.config = resolve_fanout_config(fanout_config)
+        self.rigs = {rig["rig_id"]: rig for rig in rigs if rig.get("ip")}
+        deadline = self.config["deadline_sec"]
+        self.clients = {
+            rig_id: routeros_api.RouterOSApiClient(
+                rig["ip"], user, password, port=self.config["api_port"],
+                use_ssl=self.config["api_ssl"], timeout=deadline
+            )
+            for rig_id, rig in self.rigs.items()
+        }
+        # Запас потоков под extra_jobs, чтобы снимок AP не ждал зависшие CPE
+        self._executor = ThreadPoolExecutor(max_workers=len(self.rigs) + 2, thread_name_prefix="cpe-fanout")
+        self._in_flight = {}
+
+    def _poll_one(self, rig_id):
+        try:
+            return query_cpe(self.clients[rig_id])
+        except (OSError, routeros_api.RouterOSApiError) as e:
+            print(f"   [WARN] CPE {rig_id} ({self.rigs[rig_id]['ip']}): {e}")
+            return None
+
+    def poll(self, extra_jobs=None):
+        """
+        Один тик опроса.
+
+        extra_jobs - {имя: функция()} для выполнения в том же тике и с тем же
+        сроком (например, снимок точки доступа). Возвращает ({rig_id: результат
+        или None}, {имя: результат extra_jobs или None}).
+        """
+        started = time.monotonic()
+        futures = {}
+        for rig_id in self.rigs:
+            previous = self._in_flight.get(rig_id)
+            if previous is not None and not previous.done():
+                continue
+            futures[self._executor.submit(self._poll_one, rig_id)] = ("cpe", rig_id)
+        for name, job in (extra_jobs or {}).items():
+            futures[self._executor.submit(job)] = ("job", name)
+
+        done, _ = wait(futures, timeout=self.config["deadline_sec"])
+
+        cpe_results = {rig_id: None for rig_id in self.rigs}
+        job_results = {name: None for name in (extra_jobs or {})}
+        for future, (kind, key) in futures.items():
+            if kind == "cpe":
+                self._in_flight[key] = future
+            if future not in done:
+                print(f"   [WARN] {key}: нет ответа за {self.config['deadline_sec']} с.")
+                continue
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f"   [ERROR] {key}: {e}")
+                value = None
+            (cpe_results if kind == "cpe" else job_results)[key] = value
+        self.last_tick_sec = time.monotonic() - started
+        return cpe_results, job_results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
+
+# ------------------------------------------------------------------------------
+# 3. ОБЪЕДИНЕНИЕ С ДАННЫМИ ТОЧКИ ДОСТУПА
+# ------------------------------------------------------------------------------
+
+def merge_views(cpe, ap):
+    """
+    Один замер установки из данных CPE и точки доступа.
+
+    RSSI, TxRate, RxRate берутся со стороны точки доступа (как в остальном логе);
+    если AP клиента не видит, используются значения, измеренные CPE.
+    При нескольких AP ap_id - обслуживающая точка доступа из ap_fleet.
+    """
+    cpe = cpe or {}
+    ap = ap or {}
+    return {
+        "mac": cpe.get("mac"),
+        "RSSI": ap.get("RSSI") if ap.get("RSSI") is not None else cpe.get("cpe_rssi"),
+        "TxRate": ap.get("TxRate") or cpe.get("RxRate"),   # Передача AP = прием CPE
+        "RxRate": ap.get("RxRate") or cpe.get("TxRate"),
+        "cpe_rssi": cpe.get("cpe_rssi"),
+        "ccq": cpe.get("ccq"),
+        "tx_bytes": cpe.get("tx_bytes"),
+        "rx_bytes": cpe.get("rx_bytes"),
+        "ap_id": ap.get("ap_id"),
+    }
@@ -0,0 +1,319 @@
+# ==============================================================================
+# CSV_IMPORTER.PY - Потоковый импорт старых CSV-логов в mikrotik_log.db
+# ==============================================================================
+# Формат старых файлов: Timestamp,Rig_ID,Client_MAC,Longitude_X,Latitude_Y,RSSI,TxRate,RxRate
+#
+# - файлы читаются порциями (chunksize), память не зависит от объема истории;
+# - нормализация времени и скоростей выполняется векторно (pandas);
+# - файлы разбираются параллельно в отдельных процессах, загрузка в БД - одна,
+#   большими транзакциями через временную таблицу;
+# - дубликаты (rig_id, timestamp) отбрасываются как внутри импорта, так и
+#   относительно уже загруженных строк;
+# - полностью загруженные файлы отмечаются в import_progress и пропускаются при
+#   повторном запуске; прерванный файл просто перечитывается (дубликаты отсекаются).
+# ==============================================================================
+import argparse
+import glob
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from queue import Empty
+
+import pandas as pd
+
+import archive_catalog
+import mikrotik_storage
+import shift_calendar
+
+# --- Файлы проекта ---
+LEGACY_CSV_FILES = ['coverage_log.csv']
+LEGACY_LOG_PATTERN = os.path.join('logs', 'coverage_log_*.csv')
+
+LEGACY_COLUMNS = ['Timestamp', 'Rig_ID', 'Client_MAC', 'Longitude_X', 'Latitude_Y', 'RSSI', 'TxRate', 'RxRate']
+CHUNK_ROWS = 100000         # Строк в одной порции чтения
+COMMIT_ROWS = 200000        # Строк в одной транзакции
+QUEUE_CHUNKS = 8            # Максимум порций в очереди между разбором и загрузкой
+QUEUE_POLL_SEC = 5.0        # Ожидание порции, после которого проверяется, живы ли обработчики
+MAX_GAP_SEC = mikrotik_storage.DEFAULT_DEADBAND["max_gap_sec"]
+
+# ------------------------------------------------------------------------------
+# 1. РАЗБОР И НОРМАЛИЗАЦИЯ (В ПРОЦЕССАХ-ОБРАБОТЧИКАХ)
+# ------------------------------------------------------------------------------
+
+def _format_rate(values):
+    """Числовая скорость -> строка в формате коллектора ('54Mbps')."""
+    text = values.map(lambda v: f"{v:g}Mbps", na_action='ignore')
+    return text.astype(object).where(values.notna(), None)
+
+
+def normalize_chunk(df):
+    """Векторная нормализация порции старого CSV. Возвращает DataFrame в порядке времени."""
+    df = df.reindex(columns=LEGACY_COLUMNS)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'], format=mikrotik_storage.TIMESTAMP_FORMAT, errors='coerce')
+    df = df.dropna(subset=['Timestamp', 'Rig_ID'])
+
+    for col in ('Longitude_X', 'Latitude_Y', 'RSSI'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in ('TxRate', 'RxRate'):
+        df[col] = pd.to_numeric(df[col].astype(str).str.extract(r'(\d+\.?\d*)', expand=False), errors='coerce')
+
+    df['Rig_ID'] = df['Rig_ID'].astype(str)
+    df['Client_MAC'] = df['Client_MAC'].fillna('').astype(str)
+    df = df.drop_duplicates(subset=['Rig_ID', 'Timestamp'])
+    return df.sort_values(['Rig_ID', 'Timestamp'], kind='stable')
+
+
+def to_rows(df, keep=None):
+    """
+    Строки для mikrotik_log с колонками сжатия (keep - маска строк для вывода).
+
+    duration_sec каждого замера - время до следующего замера той же установки
+    (не больше MAX_GAP_SEC), так же, как при записи коллектором.
+    """
+    next_ts = df.groupby('Rig_ID')['Timestamp'].shift(-1)
+    dt = (next_ts - df['Timestamp']).dt.total_seconds()
+    dt = dt.where(dt <= MAX_GAP_SEC, 0.0).fillna(0.0)
+
+    out = pd.DataFrame({
+        'timestamp': df['Timestamp'].dt.strftime(mikrotik_storage.TIMESTAMP_FORMAT),
+        'rig_id': df['Rig_ID'],
+        'client_mac': df['Client_MAC'],
+        'longitude': df['Longitude_X'],
+        'latitude': df['Latitude_Y'],
+        'rssi': df['RSSI'].astype('Int64'),
+        'tx_rate': _format_rate(df['TxRate']),
+        'rx_rate': _format_rate(df['RxRate']),
+        'duration_sec': dt,
+        'rssi_sum': df['RSSI'],
+        'rssi_wsum': df['RSSI'].fillna(0) * dt,
+        'tx_sum': df['TxRate'],
+        'tx_wsum': df['TxRate'].fillna(0) * dt,
+    })
+    if keep is not None:
+        out = out[keep]
+    # NaN/NA -> NULL для sqlite3
+    out = out.astype(object).where(out.notna(), None)
+    return list(out.itertuples(index=False, name=None))
+
+
+def _parse_file(path, chunk_rows, queue):
+    """
+    Читает файл порциями и отправляет нормализованные строки в очередь.
+
+    Последний замер каждой установки удерживается до следующей порции, чтобы
+    его длительность была посчитана по следующему замеру.
+    """
+    carry = None
+    rows_total = 0
+    try:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str):
+            df = normalize_chunk(chunk)
+            if carry is not None:
+                df = (pd.concat([carry, df])
+                      .drop_duplicates(subset=['Rig_ID', 'Timestamp'])
+                      .sort_values(['Rig_ID', 'Timestamp'], kind='stable'))
+            if df.empty:
+                continue
+            df = df.reset_index(drop=True)
+            tail = df.index.isin(df.groupby('Rig_ID').tail(1).index)
+            rows = to_rows(df, keep=~tail)
+            carry = df[tail]
+            if rows:
+                rows_total += len(rows)
+                queue.put(('chunk', path, rows))
+        if carry is not None and not carry.empty:
+            rows = to_rows(carry)
+            rows_total += len(rows)
+            queue.put(('chunk', path, rows))
+        queue.put(('done', path, rows_total))
+    except Exception as e:
+        queue.put(('error', path, str(e)))
+
+
+def _worker(paths, chunk_rows, queue):
+    """Процесс-обработчик: разбирает свои файлы по очереди."""
+    for path in paths:
+        _parse_file(path, chunk_rows, queue)
+
+# ------------------------------------------------------------------------------
+# 2. ЗАГРУЗКА В SQLITE
+# ------------------------------------------------------------------------------
+
+def _prepare_db(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_progress (
+            file_path TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            file_mtime REAL NOT NULL,
+            rows_loaded INTEGER NOT NULL,
+            completed_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS import_stage (
+            timestamp TEXT NOT NULL,
+            rig_id TEXT NOT NULL,
+            client_mac TEXT NOT NULL,
+            longitude REAL, latitude REAL, rssi INTEGER, tx_rate TEXT, rx_rate TEXT,
+            duration_sec REAL, rssi_sum REAL, rssi_wsum REAL, tx_sum REAL, tx_wsum REAL,
+            PRIMARY KEY (rig_id, timestamp)
+        )
+    """)
+    conn.commit()
+
+
+def _flush_stage(conn, db_path):
+    """
+    Переносит временную таблицу в mikrotik_log, пропуская уже загруженные (rig_id, timestamp),
+    и пересчитывает каталог архива для затронутых рабочих дней (источник - db_path).
+    """
+    shift_id_sql = shift_calendar.get_calendar().shift_id_sql("s.timestamp")
+    shift_dates = [row[0] for row in conn.execute(
+        "SELECT DISTINCT " + archive_catalog.shift_date_sql("timestamp") + " FROM import_stage")]
+    cursor = conn.execute(f"""
+        INSERT INTO mikrotik_log (
+            timestamp, rig_id, client_mac, longitude, latitude, rssi, tx_rate, rx_rate,
+            last_timestamp, sample_count, duration_sec, rssi_sum, rssi_wsum, tx_sum, tx_wsum, shift_id
+        )
+        SELECT s.timestamp, s.rig_id, s.client_mac, s.longitude, s.latitude, s.rssi, s.tx_rate, s.rx_rate,
+               s.timestamp, 1, s.duration_sec, s.rssi_sum, s.rssi_wsum, s.tx_sum, s.tx_wsum, {shift_id_sql}
+        FROM import_stage s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM mikrotik_log m WHERE m.rig_id = s.rig_id AND m.timestamp = s.timestamp
+        )
+        ORDER BY s.rig_id, s.timestamp
+    """)
+    inserted = cursor.rowcount
+    conn.execute("DELETE FROM import_stage")
+    conn.commit()
+    if inserted:
+        archive_catalog.refresh_db_entries(conn, shift_dates, db_path)
+    return inserted
+
+
+def _completed_files(conn):
+    return {path: (size, mtime) for path, size, mtime in
+            conn.execute("SELECT file_path, file_size, file_mtime FROM import_progress")}
+
+
+def import_csv_files(paths, db_path=mikrotik_storage.MIKROTIK_DB, workers=None, chunk_rows=CHUNK_ROWS, force=False):
+    """Импортирует CSV-файлы в db_path. Возвращает число добавленных строк."""
+    mikrotik_storage.initialize_db(db_path)
+    conn = sqlite3.connect(db_path)
+    _prepare_db(conn)
+
+    done = _completed_files(conn)
+    pending = []
+    for path in paths:
+        stat = os.stat(path)
+        if not force and done.get(os.path.abspath(path)) == (stat.st_size, stat.st_mtime):
+            print(f"[SKIP] {path}: уже импортирован.")
+            continue
+        pending.append(path)
+
+    if not pending:
+        conn.close()
+        return 0
+
+    workers = workers or min(len(pending), os.cpu_count() or 1)
+    queue = multiprocessing.Queue(maxsize=QUEUE_CHUNKS)
+    owner = {}   # файл -> процесс, который его разбирает
+    processes = []
+    for i in range(min(workers, len(pending))):
+        files = pending[i::workers]
+        process = multiprocessing.Process(target=_worker, args=(files, chunk_rows, queue), daemon=True)
+        process.start()
+        processes.append(process)
+        owner.update({path: process for path in files})
+
+    started = time.time()
+    staged = parsed = inserted = 0
+    remaining = set(pending)
+    finished = {}
+    try:
+        while remaining:
+            try:
+                kind, path, payload = queue.get(timeout=QUEUE_POLL_SEC)
+            except Empty:
+                # Завершившийся обработчик уже отдал все свои сообщения: его недоделанные
+                # файлы (процесс упал или был убит) больше не придут
+                for path in sorted(p for p in remaining if not owner[p].is_alive()):
+                    remaining.discard(path)
+                    print(f"[ERROR] {path}: обработчик завершился (код {owner[path].exitcode}), файл не загружен.")
+                kind = None
+            if kind == 'chunk':
+                conn.executemany(
+                    "INSERT OR IGNORE INTO import_stage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", payload)
+                staged += len(payload)
+                parsed += len(payload)
+                if staged >= COMMIT_ROWS:
+                    inserted += _flush_stage(conn, db_path)
+                    staged = 0
+                    elapsed = time.time() - started
+                    print(f"[IMPORT] Разобрано {parsed} строк, добавлено {inserted} ({parsed / elapsed:.0f} строк/с)")
+            elif kind == 'done':
+                remaining.discard(path)
+                finished[path] = payload
+            elif kind == 'error':
+                remaining.discard(path)
+                print(f"[ERROR] {path}: {payload}")
+
+            # Файл считается загруженным только после фиксации его строк
+            if finished and (staged == 0 or not remaining):
+                inserted += _flush_stage(conn, db_path)
+                staged = 0
+                _mark_completed(conn, finished)
+                finished = {}
+    finally:
+        for process in processes:
+            process.join(timeout=QUEUE_POLL_SEC)
+            if process.is_alive():
+                process.terminate()    # Прерванный импорт: обработчик мог застрять на полной очереди
+                process.join()
+        conn.close()
+
+    elapsed = time.time() - started
+    print(f"[IMPORT] Готово: файлов {len(pending)}, разобрано {parsed}, добавлено {inserted} за {elapsed:.1f} с.")
+    return inserted
+
+
+def _mark_completed(conn, finished):
+    now = datetime.now().strftime(mikrotik_storage.TIMESTAMP_FORMAT)
+    for path, rows in finished.items():
+        stat = os.stat(path)
+        conn.execute(
+            "INSERT OR REPLACE INTO import_progress VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(path), stat.st_size, stat.st_mtime, rows, now)
+        )
+        print(f"[IMPORT] {path}: {rows} строк загружено.")
+    conn.commit()
+
+
+def default_legacy_files():
+    """Все старые CSV-логи проекта."""
+    files = [p for p in LEGACY_CSV_FILES if os.path.exists(p)]
+    return files + sorted(glob.glob(LEGACY_LOG_PATTERN))
+
+# ------------------------------------------------------------------------------
+# 3. ТОЧКА ВХОДА
+# ------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт старых CSV-логов покрытия в mikrotik_log.db")
+    parser.add_argument('files', nargs='*', help="CSV-файлы (по умолчанию coverage_log.csv и logs/coverage_log_*.csv)")
+    parser.add_argument('--db', default=mikrotik_storage.MIKROTIK_DB)
+    parser.add_argument('--workers', type=int, default=None, help="Число процессов разбора")
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help="Строк в порции чтения")
+    parser.add_argument('--force', action='store_true', help="Перечитать уже импортированные файлы")
+    args = parser.parse_args()
+
+    files = args.files or default_legacy_files()
+    if not files:
+        print("Нет файлов для импорта.")
+        sys.exit(0)
+    import_csv_files(files, args.db, args.workers, args.chunk, args.force)
@@ -0,0 +1,240 @@
+# ==============================================================================
+# DATA_ACCESS.PY - Общий слой чтения данных: пути БД, пул соединений, кэш запросов
+# ==============================================================================
+# Пути к базам берутся из config.json (data_storage.mikrotik_log_db и
+# data_storage.db_name), а не из констант в каждом модуле.
+#
+# Чтение идет через пул соединений только для чтения (по одному на поток и
+# БД): mode=ro + PRAGMA query_only, mmap_size и кэш подготовленных выражений
+# sqlite3 - одни и те же SQL запросов каталога QUERIES не компилируются заново.
+#
+# Результаты запросов каталога кэшируются (LRU, срок жизни cache_ttl_sec).
+# Кэш сбрасывается при записи в БД любым другим процессом (сборщиком,
+# анализатором): PRAGMA data_version соединения меняется после каждого
+# чужого commit, и записи кэша этой БД становятся недействительными. Поэтому
+# вкладки GUI, карта и отчеты в одном цикле обновления не повторяют один и
+# тот же запрос, но новые данные видят сразу после их записи.
+#
+# Результаты из кэша общие - вызывающий код не должен их изменять.
+# ==============================================================================
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import alert_engine
+import coverage_grid
+import coverage_holes
+import mikrotik_storage
+import perf_metrics
+import rtk_storage
+
+CONFIG_FILE = 'config.json'
+
+DB_MIKROTIK = "mikrotik"
+DB_RTK = "rtk"
+
+# Настройки по умолчанию (перекрываются data_storage.data_access в config.json)
+DEFAULT_ACCESS = {
+    "mmap_mb": 256,          # Отображение файла БД в память для чтения
+    "cache_ttl_sec": 5.0,    # Срок жизни результата в кэше
+    "cache_entries": 256     # Размер кэша (LRU)
+}
+
+# Подготовленных выражений на соединение (кэш sqlite3)
+STATEMENT_CACHE = 128
+
+
+def resolve_db_paths(config):
+    """Пути к базам из config.json: {DB_MIKROTIK: ..., DB_RTK: ...}."""
+    data_storage = (config or {}).get("data_storage", {})
+    return {
+        DB_MIKROTIK: data_storage.get("mikrotik_log_db", mikrotik_storage.MIKROTIK_DB),
+        DB_RTK: data_storage.get("db_name", rtk_storage.RTK_DB),
+    }
+
+
+def load_db_paths(config_file=CONFIG_FILE):
+    """Пути к базам для запуска вне сервисов (скрипты, отчеты)."""
+    try:
+        with open(config_file, 'r') as f:
+            return resolve_db_paths(json.load(f))
+    except (OSError, ValueError):
+        return resolve_db_paths(None)
+
+
+def resolve_access_config(config_section):
+    """Объединяет настройки слоя чтения из config.json со значениями по умолчанию."""
+    access_config = dict(DEFAULT_ACCESS)
+    access_config.update(config_section or {})
+    return access_config
+
+
+def open_readonly(db_path, mmap_mb=DEFAULT_ACCESS["mmap_mb"]):
+    """Соединение только для чтения (файл БД должен существовать)."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=1,
+                           cached_statements=STATEMENT_CACHE)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_mb) * 1024 * 1024}")
+    return conn
+
+# ------------------------------------------------------------------------------
+# 1. КАТАЛОГ ЗАПРОСОВ
+# ------------------------------------------------------------------------------
+
+LATEST_FIELDS = ("id", "timestamp", "last_timestamp", "rig_id", "longitude", "latitude", "rssi",
+                 "tx_rate", "rx_rate", "sample_count", "ap_id")
+
+
+def _latest_per_rig(conn, rig_ids):
+    """Последняя строка каждой установки (dict rig_id -> dict или None) по индексу (rig_id, timestamp)."""
+    latest = {}
+    for rig_id in rig_ids:
+        row = conn.execute(
+            f"""SELECT {', '.join(LATEST_FIELDS)} FROM mikrotik_log
+                WHERE rig_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1""",
+            (rig_id,)
+        ).fetchone()
+        latest[rig_id] = dict(zip(LATEST_FIELDS, row)) if row else None
+    return latest
+
+
+def _shift_window(conn, first_shift, last_shift, rig_id=None):
+    """Замеры смен first_shift..last_shift с координатами: список (timestamp, rig_id, longitude, latitude, rssi)."""
+    sql = """SELECT timestamp, rig_id, longitude, latitude, COALESCE(rssi_sum / sample_count, rssi)
+             FROM mikrotik_log
+             WHERE shift_id BETWEEN ? AND ? AND longitude IS NOT NULL AND latitude IS NOT NULL"""
+    params = [first_shift, last_shift]
+    if rig_id is not None:
+        sql += " AND rig_id = ?"
+        params.append(rig_id)
+    return conn.execute(sql + " ORDER BY timestamp", params).fetchall()
+
+
+def _table_or_empty(reader, empty):
+    """Чтение таблицы, которой может еще не быть (сервис ее не создавал)."""
+    def read(conn, *args):
+        try:
+            return reader(conn, *args)
+        except sqlite3.OperationalError:
+            return empty
+    return read
+
+
+# Имя -> (БД по умолчанию, функция(conn, *args))
+QUERIES = {
+    "latest_per_rig": (DB_MIKROTIK, _latest_per_rig),
+    "wifi_stats": (DB_MIKROTIK, mikrotik_storage.query_wifi_stats),
+    "shift_window": (DB_MIKROTIK, _shift_window),
+    "coverage_cells": (DB_MIKROTIK, _table_or_empty(coverage_grid.load_cells, None)),
+    "coverage_holes": (DB_MIKROTIK, coverage_holes.read_holes),
+    "rtk_latest": (DB_RTK, _table_or_empty(rtk_storage.read_latest, None)),
+    "active_alerts": (DB_MIKROTIK, alert_engine.read_active),
+    "last_valid_per_rig": (DB_MIKROTIK, _table_or_empty(alert_engine.read_last_valid, {})),
+    "perf_latest": (DB_MIKROTIK, perf_metrics.read_latest),
+}
+
+# ------------------------------------------------------------------------------
+# 2. ПУЛ СОЕДИНЕНИЙ И КЭШ
+# ------------------------------------------------------------------------------
+
+class DataAccess:
+    """
+    Точка чтения данных для GUI, карты и отчетов.
+
+        data = DataAccess(config)
+        stats = data.query("wifi_stats", rig_id, first_shift, last_shift)
+        status = data.query("rtk_latest", station)
+        metrics = data.query("perf_latest", db=DB_RTK)
+    """
+
+    def __init__(self, config=None):
+        self.db_paths = resolve_db_paths(config)
+        self.config = resolve_access_config((config or {}).get("data_storage", {}).get("data_access"))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # key -> (expires_at, db_key, result)
+        self._versions = {}           # (поток, db_key) -> последний PRAGMA data_version
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, db_key):
+        return self.db_paths[db_key]
+
+    def connection(self, db_key):
+        """Соединение только для чтения из пула текущего потока (None - файла БД нет)."""
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            pool = self._local.pool = {}
+        conn = pool.get(db_key)
+        if conn is None:
+            if not os.path.exists(self.db_paths[db_key]):
+                return None
+            conn = pool[db_key] = open_readonly(self.db_paths[db_key], self.config["mmap_mb"])
+        return conn
+
+    def close(self):
+        """Закрывает соединения пула текущего потока."""
+        pool = getattr(self._local, "pool", None) or {}
+        for conn in pool.values():
+            conn.close()
+        pool.clear()
+
+    def invalidate(self, db_key=None):
+        """Сбрасывает кэш (одной БД или весь) - например, после записи в этом же процессе."""
+        with self._lock:
+            for key in [k for k, (_, db, _) in self._cache.items() if db_key is None or db == db_key]:
+                del self._cache[key]
+
+    def _check_version(self, db_key, conn):
+        """Сбрасывает кэш БД, если в нее писали с прошлой проверки."""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        slot = (threading.get_ident(), db_key)
+        if self._versions.get(slot) != version:
+            if slot in self._versions:
+                self.invalidate(db_key)
+            self._versions[slot] = version
+
+    def _cached(self, key, db_key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+        result = loader()
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = (now + self.config["cache_ttl_sec"], db_key, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.config["cache_entries"]:
+                self._cache.popitem(last=False)
+        return result
+
+    def query(self, name, *args, db=None):
+        """
+        Запрос каталога QUERIES с кэшем. db - другая БД для запросов к таблицам,
+        которые есть в обеих (perf_latest, active_alerts). Если файла БД нет,
+        возвращает None.
+        """
+        default_db, reader = QUERIES[name]
+        db_key = db or default_db
+        conn = self.connection(db_key)
+        if conn is None:
+            return None
+        self._check_version(db_key, conn)
+        return self._cached((name, db_key) + tuple(args), db_key, lambda: reader(conn, *args))
+
+    def read_csv(self, path, **kwargs):
+        """
+        pd.read_csv с кэшем по (путь, время изменения, размер): несколько вкладок
+        в одном цикле обновления разбирают файл один раз. Нет файла - FileNotFoundError.
+        """
+        stat = os.stat(path)
+        key = ("read_csv", path, stat.st_mtime_ns, stat.st_size, tuple(sorted(kwargs.items())))
+        return self._cached(key, None, lambda: pd.read_csv(path, **kwargs))
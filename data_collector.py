@@ -8,10 +8,18 @@ import random
 import sys
 import os
 import sqlite3 # <-- НОВЫЙ ИМПОРТ
+import alert_engine
+import ap_fleet
+import cpe_fanout
+import mikrotik_storage
+import metrics_http
+import perf_metrics
+import routeros_api
+import snmp_poller
+import spool_journal
 
 # --- Файлы проекта ---
 CONFIG_FILE = 'config.json'
-MIKROTIK_DB = 'mikrotik_log.db' # <-- НОВАЯ КОНСТАНТА БД
 
 # ==============================================================================
 # КОНФИГУРАЦИЯ И ЗАГРУЗКА
@@ -27,6 +35,29 @@ def load_config():
 
 CONFIG = load_config()
 
+# База замеров: data_storage.mikrotik_log_db в config.json
+MIKROTIK_DB = CONFIG.get('data_storage', {}).get('mikrotik_log_db', mikrotik_storage.MIKROTIK_DB)
+
+# Настройки сжатия при записи (data_storage.deadband в config.json)
+DEADBAND = mikrotik_storage.resolve_deadband(CONFIG.get("data_storage", {}).get("deadband"))
+
+# Журнал записи: замер сначала попадает в spool, в БД его переносит фоновый drainer
+SPOOL_CONFIG = spool_journal.resolve_spool_config(CONFIG.get("data_storage", {}).get("spool"))
+
+# Таймеры этапов цикла сбора (выгружаются в perf_metrics, data_storage.metrics в config.json)
+METRICS_CONFIG = perf_metrics.resolve_metrics_config(CONFIG.get("data_storage", {}).get("metrics"))
+METRICS = perf_metrics.Registry("data_collector")
+
+# Потоковые тревоги (data_storage.alerts в config.json); движок создается в start_metrics
+ALERTS_CONFIG = CONFIG.get("data_storage", {}).get("alerts")
+ALERTS = None
+
+# Способ опроса точки доступа: "ssh" (разбор print brief), "api" (RouterOS API) или "snmp" (GETBULK)
+POLLER_BACKEND = CONFIG.get("script_collector", {}).get("poller_backend", "ssh")
+
+# Несколько точек доступа (mikrotik_aps): опрос всех AP одним расписанием с учетом роуминга
+MULTI_AP = bool(CONFIG.get("mikrotik_aps"))
+
 # Удаляем CSV_HEADERS, так как структура будет определяться SQL-схемой
 
 def get_rig_info(rig_id):
@@ -37,28 +68,42 @@ def get_rig_info(rig_id):
             return rig
     return None
 
+def get_collection_interval():
+    """Период опроса: script_collector.collection_interval_sec (старые конфиги - data_storage)."""
+    for section in ("script_collector", "data_storage"):
+        interval = CONFIG.get(section, {}).get("collection_interval_sec")
+        if interval:
+            return interval
+    return 60
+
+def resolve_rig_mac(rig_info):
+    """
+    MAC беспроводного интерфейса CPE: mikrotik_mac из конфига или, если его нет
+    (в mikrotik_cpelist указаны только ip и model), запрос к самой CPE по API.
+    """
+    if rig_info.get('mikrotik_mac'):
+        return rig_info['mikrotik_mac'].upper()
+    if not rig_info.get('ip'):
+        return None
+    collector = CONFIG.get("script_collector", {})
+    fanout_config = cpe_fanout.resolve_fanout_config(collector.get("fanout"))
+    client = routeros_api.RouterOSApiClient(
+        rig_info['ip'], collector.get("user"), collector.get("password"),
+        port=fanout_config["api_port"], use_ssl=fanout_config["api_ssl"],
+        timeout=fanout_config["deadline_sec"]
+    )
+    try:
+        return cpe_fanout.query_cpe(client)["mac"]
+    except (OSError, routeros_api.RouterOSApiError) as e:
+        print(f"   [ERROR] Не удалось получить MAC CPE {rig_info['rig_id']} ({rig_info['ip']}): {e}")
+        return None
+    finally:
+        client.close()
+
 def initialize_db():
-    """Создает таблицу mikrotik_log, если она не существует."""
+    """Создает таблицу mikrotik_log (и колонки режима сжатия), если они не существуют."""
     try:
-        conn = sqlite3.connect(MIKROTIK_DB)
-        cursor = conn.cursor()
-        
-        # SQL-схема для хранения логов Mikrotik
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS mikrotik_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                rig_id TEXT NOT NULL,
-                client_mac TEXT NOT NULL,
-                longitude REAL,
-                latitude REAL,
-                rssi INTEGER,
-                tx_rate TEXT,
-                rx_rate TEXT
-            );
-        """)
-        conn.commit()
-        conn.close()
+        mikrotik_storage.initialize_db(MIKROTIK_DB)
         print(f"-> Инициализирована база данных: {MIKROTIK_DB}")
     except Exception as e:
         print(f"[FATAL] Ошибка инициализации базы данных: {e}")
@@ -100,35 +145,38 @@ def get_mikrotik_data(client_mac):
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     
     try:
-        ssh.connect(
-            hostname=CONFIG["mikrotik_ap"]["ip"],
-            username=CONFIG["mikrotik_ap"]["user"],
-            password=CONFIG["mikrotik_ap"]["password"],
-            port=22,
-            timeout=5
-        )
-        command = f'/interface/wireless/registration-table print brief where mac-address="{client_mac}"'
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode('utf-8').strip()
+        with METRICS.stage("ssh_connect"):
+            ssh.connect(
+                hostname=CONFIG["mikrotik_ap"]["ip"],
+                username=CONFIG["mikrotik_ap"]["user"],
+                password=CONFIG["mikrotik_ap"]["password"],
+                port=22,
+                timeout=5
+            )
+        with METRICS.stage("ssh_exec"):
+            command = f'/interface/wireless/registration-table print brief where mac-address="{client_mac}"'
+            stdin, stdout, stderr = ssh.exec_command(command)
+            output = stdout.read().decode('utf-8').strip()
 
         if not output:
             print(f"   [WARN] Клиент {client_mac} не найден в registration-table.")
             return mikrotik_data
 
-        rssi_match = re.search(r'signal-strength=(-?\d+)', output)
-        if rssi_match:
-            # RSSI должен быть целым числом
-            mikrotik_data["RSSI"] = int(rssi_match.group(1))
+        with METRICS.stage("parse"):
+            rssi_match = re.search(r'signal-strength=(-?\d+)', output)
+            if rssi_match:
+                # RSSI должен быть целым числом
+                mikrotik_data["RSSI"] = int(rssi_match.group(1))
+
+            # TxRate и RxRate оставляем в виде строк (например, "54M" или "6.5M")
+            tx_rate_match = re.search(r'tx-rate=(\d+\.?\d*Mbps)', output)
+            if tx_rate_match:
+                mikrotik_data["TxRate"] = tx_rate_match.group(1) #.replace("Mbps", "") # Оставим 'Mbps' для строкового хранения
+
+            rx_rate_match = re.search(r'rx-rate=(\d+\.?\d*Mbps)', output)
+            if rx_rate_match:
+                mikrotik_data["RxRate"] = rx_rate_match.group(1) #.replace("Mbps", "")
 
-        # TxRate и RxRate оставляем в виде строк (например, "54M" или "6.5M")
-        tx_rate_match = re.search(r'tx-rate=(\d+\.?\d*Mbps)', output)
-        if tx_rate_match:
-            mikrotik_data["TxRate"] = tx_rate_match.group(1) #.replace("Mbps", "") # Оставим 'Mbps' для строкового хранения
-            
-        rx_rate_match = re.search(r'rx-rate=(\d+\.?\d*Mbps)', output)
-        if rx_rate_match:
-            mikrotik_data["RxRate"] = rx_rate_match.group(1) #.replace("Mbps", "")
-            
     except paramiko.AuthenticationException:
         print("   [ERROR] Ошибка аутентификации SSH. Проверьте логин/пароль.")
     except Exception as e:
@@ -139,30 +187,210 @@ def get_mikrotik_data(client_mac):
             
     return mikrotik_data
 
+_API_CLIENT = None
+
+def get_api_client():
+    """Постоянная сессия RouterOS API к точке доступа (создается при первом опросе)."""
+    global _API_CLIENT
+    if _API_CLIENT is None:
+        collector = CONFIG.get("script_collector", {})
+        _API_CLIENT = routeros_api.RouterOSApiClient(
+            CONFIG["mikrotik_ap"]["ip"],
+            CONFIG["mikrotik_ap"]["user"],
+            CONFIG["mikrotik_ap"]["password"],
+            port=collector.get("api_port"),
+            use_ssl=collector.get("api_ssl", False),
+            timeout=collector.get("api_timeout", 5)
+        )
+    return _API_CLIENT
+
+def get_mikrotik_data_api(client_mac):
+    """Получает RSSI, TxRate и RxRate для одного MAC-адреса через RouterOS API."""
+    mikrotik_data = {"RSSI": None, "TxRate": None, "RxRate": None}
+    try:
+        rows = get_api_client().registration_table(client_mac)
+        if not rows:
+            print(f"   [WARN] Клиент {client_mac} не найден в registration-table.")
+            return mikrotik_data
+        mikrotik_data.update(routeros_api.registration_to_metrics(rows[0]))
+    except routeros_api.RouterOSApiError as e:
+        print(f"   [ERROR] Ошибка RouterOS API: {e}")
+    except OSError as e:
+        print(f"   [ERROR] Ошибка подключения к RouterOS API: {e}")
+    return mikrotik_data
+
+_SNMP_CACHE = None
+
+def get_mikrotik_data_snmp(client_mac):
+    """Получает RSSI, TxRate и RxRate для одного MAC-адреса из SNMP-снимка registration-table."""
+    global _SNMP_CACHE
+    mikrotik_data = {"RSSI": None, "TxRate": None, "RxRate": None}
+    if _SNMP_CACHE is None:
+        _SNMP_CACHE = snmp_poller.RegistrationCache(
+            CONFIG["mikrotik_ap"]["ip"], CONFIG.get("script_collector", {}).get("snmp")
+        )
+    try:
+        client = _SNMP_CACHE.lookup(client_mac)
+        if client is None:
+            print(f"   [WARN] Клиент {client_mac} не найден в registration-table.")
+            return mikrotik_data
+        for key in mikrotik_data:
+            mikrotik_data[key] = client[key]
+    except snmp_poller.SnmpError as e:
+        print(f"   [ERROR] Ошибка SNMP: {e}")
+    except OSError as e:
+        print(f"   [ERROR] Ошибка сети при опросе SNMP: {e}")
+    return mikrotik_data
+
+_FLEET = None
+
+def get_mikrotik_data_fleet(client_mac):
+    """RSSI, TxRate, RxRate по самой сильной ассоциации среди всех AP и обслуживающая AP (ap_id)."""
+    global _FLEET
+    mikrotik_data = {"RSSI": None, "TxRate": None, "RxRate": None, "ap_id": None}
+    if _FLEET is None:
+        collector = CONFIG.get("script_collector", {})
+        fleet_config = ap_fleet.resolve_fleet_config(collector.get("ap_fleet"))
+        if fleet_config["deadline_sec"] is None:
+            fleet_config["deadline_sec"] = cpe_fanout.resolve_fanout_config(collector.get("fanout"))["deadline_sec"]
+        _FLEET = ap_fleet.APFleet(
+            ap_fleet.normalize_aps(CONFIG), POLLER_BACKEND, collector.get("snmp"), collector, fleet_config
+        )
+    try:
+        client = _FLEET.lookup(client_mac)
+    except (OSError, snmp_poller.SnmpError) as e:
+        print(f"   [ERROR] Ошибка опроса точек доступа: {e}")
+        return mikrotik_data
+    if client is None:
+        print(f"   [WARN] Клиент {client_mac} не найден ни в одной registration-table.")
+        return mikrotik_data
+    for key in mikrotik_data:
+        mikrotik_data[key] = client[key]
+    return mikrotik_data
+
+# Доступные способы опроса: функция(client_mac) -> {"RSSI", "TxRate", "RxRate"}
+MIKROTIK_POLLERS = {
+    "ssh": get_mikrotik_data,
+    "api": get_mikrotik_data_api,
+    "snmp": get_mikrotik_data_snmp,
+}
+
+def get_poller(backend=None):
+    """
+    Функция опроса для выбранного бэкенда (script_collector.poller_backend).
+    Если задан список mikrotik_aps, опрашиваются все AP (api или snmp).
+    """
+    if MULTI_AP and backend is None:
+        return get_mikrotik_data_fleet
+    backend = backend or POLLER_BACKEND
+    if backend not in MIKROTIK_POLLERS:
+        print(f"   [WARN] Неизвестный poller_backend '{backend}', используется ssh.")
+        backend = "ssh"
+    return MIKROTIK_POLLERS[backend]
+
 # ==============================================================================
 # ОСНОВНОЙ ЦИКЛ СБОРА (Обновленная версия)
 # ==============================================================================
 
 def write_to_db(data_row):
-    """Записывает одну строку данных в базу данных SQLite."""
+    """Записывает одну строку данных в базу данных SQLite (с deadband-сжатием, если включено)."""
     conn = None
     try:
         conn = sqlite3.connect(MIKROTIK_DB)
         cursor = conn.cursor()
-        
-        # Используем INSERT INTO с параметрами для безопасности
-        sql = """
-            INSERT INTO mikrotik_log (timestamp, rig_id, client_mac, longitude, latitude, rssi, tx_rate, rx_rate)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        cursor.execute(sql, data_row)
+        mikrotik_storage.write_sample(cursor, data_row, DEADBAND)
         conn.commit()
     except sqlite3.Error as e:
         print(f"   [ERROR] Ошибка записи в БД: {e}")
+        # Состояние сжатия могло разойтись с БД - следующий замер начнет новую строку
+        mikrotik_storage.reset_state(data_row[1])
     finally:
         if conn:
             conn.close()
 
+def start_metrics(service, rig_ids):
+    """
+    Задает имя сервиса для метрик, создает движок тревог, запускает выгрузку
+    метрик в БД и, если включен, HTTP-endpoint Prometheus
+    (порт collector_port + номер установки; fan-out - collector_port).
+    """
+    global ALERTS
+    METRICS.service = service
+    ALERTS = alert_engine.create_engine(service, MIKROTIK_DB, ALERTS_CONFIG)
+    if METRICS_CONFIG["enabled"]:
+        perf_metrics.start_flusher(METRICS, MIKROTIK_DB, METRICS_CONFIG)
+
+    http_config = metrics_http.resolve_http_config(METRICS_CONFIG.get("http"))
+    port = http_config["collector_port"]
+    if len(rig_ids) == 1:
+        all_rigs = [rig['rig_id'] for rig in CONFIG.get('mikrotik_cpelist', [])]
+        port += 1 + (all_rigs.index(rig_ids[0]) if rig_ids[0] in all_rigs else 0)
+    gauges = {}
+    if SPOOL_CONFIG["enabled"]:
+        names = [spool_name_for(rig_id) for rig_id in rig_ids]
+        gauges["spool_backlog_records"] = lambda: sum(
+            spool_journal.spool_backlog(name, MIKROTIK_DB, SPOOL_CONFIG) for name in names)
+    metrics_http.start_exporter(METRICS, port, http_config, gauges)
+
+def wait_next_tick(next_tick, interval_sec):
+    """
+    Ждет начала следующего тика по расписанию и возвращает его плановое время.
+    Опоздание тика (tick_lag_seconds) видно в метриках; при опоздании больше
+    периода расписание сдвигается, чтобы не запускать пачку догоняющих тиков.
+    """
+    next_tick += interval_sec
+    now = time.monotonic()
+    if next_tick > now:
+        time.sleep(next_tick - now)
+    elif now - next_tick > interval_sec:
+        next_tick = now
+    METRICS.set_gauge("tick_lag_seconds", round(max(0.0, time.monotonic() - next_tick), 3))
+    return next_tick
+
+def build_data_row(timestamp, rig_id, mac_address, lon, lat, metrics):
+    """
+    Кортеж замера для mikrotik_log: восемь базовых полей и необязательные
+    (mikrotik_storage.OPTIONAL_COLUMNS), если бэкенд их вернул.
+    """
+    row = (
+        timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        rig_id,
+        mac_address,
+        lon,
+        lat,
+        metrics["RSSI"],
+        metrics["TxRate"],
+        metrics["RxRate"]
+    )
+    optional = tuple(metrics.get(name) for name, _ in mikrotik_storage.OPTIONAL_COLUMNS)
+    # Строки без дополнительных полей остаются короткими (меньше места в журнале)
+    return row + optional if any(value is not None for value in optional) else row
+
+def check_alerts(rig_id, metrics):
+    """Передает замер в движок тревог (до записи, чтобы тревога не ждала БД)."""
+    if ALERTS is None:
+        return
+    with METRICS.stage("alerts"):
+        ALERTS.ingest(rig_id, {"rssi": metrics.get("RSSI"),
+                               "tx_mbps": mikrotik_storage.parse_rate_mbps(metrics.get("TxRate"))})
+
+def _write_spooled_row(cursor, values):
+    """Обработчик drainer: загружает строку из журнала в mikrotik_log."""
+    mikrotik_storage.write_sample(cursor, tuple(values), DEADBAND)
+
+def spool_name_for(rig_id):
+    return "mikrotik_" + re.sub(r'[^A-Za-z0-9_-]', '_', rig_id)
+
+def open_rig_spool(rig_id):
+    """Открывает журнал установки и запускает его загрузку в БД (включая накопленный хвост)."""
+    spool_name = spool_name_for(rig_id)
+    spool = spool_journal.SpoolWriter(spool_name, SPOOL_CONFIG)
+    spool_journal.start_drainer(
+        spool_name, MIKROTIK_DB, {spool_journal.KIND_MIKROTIK: _write_spooled_row}, SPOOL_CONFIG,
+        on_error=lambda: mikrotik_storage.reset_state(rig_id)
+    )
+    return spool
+
 def collect_data_for_rig(rig_id):
     """Основной цикл для ОДНОЙ буровой установки."""
     
@@ -174,48 +402,145 @@ def collect_data_for_rig(rig_id):
         print(f"[FATAL] Буровая установка с ID '{rig_id}' не найдена в config.json (mikrotik_cpelist). Выход.")
         return
 
-    mac_address = rig_info['mikrotik_mac']
-    interval_sec = CONFIG["data_storage"]["collection_interval_sec"]
+    mac_address = resolve_rig_mac(rig_info)
+    if not mac_address:
+        print(f"[FATAL] Для '{rig_id}' не задан mikrotik_mac и CPE не ответила по API. Выход.")
+        return
+    interval_sec = get_collection_interval()
+
+    spool = open_rig_spool(rig_id) if SPOOL_CONFIG["enabled"] else None
+    poll_mikrotik = get_poller()
+    start_metrics(f"data_collector:{rig_id}", [rig_id])
 
     print(f"--- Мониторинг запущен для {rig_id} ({mac_address}). БД: {MIKROTIK_DB} ---")
     
+    next_tick = time.monotonic()
     while True:
-        try:
-            timestamp = datetime.now()
+        with METRICS.stage("tick"):
+            try:
+                timestamp = datetime.now()
             
-            # 1. Сбор данных Mikrotik
-            mikrotik_metrics = get_mikrotik_data(mac_address)
+                # 1. Сбор данных Mikrotik
+                with METRICS.stage("poll"):
+                    mikrotik_metrics = poll_mikrotik(mac_address)
             
-            # 2. Сбор GPS-данных (мокируем)
-            lon, lat, hdop = get_gps_data_mock(rig_id)
+                # 2. Сбор GPS-данных (мокируем)
+                with METRICS.stage("gps"):
+                    lon, lat, hdop = get_gps_data_mock(rig_id)
             
-            # 3. Формирование строки данных для БД
-            data_row = (
-                timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                rig_id,
-                mac_address,
-                lon,
-                lat,
-                mikrotik_metrics["RSSI"],
-                mikrotik_metrics["TxRate"],
-                mikrotik_metrics["RxRate"]
-            )
+                # 3. Формирование строки данных для БД
+                data_row = build_data_row(timestamp, rig_id, mac_address, lon, lat, mikrotik_metrics)
+                check_alerts(rig_id, mikrotik_metrics)
+
+                # 4. Запись: через журнал (spool) или напрямую в SQLite
+                if spool is not None:
+                    with METRICS.stage("spool_append"):
+                        spool.append(spool_journal.KIND_MIKROTIK, data_row)
+                    print(f"[{timestamp.strftime('%H:%M:%S')}] {rig_id}: RSSI={mikrotik_metrics['RSSI']} dBm. Записано в журнал.")
+                else:
+                    with METRICS.stage("db_write"):
+                        write_to_db(data_row)
+                    print(f"[{timestamp.strftime('%H:%M:%S')}] {rig_id}: RSSI={mikrotik_metrics['RSSI']} dBm. Записано в БД.")
+                METRICS.incr("samples")
+
+            except Exception as e:
+                METRICS.incr("errors")
+                print(f"   [FATAL] Ошибка в цикле сбора для {rig_id}: {e}")
+                check_alerts(rig_id, {})   # Тик без замера - для правила collector_silent
+
+            if ALERTS is not None:
+                ALERTS.tick()
+
+        next_tick = wait_next_tick(next_tick, interval_sec)
 
-            # 4. Запись в SQLite
-            write_to_db(data_row)
-                        
-            print(f"[{timestamp.strftime('%H:%M:%S')}] {rig_id}: RSSI={mikrotik_metrics['RSSI']} dBm. Записано в БД.")
+# ==============================================================================
+# РЕЖИМ FAN-OUT: ВСЕ CPE ОДНОВРЕМЕННО
+# ==============================================================================
+
+def get_ap_view(mac_addresses):
+    """
+    Данные точки доступа по списку MAC: {MAC: {"RSSI", "TxRate", "RxRate"}}.
+    В режиме snmp все MAC обслуживаются одним обходом таблицы (RegistrationCache).
+    """
+    poll_mikrotik = get_poller()
+    return {mac: poll_mikrotik(mac) for mac in mac_addresses}
 
+def collect_fanout():
+    """Основной цикл опроса всех установок из mikrotik_cpelist по их собственным IP."""
+    initialize_db()
+
+    rigs = [rig for rig in CONFIG.get('mikrotik_cpelist', []) if rig.get('ip')]
+    if not rigs:
+        print("[FATAL] В mikrotik_cpelist нет установок с ip. Выход.")
+        return
+
+    collector = CONFIG.get("script_collector", {})
+    poller = cpe_fanout.FanoutPoller(rigs, collector.get("user"), collector.get("password"), collector.get("fanout"))
+    spools = {rig['rig_id']: open_rig_spool(rig['rig_id']) for rig in rigs} if SPOOL_CONFIG["enabled"] else {}
+    # MAC из конфига; для остальных - MAC интерфейса, который сообщила сама CPE
+    macs = {rig['rig_id']: rig['mikrotik_mac'].upper() for rig in rigs if rig.get('mikrotik_mac')}
+    use_ap = MULTI_AP or "mikrotik_ap" in CONFIG
+    interval_sec = get_collection_interval()
+
+    start_metrics("data_collector:fanout", [rig['rig_id'] for rig in rigs])
+
+    print(f"--- Fan-out мониторинг запущен для {len(rigs)} установок. БД: {MIKROTIK_DB} ---")
+
+    next_tick = time.monotonic()
+    while True:
+        tick_start = time.monotonic()
+        try:
+            timestamp = datetime.now()
+            known_macs = sorted(set(macs.values()))
+            jobs = {"ap": lambda: get_ap_view(known_macs)} if use_ap and known_macs else {}
+            with METRICS.stage("fanout_poll"):
+                cpe_results, job_results = poller.poll(jobs)
+            ap_view = job_results.get("ap") or {}
+
+            for rig in rigs:
+                rig_id = rig['rig_id']
+                cpe = cpe_results.get(rig_id)
+                if cpe and cpe.get("mac"):
+                    macs.setdefault(rig_id, cpe["mac"])
+                mac_address = macs.get(rig_id)
+                if mac_address is None:
+                    continue
+                sample = cpe_fanout.merge_views(cpe, ap_view.get(mac_address))
+                lon, lat, hdop = get_gps_data_mock(rig_id)
+                data_row = build_data_row(timestamp, rig_id, mac_address, lon, lat, sample)
+                check_alerts(rig_id, sample)
+                with METRICS.stage("spool_append" if rig_id in spools else "db_write"):
+                    if rig_id in spools:
+                        spools[rig_id].append(spool_journal.KIND_MIKROTIK, data_row)
+                    else:
+                        write_to_db(data_row)
+                METRICS.incr("samples")
+
+            answered = sum(1 for result in cpe_results.values() if result)
+            print(f"[{timestamp.strftime('%H:%M:%S')}] Fan-out: ответили {answered}/{len(rigs)} CPE "
+                  f"за {poller.last_tick_sec:.2f} с.")
         except Exception as e:
-            print(f"   [FATAL] Ошибка в цикле сбора для {rig_id}: {e}")
-            
-        time.sleep(interval_sec)
+            METRICS.incr("errors")
+            print(f"   [FATAL] Ошибка в цикле fan-out: {e}")
+
+        if ALERTS is not None:
+            ALERTS.tick()
+        METRICS.observe("tick", time.monotonic() - tick_start)
+        next_tick = wait_next_tick(next_tick, interval_sec)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Использование: python data_collector.py <Rig_ID>")
+        print("               python data_collector.py --fanout   (все CPE из mikrotik_cpelist)")
         sys.exit(1)
-        
+
+    if sys.argv[1] == "--fanout":
+        try:
+            collect_fanout()
+        except KeyboardInterrupt:
+            print("\nFan-out мониторинг остановлен вручную.")
+        sys.exit(0)
+
     rig_id_to_monitor = sys.argv[1]
     
     try:
@@ -0,0 +1,185 @@
+# ==============================================================================
+# METRICS_HTTP.PY - Встроенный HTTP-endpoint метрик в формате Prometheus
+# ==============================================================================
+# Включается в config.json (data_storage.metrics.http.enabled). Фоновый поток
+# раз в interval_sec берет снимок реестра perf_metrics, считает скорости
+# (замеров/с, сообщений/с) и опрашивает поставщиков текущих значений (длина
+# очередей, RSS), после чего готовит текст ответа целиком. Обработчик HTTP
+# только отдает последний готовый текст: запрос не обращается к SQLite и не
+# берет блокировок цикла сбора.
+# ==============================================================================
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import perf_metrics
+
+METRIC_PREFIX = "mikrotik"
+
+# Настройки по умолчанию (перекрываются data_storage.metrics.http в config.json)
+DEFAULT_HTTP = {
+    "enabled": False,
+    "host": "127.0.0.1",
+    "collector_port": 9108,   # data_collector (+ номер установки в mikrotik_cpelist)
+    "analyzer_port": 9109,    # rtcm_analyzer
+    "interval_sec": 5.0       # Период подготовки снимка
+}
+
+
+def resolve_http_config(config_section):
+    """Объединяет настройки HTTP-метрик из config.json со значениями по умолчанию."""
+    http_config = dict(DEFAULT_HTTP)
+    http_config.update(config_section or {})
+    return http_config
+
+
+def process_rss_bytes():
+    """Резидентная память процесса (байт) или None, если платформа не дает ее прочитать."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss - пик, а не текущее значение, но лучше, чем ничего (Linux: КБ, macOS: байты)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+# ------------------------------------------------------------------------------
+# 1. ФОРМАТ PROMETHEUS
+# ------------------------------------------------------------------------------
+
+def _name(raw):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', raw)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def render(snapshot, rates, gauges):
+    """Текст в формате Prometheus exposition по снимку реестра."""
+    service = _label(snapshot["service"])
+    lines = []
+
+    metric = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines += [f"# HELP {metric} Длительность этапов цикла.", f"# TYPE {metric} histogram"]
+    for stage, (counts, count, total_ms) in sorted(snapshot["stages"].items()):
+        labels = f'service="{service}",stage="{_label(stage)}"'
+        cumulative = 0
+        for bound, bucket in zip(perf_metrics.BUCKET_BOUNDS_MS, counts):
+            cumulative += bucket
+            le = "+Inf" if bound == float('inf') else repr(bound / 1000.0)
+            lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{metric}_sum{{{labels}}} {total_ms / 1000.0}")
+        lines.append(f"{metric}_count{{{labels}}} {count}")
+
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = f"{METRIC_PREFIX}_{_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f'{metric}{{service="{service}"}} {value}']
+
+    for name, value in sorted(rates.items()):
+        metric = f"{METRIC_PREFIX}_{_name(name)}_per_second"
+        lines += [f"# TYPE {metric} gauge", f'{metric}{{service="{service}"}} {value}']
+
+    for name, value in sorted(gauges.items()):
+        if value is None:
+            continue
+        metric = f"{METRIC_PREFIX}_{_name(name)}"
+        lines += [f"# TYPE {metric} gauge", f'{metric}{{service="{service}"}} {value}']
+
+    metric = f"{METRIC_PREFIX}_uptime_seconds"
+    lines += [f"# TYPE {metric} gauge", f'{metric}{{service="{service}"}} {time.time() - snapshot["started"]:.0f}']
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+# ------------------------------------------------------------------------------
+# 2. ЭКСПОРТЕР
+# ------------------------------------------------------------------------------
+
+class MetricsExporter:
+    """
+    Готовит снимок метрик в фоне и отдает его по HTTP (GET /metrics).
+
+    gauge_providers - {имя: функция() -> число}; вызываются только из потока
+    подготовки снимка, поэтому могут быть сравнительно медленными (stat файлов).
+    """
+
+    def __init__(self, registry, host, port, interval_sec=5.0, gauge_providers=None):
+        self.registry = registry
+        self.interval_sec = interval_sec
+        self.gauge_providers = dict(gauge_providers or {})
+        self._body = render(registry.snapshot(), {}, {})
+        self._previous = None
+
+        exporter = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = exporter._body   # Ссылка на готовые байты - атомарное чтение
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass    # Не засоряем консоль сервиса строками доступа
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+
+    def refresh(self):
+        """Готовит новый снимок: накопительные значения, скорости и текущие величины."""
+        snapshot = self.registry.snapshot()
+        now = time.monotonic()
+        rates = {}
+        if self._previous is not None:
+            previous_time, previous_counters = self._previous
+            elapsed = now - previous_time
+            if elapsed > 0:
+                for name, value in snapshot["counters"].items():
+                    rates[name] = round((value - previous_counters.get(name, 0)) / elapsed, 3)
+        self._previous = (now, snapshot["counters"])
+
+        gauges = dict(snapshot["gauges"])
+        gauges["process_resident_memory_bytes"] = process_rss_bytes()
+        for name, provider in self.gauge_providers.items():
+            try:
+                gauges[name] = provider()
+            except Exception:
+                gauges[name] = None
+        self._body = render(snapshot, rates, gauges)
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.interval_sec)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[METRICS] Ошибка подготовки снимка метрик: {e}")
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        threading.Thread(target=self._refresh_loop, name="metrics-snapshot", daemon=True).start()
+        return self
+
+
+def start_exporter(registry, port, http_config=None, gauge_providers=None):
+    """Запускает HTTP-endpoint, если он включен. Возвращает экспортер или None."""
+    config = resolve_http_config(http_config)
+    if not config["enabled"]:
+        return None
+    try:
+        exporter = MetricsExporter(registry, config["host"], port, config["interval_sec"], gauge_providers)
+    except OSError as e:
+        print(f"[METRICS] HTTP-endpoint на {config['host']}:{port} не запущен: {e}")
+        return None
+    print(f"[METRICS] Метрики Prometheus: http://{config['host']}:{port}/metrics")
+    return exporter.start()
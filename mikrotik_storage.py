@@ -0,0 +1,456 @@
+# ==============================================================================
+# MIKROTIK_STORAGE.PY - Схема и запись логов Mikrotik (mikrotik_log.db)
+# ==============================================================================
+import math
+import re
+import sqlite3
+from datetime import datetime
+
+import archive_catalog
+import shift_calendar
+import spatial_index
+
+# --- Файлы проекта ---
+MIKROTIK_DB = 'mikrotik_log.db'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# ------------------------------------------------------------------------------
+# 1. СХЕМА И МИГРАЦИИ
+# ------------------------------------------------------------------------------
+
+# Колонки режима сжатия (deadband). Одна строка может представлять несколько
+# последовательных замеров: sample_count - число замеров, duration_sec - время,
+# которое они покрывают, *_sum - сумма значений, *_wsum - сумма (значение * dt).
+# Для старых БД колонки добавляются через ALTER TABLE.
+COMPRESSION_COLUMNS = [
+    ("last_timestamp", "TEXT"),
+    ("sample_count", "INTEGER NOT NULL DEFAULT 1"),
+    ("duration_sec", "REAL NOT NULL DEFAULT 0"),
+    ("rssi_sum", "REAL"),
+    ("rssi_wsum", "REAL NOT NULL DEFAULT 0"),
+    ("tx_sum", "REAL"),
+    ("tx_wsum", "REAL NOT NULL DEFAULT 0"),
+]
+
+# Необязательные поля замера со стороны CPE (опрос CPE напрямую, cpe_fanout).
+# В кортеже замера идут после восьми базовых полей; старые строки содержат NULL.
+CPE_COLUMNS = [
+    ("cpe_rssi", "INTEGER"),
+    ("ccq", "INTEGER"),
+    ("tx_bytes", "INTEGER"),
+    ("rx_bytes", "INTEGER"),
+]
+
+# Обслуживающая точка доступа (несколько AP, ap_fleet). Идет в кортеже после CPE_COLUMNS.
+AP_COLUMNS = [
+    ("ap_id", "TEXT"),
+]
+OPTIONAL_COLUMNS = CPE_COLUMNS + AP_COLUMNS
+
+# Смена замера по календарю площадки (shift_calendar), вычисляется при записи
+SHIFT_COLUMNS = [
+    ("shift_id", "INTEGER"),
+]
+
+# Настройки deadband по умолчанию (перекрываются data_storage.deadband в config.json)
+DEFAULT_DEADBAND = {
+    "enabled": False,
+    "rssi_db": 2,           # Допустимое отклонение RSSI от опорного замера, дБм
+    "position_m": 5.0,      # Допустимое смещение координат, метры
+    "rate_mbps": 6.0,       # Допустимое отклонение Tx/Rx Rate, Мбит/с
+    "max_record_sec": 900,  # Максимальная длительность одной сжатой строки
+    "max_gap_sec": 180      # Разрыв между замерами, после которого dt не учитывается
+}
+
+
+def initialize_db(db_path=MIKROTIK_DB):
+    """
+    Создает таблицу mikrotik_log, добавляет недостающие колонки сжатия, CPE и AP
+    и пространственный индекс координат (spatial_index).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS mikrotik_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                rig_id TEXT NOT NULL,
+                client_mac TEXT NOT NULL,
+                longitude REAL,
+                latitude REAL,
+                rssi INTEGER,
+                tx_rate TEXT,
+                rx_rate TEXT
+            );
+        """)
+
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(mikrotik_log)")}
+        for name, col_type in COMPRESSION_COLUMNS + OPTIONAL_COLUMNS + SHIFT_COLUMNS:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE mikrotik_log ADD COLUMN {name} {col_type}")
+
+        # Старые строки (до миграции) - это одиночные замеры
+        cursor.execute("""
+            UPDATE mikrotik_log
+            SET last_timestamp = timestamp,
+                rssi_sum = rssi,
+                tx_sum = CASE WHEN tx_rate IS NOT NULL
+                              THEN CAST(REPLACE(tx_rate, 'Mbps', '') AS REAL) END
+            WHERE last_timestamp IS NULL
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_mikrotik_log_rig_time ON mikrotik_log (rig_id, timestamp)"
+        )
+        # Выборки смен и рабочих дней - по shift_id; индексы прежних версий по времени не нужны
+        for index in ("idx_mikrotik_log_time", "idx_mikrotik_log_ap_time", "idx_mikrotik_log_shift"):
+            cursor.execute(f"DROP INDEX IF EXISTS {index}")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_mikrotik_log_shift_time ON mikrotik_log (shift_id, timestamp)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_mikrotik_log_shift_rig ON mikrotik_log (shift_id, rig_id, timestamp)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_mikrotik_log_ap_shift ON mikrotik_log (ap_id, shift_id)")
+        spatial_index.initialize_index(cursor)
+
+        # Каталог архива: при первом запуске заполняется по уже записанным строкам
+        archive_catalog.initialize_catalog(cursor)
+        _sync_shift_ids(conn)
+        conn.commit()
+        has_entries = cursor.execute(
+            "SELECT 1 FROM archive_catalog WHERE location = ? LIMIT 1", (archive_catalog.LOCATION_DB,)
+        ).fetchone()
+        if not has_entries:
+            shift_dates = [row[0] for row in cursor.execute(
+                "SELECT DISTINCT " + archive_catalog.shift_date_sql("timestamp") + " FROM mikrotik_log")]
+            archive_catalog.refresh_db_entries(conn, shift_dates, db_path)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _sync_shift_ids(conn):
+    """
+    Заполняет shift_id строк, записанных до появления колонки. Если календарь
+    смен в config.json изменился, shift_id пересчитываются для всех строк, а
+    каталог архива и сетка покрытия (coverage_cells) строятся заново.
+    """
+    calendar = shift_calendar.get_calendar()
+    conn.execute("CREATE TABLE IF NOT EXISTS shift_calendar_state (fingerprint TEXT NOT NULL)")
+    row = conn.execute("SELECT fingerprint FROM shift_calendar_state").fetchone()
+    changed = row is not None and row[0] != calendar.fingerprint
+    shift_id_sql = calendar.shift_id_sql("timestamp")
+    if changed:
+        print("[WARN] Календарь смен изменился: пересчет shift_id, каталога архива и сетки покрытия.")
+        conn.execute(f"UPDATE mikrotik_log SET shift_id = {shift_id_sql}")
+        conn.execute("DELETE FROM archive_catalog WHERE location = ?", (archive_catalog.LOCATION_DB,))
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in ("coverage_cells", "coverage_rollup"):
+            if table in tables:
+                conn.execute(f"DELETE FROM {table}")
+    else:
+        conn.execute(f"UPDATE mikrotik_log SET shift_id = {shift_id_sql} WHERE shift_id IS NULL")
+    conn.execute("DELETE FROM shift_calendar_state")
+    conn.execute("INSERT INTO shift_calendar_state (fingerprint) VALUES (?)", (calendar.fingerprint,))
+
+# ------------------------------------------------------------------------------
+# 2. УТИЛИТЫ
+# ------------------------------------------------------------------------------
+
+def parse_rate_mbps(value):
+    """Преобразует строку скорости ('54Mbps', '6.5M', 54) в число Мбит/с или None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.match(r'\s*(\d+\.?\d*)', str(value))
+    return float(match.group(1)) if match else None
+
+
+def distance_m(lon1, lat1, lon2, lat2):
+    """Приближенное расстояние (м) между двумя точками. Достаточно для масштабов карьера."""
+    if None in (lon1, lat1, lon2, lat2):
+        return math.inf
+    dx = (lon2 - lon1) * 111320.0 * math.cos(math.radians((lat1 + lat2) / 2))
+    dy = (lat2 - lat1) * 110540.0
+    return math.hypot(dx, dy)
+
+
+def _within(a, b, tolerance):
+    """Сравнивает два значения с допуском. None совпадает только с None."""
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= tolerance
+
+
+def resolve_deadband(config_section):
+    """Объединяет настройки deadband из config.json со значениями по умолчанию."""
+    deadband = dict(DEFAULT_DEADBAND)
+    deadband.update(config_section or {})
+    return deadband
+
+# ------------------------------------------------------------------------------
+# 3. ЗАПИСЬ С DEADBAND-СЖАТИЕМ
+# ------------------------------------------------------------------------------
+
+# Состояние последней записанной строки по каждой установке:
+# {rig_id: {"row_id", "anchor", "start", "shift_id", "last_time", "last_rssi", "last_tx"}}
+_LAST_RECORD = {}
+
+
+def _in_deadband(anchor, sample, deadband):
+    """Проверяет, попадает ли новый замер в deadband опорного замера строки."""
+    return (
+        anchor["client_mac"] == sample["client_mac"]
+        and anchor["ap_id"] == sample["ap_id"]
+        and _within(anchor["rssi"], sample["rssi"], deadband["rssi_db"])
+        and _within(anchor["tx"], sample["tx"], deadband["rate_mbps"])
+        and _within(anchor["rx"], sample["rx"], deadband["rate_mbps"])
+        and distance_m(anchor["lon"], anchor["lat"], sample["lon"], sample["lat"]) <= deadband["position_m"]
+    )
+
+
+def write_sample(cursor, data_row, deadband=None):
+    """
+    Записывает один замер (timestamp, rig_id, mac, lon, lat, rssi, tx_rate, rx_rate)
+    и следом за ними необязательные поля OPTIONAL_COLUMNS (CPE, обслуживающая AP).
+
+    Предыдущей строке установки всегда добавляется время до текущего замера (dt),
+    поэтому средние, взвешенные по времени, восстанавливаются точно:
+    SUM(rssi_wsum) / SUM(duration_sec). Если сжатие включено и замер попадает
+    в deadband, вместо новой строки увеличиваются sample_count и суммы предыдущей.
+    Транзакцией управляет вызывающий код. Возвращает id строки.
+    """
+    deadband = resolve_deadband(deadband)
+    timestamp, rig_id, client_mac, lon, lat, rssi, tx_rate, rx_rate = data_row[:8]
+    optional_values = (tuple(data_row[8:]) + (None,) * len(OPTIONAL_COLUMNS))[:len(OPTIONAL_COLUMNS)]
+    now = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    calendar = shift_calendar.get_calendar()
+    shift_id = calendar.shift_id(now)
+    sample = {
+        "client_mac": client_mac, "lon": lon, "lat": lat, "rssi": rssi,
+        "tx": parse_rate_mbps(tx_rate), "rx": parse_rate_mbps(rx_rate),
+        "ap_id": optional_values[-1]
+    }
+
+    archive_catalog.record_sample(cursor, rig_id, timestamp, shift_date=calendar.day_of(shift_id))
+
+    state = _LAST_RECORD.get(rig_id)
+    if state is not None:
+        dt = (now - state["last_time"]).total_seconds()
+        if 0 <= dt <= deadband["max_gap_sec"]:
+            # Закрываем интервал предыдущего замера
+            cursor.execute(
+                """UPDATE mikrotik_log
+                   SET duration_sec = duration_sec + ?,
+                       rssi_wsum = rssi_wsum + ?,
+                       tx_wsum = tx_wsum + ?
+                   WHERE id = ?""",
+                (dt, (state["last_rssi"] or 0) * dt, (state["last_tx"] or 0) * dt, state["row_id"])
+            )
+            span = (now - state["start"]).total_seconds()
+            # Сжатая строка не переходит границу смены: строка целиком относится к своему shift_id
+            same_shift = state["shift_id"] == shift_id
+            if (deadband["enabled"] and span <= deadband["max_record_sec"] and same_shift
+                    and _in_deadband(state["anchor"], sample, deadband)):
+                cursor.execute(
+                    """UPDATE mikrotik_log
+                       SET last_timestamp = ?,
+                           sample_count = sample_count + 1,
+                           rssi_sum = rssi_sum + ?,
+                           tx_sum = tx_sum + ?
+                       WHERE id = ?""",
+                    (timestamp, rssi, sample["tx"], state["row_id"])
+                )
+                state.update(last_time=now, last_rssi=rssi, last_tx=sample["tx"])
+                return state["row_id"]
+
+    cursor.execute(
+        """INSERT INTO mikrotik_log (
+               timestamp, rig_id, client_mac, longitude, latitude, rssi, tx_rate, rx_rate,
+               last_timestamp, sample_count, duration_sec, rssi_sum, rssi_wsum, tx_sum, tx_wsum,
+               cpe_rssi, ccq, tx_bytes, rx_bytes, ap_id, shift_id
+           ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, 0, ?, 0, ?, ?, ?, ?, ?, ?)""",
+        (timestamp, rig_id, client_mac, lon, lat, rssi, tx_rate, rx_rate,
+         timestamp, rssi, sample["tx"]) + optional_values + (shift_id,)
+    )
+    _LAST_RECORD[rig_id] = {
+        "row_id": cursor.lastrowid, "anchor": sample, "start": now, "shift_id": shift_id,
+        "last_time": now, "last_rssi": rssi, "last_tx": sample["tx"]
+    }
+    return cursor.lastrowid
+
+
+def reset_state(rig_id=None):
+    """Сбрасывает состояние сжатия (например, после переподключения к другой БД)."""
+    if rig_id is None:
+        _LAST_RECORD.clear()
+    else:
+        _LAST_RECORD.pop(rig_id, None)
+
+# ------------------------------------------------------------------------------
+# 4. АГРЕГАТЫ
+# ------------------------------------------------------------------------------
+
+def query_wifi_stats(conn, rig_id, first_shift, last_shift):
+    """
+    Возвращает статистику за смены first_shift..last_shift по сжатым (и несжатым) строкам.
+
+    rssi_avg / tx_avg - среднее по замерам, rssi_tw_avg / tx_tw_avg - среднее,
+    взвешенное по времени. Строка относится к смене по времени начала.
+    """
+    cursor = conn.execute(
+        """SELECT
+               SUM(sample_count),
+               SUM(duration_sec),
+               SUM(rssi_sum) / SUM(CASE WHEN rssi_sum IS NOT NULL THEN sample_count END),
+               SUM(rssi_wsum) / SUM(CASE WHEN rssi_sum IS NOT NULL THEN duration_sec END),
+               SUM(tx_sum) / SUM(CASE WHEN tx_sum IS NOT NULL THEN sample_count END),
+               SUM(tx_wsum) / SUM(CASE WHEN tx_sum IS NOT NULL THEN duration_sec END),
+               COUNT(*)
+           FROM mikrotik_log
+           WHERE shift_id BETWEEN ? AND ? AND rig_id = ?""",
+        (first_shift, last_shift, rig_id)
+    )
+    samples, duration, rssi_avg, rssi_tw, tx_avg, tx_tw, rows = cursor.fetchone()
+    return {
+        "samples": samples or 0,
+        "rows": rows,
+        "duration_sec": duration or 0.0,
+        "rssi_avg": rssi_avg,
+        "rssi_tw_avg": rssi_tw,
+        "tx_avg": tx_avg,
+        "tx_tw_avg": tx_tw
+    }
+
+
+def query_ap_coverage(conn, first_shift, last_shift):
+    """
+    Покрытие по обслуживающим точкам доступа за смены first_shift..last_shift.
+
+    Возвращает список dict: ap_id, rigs (число установок), samples, duration_sec,
+    rssi_tw_avg, rssi_min и границы обслуженной области (lon/lat min/max).
+    Строки без ap_id (одиночная AP) группируются под ap_id = None.
+    """
+    cursor = conn.execute(
+        """SELECT ap_id,
+                  COUNT(DISTINCT rig_id),
+                  SUM(sample_count),
+                  SUM(duration_sec),
+                  SUM(rssi_wsum) / SUM(CASE WHEN rssi_sum IS NOT NULL THEN duration_sec END),
+                  MIN(rssi),
+                  MIN(longitude), MAX(longitude), MIN(latitude), MAX(latitude)
+           FROM mikrotik_log
+           WHERE shift_id BETWEEN ? AND ?
+           GROUP BY ap_id
+           ORDER BY ap_id""",
+        (first_shift, last_shift)
+    )
+    keys = ("ap_id", "rigs", "samples", "duration_sec", "rssi_tw_avg", "rssi_min",
+            "lon_min", "lon_max", "lat_min", "lat_max")
+    return [dict(zip(keys, row)) for row in cursor]
+
+
+def query_ap_points(conn, ap_id, first_shift, last_shift):
+    """Точки (lon, lat, rssi), обслуженные точкой доступа ap_id за смены - для карты покрытия AP."""
+    return conn.execute(
+        """SELECT longitude, latitude, rssi FROM mikrotik_log
+           WHERE ap_id IS ? AND shift_id BETWEEN ? AND ?
+             AND longitude IS NOT NULL AND latitude IS NOT NULL
+           ORDER BY timestamp""",
+        (ap_id, first_shift, last_shift)
+    ).fetchall()
+
+
+def query_handovers(conn, first_shift, last_shift, rig_id=None):
+    """
+    Переключения установок между точками доступа за смены first_shift..last_shift.
+
+    Возвращает список dict: rig_id, from_ap, to_ap, count. Считаются смены
+    ap_id между соседними строками установки; строки без ap_id пропускаются.
+    """
+    params = [first_shift, last_shift]
+    rig_filter = ""
+    if rig_id is not None:
+        rig_filter = "AND rig_id = ?"
+        params.append(rig_id)
+    cursor = conn.execute(
+        f"""SELECT rig_id, prev_ap, ap_id, COUNT(*)
+            FROM (
+                SELECT rig_id, ap_id,
+                       LAG(ap_id) OVER (PARTITION BY rig_id ORDER BY timestamp) AS prev_ap
+                FROM mikrotik_log
+                WHERE shift_id BETWEEN ? AND ? AND ap_id IS NOT NULL {rig_filter}
+            )
+            WHERE prev_ap IS NOT NULL AND prev_ap != ap_id
+            GROUP BY rig_id, prev_ap, ap_id
+            ORDER BY rig_id, COUNT(*) DESC""",
+        params
+    )
+    return [{"rig_id": rig, "from_ap": src, "to_ap": dst, "count": n} for rig, src, dst, n in cursor]
+
+
+LOG_FIELDS = ("id", "timestamp", "rig_id", "rssi", "tx_rate", "rx_rate", "longitude", "latitude", "sample_count")
+
+
+def query_log_page(conn, first_shift, last_shift, rig_id=None, rssi_above=None, rssi_at_most=None,
+                   after_key=None, before_key=None, limit=200):
+    """
+    Страница журнала замеров за смены first_shift..last_shift одного рабочего дня
+    (список dict LOG_FIELDS по (timestamp, id)).
+
+    Постраничное чтение по ключу (timestamp, id) строки: after_key - следующие
+    строки после указанной, before_key - предыдущие перед ней, без обоих -
+    последние строки периода. Смены читаются по очереди: при shift_id = ?
+    порядок (timestamp, id) совпадает с индексами (shift_id, timestamp) и
+    (shift_id, rig_id, timestamp), поэтому страница читается из индекса без
+    сортировки и OFFSET - ее стоимость не зависит от положения в журнале.
+    rssi - среднее замеров строки; фильтр rssi_above < rssi <= rssi_at_most.
+    """
+    if first_shift // 10 != last_shift // 10:
+        raise ValueError("Журнал читается в пределах одного рабочего дня.")
+    rssi_expr = "COALESCE(rssi_sum / sample_count, rssi)"
+    columns = ", ".join(f"{rssi_expr} AS rssi" if field == "rssi" else field for field in LOG_FIELDS)
+    shift_count = len(shift_calendar.get_calendar().shifts)
+    shift_ids = [shift_id for shift_id in range(first_shift, last_shift + 1) if shift_id % 10 < shift_count]
+    order = "DESC"
+    conditions, params = ["shift_id = ?"], []
+    if after_key is not None:
+        conditions.append("(timestamp, id) > (?, ?)")
+        params = list(after_key)
+        order = "ASC"
+    elif before_key is not None:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params = list(before_key)
+    if order == "DESC":
+        shift_ids.reverse()
+    if rig_id is not None:
+        conditions.append("rig_id = ?")
+        params.append(rig_id)
+    if rssi_above is not None:
+        conditions.append(f"{rssi_expr} > ?")
+        params.append(rssi_above)
+    if rssi_at_most is not None:
+        conditions.append(f"{rssi_expr} <= ?")
+        params.append(rssi_at_most)
+    sql = f"""SELECT {columns} FROM mikrotik_log WHERE {' AND '.join(conditions)}
+              ORDER BY timestamp {order}, id {order} LIMIT ?"""
+    rows = []
+    for shift_id in shift_ids:
+        rows += conn.execute(sql, [shift_id] + params + [limit - len(rows)]).fetchall()
+        if len(rows) >= limit:
+            break
+    if order == "DESC":
+        rows.reverse()
+    return [dict(zip(LOG_FIELDS, row)) for row in rows]
+
+
+def query_log_rows(conn, ids):
+    """Строки журнала по id (для обновления открытых строк deadband в GUI)."""
+    if not ids:
+        return []
+    rows = conn.execute(
+        f"""SELECT id, timestamp, rig_id, COALESCE(rssi_sum / sample_count, rssi), tx_rate, rx_rate,
+                   longitude, latitude, sample_count
+            FROM mikrotik_log WHERE id IN ({', '.join('?' * len(ids))})""",
+        list(ids)
+    ).fetchall()
+    return [dict(zip(LOG_FIELDS, row)) for row in rows]
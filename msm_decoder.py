@@ -0,0 +1,232 @@
+# ==============================================================================
+# MSM_DECODER.PY - Векторное декодирование RTCM MSM (1071-1127) на NumPy
+# ==============================================================================
+# Декодер разбирает маски спутников/сигналов и массивы ячеек MSM целиком
+# (np.unpackbits + матричная сборка полей), без цикла по ячейкам на Python.
+# Из сообщения извлекаются номера спутников, CNR и индикаторы времени захвата
+# (lock time) по каждой ячейке; MsmAccumulator собирает из них строки
+# по эпохам и компактную статистику по спутникам за интервал записи в БД.
+# ==============================================================================
+from datetime import datetime
+
+import numpy as np
+
+# Система по первым трем цифрам типа сообщения (1074 -> 107)
+MSM_CONSTELLATIONS = {
+    107: "GPS",
+    108: "GLONASS",
+    109: "GALILEO",
+    110: "SBAS",
+    111: "QZSS",
+    112: "BeiDou",
+}
+CONSTELLATION_INDEX = {name: i for i, name in enumerate(MSM_CONSTELLATIONS.values())}
+MAX_SATS = 64
+
+# Длина общего заголовка MSM без маски ячеек (бит)
+MSM_HEADER_BITS = 169
+
+# Поля спутникового блока (ширины в битах, по порядку следования массивов)
+SAT_FIELDS = {
+    1: (10,), 2: (10,), 3: (10,),
+    4: (8, 10), 6: (8, 10),
+    5: (8, 4, 10, 14), 7: (8, 4, 10, 14),
+}
+
+# Поля блока сигналов: (имя, ширина). Массивы идут один за другим по всем ячейкам.
+SIGNAL_FIELDS = {
+    1: (('pr', 15),),
+    2: (('ph', 22), ('lock', 4), ('half', 1)),
+    3: (('pr', 15), ('ph', 22), ('lock', 4), ('half', 1)),
+    4: (('pr', 15), ('ph', 22), ('lock', 4), ('half', 1), ('cnr', 6)),
+    5: (('pr', 15), ('ph', 22), ('lock', 4), ('half', 1), ('cnr', 6), ('rate', 15)),
+    6: (('pr', 20), ('ph', 24), ('lock', 10), ('half', 1), ('cnr', 10)),
+    7: (('pr', 20), ('ph', 24), ('lock', 10), ('half', 1), ('cnr', 10), ('rate', 15)),
+}
+
+# Масштаб CNR: MSM4/5 - 1 дБГц, MSM6/7 (расширенное поле) - 0.0625 дБГц
+CNR_SCALE = {4: 1.0, 5: 1.0, 6: 0.0625, 7: 0.0625}
+
+
+def is_msm(msg_type):
+    """True для MSM1-MSM7 всех поддерживаемых систем."""
+    return (msg_type // 10) in MSM_CONSTELLATIONS and 1 <= msg_type % 10 <= 7
+
+# ------------------------------------------------------------------------------
+# 1. РАЗБОР БИТОВЫХ ПОЛЕЙ
+# ------------------------------------------------------------------------------
+
+def _weights(width):
+    return np.left_shift(np.int64(1), np.arange(width - 1, -1, -1, dtype=np.int64))
+
+
+def _field_array(bits, pos, width, count):
+    """count подряд идущих беззнаковых полей шириной width начиная с бита pos."""
+    block = bits[pos:pos + width * count]
+    if block.size < width * count:
+        raise ValueError("MSM: сообщение короче, чем требуют маски")
+    return block.reshape(count, width).astype(np.int64) @ _weights(width)
+
+
+def _field(bits, pos, width):
+    return int(_field_array(bits, pos, width, 1)[0])
+
+
+def lock_time_ms(indicator, subtype):
+    """Минимальное время захвата (мс) по индикатору DF402 (MSM2-5) или DF407 (MSM6-7)."""
+    indicator = np.asarray(indicator, dtype=np.int64)
+    if subtype >= 6:
+        i = np.minimum(indicator, 704)
+        k = np.maximum((i - 64) // 32 + 1, 0)
+        scale = np.left_shift(np.int64(1), k)
+        return np.where(i < 64, i, scale * i - k * scale * 32)
+    return np.where(indicator == 0, 0, np.left_shift(np.int64(1), indicator + 4))
+
+
+def frame_payload(raw_data):
+    """Payload RTCM3-кадра (без преамбулы D3, длины и CRC)."""
+    length = ((raw_data[1] & 0x03) << 8) | raw_data[2]
+    return raw_data[3:3 + length]
+
+
+def decode_msm(payload):
+    """
+    Декодирует payload MSM-сообщения.
+
+    Возвращает dict: msg_type, constellation, subtype, station_id, epoch_ms,
+    sats (PRN спутников), cell_sat (PRN каждой ячейки), cell_sig (ID сигнала),
+    cnr (дБГц по ячейкам или None для MSM1-3), lock_ms (мс или None для MSM1).
+    """
+    bits = np.unpackbits(np.frombuffer(bytes(payload), dtype=np.uint8))
+    msg_type = _field(bits, 0, 12)
+    subtype = msg_type % 10
+    if not is_msm(msg_type):
+        raise ValueError(f"Сообщение {msg_type} не является MSM")
+
+    station_id = _field(bits, 12, 12)
+    epoch_ms = _field(bits, 24, 30)
+
+    sat_mask = bits[73:137]
+    sig_mask = bits[137:169]
+    sats = np.flatnonzero(sat_mask) + 1
+    sigs = np.flatnonzero(sig_mask) + 1
+    n_sat, n_sig = sats.size, sigs.size
+
+    cell_mask = bits[MSM_HEADER_BITS:MSM_HEADER_BITS + n_sat * n_sig]
+    cells = np.flatnonzero(cell_mask)
+    n_cell = cells.size
+    pos = MSM_HEADER_BITS + n_sat * n_sig
+
+    # Спутниковый блок пропускаем целиком (нужны только позиции)
+    pos += sum(SAT_FIELDS[subtype]) * n_sat
+
+    fields = {}
+    for name, width in SIGNAL_FIELDS[subtype]:
+        fields[name] = _field_array(bits, pos, width, n_cell)
+        pos += width * n_cell
+
+    cnr = None
+    if 'cnr' in fields:
+        cnr = fields['cnr'] * CNR_SCALE[subtype]
+    lock = lock_time_ms(fields['lock'], subtype) if 'lock' in fields else None
+
+    return {
+        "msg_type": msg_type,
+        "constellation": MSM_CONSTELLATIONS[msg_type // 10],
+        "subtype": subtype,
+        "station_id": station_id,
+        "epoch_ms": epoch_ms,
+        "sats": sats,
+        "cell_sat": sats[cells // n_sig] if n_sig else cells,
+        "cell_sig": sigs[cells % n_sig] if n_sig else cells,
+        "cnr": cnr,
+        "lock_ms": lock,
+    }
+
+# ------------------------------------------------------------------------------
+# 2. НАКОПЛЕНИЕ СТАТИСТИКИ ДЛЯ БД
+# ------------------------------------------------------------------------------
+
+class MsmAccumulator:
+    """
+    Собирает декодированные MSM за интервал записи.
+
+    epoch_rows - по строке на (эпоха, система): число спутников и сигналов,
+    средний/минимальный CNR, минимальное время захвата. Статистика по спутникам
+    хранится в массивах [система x PRN] и обновляется векторно (np.*.at).
+    """
+
+    def __init__(self, station):
+        self.station = station
+        self.reset()
+
+    def reset(self):
+        shape = (len(MSM_CONSTELLATIONS), MAX_SATS)
+        self.interval_start = datetime.now()
+        self.epoch_rows = []
+        self.epochs = np.zeros(shape, dtype=np.int64)
+        self.cnr_sum = np.zeros(shape)
+        self.cnr_count = np.zeros(shape, dtype=np.int64)
+        self.cnr_min = np.full(shape, np.inf)
+        self.cnr_max = np.full(shape, -np.inf)
+        self.lock_min = np.full(shape, np.iinfo(np.int64).max, dtype=np.int64)
+
+    def add(self, decoded, timestamp=None):
+        """Учитывает одно декодированное сообщение."""
+        if timestamp is None:
+            timestamp = datetime.now()
+        c = CONSTELLATION_INDEX[decoded["constellation"]]
+        sat_idx = decoded["sats"] - 1
+        self.epochs[c, sat_idx] += 1
+
+        cnr, lock = decoded["cnr"], decoded["lock_ms"]
+        cell_idx = decoded["cell_sat"] - 1
+        cnr_mean = cnr_min = lock_min = None
+        if cnr is not None and cnr.size:
+            valid = cnr > 0
+            if valid.any():
+                idx, values = cell_idx[valid], cnr[valid]
+                np.add.at(self.cnr_sum[c], idx, values)
+                np.add.at(self.cnr_count[c], idx, 1)
+                np.minimum.at(self.cnr_min[c], idx, values)
+                np.maximum.at(self.cnr_max[c], idx, values)
+                cnr_mean, cnr_min = float(values.mean()), float(values.min())
+        if lock is not None and lock.size:
+            np.minimum.at(self.lock_min[c], cell_idx, lock)
+            lock_min = int(lock.min())
+
+        self.epoch_rows.append((
+            timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3], self.station, decoded["constellation"],
+            decoded["msg_type"], decoded["epoch_ms"], int(decoded["sats"].size), int(decoded["cell_sat"].size),
+            cnr_mean, cnr_min, lock_min
+        ))
+
+    def satellite_rows(self, interval_end=None):
+        """Строки по спутникам за интервал (только спутники, которые были видны)."""
+        if interval_end is None:
+            interval_end = datetime.now()
+        start = self.interval_start.strftime("%Y-%m-%d %H:%M:%S")
+        end = interval_end.strftime("%Y-%m-%d %H:%M:%S")
+        names = list(MSM_CONSTELLATIONS.values())
+
+        seen_c, seen_s = np.nonzero(self.epochs)
+        counts = self.cnr_count[seen_c, seen_s]
+        has_cnr = counts > 0
+        mean = np.where(has_cnr, self.cnr_sum[seen_c, seen_s] / np.maximum(counts, 1), np.nan)
+        lock = self.lock_min[seen_c, seen_s]
+        rows = []
+        for i, (c, s) in enumerate(zip(seen_c, seen_s)):
+            rows.append((
+                start, end, self.station, names[c], int(s) + 1, int(self.epochs[c, s]),
+                float(mean[i]) if has_cnr[i] else None,
+                float(self.cnr_min[c, s]) if has_cnr[i] else None,
+                float(self.cnr_max[c, s]) if has_cnr[i] else None,
+                int(lock[i]) if lock[i] != np.iinfo(np.int64).max else None
+            ))
+        return rows
+
+    def satellite_counts(self):
+        """Число видимых спутников по системам за интервал: {система: N}."""
+        names = list(MSM_CONSTELLATIONS.values())
+        seen = (self.epochs > 0).sum(axis=1)
+        return {names[c]: int(n) for c, n in enumerate(seen) if n}
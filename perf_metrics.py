@@ -0,0 +1,251 @@
+# ==============================================================================
+# PERF_METRICS.PY - Таймеры этапов и счетчики для циклов сбора
+# ==============================================================================
+# Каждый этап цикла (опрос AP, SSH, разбор, GPS, запись) замеряется монотонным
+# таймером и попадает в гистограмму с фиксированными корзинами, поэтому память
+# не растет со временем. Гистограммы ведутся в двух видах: накопительные (для
+# внешнего мониторинга) и оконные - за период между выгрузками. Фоновый поток
+# раз в flush_interval_sec выгружает окно в таблицу perf_metrics той же БД, что
+# и данные сервиса; вкладка диагностики GUI читает последние строки оттуда.
+#
+# Стоимость замера - два вызова perf_counter и поиск корзины (единицы мкс),
+# что на порядки меньше длительности тика.
+# ==============================================================================
+import bisect
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Верхние границы корзин, мс (последняя - бесконечность)
+BUCKET_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250,
+                    500, 1000, 2500, 5000, 10000, 30000, 60000, float('inf'))
+
+# Настройки по умолчанию (перекрываются data_storage.metrics в config.json)
+DEFAULT_METRICS = {
+    "enabled": True,
+    "flush_interval_sec": 60
+}
+
+
+def resolve_metrics_config(config_section):
+    """Объединяет настройки метрик из config.json со значениями по умолчанию."""
+    metrics_config = dict(DEFAULT_METRICS)
+    metrics_config.update(config_section or {})
+    return metrics_config
+
+# ------------------------------------------------------------------------------
+# 1. ГИСТОГРАММЫ И РЕЕСТР
+# ------------------------------------------------------------------------------
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами (накопительная и оконная)."""
+
+    __slots__ = ("counts", "total_count", "total_ms", "window_counts", "window_ms", "window_max")
+
+    def __init__(self):
+        n = len(BUCKET_BOUNDS_MS)
+        self.counts = [0] * n
+        self.total_count = 0
+        self.total_ms = 0.0
+        self.window_counts = [0] * n
+        self.window_ms = 0.0
+        self.window_max = 0.0
+
+    def observe(self, ms):
+        i = bisect.bisect_left(BUCKET_BOUNDS_MS, ms)
+        self.counts[i] += 1
+        self.total_count += 1
+        self.total_ms += ms
+        self.window_counts[i] += 1
+        self.window_ms += ms
+        if ms > self.window_max:
+            self.window_max = ms
+
+    def reset_window(self):
+        self.window_counts = [0] * len(BUCKET_BOUNDS_MS)
+        self.window_ms = 0.0
+        self.window_max = 0.0
+
+
+def quantile_ms(counts, q, max_ms=None):
+    """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = BUCKET_BOUNDS_MS[i - 1] if i else 0.0
+            upper = BUCKET_BOUNDS_MS[i]
+            if upper == float('inf') or (max_ms is not None and upper > max_ms):
+                upper = max_ms if max_ms is not None else lower
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return max_ms
+
+
+class _StageTimer:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """
+    Метрики одного процесса: гистограммы этапов, счетчики и текущие значения.
+
+    Запись и чтение снимков защищены одной блокировкой; снимок - копия,
+    поэтому читатель (выгрузка, HTTP) не держит цикл сбора.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._window_counters = {}
+        self._gauges = {}
+
+    def stage(self, name):
+        """Контекстный менеджер: замеряет длительность блока как этап name."""
+        return _StageTimer(self, name)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = Histogram()
+            histogram.observe(seconds * 1000.0)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+            self._window_counters[name] = self._window_counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        """Накопительный снимок: {"stages": {имя: (counts, count, sum_ms)}, "counters", "gauges"}."""
+        with self._lock:
+            return {
+                "service": self.service,
+                "started": self.started,
+                "stages": {name: (list(h.counts), h.total_count, h.total_ms) for name, h in self._stages.items()},
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+
+    def drain_window(self):
+        """
+        Забирает окно с момента прошлой выгрузки и обнуляет его.
+
+        Возвращает строки (stage, count, total_ms, mean_ms, p50_ms, p95_ms, max_ms);
+        счетчики выгружаются как строки 'counter:<имя>' с count = приращение.
+        """
+        with self._lock:
+            windows = [(name, list(h.window_counts), h.window_ms, h.window_max) for name, h in self._stages.items()]
+            for h in self._stages.values():
+                h.reset_window()
+            counters, self._window_counters = self._window_counters, {}
+
+        rows = []
+        for name, counts, total_ms, max_ms in windows:
+            count = sum(counts)
+            if not count:
+                continue
+            rows.append((name, count, total_ms, total_ms / count,
+                         quantile_ms(counts, 0.5, max_ms), quantile_ms(counts, 0.95, max_ms), max_ms))
+        for name, delta in counters.items():
+            rows.append((f"counter:{name}", delta, None, None, None, None, None))
+        return rows
+
+# ------------------------------------------------------------------------------
+# 2. ВЫГРУЗКА В SQLITE
+# ------------------------------------------------------------------------------
+
+def initialize_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS perf_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            service TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total_ms REAL,
+            mean_ms REAL,
+            p50_ms REAL,
+            p95_ms REAL,
+            max_ms REAL
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_perf_metrics_stage ON perf_metrics (service, stage, timestamp)"
+    )
+    conn.commit()
+
+
+def flush(registry, db_path):
+    """Выгружает окно метрик в perf_metrics. Возвращает число строк."""
+    rows = registry.drain_window()
+    if not rows:
+        return 0
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        initialize_table(conn)
+        conn.executemany(
+            """INSERT INTO perf_metrics (timestamp, service, stage, count, total_ms, mean_ms, p50_ms, p95_ms, max_ms)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(timestamp, registry.service) + row for row in rows]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def start_flusher(registry, db_path, metrics_config=None):
+    """Фоновый поток, выгружающий окно метрик раз в flush_interval_sec."""
+    config = resolve_metrics_config(metrics_config)
+
+    def _loop():
+        while True:
+            time.sleep(config["flush_interval_sec"])
+            try:
+                flush(registry, db_path)
+            except sqlite3.Error as e:
+                # Окно уже обнулено - диагностические данные за период теряются, сбор не страдает
+                print(f"[METRICS] Не удалось выгрузить метрики в {db_path}: {e}")
+
+    thread = threading.Thread(target=_loop, name="metrics-flusher", daemon=True)
+    thread.start()
+    return thread
+
+
+def read_latest(conn):
+    """Последняя выгрузка по каждому (service, stage) - для вкладки диагностики."""
+    try:
+        return conn.execute("""
+            SELECT p.service, p.stage, p.count, p.mean_ms, p.p50_ms, p.p95_ms, p.max_ms, p.timestamp
+            FROM perf_metrics p
+            JOIN (SELECT service, stage, MAX(timestamp) AS ts FROM perf_metrics GROUP BY service, stage) last
+              ON p.service = last.service AND p.stage = last.stage AND p.timestamp = last.ts
+            ORDER BY p.service, p.stage
+        """).fetchall()
+    except sqlite3.OperationalError:
+        return []   # Таблицы еще нет - сервис не выгружал метрики
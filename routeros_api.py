@@ -0,0 +1,211 @@
+# ==============================================================================
+# ROUTEROS_API.PY - Клиент бинарного RouterOS API (порт 8728 / 8729 SSL)
+# ==============================================================================
+# Альтернатива разбору вывода 'print brief' по SSH: одна постоянная сессия,
+# запросы с =.proplist= только по нужным полям и ответ в виде структурированных
+# предложений (=ключ=значение), которые сразу приводятся к типам.
+# ==============================================================================
+import re
+import socket
+import ssl
+import threading
+
+API_PORT = 8728
+API_SSL_PORT = 8729
+
+# Поля registration-table, которые сохраняются в mikrotik_log
+REGISTRATION_PROPLIST = "mac-address,signal-strength,tx-rate,rx-rate"
+
+
+class RouterOSApiError(Exception):
+    """Ошибка RouterOS API (!trap / !fatal) или обрыв сессии."""
+
+# ------------------------------------------------------------------------------
+# 1. КОДИРОВАНИЕ СЛОВ И ПРЕДЛОЖЕНИЙ
+# ------------------------------------------------------------------------------
+
+def encode_length(length):
+    """Длина слова в формате RouterOS API (1-5 байт)."""
+    if length < 0x80:
+        return bytes([length])
+    if length < 0x4000:
+        return (length | 0x8000).to_bytes(2, 'big')
+    if length < 0x200000:
+        return (length | 0xC00000).to_bytes(3, 'big')
+    if length < 0x10000000:
+        return (length | 0xE0000000).to_bytes(4, 'big')
+    return b'\xf0' + length.to_bytes(4, 'big')
+
+
+def encode_sentence(words):
+    """Предложение: слова с префиксом длины и завершающий пустой байт."""
+    out = bytearray()
+    for word in words:
+        data = word.encode('utf-8')
+        out += encode_length(len(data)) + data
+    return bytes(out + b'\x00')
+
+
+def _read_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("RouterOS API: соединение закрыто устройством")
+        data += chunk
+    return bytes(data)
+
+
+def read_length(sock):
+    first = _read_exact(sock, 1)[0]
+    if first < 0x80:
+        return first
+    if first < 0xC0:
+        return ((first & 0x3F) << 8) | _read_exact(sock, 1)[0]
+    if first < 0xE0:
+        return ((first & 0x1F) << 16) | int.from_bytes(_read_exact(sock, 2), 'big')
+    if first < 0xF0:
+        return ((first & 0x0F) << 24) | int.from_bytes(_read_exact(sock, 3), 'big')
+    return int.from_bytes(_read_exact(sock, 4), 'big')
+
+
+def read_sentence(sock):
+    """Читает одно предложение (список слов)."""
+    words = []
+    while True:
+        length = read_length(sock)
+        if length == 0:
+            return words
+        words.append(_read_exact(sock, length).decode('utf-8', errors='replace'))
+
+
+def parse_reply(words):
+    """'!re', '=key=value'... -> ('!re', {key: value})."""
+    attrs = {}
+    for word in words[1:]:
+        if word.startswith('='):
+            key, _, value = word[1:].partition('=')
+            attrs[key] = value
+        elif word.startswith('.tag='):
+            attrs['.tag'] = word[5:]
+    return (words[0] if words else ''), attrs
+
+# ------------------------------------------------------------------------------
+# 2. ПРИВЕДЕНИЕ ТИПОВ
+# ------------------------------------------------------------------------------
+
+def parse_signal(value):
+    """'-63', '-63dBm', '-63@HT20-7' -> -63 (int) или None."""
+    match = re.match(r'\s*(-?\d+)', value or '')
+    return int(match.group(1)) if match else None
+
+
+def parse_rate(value):
+    """'54Mbps', '130Mbps-20MHz/2S/SGI', '6.5Mbps' -> строка в формате коллектора ('130Mbps')."""
+    match = re.match(r'\s*(\d+\.?\d*)\s*(G|M|k)?bps', value or '')
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2) or 'M'
+    number *= {'G': 1000.0, 'M': 1.0, 'k': 0.001}[unit]
+    return f"{number:g}Mbps"
+
+
+def registration_to_metrics(attrs):
+    """Строка registration-table -> {'RSSI', 'TxRate', 'RxRate'} как у get_mikrotik_data."""
+    return {
+        "RSSI": parse_signal(attrs.get('signal-strength')),
+        "TxRate": parse_rate(attrs.get('tx-rate')),
+        "RxRate": parse_rate(attrs.get('rx-rate')),
+    }
+
+# ------------------------------------------------------------------------------
+# 3. КЛИЕНТ С ПОСТОЯННОЙ СЕССИЕЙ
+# ------------------------------------------------------------------------------
+
+class RouterOSApiClient:
+    """
+    Постоянная сессия RouterOS API.
+
+    Соединение открывается при первом запросе и переиспользуется; при обрыве
+    следующий запрос переподключается один раз.
+    """
+
+    def __init__(self, host, user, password, port=None, use_ssl=False, timeout=5):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.port = port or (API_SSL_PORT if use_ssl else API_PORT)
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        if self.use_ssl:
+            context = ssl.create_default_context()
+            # Сертификаты RouterOS обычно самоподписанные
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=self.host)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        try:
+            self._talk(['/login', f'=name={self.user}', f'=password={self.password}'])
+        except RouterOSApiError:
+            # Неверные учетные данные: полуоткрытую сессию не оставляем
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def _talk(self, words):
+        self._sock.sendall(encode_sentence(words))
+        replies = []
+        while True:
+            kind, attrs = parse_reply(read_sentence(self._sock))
+            if kind == '!re':
+                replies.append(attrs)
+            elif kind == '!done':
+                return replies
+            elif kind == '!trap':
+                # После !trap устройство все равно присылает !done - дочитываем его
+                self._drain_until_done()
+                raise RouterOSApiError(attrs.get('message', 'ошибка команды'))
+            elif kind == '!fatal':
+                self.close()
+                raise RouterOSApiError(attrs.get('message', 'сессия закрыта устройством'))
+
+    def _drain_until_done(self):
+        while parse_reply(read_sentence(self._sock))[0] != '!done':
+            pass
+
+    def talk(self, words):
+        """
+        Отправляет команду и возвращает список ответов !re (dict).
+
+        Обрыв сессии (OSError) приводит к одному переподключению и повтору;
+        ошибка команды (!trap) сессию не закрывает и пробрасывается сразу.
+        """
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    return self._talk(words)
+                except OSError:
+                    self.close()
+                    if attempt == 2:
+                        raise
+
+    def registration_table(self, mac_address=None):
+        """Строки /interface/wireless/registration-table только с нужными полями."""
+        words = ['/interface/wireless/registration-table/print', f'=.proplist={REGISTRATION_PROPLIST}']
+        if mac_address:
+            words.append(f'?mac-address={mac_address}')
+        return self.talk(words)
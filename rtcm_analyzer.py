@@ -1,19 +1,28 @@
+import io
 import socket
-import sqlite3
 import time
 from datetime import datetime
 import json
 import os
 import sys
 from pyrtcm import RTCMReader, RTCM_VERSION
+import alert_engine
+import metrics_http
+import msm_decoder
+import perf_metrics
+import rtcm_capture
+import rtk_storage
+import spool_journal
 
 # --- Константы ---
 CONFIG_FILE = 'config.json'
-RTK_DB = 'rtk_log.db'
 
 # Интервал записи статистики в БД (в секундах)
 LOG_INTERVAL_SEC = 60
 
+# Предел накопленных строк MSM, если БД долго недоступна (дальше статистика сбрасывается)
+MSM_BUFFER_LIMIT = 100000
+
 # ==============================================================================
 # КОНФИГУРАЦИЯ И УТИЛИТЫ
 # ==============================================================================
@@ -28,54 +37,97 @@ def load_config():
 
 CONFIG = load_config()
 RTK_CONFIG = CONFIG.get('rtk_base_station', {})
+# База статусов RTK: data_storage.db_name в config.json
+RTK_DB = CONFIG.get('data_storage', {}).get('db_name', rtk_storage.RTK_DB)
+SPOOL_CONFIG = spool_journal.resolve_spool_config(CONFIG.get('data_storage', {}).get('spool'))
+SPOOL_NAME = 'rtcm_analyzer'
+
+# Декодирование MSM-наблюдений (CNR, lock time, число спутников по эпохам)
+MSM_QUALITY = RTK_CONFIG.get('msm_quality', True)
+
+# Запись сырого потока в файлы (включается rtk_base_station.capture.enabled)
+CAPTURE_CONFIG = rtcm_capture.resolve_capture_config(RTK_CONFIG.get('capture'))
+
+# Журнал записи (открывается при запуске сервиса, если включен в config.json)
+SPOOL = None
+
+STATION = rtk_storage.station_key(RTK_CONFIG)
+
+# Таймеры этапов разбора потока (выгружаются в perf_metrics базы RTK)
+METRICS_CONFIG = perf_metrics.resolve_metrics_config(CONFIG.get('data_storage', {}).get('metrics'))
+METRICS = perf_metrics.Registry("rtcm_analyzer")
+EXPORTER = None
+
+# Потоковые тревоги: остановка потока и качество CRC (data_storage.alerts в config.json)
+ALERTS = None
+ALERTS_CONFIG = alert_engine.resolve_alerts_config(CONFIG.get('data_storage', {}).get('alerts'))
+# Таймаут чтения сокета: без данных дольше stall_sec поток считается остановленным
+STALL_SEC = ALERTS_CONFIG["rules"]["rtcm_stall"]["stall_sec"]
 
 def initialize_db():
-    """Создает таблицу rtk_status с расширенной схемой для анализа RTCM."""
+    """Создает (или обновляет) единую схему RTK: rtk_status и rtk_latest."""
     try:
-        conn = sqlite3.connect(RTK_DB)
-        cursor = conn.cursor()
-        
-        # Обновленная SQL-схема для хранения аналитических данных
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS rtk_status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                Overall_Status TEXT NOT NULL,
-                Stream_Quality_Pct REAL,
-                Active_Constellations TEXT,
-                Station_ID INTEGER,
-                Message_Count_Total INTEGER,
-                Connection_Latency_sec REAL
-            );
-        """)
-        conn.commit()
-        conn.close()
-        print(f"[RTK] База данных {RTK_DB} инициализирована с новой схемой.")
+        rtk_storage.initialize_db(RTK_DB, STATION)
+        print(f"[RTK] База данных {RTK_DB} инициализирована (схема v{rtk_storage.SCHEMA_VERSION}).")
     except Exception as e:
         print(f"[RTK-FATAL] Ошибка инициализации БД: {e}")
         sys.exit(1)
 
-def write_analysis_to_db(status, quality, systems, sta_id, total_count, latency):
-    """Записывает результаты анализа в базу данных."""
-    conn = None
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        conn = sqlite3.connect(RTK_DB)
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO rtk_status (
-                timestamp, Overall_Status, Stream_Quality_Pct, Active_Constellations, 
-                Station_ID, Message_Count_Total, Connection_Latency_sec
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (timestamp, status, quality, systems, sta_id, total_count, latency)
-        )
-        conn.commit()
+def write_analysis_to_db(status, quality, systems, sta_id, total_count, latency, message=None):
+    """Записывает результаты анализа в журнал (spool) или напрямую в базу данных."""
+    if message is None:
+        message = f"Качество потока {quality:.1f}%, системы: {systems or '-'}"
+    # Текст исключения может быть длинным - запись журнала имеет фиксированный размер
+    row = rtk_storage.make_status_row(
+        STATION, rtk_storage.SOURCE_ANALYZER, status, message[:120], quality, systems,
+        sta_id, total_count, latency
+    )
+    timestamp = row[0]
+    if SPOOL is not None:
+        SPOOL.append(spool_journal.KIND_RTK_STATUS, row)
+        print(f"[{timestamp}] [SPOOL OK] Запись: {status}, Качество: {quality:.1f}%, Системы: {systems}")
+    elif rtk_storage.write_status_to_db(row, RTK_DB):
         print(f"[{timestamp}] [DB OK] Запись: {status}, Качество: {quality:.1f}%, Системы: {systems}")
-    except sqlite3.Error as e:
-        print(f"[RTK-ERROR] Ошибка записи анализа в БД: {e}")
-    finally:
-        if conn:
-            conn.close()
+    if ALERTS is not None:
+        # Качество 0% при обрыве - следствие остановки, а не отдельная тревога
+        has_quality = status != "ERROR" and total_count > 0
+        ALERTS.ingest(STATION, {"rtk_status": status, "message": message,
+                                "rtcm_quality": round(quality, 1) if has_quality else None})
+
+class StallAwareStream(io.RawIOBase):
+    """
+    Сокет как поток для RTCMReader. Таймаут чтения не обрывает соединение:
+    вызывается on_stall(секунд без данных), и чтение продолжается, поэтому
+    остановка потока замечается через stall_sec, а не при записи статистики.
+    """
+
+    def __init__(self, sock, on_stall):
+        self.sock = sock
+        self.on_stall = on_stall
+        self.last_data = time.monotonic()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            try:
+                n = self.sock.recv_into(buffer)
+            except socket.timeout:
+                self.on_stall(time.monotonic() - self.last_data)
+                continue
+            self.last_data = time.monotonic()
+            return n
+
+
+def report_stream_state(status, message):
+    """Передает состояние потока в движок тревог сразу (правило rtcm_stall), без записи в БД."""
+    if ALERTS is not None:
+        ALERTS.ingest(STATION, {"rtk_status": status, "message": message})
+
+
+def on_stream_stall(idle_sec):
+    report_stream_state("ERROR", f"Нет данных RTCM {idle_sec:.0f} с")
 
 def get_constellation_from_type(msg_type: int) -> str:
     """Определяет звездную систему по типу RTCM-сообщения (Message Type ID)."""
@@ -103,16 +155,23 @@ def rtk_analyzer_loop():
         print("[RTK-FATAL] RTK IP/Port не настроены в config.json.")
         return
 
+    capture = rtcm_capture.CaptureWriter(CAPTURE_CONFIG) if CAPTURE_CONFIG["enabled"] else None
+    if capture is not None and EXPORTER is not None:
+        EXPORTER.gauge_providers["capture_queue_frames"] = capture.pending
+
     while True:
         try:
             # 1. Попытка установить соединение (Таймаут соединения 5 сек)
             print(f"[{datetime.now().strftime('%H:%M:%S')}] [CONNECT] Попытка подключения к {ip}:{port}...")
             with socket.create_connection((ip, port), timeout=5) as sock:
-                sock.settimeout(None) # Убираем таймаут для чтения, чтобы ждать данные
+                # Таймаут чтения - порог остановки потока: StallAwareStream сообщает о
+                # простое в движок тревог и продолжает ждать данные
+                sock.settimeout(STALL_SEC)
                 
                 # 2. Инициализация RTCMReader
-                # Передаем файловый объект сокета, чтобы RTCMReader мог читать байты по одному
-                rtcm_reader = RTCMReader(stream=sock.makefile(mode='rb'), protfilter=RTCM_VERSION.RTCM3) 
+                # Передаем буферизованный поток сокета, чтобы RTCMReader мог читать байты по одному
+                stream = io.BufferedReader(StallAwareStream(sock, on_stream_stall))
+                rtcm_reader = RTCMReader(stream=stream, protfilter=RTCM_VERSION.RTCM3) 
                 
                 # --- Счетчики для статистики за интервал ---
                 total_messages = 0
@@ -120,15 +179,25 @@ def rtk_analyzer_loop():
                 active_constellations = set()
                 station_id = None
                 last_db_log_time = time.time()
+                msm_stats = msm_decoder.MsmAccumulator(STATION)
                 
                 print("[RTK-OK] Соединение активно. Начало парсинга RTCMv3...")
 
                 while True:
                     # Чтение и декодирование следующего сообщения
-                    (raw_data, parsed_message) = rtcm_reader.readmessage()
+                    with METRICS.stage("read"):
+                        (raw_data, parsed_message) = rtcm_reader.readmessage()
                     
                     if raw_data is not None:
                         total_messages += 1
+                        METRICS.incr("messages")
+                        # Каждое сообщение - в правило rtcm_stall: тревога снимается с первым кадром
+                        report_stream_state("OK", "Поток RTCM возобновлен")
+
+                        # Сырые байты сохраняются до разбора, включая кадры с ошибкой CRC
+                        if capture is not None:
+                            with METRICS.stage("capture"):
+                                capture.write(raw_data)
                         
                         current_time = time.time()
                         
@@ -145,6 +214,16 @@ def rtk_analyzer_loop():
                             # 2. Извлечение ID станции (из сообщений, содержащих этот атрибут)
                             if hasattr(parsed_message, 'staid') and parsed_message.staid is not None:
                                 station_id = parsed_message.staid
+
+                            # 3. Качество сигнала по спутникам (MSM декодируется векторно из сырых байт)
+                            if MSM_QUALITY and msm_decoder.is_msm(msg_type):
+                                try:
+                                    with METRICS.stage("msm_decode"):
+                                        msm_stats.add(msm_decoder.decode_msm(msm_decoder.frame_payload(raw_data)))
+                                except ValueError as e:
+                                    print(f"[RTK-WARN] Не удалось декодировать MSM {msg_type}: {e}")
+                        else:
+                            METRICS.incr("crc_fail")
                             
                         # 3. Запись статистики в БД
                         if current_time - last_db_log_time >= LOG_INTERVAL_SEC:
@@ -152,6 +231,12 @@ def rtk_analyzer_loop():
                             # Расчет качества потока
                             quality_pct = (crc_ok_messages / total_messages) * 100 if total_messages > 0 else 0
                             
+                            sat_counts = msm_stats.satellite_counts()
+                            message = None
+                            if sat_counts:
+                                sats_info = ", ".join(f"{name} {n}" for name, n in sorted(sat_counts.items()))
+                                message = f"Качество потока {quality_pct:.1f}%, спутники: {sats_info}"
+
                             # Логирование в БД
                             write_analysis_to_db(
                                 status="OK", 
@@ -159,9 +244,20 @@ def rtk_analyzer_loop():
                                 systems=", ".join(sorted(active_constellations)),
                                 sta_id=station_id,
                                 total_count=total_messages,
-                                latency=current_time - last_db_log_time
+                                latency=current_time - last_db_log_time,
+                                message=message
                             )
+
+                            # Статистика MSM: сводка по эпохам и по спутникам одной транзакцией
+                            if msm_stats.epoch_rows:
+                                written = rtk_storage.write_msm_batch(
+                                    msm_stats.epoch_rows, msm_stats.satellite_rows(), RTK_DB)
+                                if written or len(msm_stats.epoch_rows) > MSM_BUFFER_LIMIT:
+                                    msm_stats.reset()
                             
+                            METRICS.observe("db_flush", time.time() - current_time)
+                            METRICS.set_gauge("msm_buffered_epochs", len(msm_stats.epoch_rows))
+
                             # Сброс счетчиков
                             total_messages = 0
                             crc_ok_messages = 0
@@ -171,17 +267,17 @@ def rtk_analyzer_loop():
         except socket.timeout:
             error_msg = f"Таймаут соединения: Не удалось подключиться к {ip}:{port}."
             print(f"[RTK-ERROR] {error_msg}")
-            write_analysis_to_db("ERROR", 0.0, "", None, 0, 0.0)
+            write_analysis_to_db("ERROR", 0.0, "", None, 0, 0.0, message=error_msg)
             
         except ConnectionRefusedError:
             error_msg = "Отказано в соединении: Базовая станция недоступна или служба не запущена."
             print(f"[RTK-ERROR] {error_msg}")
-            write_analysis_to_db("ERROR", 0.0, "", None, 0, 0.0)
+            write_analysis_to_db("ERROR", 0.0, "", None, 0, 0.0, message=error_msg)
             
         except Exception as e:
             error_msg = f"Критическая ошибка в цикле RTCM-анализа: {e}"
             print(f"[RTK-ERROR] {error_msg}")
-            write_analysis_to_db("ERROR", 0.0, f"Exception: {e}", None, 0, 0.0)
+            write_analysis_to_db("ERROR", 0.0, "", None, 0, 0.0, message=error_msg)
 
         # Пауза перед следующей попыткой подключения
         time.sleep(10) 
@@ -195,7 +291,25 @@ if __name__ == "__main__":
         os.makedirs('logs')
         
     initialize_db()
+
+    if SPOOL_CONFIG["enabled"]:
+        SPOOL = spool_journal.SpoolWriter(SPOOL_NAME, SPOOL_CONFIG)
+        spool_journal.start_drainer(
+            SPOOL_NAME, RTK_DB,
+            {spool_journal.KIND_RTK_STATUS: rtk_storage.write_status},
+            SPOOL_CONFIG
+        )
     
+    ALERTS = alert_engine.create_engine("rtcm_analyzer", RTK_DB, CONFIG.get('data_storage', {}).get('alerts'))
+    if METRICS_CONFIG["enabled"]:
+        perf_metrics.start_flusher(METRICS, RTK_DB, METRICS_CONFIG)
+    http_config = metrics_http.resolve_http_config(METRICS_CONFIG.get("http"))
+    EXPORTER = metrics_http.start_exporter(
+        METRICS, http_config["analyzer_port"], http_config,
+        {"spool_backlog_records": lambda: spool_journal.spool_backlog(SPOOL_NAME, RTK_DB, SPOOL_CONFIG)}
+        if SPOOL_CONFIG["enabled"] else None
+    )
+
     print(f"--- RTCM Analyzer Service запущен. Запись статистики каждые {LOG_INTERVAL_SEC} сек. ---")
     
     try:
@@ -0,0 +1,199 @@
+# ==============================================================================
+# RTCM_CAPTURE.PY - Запись сырого потока RTCM в файлы с индексом
+# ==============================================================================
+# В режиме захвата rtcm_analyzer передает каждый кадр в CaptureWriter. Кадры
+# пишутся фоновым потоком в файлы captures/rtcm_YYYYmmdd_HHMMSS.rtcm с ротацией
+# по размеру или времени. Рядом ведется индекс .idx из записей фиксированного
+# размера (время, смещение в файле, тип сообщения), поэтому офлайн-утилиты
+# открывают захват через memory map и находят нужную минуту бинарным поиском.
+# ==============================================================================
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# --- Формат индекса ---
+INDEX_DTYPE = np.dtype([('ts', '<f8'), ('offset', '<u8'), ('msg_type', '<u2')])
+CAPTURE_EXT = '.rtcm'
+INDEX_EXT = '.idx'
+
+# Настройки по умолчанию (перекрываются rtk_base_station.capture в config.json)
+DEFAULT_CAPTURE = {
+    "enabled": False,
+    "dir": "captures",
+    "rotate_mb": 64,        # Новый файл после указанного размера...
+    "rotate_min": 60,       # ...или после указанного времени
+    "buffer_kb": 256        # Буфер записи файла
+}
+
+
+def resolve_capture_config(config_section):
+    """Объединяет настройки захвата из config.json со значениями по умолчанию."""
+    capture_config = dict(DEFAULT_CAPTURE)
+    capture_config.update(config_section or {})
+    return capture_config
+
+
+def frame_msg_type(raw_data):
+    """Тип сообщения из сырого RTCM3-кадра (первые 12 бит payload)."""
+    if len(raw_data) < 5:
+        return 0
+    return (raw_data[3] << 4) | (raw_data[4] >> 4)
+
+# ------------------------------------------------------------------------------
+# 1. ЗАПИСЬ
+# ------------------------------------------------------------------------------
+
+class CaptureWriter:
+    """
+    Буферизованная запись кадров в ротируемые файлы.
+
+    write() только кладет кадр в очередь; файлы, индекс и ротацию обслуживает
+    фоновый поток, поэтому цикл разбора не ждет диск.
+    """
+
+    def __init__(self, capture_config=None):
+        self.config = resolve_capture_config(capture_config)
+        os.makedirs(self.config["dir"], exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._data = self._index = None
+        self._opened_at = 0.0
+        self._thread = threading.Thread(target=self._run, name="rtcm-capture", daemon=True)
+        self._thread.start()
+
+    def write(self, raw_data, msg_type=None, timestamp=None):
+        """Ставит кадр в очередь записи."""
+        if msg_type is None:
+            msg_type = frame_msg_type(raw_data)
+        self._queue.put((timestamp if timestamp is not None else time.time(), msg_type, bytes(raw_data)))
+
+    def pending(self):
+        """Число кадров в очереди записи (для метрик)."""
+        return self._queue.qsize()
+
+    def close(self):
+        """Дописывает очередь и закрывает текущие файлы."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _open(self, ts):
+        self._close_files()
+        stem = os.path.join(self.config["dir"], datetime.fromtimestamp(ts).strftime("rtcm_%Y%m%d_%H%M%S"))
+        base, n = stem, 0
+        while os.path.exists(base + CAPTURE_EXT):
+            n += 1
+            base = f"{stem}_{n}"
+        buffering = self.config["buffer_kb"] * 1024
+        self._data = open(base + CAPTURE_EXT, 'ab', buffering=buffering)
+        self._index = open(base + INDEX_EXT, 'ab', buffering=buffering)
+        self._opened_at = ts
+
+    def _close_files(self):
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = self._index = None
+
+    def _needs_rotation(self, ts):
+        return (self._data is None
+                or self._data.tell() >= self.config["rotate_mb"] * 1024 * 1024
+                or ts - self._opened_at >= self.config["rotate_min"] * 60)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            ts, msg_type, raw = item
+            try:
+                if self._needs_rotation(ts):
+                    self._open(ts)
+                record = np.array([(ts, self._data.tell(), msg_type)], dtype=INDEX_DTYPE)
+                self._data.write(raw)
+                self._index.write(record.tobytes())
+                # Пока поток простаивает, сбрасываем буферы, чтобы захват был читаем офлайн
+                if self._queue.empty():
+                    self._data.flush()
+                    self._index.flush()
+            except OSError as e:
+                print(f"[RTK-CAPTURE] Ошибка записи захвата: {e}")
+                self._close_files()
+        self._close_files()
+
+# ------------------------------------------------------------------------------
+# 2. ЧТЕНИЕ (ОФЛАЙН)
+# ------------------------------------------------------------------------------
+
+class CaptureReader:
+    """Доступ к захвату через memory map: поиск по времени и по типу сообщения."""
+
+    def __init__(self, capture_path):
+        base = capture_path[:-len(CAPTURE_EXT)] if capture_path.endswith(CAPTURE_EXT) else capture_path
+        self.data = np.memmap(base + CAPTURE_EXT, dtype=np.uint8, mode='r')
+        index_size = os.path.getsize(base + INDEX_EXT) // INDEX_DTYPE.itemsize
+        self.index = np.memmap(base + INDEX_EXT, dtype=INDEX_DTYPE, mode='r', shape=(index_size,))
+        # Конец каждого кадра - начало следующего (или конец файла)
+        self._ends = np.append(self.index['offset'][1:], np.uint64(self.data.size))
+
+    def __len__(self):
+        return self.index.size
+
+    def time_range(self):
+        """(первое, последнее) время кадров как datetime."""
+        if not len(self):
+            return None, None
+        return (datetime.fromtimestamp(float(self.index['ts'][0])),
+                datetime.fromtimestamp(float(self.index['ts'][-1])))
+
+    def seek(self, when):
+        """Номер первого кадра не раньше when (datetime) - бинарный поиск по индексу."""
+        return int(np.searchsorted(self.index['ts'], when.timestamp(), side='left'))
+
+    def frame(self, i):
+        """(время, тип, сырые байты) кадра номер i."""
+        start, end = int(self.index['offset'][i]), int(self._ends[i])
+        return float(self.index['ts'][i]), int(self.index['msg_type'][i]), self.data[start:end].tobytes()
+
+    def frames(self, start=None, end=None, msg_types=None):
+        """Кадры в интервале [start, end) с необязательным фильтром по типам."""
+        lo = self.seek(start) if start is not None else 0
+        hi = self.seek(end) if end is not None else len(self)
+        selected = np.arange(lo, hi)
+        if msg_types is not None:
+            selected = selected[np.isin(self.index['msg_type'][lo:hi], list(msg_types))]
+        for i in selected:
+            yield self.frame(int(i))
+
+    def message_counts(self, start=None, end=None):
+        """Число кадров каждого типа в интервале: {тип: N}."""
+        lo = self.seek(start) if start is not None else 0
+        hi = self.seek(end) if end is not None else len(self)
+        types, counts = np.unique(self.index['msg_type'][lo:hi], return_counts=True)
+        return dict(zip(types.tolist(), counts.tolist()))
+
+# ------------------------------------------------------------------------------
+# 3. ТОЧКА ВХОДА: СВОДКА ПО ЗАХВАТУ
+# ------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python rtcm_capture.py <файл.rtcm> [\"YYYY-mm-dd HH:MM\"]")
+        sys.exit(1)
+
+    reader = CaptureReader(sys.argv[1])
+    first, last = reader.time_range()
+    print(f"Кадров: {len(reader)}, период: {first} - {last}")
+
+    if len(sys.argv) > 2:
+        minute = datetime.strptime(sys.argv[2], "%Y-%m-%d %H:%M")
+        minute_end = datetime.fromtimestamp(minute.timestamp() + 60)
+        print(f"Сообщения за {sys.argv[2]}:")
+        for msg_type, count in sorted(reader.message_counts(minute, minute_end).items()):
+            print(f"  {msg_type}: {count}")
+    else:
+        for msg_type, count in sorted(reader.message_counts().items()):
+            print(f"  {msg_type}: {count}")
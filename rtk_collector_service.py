@@ -3,44 +3,61 @@
 # ==============================================================================
 import time
 import socket
+import select
 import json
-import sqlite3
 from datetime import datetime
+import alert_engine
+import rtk_storage
+import spool_journal
 
 # ------------------------------------------------------------------------------
 # 1. КОНСТАНТЫ И КОНФИГУРАЦИЯ
 # ------------------------------------------------------------------------------
 CONFIG_FILE = "config.json"
-DB_NAME = "rtk_log.db" # База данных для записи статусов RTK
+DB_NAME = rtk_storage.RTK_DB # База статусов RTK (data_storage.db_name в config.json)
+SPOOL_NAME = "rtk_collector"
+
+# Журнал записи (открывается в run_rtk_collector, если включен в config.json)
+SPOOL = None
+
+# Движок тревог (создается в run_rtk_collector, data_storage.alerts в config.json)
+ALERTS = None
+
+# Период эпох RTCM: база передает пачку сообщений примерно раз в секунду
+RTCM_EPOCH_SEC = 1.0
+
+# Настройки режима watchdog по умолчанию (rtk_base_station.watchdog в config.json)
+DEFAULT_WATCHDOG = {
+    "enabled": False,
+    "stall_threshold_sec": 2.5,   # Пауза между данными, после которой фиксируется простой (> RTCM_EPOCH_SEC)
+    "heartbeat_sec": 60,          # Период записи статуса при нормальной работе
+    "reconnect_delay_sec": 2      # Пауза перед повторным подключением
+}
 
 # ------------------------------------------------------------------------------
 # 2. ФУНКЦИИ БАЗЫ ДАННЫХ
 # ------------------------------------------------------------------------------
 
-def initialize_db():
-    """Создает таблицу для записи логов RTK-мониторинга, если она не существует."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS rtk_status (
-            timestamp TEXT,
-            ip TEXT,
-            status TEXT,
-            message TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def log_rtk_status(ip, status, message):
-    """Записывает результат проверки RTK в базу данных."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO rtk_status VALUES (?, ?, ?, ?)", 
-                   (timestamp, ip, status, message))
-    conn.commit()
-    conn.close()
+def initialize_db(station=''):
+    """Создает (или обновляет) единую схему RTK: rtk_status и rtk_latest."""
+    rtk_storage.initialize_db(DB_NAME, station)
+
+def log_rtk_status(station, status, message):
+    """Записывает результат проверки RTK в журнал (spool) или напрямую в базу данных."""
+    row = rtk_storage.make_status_row(station, rtk_storage.SOURCE_COLLECTOR, status, message)
+    if SPOOL is not None:
+        SPOOL.append(spool_journal.KIND_RTK_STATUS, row)
+    else:
+        rtk_storage.write_status_to_db(row, DB_NAME)
+    if ALERTS is not None:
+        ALERTS.ingest(station, {"rtk_status": status, "message": message})
+
+def log_rtk_event(row):
+    """Записывает событие потока (начало/конец простоя) в журнал или в базу данных."""
+    if SPOOL is not None:
+        SPOOL.append(spool_journal.KIND_RTK_EVENT, row)
+    else:
+        rtk_storage.write_event_to_db(row, DB_NAME)
 
 # ------------------------------------------------------------------------------
 # 3. ФУНКЦИЯ МОНИТОРИНГА (ИЗМЕНЕННАЯ ВЕРСИЯ test_rtk_base_connection)
@@ -73,6 +90,105 @@ def check_rtk_base(ip, port, timeout, name):
     except Exception as e:
         return "ERROR", f"Непредвиденная ошибка: {e}"
 
+# ------------------------------------------------------------------------------
+# 3.1 РЕЖИМ WATCHDOG: ПОСТОЯННОЕ СОЕДИНЕНИЕ И ПАССИВНОЕ ЧТЕНИЕ ПОТОКА
+# ------------------------------------------------------------------------------
+
+class OutageTracker:
+    """Фиксирует начало и конец простоя потока с точностью до миллисекунд."""
+
+    def __init__(self, station):
+        self.station = station
+        self.start = None       # Время последних данных перед простоем (datetime)
+        self.reason = None
+
+    @property
+    def active(self):
+        return self.start is not None
+
+    def begin(self, last_data_time, reason):
+        if self.active:
+            return
+        self.start, self.reason = last_data_time, reason
+        log_rtk_event(rtk_storage.make_event_row(
+            self.station, rtk_storage.EVENT_OUTAGE_START, datetime.now(), self.start, None, reason))
+        message = f"Простой потока ({reason}) с {rtk_storage.format_event_time(self.start)}"
+        log_rtk_status(self.station, "ERROR", message)
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] [WATCHDOG] {message}")
+
+    def end(self, resumed_at):
+        if not self.active:
+            return
+        duration_ms = int((resumed_at - self.start).total_seconds() * 1000)
+        log_rtk_event(rtk_storage.make_event_row(
+            self.station, rtk_storage.EVENT_OUTAGE_END, resumed_at, self.start, duration_ms, self.reason))
+        message = f"Поток восстановлен, простой {duration_ms} мс ({self.reason})"
+        log_rtk_status(self.station, "OK", message)
+        print(f"[{resumed_at.strftime('%H:%M:%S')}] [WATCHDOG] {message}")
+        self.start, self.reason = None, None
+
+
+def watch_rtk_stream(ip, port, timeout, station, watchdog_config, stop=None):
+    """
+    Держит одно TCP-соединение со станцией и непрерывно читает поток.
+
+    Простой фиксируется, как только пауза между данными превышает
+    stall_threshold_sec (ожидание select() рассчитано точно до этого момента),
+    а также при разрыве соединения. Конец простоя - первые данные после него.
+    Пауза между эпохами (RTCM_EPOCH_SEC) - норма, поэтому порог должен быть
+    больше нее. stop (threading.Event) завершает наблюдение после разрыва.
+    """
+    threshold = watchdog_config["stall_threshold_sec"]
+    heartbeat = watchdog_config["heartbeat_sec"]
+    outage = OutageTracker(station)
+    last_data_time = datetime.now()
+
+    while stop is None or not stop.is_set():
+        try:
+            with socket.create_connection((ip, port), timeout=timeout) as sock:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                sock.setblocking(False)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] [WATCHDOG] Подключено к {ip}:{port}")
+
+                last_data = time.monotonic()
+                last_heartbeat = last_data
+                received = 0
+
+                while True:
+                    now = time.monotonic()
+                    if outage.active:
+                        wait = heartbeat
+                    else:
+                        wait = threshold - (now - last_data)
+                        if wait <= 0:
+                            outage.begin(last_data_time, "stall")
+                            continue
+                    wait = min(wait, max(heartbeat - (now - last_heartbeat), 0))
+
+                    readable, _, _ = select.select([sock], [], [], wait)
+                    if readable:
+                        data = sock.recv(65536)
+                        if not data:
+                            raise ConnectionError("станция закрыла соединение")
+                        last_data = time.monotonic()
+                        last_data_time = datetime.now()
+                        received += len(data)
+                        outage.end(last_data_time)
+
+                    now = time.monotonic()
+                    if now - last_heartbeat >= heartbeat:
+                        if not outage.active:
+                            log_rtk_status(station, "OK",
+                                           f"Поток активен, получено {received} байт за {now - last_heartbeat:.0f} с.")
+                        last_heartbeat, received = now, 0
+
+        except (OSError, ConnectionError) as e:
+            if stop is not None and stop.is_set():
+                return
+            outage.begin(last_data_time, f"disconnect: {e}")
+
+        time.sleep(watchdog_config["reconnect_delay_sec"])
+
 # ------------------------------------------------------------------------------
 # 4. ГЛАВНЫЙ ЦИКЛ СЕРВИСА
 # ------------------------------------------------------------------------------
@@ -81,7 +197,7 @@ def run_rtk_collector():
     """
     Основной цикл, который циклически проверяет статус RTK и логирует результат.
     """
-    initialize_db()
+    global SPOOL, ALERTS, DB_NAME
     
     try:
         with open(CONFIG_FILE, 'r') as f:
@@ -90,6 +206,10 @@ def run_rtk_collector():
         ip = base_config.get("ip")
         port = base_config.get("port")
         timeout = base_config.get("timeout", 5)
+        spool_config = spool_journal.resolve_spool_config(config.get("data_storage", {}).get("spool"))
+        DB_NAME = config.get("data_storage", {}).get("db_name", DB_NAME)
+        watchdog_config = dict(DEFAULT_WATCHDOG)
+        watchdog_config.update(base_config.get("watchdog", {}))
         
         if not ip or not port:
             print("ERROR: RTK IP/Port не настроены в config.json. Выход.")
@@ -102,6 +222,30 @@ def run_rtk_collector():
         print(f"ERROR: Ошибка парсинга {CONFIG_FILE}.")
         return
 
+    station = rtk_storage.station_key(base_config)
+    initialize_db(station)
+    ALERTS = alert_engine.create_engine("rtk_collector", DB_NAME, config.get("data_storage", {}).get("alerts"))
+
+    if spool_config["enabled"]:
+        SPOOL = spool_journal.SpoolWriter(SPOOL_NAME, spool_config)
+        spool_journal.start_drainer(
+            SPOOL_NAME, DB_NAME,
+            {
+                spool_journal.KIND_RTK_STATUS: rtk_storage.write_status,
+                spool_journal.KIND_RTK_EVENT: rtk_storage.write_event
+            },
+            spool_config
+        )
+
+    if watchdog_config["enabled"]:
+        if watchdog_config["stall_threshold_sec"] <= RTCM_EPOCH_SEC:
+            print(f"[WARN] stall_threshold_sec = {watchdog_config['stall_threshold_sec']} с не больше периода "
+                  f"эпох RTCM ({RTCM_EPOCH_SEC} с): каждая пауза между эпохами будет считаться простоем.")
+        print(f"--- RTK Collector Service (watchdog) запущен ({ip}:{port}), "
+              f"порог простоя {watchdog_config['stall_threshold_sec']} с ---")
+        watch_rtk_stream(ip, port, timeout, station, watchdog_config)
+        return
+
     print(f"--- RTK Collector Service запущен ({ip}:{port}) ---")
     
     # Цикл мониторинга: каждые 60 секунд (для промышленного мониторинга)
@@ -109,7 +253,7 @@ def run_rtk_collector():
 
     while True:
         status, message = check_rtk_base(ip, port, timeout, base_config.get("name"))
-        log_rtk_status(ip, status, message)
+        log_rtk_status(station, status, message)
         
         current_time = datetime.now().strftime("%H:%M:%S")
         print(f"[{current_time}] Статус: {status}. Сообщение: {message}")
@@ -0,0 +1,311 @@
+# ==============================================================================
+# RTK_STORAGE.PY - Единая схема статусов RTK (rtk_log.db)
+# ==============================================================================
+# rtk_collector_service и rtcm_analyzer пишут в одну таблицу rtk_status через
+# write_status(). Каждая запись также обновляет строку станции в rtk_latest,
+# поэтому GUI читает текущий статус по первичному ключу, независимо от объема
+# истории. Версия схемы хранится в PRAGMA user_version.
+# ==============================================================================
+import sqlite3
+from datetime import datetime
+
+# --- Файлы проекта ---
+RTK_DB = 'rtk_log.db'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+SCHEMA_VERSION = 3
+
+# --- События потока (rtk_events, время с миллисекундами) ---
+EVENT_OUTAGE_START = 'outage_start'
+EVENT_OUTAGE_END = 'outage_end'
+
+# --- Источники записей ---
+SOURCE_COLLECTOR = 'collector'   # rtk_collector_service (проверка TCP-потока)
+SOURCE_ANALYZER = 'analyzer'     # rtcm_analyzer (анализ RTCM-сообщений)
+
+# Порядок полей строки статуса (так же она хранится в журнале spool)
+STATUS_FIELDS = (
+    'timestamp', 'station', 'source', 'status', 'message',
+    'stream_quality_pct', 'active_constellations', 'station_id',
+    'message_count', 'latency_sec'
+)
+
+# ------------------------------------------------------------------------------
+# 1. СХЕМА И МИГРАЦИИ
+# ------------------------------------------------------------------------------
+
+def _create_schema_v1(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rtk_status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            station TEXT NOT NULL,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            message TEXT,
+            stream_quality_pct REAL,
+            active_constellations TEXT,
+            station_id INTEGER,
+            message_count INTEGER,
+            latency_sec REAL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rtk_status_time ON rtk_status (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rtk_status_station_time ON rtk_status (station, timestamp)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rtk_latest (
+            station TEXT PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            source TEXT NOT NULL,
+            status TEXT NOT NULL,
+            message TEXT,
+            stream_quality_pct REAL,
+            active_constellations TEXT,
+            station_id INTEGER,
+            message_count INTEGER,
+            latency_sec REAL
+        )
+    """)
+
+
+def _create_schema_v2(cursor):
+    """Версия 2: события начала/конца простоя потока от watchdog."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rtk_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            station TEXT NOT NULL,
+            event TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            outage_start TEXT,
+            duration_ms INTEGER,
+            reason TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rtk_events_station_time ON rtk_events (station, timestamp)")
+
+
+def _create_schema_v3(cursor):
+    """Версия 3: качество сигнала по MSM - сводка по эпохам и статистика по спутникам."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rtk_msm_epochs (
+            timestamp TEXT NOT NULL,
+            station TEXT NOT NULL,
+            constellation TEXT NOT NULL,
+            msg_type INTEGER NOT NULL,
+            epoch_ms INTEGER NOT NULL,
+            n_sats INTEGER NOT NULL,
+            n_signals INTEGER NOT NULL,
+            cnr_mean REAL,
+            cnr_min REAL,
+            lock_min_ms INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rtk_msm_epochs_time ON rtk_msm_epochs (station, timestamp)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rtk_sat_quality (
+            interval_start TEXT NOT NULL,
+            interval_end TEXT NOT NULL,
+            station TEXT NOT NULL,
+            constellation TEXT NOT NULL,
+            prn INTEGER NOT NULL,
+            epochs INTEGER NOT NULL,
+            cnr_mean REAL,
+            cnr_min REAL,
+            cnr_max REAL,
+            lock_min_ms INTEGER
+        )
+    """)
+    cursor.execute("""CREATE INDEX IF NOT EXISTS idx_rtk_sat_quality_sat
+                      ON rtk_sat_quality (station, constellation, prn, interval_start)""")
+
+
+def _migrate_legacy_v0(cursor, station):
+    """Переносит строки из старых несовместимых схем rtk_status (версия 0)."""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(rtk_status)")}
+    if not columns or 'source' in columns:
+        return
+    cursor.execute("ALTER TABLE rtk_status RENAME TO rtk_status_v0")
+    _create_schema_v1(cursor)
+
+    if 'Overall_Status' in columns:
+        # Схема rtcm_analyzer
+        cursor.execute(
+            """INSERT INTO rtk_status (timestamp, station, source, status, message, stream_quality_pct,
+                                       active_constellations, station_id, message_count, latency_sec)
+               SELECT timestamp, ?, ?, Overall_Status, '', Stream_Quality_Pct, Active_Constellations,
+                      Station_ID, Message_Count_Total, Connection_Latency_sec
+               FROM rtk_status_v0 ORDER BY timestamp""",
+            (station, SOURCE_ANALYZER)
+        )
+    else:
+        # Схема rtk_collector_service
+        cursor.execute(
+            """INSERT INTO rtk_status (timestamp, station, source, status, message)
+               SELECT timestamp, ?, ?, status, message
+               FROM rtk_status_v0 ORDER BY timestamp""",
+            (station, SOURCE_COLLECTOR)
+        )
+    cursor.execute("DROP TABLE rtk_status_v0")
+    _rebuild_latest(cursor)
+
+
+def _rebuild_latest(cursor):
+    """Заполняет rtk_latest по последним строкам истории каждой станции."""
+    cursor.execute("DELETE FROM rtk_latest")
+    cursor.execute("""
+        INSERT INTO rtk_latest (station, timestamp, source, status, message, stream_quality_pct,
+                                active_constellations, station_id, message_count, latency_sec)
+        SELECT station, timestamp, source, status, message, stream_quality_pct,
+               active_constellations, station_id, message_count, latency_sec
+        FROM rtk_status
+        WHERE id IN (SELECT MAX(id) FROM rtk_status GROUP BY station)
+    """)
+
+
+def initialize_db(db_path=RTK_DB, station=''):
+    """Создает (или обновляет до SCHEMA_VERSION) схему RTK в db_path."""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            _migrate_legacy_v0(cursor, station)
+            _create_schema_v1(cursor)
+        if version < 2:
+            _create_schema_v2(cursor)
+        if version < 3:
+            _create_schema_v3(cursor)
+        if version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def station_key(base_config):
+    """Ключ станции для rtk_latest: 'ip:port' из секции rtk_base_station."""
+    return f"{base_config.get('ip', '')}:{base_config.get('port', '')}"
+
+# ------------------------------------------------------------------------------
+# 2. ЗАПИСЬ
+# ------------------------------------------------------------------------------
+
+def make_status_row(station, source, status, message='', quality=None, constellations=None,
+                    station_id=None, message_count=None, latency=None, timestamp=None):
+    """Формирует строку статуса в порядке STATUS_FIELDS."""
+    if timestamp is None:
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+    return (timestamp, station, source, status, message, quality, constellations,
+            station_id, message_count, latency)
+
+
+def write_status(cursor, row):
+    """Добавляет строку в историю и обновляет rtk_latest (транзакцией управляет вызывающий код)."""
+    row = tuple(row)
+    cursor.execute(
+        """INSERT INTO rtk_status (timestamp, station, source, status, message, stream_quality_pct,
+                                   active_constellations, station_id, message_count, latency_sec)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        row
+    )
+    cursor.execute(
+        """INSERT INTO rtk_latest (timestamp, station, source, status, message, stream_quality_pct,
+                                   active_constellations, station_id, message_count, latency_sec)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(station) DO UPDATE SET
+               timestamp = excluded.timestamp, source = excluded.source,
+               status = excluded.status, message = excluded.message,
+               stream_quality_pct = excluded.stream_quality_pct,
+               active_constellations = excluded.active_constellations,
+               station_id = excluded.station_id, message_count = excluded.message_count,
+               latency_sec = excluded.latency_sec
+           WHERE excluded.timestamp >= rtk_latest.timestamp""",
+        row
+    )
+
+
+def write_status_to_db(row, db_path=RTK_DB):
+    """Записывает строку статуса в отдельной транзакции. Возвращает True при успехе."""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        write_status(conn.cursor(), row)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"[RTK-ERROR] Ошибка записи статуса RTK в БД: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def format_event_time(dt):
+    """Время события с миллисекундами."""
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def make_event_row(station, event, timestamp, outage_start=None, duration_ms=None, reason=None):
+    """Строка rtk_events: (station, event, timestamp, outage_start, duration_ms, reason)."""
+    return (station, event, format_event_time(timestamp),
+            format_event_time(outage_start) if outage_start is not None else None,
+            duration_ms, reason)
+
+
+def write_event(cursor, row):
+    """Добавляет событие потока в rtk_events (транзакцией управляет вызывающий код)."""
+    cursor.execute(
+        """INSERT INTO rtk_events (station, event, timestamp, outage_start, duration_ms, reason)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        tuple(row)
+    )
+
+
+def write_event_to_db(row, db_path=RTK_DB):
+    """Записывает событие в отдельной транзакции. Возвращает True при успехе."""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        write_event(conn.cursor(), row)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"[RTK-ERROR] Ошибка записи события RTK в БД: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+def write_msm_batch(epoch_rows, satellite_rows, db_path=RTK_DB):
+    """
+    Пакетная запись статистики MSM (одна транзакция на интервал анализа).
+
+    Возвращает True при успехе; при ошибке данные остаются у вызывающего кода.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.executemany("INSERT INTO rtk_msm_epochs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", epoch_rows)
+        conn.executemany("INSERT INTO rtk_sat_quality VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", satellite_rows)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"[RTK-ERROR] Ошибка записи статистики MSM в БД: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+# ------------------------------------------------------------------------------
+# 3. ЧТЕНИЕ
+# ------------------------------------------------------------------------------
+
+def read_latest(conn, station):
+    """Текущий статус станции (dict) по первичному ключу rtk_latest или None."""
+    row = conn.execute(
+        """SELECT timestamp, station, source, status, message, stream_quality_pct,
+                  active_constellations, station_id, message_count, latency_sec
+           FROM rtk_latest WHERE station = ?""",
+        (station,)
+    ).fetchone()
+    return dict(zip(STATUS_FIELDS, row)) if row else None
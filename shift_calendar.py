@@ -0,0 +1,188 @@
+# ==============================================================================
+# SHIFT_CALENDAR.PY - Календарь смен площадки: рабочие дни, смены и shift_id
+# ==============================================================================
+# Единственное место, где определены границы смен. Рабочий день начинается в
+# day_start и делится на смены (shifts, по времени начала). По умолчанию - как
+# на площадке до сих пор: рабочий день с 20:00 до 20:00, ночная смена
+# 20:00-08:00 и дневная 08:00-20:00.
+#
+# Рабочий день называется датой, на которую приходится большая его часть:
+# при day_start 20:00 день 2026-10-03 - это 2026-10-02 20:00 .. 2026-10-03 20:00
+# (так же названы CSV-логи logs/coverage_log_<дата>.csv), при day_start 07:00 -
+# дата начала.
+#
+# shift_id - целое YYYYMMDD * 10 + номер смены в рабочем дне (0 - первая).
+# Оно вычисляется при записи замера (mikrotik_storage.write_sample, импорт CSV)
+# и хранится в индексированной колонке mikrotik_log.shift_id, поэтому выборка
+# смены - равенство shift_id = ?, а рабочего дня - shift_id BETWEEN d*10 AND d*10+9.
+# ==============================================================================
+import json
+from datetime import datetime, timedelta
+
+CONFIG_FILE = 'config.json'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = '%Y-%m-%d'
+
+# Смен в рабочем дне не больше (номер смены - последняя цифра shift_id)
+MAX_SHIFTS = 10
+
+# Настройки по умолчанию (перекрываются секцией shift_calendar в config.json)
+DEFAULT_CALENDAR = {
+    "day_start": "20:00",
+    "shifts": [
+        {"code": "N", "name": "Ночная", "start": "20:00"},
+        {"code": "D", "name": "Дневная", "start": "08:00"}
+    ]
+}
+
+
+def resolve_calendar_config(config_section):
+    """Объединяет настройки календаря из config.json со значениями по умолчанию."""
+    calendar_config = dict(DEFAULT_CALENDAR)
+    calendar_config.update(config_section or {})
+    return calendar_config
+
+
+def _seconds_of_day(text):
+    """'HH:MM' -> секунды от полуночи."""
+    moment = datetime.strptime(text, '%H:%M')
+    return moment.hour * 3600 + moment.minute * 60
+
+
+def _fmt(dt):
+    return dt.strftime('%Y-%m-%d %H:%M')
+
+
+class ShiftCalendar:
+    """
+    Календарь смен. Время - datetime или строка TIMESTAMP_FORMAT.
+
+        calendar = load_calendar()
+        shift_id = calendar.shift_id(timestamp)            # 202610030
+        start, end = calendar.shift_bounds(shift_id)
+        first, last = calendar.day_id_range('2026-10-03')  # для BETWEEN
+    """
+
+    def __init__(self, config_section=None):
+        self.config = resolve_calendar_config(config_section)
+        day_start = _seconds_of_day(self.config["day_start"])
+        shifts = sorted(self.config["shifts"], key=lambda s: (_seconds_of_day(s["start"]) - day_start) % 86400)
+        if not shifts or len(shifts) > MAX_SHIFTS:
+            raise ValueError(f"В рабочем дне должно быть от 1 до {MAX_SHIFTS} смен.")
+        if _seconds_of_day(shifts[0]["start"]) != day_start:
+            raise ValueError("Первая смена рабочего дня должна начинаться в day_start.")
+        self.shifts = shifts
+        # Начала смен от начала рабочего дня, сек
+        self.offsets = [(_seconds_of_day(s["start"]) - day_start) % 86400 for s in shifts]
+        # Сдвиг времени, после которого дата = имя рабочего дня
+        self.label_shift = 86400 - day_start if day_start >= 43200 else -day_start
+
+    @property
+    def fingerprint(self):
+        """Строка настроек: если она изменилась, сохраненные shift_id нужно пересчитать."""
+        return json.dumps({"day_start": self.config["day_start"], "starts": [s["start"] for s in self.shifts]},
+                          sort_keys=True)
+
+    @staticmethod
+    def _parse(timestamp):
+        if isinstance(timestamp, str):
+            return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        return timestamp
+
+    # --- Рабочий день ---
+
+    def work_day(self, timestamp):
+        """Имя рабочего дня (YYYY-MM-DD) для времени замера."""
+        return (self._parse(timestamp) + timedelta(seconds=self.label_shift)).strftime(DATE_FORMAT)
+
+    def day_bounds(self, work_day):
+        """Границы рабочего дня (start, end)."""
+        day = datetime.strptime(work_day, DATE_FORMAT)
+        start = day - timedelta(seconds=self.label_shift)
+        return start, start + timedelta(days=1)
+
+    def day_id_range(self, work_day):
+        """Первый и последний возможный shift_id рабочего дня (для BETWEEN)."""
+        base = int(work_day.replace('-', '')) * 10
+        return base, base + MAX_SHIFTS - 1
+
+    def day_sql(self, col):
+        """SQL-выражение имени рабочего дня для колонки времени."""
+        return f"date({col}, '{self.label_shift:+d} seconds')"
+
+    # --- Смены ---
+
+    def shift_id(self, timestamp):
+        """shift_id для времени замера."""
+        moment = self._parse(timestamp)
+        work_day = self.work_day(moment)
+        elapsed = (moment - self.day_bounds(work_day)[0]).total_seconds()
+        index = sum(1 for offset in self.offsets if offset <= elapsed) - 1
+        return int(work_day.replace('-', '')) * 10 + index
+
+    def shift_id_sql(self, col):
+        """
+        То же в SQL (для миграции и загрузки через INSERT ... SELECT): после сдвига
+        на label_shift дата - имя рабочего дня, а время суток - время от его начала.
+        """
+        shifted = f"{col}, '{self.label_shift:+d} seconds'"
+        elapsed = f"(CAST(strftime('%s', {shifted}) AS INTEGER) % 86400)"
+        index = "".join(f" + ({elapsed} >= {offset})" for offset in self.offsets[1:])
+        return f"(CAST(strftime('%Y%m%d', {shifted}) AS INTEGER) * 10{index})"
+
+    def day_of(self, shift_id):
+        """Имя рабочего дня смены."""
+        return datetime.strptime(str(shift_id // 10), '%Y%m%d').strftime(DATE_FORMAT)
+
+    def shift_ids(self, work_day):
+        """Все shift_id рабочего дня по порядку."""
+        base = self.day_id_range(work_day)[0]
+        return [base + index for index in range(len(self.shifts))]
+
+    def shift_bounds(self, shift_id):
+        """Границы смены (start, end)."""
+        index = shift_id % 10
+        day_start, day_end = self.day_bounds(self.day_of(shift_id))
+        start = day_start + timedelta(seconds=self.offsets[index])
+        end = day_start + timedelta(seconds=self.offsets[index + 1]) if index + 1 < len(self.offsets) else day_end
+        return start, end
+
+    def current(self, now=None):
+        """shift_id текущей смены."""
+        return self.shift_id(now or datetime.now())
+
+    def describe(self, shift_id):
+        """'Ночная смена (2026-10-02 20:00 - 2026-10-03 08:00)'."""
+        start, end = self.shift_bounds(shift_id)
+        return f"{self.shifts[shift_id % 10]['name']} смена ({_fmt(start)} - {_fmt(end)})"
+
+    def describe_day(self, work_day):
+        """'С 2026-10-02 20:00 по 2026-10-03 20:00'."""
+        start, end = self.day_bounds(work_day)
+        return f"С {_fmt(start)} по {_fmt(end)}"
+
+
+def load_calendar(config_file=CONFIG_FILE):
+    """Календарь из config.json (секция shift_calendar)."""
+    try:
+        with open(config_file, 'r') as f:
+            section = json.load(f).get("shift_calendar")
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Не удалось прочитать {config_file} ({e}), используется календарь смен по умолчанию.")
+        return ShiftCalendar()
+    try:
+        return ShiftCalendar(section)
+    except (KeyError, ValueError) as e:
+        print(f"[WARN] Неверная секция shift_calendar в {config_file} ({e}), используется календарь по умолчанию.")
+        return ShiftCalendar()
+
+
+# Календарь площадки (config.json в рабочей папке сервисов) - загружается один раз
+_CALENDAR = None
+
+
+def get_calendar():
+    global _CALENDAR
+    if _CALENDAR is None:
+        _CALENDAR = load_calendar()
+    return _CALENDAR
@@ -0,0 +1,553 @@
+# ==============================================================================
+# SHIFT_REPORTS.PY - Пакетные отчеты по установкам и сменам (HTML/PNG/CSV)
+# ==============================================================================
+# Отчет к сдаче смены: по каждой установке - карта замеров, график RSSI/TxRate,
+# почасовая статистика и число переключений между AP; по смене - поверхность
+# покрытия с зонами слабого сигнала, сводка RTK и, если точек доступа несколько
+# (ap_id в mikrotik_log), карта покрытия каждой AP и переключения. Запуск без GUI:
+#
+#   python shift_reports.py 2026-10-01..2026-10-31 --rigs "DML 511,DML 515"
+#
+# Работа в два этапа:
+#   1. Подготовка (один процесс - единственный писатель в БД): инкрементальный
+#      rollup сетки покрытия и поиск зон по строящимся сменам, пополнение
+#      mikrotik_rollup.
+#   2. Отчеты (пул процессов): каждая задача - одна смена или пара
+#      (смена, установка); БД открываются только для чтения, поверхность
+#      берется из кэша coverage_grid, длинные ряды - из mikrotik_rollup.
+#
+# Закрытая смена, отчет по которой собран после последнего обновления каталога
+# архива (archive_catalog.updated_at) с тем же набором установок, повторно не
+# строится (--force - построить заново).
+#
+# Результат: <out_dir>/<смена>/ (index.html, PNG, CSV, report.json) и общие
+# <out_dir>/index.html и <out_dir>/summary.csv.
+# ==============================================================================
+import argparse
+import csv
+import html
+import json
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import archive_catalog
+import coverage_diff
+import coverage_grid
+import coverage_holes
+import data_access
+import mikrotik_storage
+import rtk_storage
+import shift_calendar
+import timeseries
+import visualization
+
+CONFIG_FILE = 'config.json'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Настройки по умолчанию (перекрываются data_storage.reports в config.json)
+DEFAULT_REPORTS = {
+    "out_dir": "reports",
+    "workers": 0,          # 0 - по числу ядер
+    "trend_width_px": 1200
+}
+
+# Описание набора отчета смены (по нему решается, строить ли смену заново)
+MANIFEST_NAME = "report.json"
+
+SUMMARY_FIELDS = ("shift_date", "rig_id", "samples", "rows", "duration_h", "rssi_avg", "rssi_tw_avg",
+                  "tx_avg", "tx_tw_avg", "excellent_pct", "good_pct", "poor_pct", "critical_pct",
+                  "cells_visited", "handovers", "first_ts", "last_ts")
+HOURLY_FIELDS = ("shift", "hour", "samples", "rssi_mean", "rssi_min", "rssi_max", "tx_mean")
+HOLES_FIELDS = ("hole_id", "area_m2", "centroid_lon", "centroid_lat", "rssi_mean", "samples", "trend")
+AP_FIELDS = ("ap_id", "rigs", "samples", "duration_h", "rssi_tw_avg", "rssi_min")
+HANDOVER_FIELDS = ("rig_id", "from_ap", "to_ap", "count")
+
+
+def resolve_reports_config(config_section):
+    """Объединяет настройки отчетов из config.json со значениями по умолчанию."""
+    reports_config = dict(DEFAULT_REPORTS)
+    reports_config.update(config_section or {})
+    return reports_config
+
+
+def _slug(rig_id):
+    """Имя установки для имен файлов ('DML 511' -> 'DML_511')."""
+    return re.sub(r'[^0-9A-Za-z_-]+', '_', str(rig_id)).strip('_') or 'rig'
+
+
+def _load_config(config_file):
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def default_rigs(config, conn, shifts):
+    """Установки из mikrotik_cpelist, иначе - все, что есть в каталоге архива за период."""
+    rigs = [cpe["rig_id"] for cpe in config.get("mikrotik_cpelist", []) if cpe.get("rig_id")]
+    if rigs:
+        return rigs
+    placeholders = ", ".join("?" * len(shifts))
+    return [row[0] for row in conn.execute(
+        f"SELECT DISTINCT rig_id FROM archive_catalog WHERE shift_date IN ({placeholders}) ORDER BY rig_id", shifts)]
+
+# ------------------------------------------------------------------------------
+# 1. ПОДГОТОВКА (ОДИН ПИСАТЕЛЬ)
+# ------------------------------------------------------------------------------
+
+def _catalog_updated_at(conn, shift_date, rigs):
+    placeholders = ", ".join("?" * len(rigs))
+    row = conn.execute(
+        f"SELECT MAX(updated_at) FROM archive_catalog WHERE shift_date = ? AND rig_id IN ({placeholders})",
+        [shift_date] + list(rigs)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def is_up_to_date(conn, shift_date, rigs, out_dir):
+    """Отчет закрытой смены уже собран после последних изменений ее данных."""
+    if shift_date >= archive_catalog.shift_date_for(datetime.now()):
+        return False
+    try:
+        with open(os.path.join(out_dir, shift_date, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if sorted(manifest.get("rigs", [])) != sorted(rigs) or manifest.get("failed"):
+        return False                                 # Установки с ошибкой строятся при следующем запуске
+    updated_at = _catalog_updated_at(conn, shift_date, rigs)
+    return updated_at is None or manifest.get("generated_at", "") >= updated_at
+
+
+def prepare(conn, shifts, rigs, grid_config):
+    """
+    Обновляет все, что пишется в БД, до запуска пула: сетку покрытия, кэш
+    поверхности и зоны смен (rollup инкрементальный - для уже свернутой смены
+    читаются только новые строки, поверхность пересчитывается только вокруг
+    них) и mikrotik_rollup установок. Задачи пула после этого только читают.
+    """
+    for shift_date in shifts:
+        coverage_holes.analyze_shift(conn, shift_date, grid_config)
+    for rig_id in rigs:
+        timeseries.refresh_rollup(conn, rig_id)
+
+# ------------------------------------------------------------------------------
+# 2. ЗАДАЧИ ПУЛА
+# ------------------------------------------------------------------------------
+
+# Состояние процесса пула: соединения только для чтения и настройки
+_WORKER = {}
+
+
+def _init_worker(db_paths, grid_config, reports_config, station, mmap_mb):
+    _WORKER.update(db_paths=db_paths, grid_config=grid_config, reports_config=reports_config,
+                   station=station, mmap_mb=mmap_mb, connections={})
+
+
+def _connection(db_key):
+    """Соединение процесса пула (None - файла БД нет)."""
+    connections = _WORKER["connections"]
+    if db_key not in connections:
+        path = _WORKER["db_paths"][db_key]
+        connections[db_key] = data_access.open_readonly(path, _WORKER["mmap_mb"]) if os.path.exists(path) else None
+    return connections[db_key]
+
+
+def _write_csv(path, fields, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        writer.writerows(rows)
+
+
+def _round(value, digits=1):
+    return round(float(value), digits) if value is not None and not pd.isna(value) else None
+
+
+def _rig_samples(conn, rig_id, shift_date):
+    """Строки установки за рабочий день (по shift_id): DataFrame с RSSI/TxRate каждой строки и числом ее замеров."""
+    first_id, last_id = shift_calendar.get_calendar().day_id_range(shift_date)
+    rows = conn.execute(
+        """SELECT timestamp, shift_id, longitude, latitude, COALESCE(rssi_sum / sample_count, rssi),
+                  tx_sum / sample_count, COALESCE(sample_count, 1)
+           FROM mikrotik_log
+           WHERE shift_id BETWEEN ? AND ? AND rig_id = ?
+           ORDER BY timestamp, id""",
+        (first_id, last_id, rig_id)
+    ).fetchall()
+    df = pd.DataFrame(rows, columns=["timestamp", "shift_id", "lon", "lat", "rssi", "tx", "count"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+def _quality_shares(df):
+    """Доля замеров (с учетом сжатых строк) по классам шкалы RSSI, %."""
+    rated = df.dropna(subset=["rssi"])
+    total = rated["count"].sum()
+    colors = rated["rssi"].map(visualization.define_quality_color)
+    shares = {}
+    for name, color in (("excellent_pct", 'green'), ("good_pct", 'gold'), ("poor_pct", 'red'), ("critical_pct", 'maroon')):
+        shares[name] = _round(100.0 * rated["count"][colors == color].sum() / total) if total else None
+    return shares
+
+
+def _hourly(df):
+    """
+    Почасовая статистика установки по сменам календаря (среднее - по замерам,
+    min/max - по строкам). Час на границе смен делится между ними.
+    """
+    if df.empty:
+        return []
+    calendar = shift_calendar.get_calendar()
+    data = df.assign(hour=df["timestamp"].dt.floor("h"), rssi_w=df["rssi"] * df["count"], tx_w=df["tx"] * df["count"],
+                     rssi_n=df["count"].where(df["rssi"].notna(), 0), tx_n=df["count"].where(df["tx"].notna(), 0))
+    grouped = data.groupby(["shift_id", "hour"]).agg(samples=("count", "sum"), rssi_w=("rssi_w", "sum"), rssi_n=("rssi_n", "sum"),
+                                       rssi_min=("rssi", "min"), rssi_max=("rssi", "max"),
+                                       tx_w=("tx_w", "sum"), tx_n=("tx_n", "sum"))
+    rows = []
+    for (shift_id, hour), row in grouped.iterrows():
+        rows.append((calendar.shifts[int(shift_id) % 10]["name"], hour.strftime(TIMESTAMP_FORMAT), int(row["samples"]),
+                     _round(row["rssi_w"] / row["rssi_n"]) if row["rssi_n"] else None,
+                     _round(row["rssi_min"]), _round(row["rssi_max"]),
+                     _round(row["tx_w"] / row["tx_n"]) if row["tx_n"] else None))
+    return rows
+
+
+def _plot_rig_map(df, rig_id, shift_date, path):
+    """Карта замеров (колонки lon, lat, rssi) с цветом по шкале RSSI; rig_id - подпись (установка или AP)."""
+    fig = plt.figure(figsize=(10, 8))
+    points = df.dropna(subset=["lon", "lat", "rssi"])
+    if points.empty:
+        plt.text(0.5, 0.5, "НЕТ ЗАМЕРОВ С КООРДИНАТАМИ", ha='center', va='center', fontsize=14)
+    else:
+        legend_elements = visualization.quality_legend_elements()
+        plt.scatter(points["lon"], points["lat"], c=points["rssi"].map(visualization.define_quality_color),
+                    s=30, alpha=0.8, edgecolors='black', linewidths=0.3)
+        plt.legend(handles=legend_elements, loc='upper right', title="Качество сигнала RSSI")
+        plt.xlabel('Долгота (Longitude X)')
+        plt.ylabel('Широта (Latitude Y)')
+        plt.grid(True, linestyle='--', alpha=0.6)
+    plt.title(f'{rig_id}: замеры Wi-Fi, смена {shift_date} (строк: {len(points)})')
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _plot_rig_trend(conn, rig_id, shift_date, width, path):
+    """График RSSI/TxRate за смену: длинные ряды - из mikrotik_rollup, прореживание до ширины."""
+    start_time, end_time = archive_catalog.shift_bounds(shift_date)
+    start, end = timeseries.to_epoch(start_time), timeseries.to_epoch(end_time)
+    data = timeseries.downsample(timeseries.read_series(conn, rig_id, start_time, end_time), start, end, width)
+    fig, (ax_rssi, ax_tx) = plt.subplots(2, 1, figsize=(width / 100, 6), sharex=True)
+    for ax, field, label, color in ((ax_rssi, "rssi", "RSSI, дБм", 'tab:blue'), (ax_tx, "tx", "TxRate, Мбит/с", 'tab:green')):
+        band_x, low, high = data[field + "_band"]
+        x, y = data[field]
+        if len(band_x):
+            ax.fill_between([timeseries.from_epoch(t) for t in band_x], low, high, color=color, alpha=0.2, linewidth=0)
+        if len(x):
+            ax.plot([timeseries.from_epoch(t) for t in x], y, color=color, linewidth=0.8)
+        ax.set_ylabel(label)
+        ax.grid(True, linestyle='--', alpha=0.6)
+    ax_tx.set_xlim(start_time, end_time)
+    ax_rssi.set_title(f'{rig_id}: RSSI и TxRate, смена {shift_date}')
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def rig_report(shift_date, rig_id, shift_dir):
+    """Задача пула: карта, график и почасовая статистика установки за смену."""
+    conn = _connection(data_access.DB_MIKROTIK)
+    first_id, last_id = shift_calendar.get_calendar().day_id_range(shift_date)
+    slug = _slug(rig_id)
+    summary = {"shift_date": shift_date, "rig_id": rig_id}
+    if conn is None:
+        return summary
+
+    df = _rig_samples(conn, rig_id, shift_date)
+    stats = mikrotik_storage.query_wifi_stats(conn, rig_id, first_id, last_id)
+    located = df.dropna(subset=["lon", "lat"])
+    ix, iy = coverage_grid.to_cells(located["lon"].to_numpy(), located["lat"].to_numpy(), _WORKER["grid_config"])
+    summary.update(
+        samples=stats["samples"], rows=stats["rows"], duration_h=_round(stats["duration_sec"] / 3600.0, 2),
+        rssi_avg=_round(stats["rssi_avg"]), rssi_tw_avg=_round(stats["rssi_tw_avg"]),
+        tx_avg=_round(stats["tx_avg"]), tx_tw_avg=_round(stats["tx_tw_avg"]),
+        cells_visited=len(set(zip(np.asarray(ix).tolist(), np.asarray(iy).tolist()))),
+        handovers=sum(h["count"] for h in mikrotik_storage.query_handovers(conn, first_id, last_id, rig_id)),
+        first_ts=df["timestamp"].min().strftime(TIMESTAMP_FORMAT) if not df.empty else None,
+        last_ts=df["timestamp"].max().strftime(TIMESTAMP_FORMAT) if not df.empty else None,
+        **_quality_shares(df)
+    )
+
+    _write_csv(os.path.join(shift_dir, f"{slug}_hourly.csv"), HOURLY_FIELDS, _hourly(df))
+    _plot_rig_map(df, rig_id, shift_date, os.path.join(shift_dir, f"{slug}_map.png"))
+    _plot_rig_trend(conn, rig_id, shift_date, _WORKER["reports_config"]["trend_width_px"],
+                    os.path.join(shift_dir, f"{slug}_trend.png"))
+    return summary
+
+
+def _rtk_summary(conn, station, start_time, end_time):
+    """Сводка RTK за смену: статусы, качество потока и простои по событиям watchdog."""
+    summary = {"status_rows": 0, "ok_pct": None, "quality_avg": None, "outages": 0, "outage_sec": 0.0,
+               "outage_max_sec": 0.0}
+    if conn is None:
+        return summary, []
+    window = (station, start_time.strftime(TIMESTAMP_FORMAT), end_time.strftime(TIMESTAMP_FORMAT))
+    try:
+        rows, ok_rows, quality = conn.execute(
+            """SELECT COUNT(*), SUM(status = 'OK'), AVG(stream_quality_pct)
+               FROM rtk_status WHERE station = ? AND timestamp >= ? AND timestamp < ?""",
+            window
+        ).fetchone()
+        outages = conn.execute(
+            """SELECT outage_start, timestamp, duration_ms, reason FROM rtk_events
+               WHERE station = ? AND event = ? AND timestamp >= ? AND timestamp < ?
+               ORDER BY timestamp""",
+            (window[0], rtk_storage.EVENT_OUTAGE_END) + window[1:]
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return summary, []
+    durations = [(row[2] or 0) / 1000.0 for row in outages]
+    summary.update(status_rows=rows, ok_pct=_round(100.0 * ok_rows / rows) if rows else None,
+                   quality_avg=_round(quality), outages=len(outages), outage_sec=_round(sum(durations)),
+                   outage_max_sec=_round(max(durations, default=0.0)))
+    return summary, outages
+
+
+def _ap_report(conn, shift_date, shift_dir):
+    """
+    Покрытие по точкам доступа: ap_coverage.csv, карта каждой AP и handovers.csv.
+    Возвращает (строки AP_FIELDS, число переключений); без ap_id в данных - ([], 0).
+    """
+    first_id, last_id = shift_calendar.get_calendar().day_id_range(shift_date)
+    aps = [ap for ap in mikrotik_storage.query_ap_coverage(conn, first_id, last_id) if ap["ap_id"] is not None]
+    if not aps:
+        return [], 0
+    rows = []
+    for ap in aps:
+        rows.append({"ap_id": ap["ap_id"], "rigs": ap["rigs"], "samples": ap["samples"],
+                     "duration_h": _round((ap["duration_sec"] or 0) / 3600.0, 2),
+                     "rssi_tw_avg": _round(ap["rssi_tw_avg"]), "rssi_min": ap["rssi_min"]})
+        points = pd.DataFrame(mikrotik_storage.query_ap_points(conn, ap["ap_id"], first_id, last_id),
+                              columns=["lon", "lat", "rssi"])
+        _plot_rig_map(points, f"AP {ap['ap_id']}", shift_date,
+                      os.path.join(shift_dir, f"ap_{_slug(ap['ap_id'])}_map.png"))
+    _write_csv(os.path.join(shift_dir, "ap_coverage.csv"), AP_FIELDS,
+               [tuple(row[field] for field in AP_FIELDS) for row in rows])
+    handovers = mikrotik_storage.query_handovers(conn, first_id, last_id)
+    _write_csv(os.path.join(shift_dir, "handovers.csv"), HANDOVER_FIELDS,
+               [tuple(h[field] for field in HANDOVER_FIELDS) for h in handovers])
+    return rows, sum(h["count"] for h in handovers)
+
+
+def shift_report(shift_date, shift_dir):
+    """Задача пула: поверхность покрытия с зонами (из кэша), покрытие по AP и сводка RTK смены."""
+    conn = _connection(data_access.DB_MIKROTIK)
+    grid_config = _WORKER["grid_config"]
+    raster = coverage_grid.load_cached(shift_date, grid_config)
+    if raster is None and conn is not None:
+        # Кэша нет (удален или сменились настройки сетки): пересчет по coverage_cells
+        raster = coverage_grid.get_surface(conn, shift_date, grid_config, rollup=False)
+    if raster is None:
+        raster = coverage_grid.CoverageRaster(0, 0, np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)))
+    holes = coverage_holes.read_holes(conn, shift_date) if conn is not None else []
+    visualization.draw_surface(raster, holes, grid_config, shift_date, os.path.join(shift_dir, "surface.png"))
+    _write_csv(os.path.join(shift_dir, "holes.csv"), HOLES_FIELDS,
+               [tuple(hole.get(field) for field in HOLES_FIELDS) for hole in holes])
+
+    start_time, end_time = archive_catalog.shift_bounds(shift_date)
+    aps, handovers = _ap_report(conn, shift_date, shift_dir) if conn is not None else ([], 0)
+    rtk, outages = _rtk_summary(_connection(data_access.DB_RTK), _WORKER["station"], start_time, end_time)
+    _write_csv(os.path.join(shift_dir, "rtk_outages.csv"), ("outage_start", "outage_end", "duration_ms", "reason"), outages)
+    return {"shift_date": shift_date, "holes": len(holes),
+            "holes_area_m2": _round(sum(hole["area_m2"] for hole in holes), 0),
+            "cells_sampled": int((raster.count > 0).sum()), "rtk": rtk, "aps": aps, "handovers": handovers}
+
+# ------------------------------------------------------------------------------
+# 3. СБОРКА НАБОРОВ HTML/CSV
+# ------------------------------------------------------------------------------
+
+def _cell(value):
+    return "" if value is None else html.escape(str(value))
+
+
+def _summary_table(rows, link_shift=False, fields=SUMMARY_FIELDS):
+    header = "".join(f"<th>{field}</th>" for field in fields)
+    body = []
+    for row in rows:
+        cells = []
+        for field in fields:
+            value = _cell(row.get(field))
+            if field == "shift_date" and link_shift:
+                value = f'<a href="{value}/index.html">{value}</a>'
+            cells.append(f"<td>{value}</td>")
+        body.append("<tr>" + "".join(cells) + "</tr>")
+    return f"<table><tr>{header}</tr>{''.join(body)}</table>"
+
+
+HTML_STYLE = ("<style>body{font-family:sans-serif;margin:20px}table{border-collapse:collapse}"
+              "td,th{border:1px solid #999;padding:3px 6px;font-size:12px}img{max-width:100%}</style>")
+
+
+def write_shift_bundle(shift_dir, shift_summary, rig_summaries, failed=()):
+    """
+    index.html, summary.csv и report.json смены.
+
+    failed - установки, отчет по которым завершился ошибкой: они попадают в
+    report.json, и такая смена не считается собранной (is_up_to_date).
+    """
+    shift_date = shift_summary["shift_date"]
+    _write_csv(os.path.join(shift_dir, "summary.csv"), SUMMARY_FIELDS,
+               [tuple(row.get(field) for field in SUMMARY_FIELDS) for row in rig_summaries])
+    rtk = shift_summary["rtk"]
+    parts = [
+        f"<html><head><meta charset='utf-8'><title>Смена {shift_date}</title>{HTML_STYLE}</head><body>",
+        f"<h1>Отчет по смене {shift_date}</h1>",
+        f"<p>Ячеек с замерами: {shift_summary['cells_sampled']}; зон слабого сигнала: {shift_summary['holes']} "
+        f"({_cell(shift_summary['holes_area_m2'])} м²) - <a href='holes.csv'>holes.csv</a></p>",
+        f"<p>RTK: статус OK {_cell(rtk['ok_pct'])}% ({rtk['status_rows']} проверок), качество потока "
+        f"{_cell(rtk['quality_avg'])}%, простоев {rtk['outages']} (всего {_cell(rtk['outage_sec'])} с, "
+        f"макс. {_cell(rtk['outage_max_sec'])} с) - <a href='rtk_outages.csv'>rtk_outages.csv</a></p>",
+        "<h2>Установки</h2>", _summary_table(rig_summaries), "<p><a href='summary.csv'>summary.csv</a></p>",
+    ]
+    if failed:
+        parts.append(f"<p>Ошибка построения отчета: {_cell(', '.join(map(str, failed)))}</p>")
+    parts.append("<h2>Покрытие карьера</h2><img src='surface.png'>")
+    if shift_summary.get("aps"):
+        parts.append(f"<h2>Точки доступа</h2>{_summary_table(shift_summary['aps'], fields=AP_FIELDS)}"
+                     f"<p>Переключений между AP: {shift_summary['handovers']} - <a href='handovers.csv'>handovers.csv</a>, "
+                     f"<a href='ap_coverage.csv'>ap_coverage.csv</a></p>")
+        for ap in shift_summary["aps"]:
+            parts.append(f"<img src='ap_{_slug(ap['ap_id'])}_map.png'>")
+    for row in rig_summaries:
+        slug = _slug(row["rig_id"])
+        parts.append(f"<h2>{html.escape(str(row['rig_id']))}</h2>"
+                     f"<p><a href='{slug}_hourly.csv'>Почасовая статистика (CSV)</a></p>"
+                     f"<img src='{slug}_trend.png'><br><img src='{slug}_map.png'>")
+    parts.append("</body></html>")
+    with open(os.path.join(shift_dir, "index.html"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(parts))
+
+    manifest = {"generated_at": datetime.now().strftime(TIMESTAMP_FORMAT), "shift": shift_summary,
+                "rigs": [row["rig_id"] for row in rig_summaries], "failed": list(failed),
+                "summaries": rig_summaries}
+    with open(os.path.join(shift_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+def write_index(out_dir, manifests):
+    """Общие index.html и summary.csv по всем сменам периода."""
+    rows = [row for manifest in manifests for row in manifest["summaries"]]
+    _write_csv(os.path.join(out_dir, "summary.csv"), SUMMARY_FIELDS,
+               [tuple(row.get(field) for field in SUMMARY_FIELDS) for row in rows])
+    shift_rows = "".join(
+        f"<tr><td><a href='{m['shift']['shift_date']}/index.html'>{m['shift']['shift_date']}</a></td>"
+        f"<td>{m['shift']['holes']}</td><td>{_cell(m['shift']['rtk']['ok_pct'])}</td>"
+        f"<td>{m['shift']['rtk']['outages']}</td><td>{m['generated_at']}</td></tr>"
+        for m in manifests
+    )
+    with open(os.path.join(out_dir, "index.html"), 'w', encoding='utf-8') as f:
+        f.write(f"<html><head><meta charset='utf-8'><title>Отчеты по сменам</title>{HTML_STYLE}</head><body>"
+                f"<h1>Отчеты по сменам</h1><table><tr><th>Смена</th><th>Зон слабого сигнала</th>"
+                f"<th>RTK OK, %</th><th>Простоев RTK</th><th>Собран</th></tr>{shift_rows}</table>"
+                f"<h2>Установки</h2>{_summary_table(rows, link_shift=True)}"
+                f"<p><a href='summary.csv'>summary.csv</a></p></body></html>")
+
+# ------------------------------------------------------------------------------
+# 4. ЗАПУСК
+# ------------------------------------------------------------------------------
+
+def generate_reports(period, rigs=None, out_dir=None, workers=None, force=False, config_file=CONFIG_FILE):
+    """
+    Отчеты за период ('YYYY-MM-DD' или 'A..B') по установкам rigs (по умолчанию
+    все из config.json). Возвращает список report.json смен периода.
+    """
+    config = _load_config(config_file)
+    storage = config.get("data_storage", {})
+    reports_config = resolve_reports_config(storage.get("reports"))
+    grid_config = coverage_grid.resolve_grid_config(storage.get("coverage_grid"))
+    access_config = data_access.resolve_access_config(storage.get("data_access"))
+    db_paths = data_access.resolve_db_paths(config)
+    out_dir = out_dir or reports_config["out_dir"]
+    workers = workers or reports_config["workers"] or os.cpu_count() or 1
+    station = rtk_storage.station_key(config.get("rtk_base_station", {}))
+    shifts = coverage_diff.period_shifts(period)
+
+    conn = sqlite3.connect(db_paths[data_access.DB_MIKROTIK])
+    try:
+        rigs = list(rigs or default_rigs(config, conn, shifts))
+        pending = shifts if force else [s for s in shifts if not is_up_to_date(conn, s, rigs, out_dir)]
+        if pending:
+            prepare(conn, pending, rigs, grid_config)
+    finally:
+        conn.close()
+    print(f"[REPORT] Смен в периоде: {len(shifts)}, строится: {len(pending)}, установок: {len(rigs)}, процессов: {workers}.")
+
+    results = {shift_date: {"shift": None, "rigs": {}, "failed": []} for shift_date in pending}
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db_paths, grid_config, reports_config, station,
+                                           access_config["mmap_mb"])) as pool:
+            futures = {}
+            for shift_date in pending:
+                shift_dir = os.path.join(out_dir, shift_date)
+                os.makedirs(shift_dir, exist_ok=True)
+                futures[pool.submit(shift_report, shift_date, shift_dir)] = (shift_date, None)
+                for rig_id in rigs:
+                    futures[pool.submit(rig_report, shift_date, rig_id, shift_dir)] = (shift_date, rig_id)
+            for future in as_completed(futures):
+                shift_date, rig_id = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"[ERROR] Отчет {shift_date} {rig_id or '(смена)'}: {e}")
+                    result = None
+                    if rig_id is not None:
+                        result = {"shift_date": shift_date, "rig_id": rig_id}
+                        results[shift_date]["failed"].append(rig_id)
+                if rig_id is None:
+                    results[shift_date]["shift"] = result
+                else:
+                    results[shift_date]["rigs"][rig_id] = result
+                done = results[shift_date]
+                if done["shift"] is not None and len(done["rigs"]) == len(rigs):
+                    write_shift_bundle(os.path.join(out_dir, shift_date), done["shift"],
+                                       [done["rigs"][rig] for rig in rigs], done["failed"])
+                    if done["failed"]:
+                        print(f"[REPORT] Смена {shift_date} собрана с ошибками: {', '.join(done['failed'])}.")
+                    else:
+                        print(f"[REPORT] Смена {shift_date} готова.")
+
+    manifests = []
+    for shift_date in shifts:
+        try:
+            with open(os.path.join(out_dir, shift_date, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                manifests.append(json.load(f))
+        except (OSError, ValueError):
+            print(f"[WARN] Нет отчета смены {shift_date}.")
+    os.makedirs(out_dir, exist_ok=True)
+    write_index(out_dir, manifests)
+    return manifests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетные отчеты по установкам и сменам (HTML/PNG/CSV)")
+    parser.add_argument('period', help="Смена YYYY-MM-DD или период YYYY-MM-DD..YYYY-MM-DD")
+    parser.add_argument('--rigs', help="Установки через запятую (по умолчанию - все из config.json)")
+    parser.add_argument('--out', help="Папка отчетов (по умолчанию data_storage.reports.out_dir)")
+    parser.add_argument('--workers', type=int, help="Число процессов (по умолчанию - по числу ядер)")
+    parser.add_argument('--force', action='store_true', help="Построить заново и закрытые смены")
+    args = parser.parse_args()
+
+    started = datetime.now()
+    rig_list = [rig.strip() for rig in args.rigs.split(",") if rig.strip()] if args.rigs else None
+    built = generate_reports(args.period, rig_list, args.out, args.workers, args.force)
+    print(f"[REPORT] Готово: {len(built)} смен за {(datetime.now() - started).total_seconds():.1f} с.")
@@ -0,0 +1,351 @@
+# ==============================================================================
+# SNMP_POLLER.PY - Чтение registration-table точки доступа через SNMP GETBULK
+# ==============================================================================
+# Таблица MIKROTIK-MIB mtxrWlRtabTable (1.3.6.1.4.1.14988.1.1.1.2) индексируется
+# MAC-адресом клиента (6 байт) и номером интерфейса, поэтому колонки уровня
+# сигнала и скоростей читаются без колонки адреса. Все колонки идут в одном
+# GETBULK-запросе; обход нескольких агентов ведется параллельно через один
+# неблокирующий UDP-сокет (запросы различаются request-id). Один обход дает
+# замеры сразу по всем CPE точки доступа.
+#
+# Используется минимальный кодер/декодер BER для SNMPv2c (без внешних пакетов).
+# ==============================================================================
+import itertools
+import random
+import select
+import socket
+import time
+
+# --- MIKROTIK-MIB: колонки mtxrWlRtabEntry ---
+MTXR_WL_RTAB_ENTRY = (1, 3, 6, 1, 4, 1, 14988, 1, 1, 1, 2, 1)
+RTAB_COLUMNS = {
+    "strength": MTXR_WL_RTAB_ENTRY + (3,),   # dBm, Integer32
+    "tx_rate": MTXR_WL_RTAB_ENTRY + (8,),    # бит/с, Gauge32
+    "rx_rate": MTXR_WL_RTAB_ENTRY + (9,),    # бит/с, Gauge32
+}
+
+# Настройки по умолчанию (перекрываются script_collector.snmp в config.json)
+DEFAULT_SNMP = {
+    "community": "public",
+    "port": 161,
+    "max_repetitions": 25,   # Строк таблицы в одном ответе
+    "timeout_sec": 1.0,      # Ожидание ответа на один запрос
+    "retries": 2,
+    "cache_sec": 5.0         # Один обход обслуживает все CPE в пределах этого времени
+}
+
+
+class SnmpError(Exception):
+    """Ошибка протокола SNMP или отсутствие ответа агента."""
+
+
+def resolve_snmp_config(config_section):
+    """Объединяет настройки SNMP из config.json со значениями по умолчанию."""
+    snmp_config = dict(DEFAULT_SNMP)
+    snmp_config.update(config_section or {})
+    return snmp_config
+
+# ------------------------------------------------------------------------------
+# 1. BER (ASN.1) ДЛЯ SNMPv2c
+# ------------------------------------------------------------------------------
+
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_GET_RESPONSE = 0xA2
+TAG_GET_BULK = 0xA5
+# Исключения varbind (RFC 3416)
+TAG_NO_SUCH_OBJECT = 0x80
+TAG_NO_SUCH_INSTANCE = 0x81
+TAG_END_OF_MIB_VIEW = 0x82
+UNSIGNED_TAGS = (0x41, 0x42, 0x43, 0x46)   # Counter32, Gauge32, TimeTicks, Counter64
+
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def _tlv(tag, value):
+    return bytes([tag]) + _encode_length(len(value)) + value
+
+
+def _encode_integer(value):
+    size = max(1, (value + (value < 0)).bit_length() // 8 + 1)
+    return _tlv(TAG_INTEGER, value.to_bytes(size, 'big', signed=True))
+
+
+def _encode_oid(oid):
+    body = bytearray([oid[0] * 40 + oid[1]])
+    for sub in oid[2:]:
+        chunk = [sub & 0x7F]
+        sub >>= 7
+        while sub:
+            chunk.append(0x80 | (sub & 0x7F))
+            sub >>= 7
+        body += bytes(reversed(chunk))
+    return _tlv(TAG_OID, bytes(body))
+
+
+def build_getbulk(community, request_id, oids, max_repetitions, non_repeaters=0):
+    """GetBulkRequest (SNMPv2c) с varbind-ами oids."""
+    varbinds = b''.join(_tlv(TAG_SEQUENCE, _encode_oid(oid) + _tlv(TAG_NULL, b'')) for oid in oids)
+    pdu = _tlv(TAG_GET_BULK, _encode_integer(request_id) + _encode_integer(non_repeaters)
+               + _encode_integer(max_repetitions) + _tlv(TAG_SEQUENCE, varbinds))
+    return _tlv(TAG_SEQUENCE, _encode_integer(1) + _tlv(TAG_OCTET_STRING, community.encode()) + pdu)
+
+
+def _read_tlv(data, pos):
+    """(tag, начало значения, конец значения) элемента в позиции pos."""
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    if pos + length > len(data):
+        raise SnmpError("Усеченный пакет SNMP")
+    return tag, pos, pos + length
+
+
+def _decode_oid(raw):
+    oid = list(divmod(raw[0], 40)) if raw[0] < 80 else [2, raw[0] - 80]
+    sub = 0
+    for byte in raw[1:]:
+        sub = (sub << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            oid.append(sub)
+            sub = 0
+    return tuple(oid)
+
+
+def _decode_value(tag, raw):
+    if tag == TAG_INTEGER:
+        return int.from_bytes(raw, 'big', signed=True)
+    if tag in UNSIGNED_TAGS:
+        return int.from_bytes(raw, 'big')
+    if tag == TAG_OID:
+        return _decode_oid(raw)
+    if tag in (TAG_NULL, TAG_NO_SUCH_OBJECT, TAG_NO_SUCH_INSTANCE, TAG_END_OF_MIB_VIEW):
+        return None
+    return bytes(raw)
+
+
+def parse_response(data):
+    """
+    Разбирает GetResponse.
+
+    Возвращает (request_id, error_status, [(oid, tag, value), ...]).
+    """
+    _, pos, end = _read_tlv(data, 0)
+    _, _, pos = _read_tlv(data, pos)                 # version
+    _, _, pos = _read_tlv(data, pos)                 # community
+    tag, pos, end = _read_tlv(data, pos)
+    if tag != TAG_GET_RESPONSE:
+        raise SnmpError(f"Неожиданный тип PDU 0x{tag:02x}")
+    fields = []
+    for _ in range(3):                               # request-id, error-status, error-index
+        _, start, pos = _read_tlv(data, pos)
+        fields.append(int.from_bytes(data[start:pos], 'big', signed=True))
+    _, pos, end = _read_tlv(data, pos)
+    varbinds = []
+    while pos < end:
+        _, vb_pos, pos = _read_tlv(data, pos)
+        _, oid_start, vb_pos = _read_tlv(data, vb_pos)
+        value_tag, value_start, value_end = _read_tlv(data, vb_pos)
+        varbinds.append((_decode_oid(data[oid_start:vb_pos]), value_tag,
+                         _decode_value(value_tag, data[value_start:value_end])))
+    return fields[0], fields[1], varbinds
+
+# ------------------------------------------------------------------------------
+# 2. ПАРАЛЛЕЛЬНЫЙ ОБХОД ТАБЛИЦ (НЕБЛОКИРУЮЩИЙ UDP)
+# ------------------------------------------------------------------------------
+
+class _Walk:
+    """Состояние обхода колонок одного агента."""
+
+    def __init__(self, target, columns):
+        self.target = target
+        self.columns = list(columns)
+        self.cursor = list(columns)          # Последний полученный OID по каждой колонке
+        self.active = [True] * len(columns)
+        self.rows = {}                       # {(колонка, индекс): значение}
+        self.request_id = None
+        self.sent_at = 0.0
+        self.attempts = 0
+        self.error = None
+
+    def pending_oids(self):
+        return [oid for oid, active in zip(self.cursor, self.active) if active]
+
+    def consume(self, varbinds):
+        """Учитывает ответ. Ответ GETBULK - повторения по всем активным колонкам по очереди."""
+        active_idx = [i for i, active in enumerate(self.active) if active]
+        for n, (oid, tag, value) in enumerate(varbinds):
+            i = active_idx[n % len(active_idx)]
+            if not self.active[i]:
+                continue
+            column = self.columns[i]
+            if tag == TAG_END_OF_MIB_VIEW or oid[:len(column)] != column or oid <= self.cursor[i]:
+                self.active[i] = False
+                continue
+            self.rows[(i, oid[len(column):])] = value
+            self.cursor[i] = oid
+        return any(self.active)
+
+
+def _receive(sock, by_request, send):
+    """Обрабатывает один ответ: продолжает обход агента или завершает его."""
+    try:
+        data, _ = sock.recvfrom(65535)
+        request_id, error_status, varbinds = parse_response(data)
+    except (OSError, SnmpError, IndexError):
+        return
+    walk = by_request.pop(request_id, None)
+    if walk is None:
+        return                                       # Запоздалый ответ на повтор
+    walk.attempts = 0
+    if error_status:
+        walk.error = SnmpError(f"Агент {walk.target[0]}: error-status {error_status}")
+    elif varbinds and walk.consume(varbinds):
+        send(walk)
+
+
+def bulk_walk(targets, columns, snmp_config=None):
+    """
+    Обходит колонки columns на всех агентах targets одновременно.
+
+    targets - список (host, port). Возвращает {target: {индекс: [значения колонок]}};
+    для агента без ответа или с прерванным обходом (таймаут, error-status после
+    части строк) вместо таблицы возвращается исключение SnmpError.
+    """
+    config = resolve_snmp_config(snmp_config)
+    community, max_rep = config["community"], config["max_repetitions"]
+    walks = {target: _Walk(target, columns) for target in targets}
+    by_request = {}
+    request_ids = itertools.count(random.randint(1, 1 << 30))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+
+    def send(walk):
+        # Повтор идет с тем же request-id: запоздалый ответ на первую попытку тоже засчитывается
+        if walk.attempts == 0:
+            walk.request_id = next(request_ids) & 0x7FFFFFFF
+        by_request[walk.request_id] = walk
+        walk.sent_at = time.monotonic()
+        walk.attempts += 1
+        sock.sendto(build_getbulk(community, walk.request_id, walk.pending_oids(), max_rep), walk.target)
+
+    try:
+        # Первые запросы ко всем агентам уходят сразу, ответы обрабатываются по мере прихода
+        for walk in walks.values():
+            send(walk)
+        while by_request:
+            now = time.monotonic()
+            deadline = min(w.sent_at for w in by_request.values()) + config["timeout_sec"]
+            readable, _, _ = select.select([sock], [], [], max(0.0, deadline - now))
+            if readable:
+                _receive(sock, by_request, send)
+            # Таймаут: повторяем или сдаемся
+            now = time.monotonic()
+            for walk in [w for w in by_request.values() if now - w.sent_at >= config["timeout_sec"]]:
+                if walk.attempts > config["retries"]:
+                    by_request.pop(walk.request_id)
+                    walk.error = SnmpError(f"Агент {walk.target[0]} не ответил")
+                else:
+                    send(walk)
+    finally:
+        sock.close()
+
+    result = {}
+    for target, walk in walks.items():
+        if walk.error is not None:
+            # Обход, прерванный таймаутом или error-status, - неполная таблица: CPE,
+            # до которых он не дошел, выглядели бы отключенными. Такой результат - ошибка.
+            if walk.rows:
+                walk.error = SnmpError(f"{walk.error} (обход прерван, получено строк: {len(walk.rows)})")
+            result[target] = walk.error
+            continue
+        table = {}
+        for (i, index), value in walk.rows.items():
+            table.setdefault(index, [None] * len(columns))[i] = value
+        result[target] = table
+    return result
+
+# ------------------------------------------------------------------------------
+# 3. REGISTRATION-TABLE В ФОРМАТЕ КОЛЛЕКТОРА
+# ------------------------------------------------------------------------------
+
+def format_mac(index):
+    """Индекс строки mtxrWlRtab (6 октетов MAC + ifIndex) -> 'AA:BB:CC:DD:EE:FF'."""
+    return ':'.join(f"{octet:02X}" for octet in index[:6])
+
+
+def format_rate(bits_per_sec):
+    """Скорость в бит/с -> строка как в CLI ('54Mbps', '6.5Mbps')."""
+    if bits_per_sec is None:
+        return None
+    return f"{bits_per_sec / 1_000_000:g}Mbps"
+
+
+def registration_snapshots(hosts, snmp_config=None):
+    """
+    Registration-table нескольких точек доступа за один параллельный обход.
+
+    Возвращает {host: {MAC: {"RSSI", "TxRate", "RxRate", "Iface"}}} или
+    {host: SnmpError}, если агент не ответил или обход не завершился.
+    """
+    config = resolve_snmp_config(snmp_config)
+    names = list(RTAB_COLUMNS)
+    targets = {(host, config["port"]): host for host in hosts}
+    walked = bulk_walk(list(targets), [RTAB_COLUMNS[name] for name in names], config)
+
+    snapshots = {}
+    for target, table in walked.items():
+        if isinstance(table, SnmpError):
+            snapshots[targets[target]] = table
+            continue
+        clients = {}
+        for index, values in table.items():
+            row = dict(zip(names, values))
+            clients[format_mac(index)] = {
+                "RSSI": row["strength"],
+                "TxRate": format_rate(row["tx_rate"]),
+                "RxRate": format_rate(row["rx_rate"]),
+                "Iface": index[6] if len(index) > 6 else None,
+            }
+        snapshots[targets[target]] = clients
+    return snapshots
+
+
+class RegistrationCache:
+    """
+    Снимок registration-table, общий для всех CPE в пределах cache_sec.
+
+    Первый запрос после истечения срока запускает обход, остальные получают
+    уже готовый снимок - так одна прогулка по таблице покрывает весь тик.
+    """
+
+    def __init__(self, host, snmp_config=None):
+        self.host = host
+        self.config = resolve_snmp_config(snmp_config)
+        self._snapshot = None
+        self._taken_at = 0.0
+
+    def get(self):
+        if self._snapshot is None or time.monotonic() - self._taken_at >= self.config["cache_sec"]:
+            snapshot = registration_snapshots([self.host], self.config)[self.host]
+            if isinstance(snapshot, SnmpError):
+                raise snapshot
+            self._snapshot, self._taken_at = snapshot, time.monotonic()
+        return self._snapshot
+
+    def lookup(self, client_mac):
+        """Строка клиента {"RSSI", "TxRate", "RxRate", ...} или None."""
+        return self.get().get(client_mac.upper())
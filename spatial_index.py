@@ -0,0 +1,211 @@
+# ==============================================================================
+# SPATIAL_INDEX.PY - Пространственный индекс замеров (SQLite R*Tree)
+# ==============================================================================
+# Виртуальная таблица mikrotik_log_rtree хранит координаты каждой строки
+# mikrotik_log (id строки = id в R*Tree). Индекс поддерживается триггерами,
+# поэтому его не нужно обновлять ни в сборщике, ни в drainer журнала, ни в
+# импорте CSV. Запросы по радиусу, прямоугольнику, многоугольнику и ближайшему
+# замеру сначала отбирают кандидатов по R*Tree, а затем уточняют расстояние по
+# точным координатам из mikrotik_log (R*Tree хранит float32 с округлением
+# наружу, поэтому кандидаты не теряются).
+#
+# Если SQLite собран без модуля rtree, запросы работают по колонкам
+# longitude/latitude напрямую (медленнее, но с тем же результатом).
+# ==============================================================================
+import math
+import sqlite3
+
+import mikrotik_storage
+
+RTREE_TABLE = "mikrotik_log_rtree"
+
+# Метров в градусе (то же приближение, что и mikrotik_storage.distance_m)
+METERS_PER_DEG_LAT = 110540.0
+METERS_PER_DEG_LON = 111320.0
+
+SAMPLE_FIELDS = ("id", "timestamp", "rig_id", "longitude", "latitude", "rssi", "tx_rate", "rx_rate", "ap_id",
+                 "sample_count", "rssi_sum")
+
+# ------------------------------------------------------------------------------
+# 1. СОЗДАНИЕ И СИНХРОНИЗАЦИЯ
+# ------------------------------------------------------------------------------
+
+def initialize_index(cursor):
+    """
+    Создает R*Tree, триггеры синхронизации и дозаполняет индекс строками,
+    записанными до его появления. Вызывается из mikrotik_storage.initialize_db.
+    Возвращает False, если модуль rtree недоступен.
+    """
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE}
+            USING rtree(id, min_lon, max_lon, min_lat, max_lat)
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] Пространственный индекс недоступен ({e}); запросы по координатам без R*Tree.")
+        return False
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_mikrotik_log_rtree_insert
+        AFTER INSERT ON mikrotik_log
+        WHEN NEW.longitude IS NOT NULL AND NEW.latitude IS NOT NULL
+        BEGIN
+            INSERT INTO {RTREE_TABLE} VALUES (NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_mikrotik_log_rtree_update
+        AFTER UPDATE OF longitude, latitude ON mikrotik_log
+        BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+            INSERT INTO {RTREE_TABLE}
+                SELECT NEW.id, NEW.longitude, NEW.longitude, NEW.latitude, NEW.latitude
+                WHERE NEW.longitude IS NOT NULL AND NEW.latitude IS NOT NULL;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_mikrotik_log_rtree_delete
+        AFTER DELETE ON mikrotik_log
+        BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+        END
+    """)
+
+    # id в mikrotik_log растут (AUTOINCREMENT), а новые строки индексируют триггеры,
+    # поэтому дозаполнение просматривает только строки после последней проиндексированной
+    cursor.execute(f"""
+        INSERT INTO {RTREE_TABLE}
+        SELECT id, longitude, longitude, latitude, latitude
+        FROM mikrotik_log
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL
+          AND id > (SELECT COALESCE(MAX(id), 0) FROM {RTREE_TABLE})
+    """)
+    return True
+
+
+def has_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (RTREE_TABLE,)
+    ).fetchone() is not None
+
+# ------------------------------------------------------------------------------
+# 2. ГЕОМЕТРИЯ
+# ------------------------------------------------------------------------------
+
+def radius_bbox(lon, lat, radius_m):
+    """Прямоугольник (min_lon, min_lat, max_lon, max_lat), описанный вокруг круга радиуса radius_m."""
+    dlat = radius_m / METERS_PER_DEG_LAT
+    dlon = radius_m / (METERS_PER_DEG_LON * max(math.cos(math.radians(lat)), 1e-6))
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+def point_in_polygon(lon, lat, polygon):
+    """Попадание точки в многоугольник [(lon, lat), ...] (метод лучей)."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+# ------------------------------------------------------------------------------
+# 3. ЗАПРОСЫ
+# ------------------------------------------------------------------------------
+
+def _candidates(conn, bbox, start_time=None, end_time=None, rig_id=None):
+    """Строки mikrotik_log внутри прямоугольника (с фильтром по времени и установке)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    columns = ", ".join("l." + field for field in SAMPLE_FIELDS)
+    # Точная проверка по колонкам нужна и с R*Tree: он округляет границы наружу
+    sql = (f"SELECT {columns} FROM mikrotik_log l "
+           "WHERE l.longitude BETWEEN ? AND ? AND l.latitude BETWEEN ? AND ?")
+    params = [min_lon, max_lon, min_lat, max_lat]
+    if has_index(conn):
+        sql = (f"SELECT {columns} FROM {RTREE_TABLE} r JOIN mikrotik_log l ON l.id = r.id "
+               "WHERE r.max_lon >= ? AND r.min_lon <= ? AND r.max_lat >= ? AND r.min_lat <= ? "
+               "AND l.longitude BETWEEN ? AND ? AND l.latitude BETWEEN ? AND ?")
+        params = [min_lon, max_lon, min_lat, max_lat] + params
+    if start_time is not None:
+        sql += " AND l.timestamp >= ?"
+        params.append(start_time.strftime(mikrotik_storage.TIMESTAMP_FORMAT))
+    if end_time is not None:
+        sql += " AND l.timestamp < ?"
+        params.append(end_time.strftime(mikrotik_storage.TIMESTAMP_FORMAT))
+    if rig_id is not None:
+        sql += " AND l.rig_id = ?"
+        params.append(rig_id)
+    return [dict(zip(SAMPLE_FIELDS, row)) for row in conn.execute(sql, params)]
+
+
+def query_bbox(conn, min_lon, min_lat, max_lon, max_lat, start_time=None, end_time=None, rig_id=None):
+    """Замеры внутри прямоугольника (список dict с полями SAMPLE_FIELDS)."""
+    return _candidates(conn, (min_lon, min_lat, max_lon, max_lat), start_time, end_time, rig_id)
+
+
+def query_radius(conn, lon, lat, radius_m, start_time=None, end_time=None, rig_id=None):
+    """Замеры не дальше radius_m от точки, по возрастанию расстояния (поле distance_m)."""
+    result = []
+    for sample in _candidates(conn, radius_bbox(lon, lat, radius_m), start_time, end_time, rig_id):
+        distance = mikrotik_storage.distance_m(lon, lat, sample["longitude"], sample["latitude"])
+        if distance <= radius_m:
+            sample["distance_m"] = distance
+            result.append(sample)
+    result.sort(key=lambda sample: sample["distance_m"])
+    return result
+
+
+def query_polygon(conn, polygon, start_time=None, end_time=None, rig_id=None):
+    """Замеры внутри многоугольника [(lon, lat), ...]."""
+    lons = [point[0] for point in polygon]
+    lats = [point[1] for point in polygon]
+    candidates = _candidates(conn, (min(lons), min(lats), max(lons), max(lats)), start_time, end_time, rig_id)
+    return [s for s in candidates if point_in_polygon(s["longitude"], s["latitude"], polygon)]
+
+
+def query_nearest(conn, lon, lat, k=1, start_time=None, end_time=None, rig_id=None,
+                  initial_radius_m=25.0, max_radius_m=5000.0):
+    """
+    k ближайших замеров к точке (не дальше max_radius_m).
+
+    R*Tree не умеет искать ближайших напрямую, поэтому радиус поиска
+    увеличивается в 4 раза, пока в круге не окажется k замеров.
+    """
+    radius = initial_radius_m
+    while True:
+        found = query_radius(conn, lon, lat, radius, start_time, end_time, rig_id)
+        if len(found) >= k or radius >= max_radius_m:
+            return found[:k]
+        radius = min(radius * 4, max_radius_m)
+
+
+def summarize(samples):
+    """
+    Сводка по замерам для точки на карте: count, rows, rssi_avg/min/max, rigs.
+
+    Строка mikrotik_log может быть сжатой (sample_count замеров), поэтому count и
+    rssi_avg считаются по sample_count и rssi_sum, как в query_wifi_stats;
+    rssi_min/max - по значениям строк.
+    """
+    count = rssi_count = 0
+    rssi_total = 0.0
+    for s in samples:
+        n = s.get("sample_count") or 1
+        count += n
+        rssi_sum = s.get("rssi_sum")
+        if rssi_sum is None and s["rssi"] is not None:
+            rssi_sum = s["rssi"] * n
+        if rssi_sum is not None:
+            rssi_total += rssi_sum
+            rssi_count += n
+    rssi = [s["rssi"] for s in samples if s["rssi"] is not None]
+    return {
+        "count": count,
+        "rows": len(samples),
+        "rssi_avg": rssi_total / rssi_count if rssi_count else None,
+        "rssi_min": min(rssi) if rssi else None,
+        "rssi_max": max(rssi) if rssi else None,
+        "rigs": sorted({s["rig_id"] for s in samples}),
+    }
@@ -0,0 +1,424 @@
+# ==============================================================================
+# SPOOL_JOURNAL.PY - Журнал (spool) для записи замеров до загрузки в SQLite
+# ==============================================================================
+# Коллекторы сначала дописывают замер в append-only файл фиксированными записями,
+# а фоновый drainer пакетно переносит их в SQLite. Если БД заблокирована или
+# недоступна, данные копятся в журнале и догружаются после восстановления.
+#
+# Формат записи (RECORD_SIZE байт):
+#   заголовок <4sBBHQd: magic, версия, тип записи, длина payload, seq, время записи
+#   payload   JSON-массив значений строки (UTF-8), дополненный нулями
+#   crc32     контрольная сумма заголовка и payload
+# Недописанная (после сбоя) запись в хвосте не проходит проверку и отрезается.
+# Поврежденная запись внутри сегмента не обрывает чтение: записи выровнены по
+# RECORD_SIZE, поэтому она пропускается и переносится в <name>.rejected.jsonl.
+# ==============================================================================
+import glob
+import json
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# --- Константы формата ---
+SPOOL_MAGIC = b'SPL1'
+SPOOL_VERSION = 1
+RECORD_SIZE = 512
+HEADER = struct.Struct('<4sBBHQd')
+CRC = struct.Struct('<I')
+PAYLOAD_SIZE = RECORD_SIZE - HEADER.size - CRC.size
+
+# --- Типы записей ---
+KIND_MIKROTIK = 1       # Строка mikrotik_log (data_collector)
+KIND_RTK_STATUS = 2     # Строка rtk_status (rtk_storage.STATUS_FIELDS)
+KIND_RTK_EVENT = 4      # Событие потока rtk_events (watchdog)
+
+# Настройки по умолчанию (перекрываются data_storage.spool в config.json)
+DEFAULT_SPOOL = {
+    "enabled": True,
+    "dir": "spool",
+    "fsync_batch": 32,           # fsync после N записей...
+    "fsync_interval_sec": 1.0,   # ...или после указанного времени
+    "segment_records": 100000,   # Записей в одном файле-сегменте
+    "drain_interval_sec": 2.0,   # Период работы drainer
+    "drain_batch": 5000          # Записей в одной транзакции SQLite
+}
+
+
+def resolve_spool_config(config_section):
+    """Объединяет настройки spool из config.json со значениями по умолчанию."""
+    spool_config = dict(DEFAULT_SPOOL)
+    spool_config.update(config_section or {})
+    return spool_config
+
+# ------------------------------------------------------------------------------
+# 1. КОДИРОВАНИЕ ЗАПИСЕЙ
+# ------------------------------------------------------------------------------
+
+def encode_record(kind, seq, values, written_at=None):
+    """Упаковывает строку значений в запись фиксированного размера."""
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(payload) > PAYLOAD_SIZE:
+        raise ValueError(f"Запись spool слишком длинная: {len(payload)} > {PAYLOAD_SIZE} байт")
+    header = HEADER.pack(SPOOL_MAGIC, SPOOL_VERSION, kind, len(payload), seq,
+                         written_at if written_at is not None else time.time())
+    body = header + payload.ljust(PAYLOAD_SIZE, b'\x00')
+    return body + CRC.pack(zlib.crc32(body))
+
+
+def decode_record(record):
+    """Распаковывает запись. Возвращает (kind, seq, written_at, values) или None, если запись повреждена."""
+    if len(record) != RECORD_SIZE:
+        return None
+    body, (crc,) = record[:-CRC.size], CRC.unpack(record[-CRC.size:])
+    if zlib.crc32(body) != crc:
+        return None
+    magic, version, kind, length, seq, written_at = HEADER.unpack(body[:HEADER.size])
+    if magic != SPOOL_MAGIC or version != SPOOL_VERSION or length > PAYLOAD_SIZE:
+        return None
+    try:
+        values = json.loads(body[HEADER.size:HEADER.size + length].decode('utf-8'))
+    except ValueError:
+        return None
+    return kind, seq, written_at, values
+
+
+def iter_records(path, offset=0):
+    """
+    Читает записи сегмента начиная со смещения offset.
+
+    Возвращает (смещение следующей записи, kind, seq, values). Для поврежденной
+    записи полного размера kind и seq - None, values - ее байты: следующие записи
+    читаются дальше. Останавливается на неполной записи (недописанный хвост).
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            record = f.read(RECORD_SIZE)
+            if len(record) < RECORD_SIZE:
+                return
+            offset += RECORD_SIZE
+            decoded = decode_record(record)
+            if decoded is None:
+                yield offset, None, None, record
+                continue
+            kind, seq, _, values = decoded
+            yield offset, kind, seq, values
+
+
+def _segment_paths(spool_dir, name):
+    """Сегменты журнала в порядке записи."""
+    return sorted(glob.glob(os.path.join(spool_dir, f"{name}.*.spool")))
+
+
+def _segment_path(spool_dir, name, number):
+    return os.path.join(spool_dir, f"{name}.{number:08d}.spool")
+
+
+def _segment_number(path):
+    return int(os.path.basename(path).rsplit('.', 2)[-2])
+
+# ------------------------------------------------------------------------------
+# 2. ЗАПИСЬ В ЖУРНАЛ
+# ------------------------------------------------------------------------------
+
+class SpoolWriter:
+    """Append-only запись в журнал с пакетным fsync и ротацией сегментов."""
+
+    def __init__(self, name, spool_config=None):
+        self.name = name
+        self.config = resolve_spool_config(spool_config)
+        self.spool_dir = self.config["dir"]
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._open_last_segment()
+
+    def _open_last_segment(self):
+        """
+        Открывает последний сегмент. Отрезается только хвост после последней
+        целой записи (недописанное при сбое); поврежденные записи перед ней
+        остаются на месте - drainer пропустит их и перенесет в карантин.
+        """
+        segments = _segment_paths(self.spool_dir, self.name)
+        self.segment = _segment_number(segments[-1]) if segments else 0
+        path = _segment_path(self.spool_dir, self.name, self.segment)
+
+        valid_end, self.seq, corrupt = 0, 0, []
+        if os.path.exists(path):
+            for end, kind, seq, _ in iter_records(path):
+                if kind is None:
+                    corrupt.append(end)
+                    continue
+                valid_end, self.seq = end, seq
+            corrupt = [end for end in corrupt if end < valid_end]
+            if corrupt:
+                print(f"[SPOOL] {path}: поврежденных записей внутри сегмента: {len(corrupt)} (будут пропущены при загрузке).")
+            if os.path.getsize(path) != valid_end:
+                print(f"[SPOOL] {path}: отрезан недописанный хвост ({os.path.getsize(path) - valid_end} байт).")
+        self.segment_count = valid_end // RECORD_SIZE
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        os.ftruncate(self._fd, valid_end)
+        os.lseek(self._fd, valid_end, os.SEEK_SET)
+
+    def _rotate(self):
+        self._sync()
+        os.close(self._fd)
+        self.segment += 1
+        self.segment_count = 0
+        path = _segment_path(self.spool_dir, self.name, self.segment)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._fd)
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, kind, values):
+        """Дописывает строку в журнал. Запись целиком уходит одним write()."""
+        with self._lock:
+            if self.segment_count >= self.config["segment_records"]:
+                self._rotate()
+            self.seq += 1
+            os.write(self._fd, encode_record(kind, self.seq, values))
+            self.segment_count += 1
+            self._unsynced += 1
+            if (self._unsynced >= self.config["fsync_batch"]
+                    or time.monotonic() - self._last_sync >= self.config["fsync_interval_sec"]):
+                self._sync()
+
+    def flush(self):
+        """Принудительный fsync (например, при остановке сервиса)."""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                self._sync()
+                os.close(self._fd)
+                self._fd = None
+
+# ------------------------------------------------------------------------------
+# 3. ЗАГРУЗКА ЖУРНАЛА В SQLITE (DRAINER)
+# ------------------------------------------------------------------------------
+
+def _ensure_offsets_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS spool_offsets (
+            name TEXT PRIMARY KEY,
+            segment INTEGER NOT NULL,
+            offset INTEGER NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def drain_spool(name, db_path, handlers, spool_config=None, on_error=None):
+    """
+    Переносит накопленные записи журнала name в db_path.
+
+    handlers - {kind: функция(cursor, values)}. Позиция чтения хранится в таблице
+    spool_offsets той же БД и обновляется в одной транзакции с данными, поэтому
+    каждая запись загружается ровно один раз. Если БД недоступна (OperationalError),
+    транзакция откатывается, и записи повторяются в следующий раз. Запись, на
+    которой падает обработчик (неверные значения), откатывается до точки
+    сохранения, переносится в <name>.rejected.jsonl и пропускается - иначе
+    журнал остановился бы на ней навсегда; так же пропускается запись с неверной
+    CRC. on_error() вызывается при каждом откате (сбросить состояние
+    обработчиков, например deadband). Закрытый сегмент удаляется, только когда
+    позиция чтения дошла до его конца. Возвращает число загруженных записей.
+    """
+    config = resolve_spool_config(spool_config)
+    segments = _segment_paths(config["dir"], name)
+    if not segments:
+        return 0
+
+    loaded = 0
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        _ensure_offsets_table(conn)
+        row = conn.execute("SELECT segment, offset FROM spool_offsets WHERE name = ?", (name,)).fetchone()
+        done_segment, done_offset = row if row else (-1, 0)
+
+        for path in segments:
+            number = _segment_number(path)
+            if number < done_segment:
+                os.remove(path)      # Загружен раньше, удаление было прервано
+                continue
+            offset = done_offset if number == done_segment else 0
+            closed = path != segments[-1]
+
+            cursor = conn.cursor()
+            pending = 0
+            for next_offset, kind, seq, values in iter_records(path, offset):
+                if kind is None:
+                    _quarantine_corrupt(name, config, path, offset, values)
+                else:
+                    handler = handlers.get(kind)
+                    if handler is not None:
+                        _apply_record(cursor, handler, name, config, kind, seq, values, on_error)
+                    pending += 1
+                offset = next_offset
+                if pending >= config["drain_batch"]:
+                    _commit_offset(cursor, name, number, offset)
+                    loaded += pending
+                    pending = 0
+            if closed and offset < os.path.getsize(path):
+                # Неполная запись в конце закрытого сегмента уже не будет дописана
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    tail = f.read()
+                _quarantine_corrupt(name, config, path, offset, tail)
+                offset += len(tail)
+            _commit_offset(cursor, name, number, offset)
+            loaded += pending
+            done_segment, done_offset = number, offset
+
+            # Закрытый сегмент прочитан до конца - больше не нужен
+            if closed:
+                os.remove(path)
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"[SPOOL] Загрузка '{name}' отложена, БД недоступна: {e}")
+        if on_error is not None:
+            on_error()
+    except Exception:
+        conn.rollback()
+        if on_error is not None:
+            on_error()
+        raise
+    finally:
+        conn.close()
+    return loaded
+
+
+def _apply_record(cursor, handler, name, config, kind, seq, values, on_error):
+    """
+    Применяет одну запись внутри точки сохранения. Ошибка данных (любая, кроме
+    недоступности БД) откатывает только эту запись и отправляет ее в карантин.
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN")
+    cursor.execute("SAVEPOINT spool_record")
+    try:
+        handler(cursor, values)
+    except sqlite3.OperationalError:
+        raise
+    except Exception as e:
+        cursor.execute("ROLLBACK TO spool_record")
+        cursor.execute("RELEASE spool_record")
+        _quarantine(name, config, kind, seq, values, e)
+        if on_error is not None:
+            on_error()
+        return
+    cursor.execute("RELEASE spool_record")
+
+
+def _rejected_path(name, config):
+    return os.path.join(config["dir"], f"{name}.rejected.jsonl")
+
+
+def _append_rejected(name, config, entry):
+    entry["rejected_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    with open(_rejected_path(name, config), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _quarantine(name, config, kind, seq, values, error):
+    """Дописывает отвергнутую запись в <dir>/<name>.rejected.jsonl."""
+    _append_rejected(name, config, {"kind": kind, "seq": seq, "values": values, "error": repr(error)})
+    print(f"[SPOOL] Запись {seq} журнала '{name}' отвергнута ({error}), перенесена в {_rejected_path(name, config)}.")
+
+
+def _quarantine_corrupt(name, config, path, offset, raw):
+    """Поврежденная (CRC, формат) или неполная запись сегмента - байты в карантин."""
+    segment = os.path.basename(path)
+    _append_rejected(name, config, {"segment": segment, "offset": offset, "raw": raw.hex(),
+                                    "error": "поврежденная запись" if len(raw) == RECORD_SIZE else "неполная запись"})
+    print(f"[SPOOL] {segment}@{offset}: поврежденная запись пропущена, перенесена в {_rejected_path(name, config)}.")
+
+
+def _commit_offset(cursor, name, segment, offset):
+    cursor.execute(
+        """INSERT INTO spool_offsets (name, segment, offset) VALUES (?, ?, ?)
+           ON CONFLICT(name) DO UPDATE SET segment = excluded.segment, offset = excluded.offset""",
+        (name, segment, offset)
+    )
+    cursor.connection.commit()
+
+
+def start_drainer(name, db_path, handlers, spool_config=None, on_error=None):
+    """Запускает фоновый поток, периодически загружающий журнал в БД."""
+    config = resolve_spool_config(spool_config)
+
+    def _loop():
+        while True:
+            try:
+                drain_spool(name, db_path, handlers, config, on_error)
+            except Exception as e:
+                print(f"[SPOOL] Ошибка загрузки журнала '{name}': {e}")
+            time.sleep(config["drain_interval_sec"])
+
+    thread = threading.Thread(target=_loop, name=f"spool-drainer-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def spool_backlog(name, db_path, spool_config=None):
+    """
+    Число незагруженных записей журнала: после позиции spool_offsets в ее
+    сегменте и все записи следующих сегментов (загруженное начало текущего
+    сегмента не считается - он удаляется только после ротации).
+    """
+    config = resolve_spool_config(spool_config)
+    done_segment, done_offset = -1, 0
+    if os.path.exists(db_path):
+        try:
+            conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=1)
+            try:
+                row = conn.execute("SELECT segment, offset FROM spool_offsets WHERE name = ?", (name,)).fetchone()
+            finally:
+                conn.close()
+            if row:
+                done_segment, done_offset = row
+        except sqlite3.Error:
+            pass
+
+    records = 0
+    for path in _segment_paths(config["dir"], name):
+        number = _segment_number(path)
+        if number < done_segment:
+            continue
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        records += max(size - (done_offset if number == done_segment else 0), 0) // RECORD_SIZE
+    return records
+
+# ------------------------------------------------------------------------------
+# 4. ЗАПУСК ВРУЧНУЮ: ДОГРУЗКА ЖУРНАЛОВ ПОСЛЕ СБОЯ
+# ------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python spool_journal.py <имя_журнала> [spool_dir]")
+        print("Пример: python spool_journal.py mikrotik_Rig_1")
+        sys.exit(1)
+
+    spool_name = sys.argv[1]
+    spool_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SPOOL["dir"]
+    segments = _segment_paths(spool_dir, spool_name)
+    kinds = [kind for p in segments for _, kind, _, _ in iter_records(p)]
+    corrupt = kinds.count(None)
+    print(f"Журнал '{spool_name}': сегментов {len(segments)}, записей {len(kinds) - corrupt}, поврежденных {corrupt}.")
+    print("Загрузка выполняется сервисом-владельцем журнала (data_collector, rtk_collector_service, rtcm_analyzer).")
@@ -0,0 +1,643 @@
+# ==============================================================================
+# SYNTHETIC_LOAD.PY - Синтетическая нагрузка: установки в карьере, RSSI, RTCM
+# ==============================================================================
+# Генератор данных для нагрузочных прогонов и бенчмарка (benchmark.py) вместо
+# get_gps_data_mock: много установок за длинный период в формате, который
+# пишут сервисы.
+#
+# - Карьер - круг радиуса pit_radius_m с уступами (benches); чем ближе к центру,
+#   тем глубже уступ. Установка бурит блоки (сетка скважин на уступе): стоит
+#   на скважине drill_min минут, переезжает на соседнюю, после блока едет на
+#   новый уступ со скоростью tram_mps.
+# - RSSI - логарифмическая модель потерь от расстояния до ближайшей по сигналу
+#   точки доступа на борту карьера, дополнительное ослабление в глубине
+#   карьера, пространственное затенение (устойчивое поле, поэтому на сетке
+#   покрытия получаются постоянные зоны слабого сигнала) и быстрые замирания.
+#   TxRate/RxRate - по таблице MCS, ap_id - обслуживающая AP.
+# - Пропуски: установка выключена (outages_per_day, замеров нет), нет
+#   ассоциации (RSSI ниже link_floor_dbm - строка без метрик, как у сборщика),
+#   потеря GPS (строка без координат).
+# - Поток RTCM3 базовой станции: 1005 и MSM4/MSM7 по системам с CRC24Q, с
+#   редкими испорченными кадрами и перерывами потока.
+#
+# Данные детерминированы (seed). Запуск:
+#
+#   python synthetic_load.py --db synthetic_log.db --rigs 50 --days 90
+#   python synthetic_load.py --csv logs/coverage_log_sim.csv --rigs 5 --days 1
+#   python synthetic_load.py --rtcm base_sim.rtcm --rtcm-sec 3600
+# ==============================================================================
+import argparse
+import csv
+import json
+import math
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import mikrotik_storage
+import msm_decoder
+
+CONFIG_FILE = 'config.json'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+METERS_PER_DEG_LAT = 110540.0
+METERS_PER_DEG_LON = 111320.0
+
+# Настройки по умолчанию (перекрываются секцией synthetic_load в config.json)
+DEFAULT_SYNTHETIC = {
+    "seed": 1,
+    "rigs": 5,
+    "interval_sec": 60,
+    "pit_center_lon": 67.50,
+    "pit_center_lat": 51.90,
+    "pit_radius_m": 1500.0,
+    "benches": 8,
+    "aps": [],                 # [{"ap_id", "bearing_deg", "distance_m"}]; пусто - по mikrotik_aps на борту
+    "rssi_100m_dbm": -45.0,    # RSSI на расстоянии 100 м от AP
+    "path_loss_exp": 2.7,      # Показатель затухания
+    "depth_loss_db": 10.0,     # Дополнительное ослабление на дне карьера
+    "shadowing_db": 4.0,       # СКО пространственного затенения
+    "fading_db": 2.0,          # СКО быстрых замираний
+    "link_floor_dbm": -90.0,   # Ниже - нет ассоциации
+    "drill_min": 25.0,         # Бурение одной скважины, мин
+    "pattern_holes": 30,       # Скважин в блоке
+    "hole_spacing_m": 7.0,
+    "tram_mps": 0.8,           # Скорость переезда
+    "outages_per_day": 0.5,    # Выключений установки в сутки (в среднем)
+    "outage_min": 45.0,        # Средняя длительность выключения
+    "gps_loss": 0.01,          # Доля замеров без координат
+    "rtcm": {
+        "station_id": 1,
+        "msm": 4,              # MSM4 или MSM7
+        "constellations": ["GPS", "GLONASS", "GALILEO", "BeiDou"],
+        "arp_interval_sec": 10,
+        "crc_error_rate": 0.001,
+        "gaps_per_hour": 1.0   # Перерывов потока в час (5-30 с)
+    }
+}
+
+# Точки доступа по умолчанию (если нет ни aps, ни mikrotik_aps)
+DEFAULT_AP_COUNT = 3
+
+# Таблица MCS (802.11n, 2 потока): порог RSSI, дБм -> скорость, Мбит/с
+MCS_TABLE = ((-65, 130.0), (-67, 117.0), (-71, 104.0), (-75, 78.0), (-79, 52.0),
+             (-81, 39.0), (-84, 26.0), (-87, 13.0), (-math.inf, 6.5))
+
+
+def resolve_synthetic_config(config_section):
+    """Объединяет настройки генератора из config.json со значениями по умолчанию."""
+    synthetic_config = dict(DEFAULT_SYNTHETIC)
+    synthetic_config.update(config_section or {})
+    rtcm_config = dict(DEFAULT_SYNTHETIC["rtcm"])
+    rtcm_config.update((config_section or {}).get("rtcm") or {})
+    synthetic_config["rtcm"] = rtcm_config
+    return synthetic_config
+
+
+def load_synthetic_config(config_file=CONFIG_FILE):
+    """
+    Настройки генератора из config.json. Если свои AP не заданы, на борту
+    карьера размещаются точки доступа из mikrotik_aps (по ap_id).
+    """
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+    synthetic_config = resolve_synthetic_config(config.get("synthetic_load"))
+    if not synthetic_config["aps"]:
+        ap_ids = [ap.get("ap_id") or ap.get("ip") for ap in config.get("mikrotik_aps") or []]
+        synthetic_config["aps"] = rim_aps(ap_ids or None, synthetic_config["pit_radius_m"])
+    return synthetic_config
+
+
+def rim_aps(ap_ids=None, pit_radius_m=DEFAULT_SYNTHETIC["pit_radius_m"]):
+    """Точки доступа, равномерно расставленные по борту карьера."""
+    ap_ids = ap_ids or [f"AP-{i + 1}" for i in range(DEFAULT_AP_COUNT)]
+    return [{"ap_id": ap_id, "bearing_deg": 360.0 * i / len(ap_ids) + 30.0, "distance_m": pit_radius_m * 1.05}
+            for i, ap_id in enumerate(ap_ids)]
+
+
+def rig_names(count):
+    return [f"SIM {i + 1:02d}" for i in range(count)]
+
+# ------------------------------------------------------------------------------
+# 1. МОДЕЛЬ КАРЬЕРА И РАДИОКАНАЛА
+# ------------------------------------------------------------------------------
+
+class PitModel:
+    """
+    Геометрия карьера (метры от центра: x - восток, y - север), точки доступа
+    и модель RSSI.
+    """
+
+    # Плоских волн в поле затенения
+    SHADOW_WAVES = 12
+
+    def __init__(self, config, rng):
+        self.config = config
+        self.radius = float(config["pit_radius_m"])
+        self.lat0 = math.radians(config["pit_center_lat"])
+        aps = config["aps"] or rim_aps(None, self.radius)
+        self.ap_ids = [ap["ap_id"] for ap in aps]
+        bearings = np.radians([ap["bearing_deg"] for ap in aps])
+        distances = np.array([ap["distance_m"] for ap in aps], dtype=float)
+        self.ap_x, self.ap_y = distances * np.sin(bearings), distances * np.cos(bearings)
+
+        # Затенение: сумма плоских волн с длиной 80-400 м, СКО = shadowing_db
+        wavelength = rng.uniform(80.0, 400.0, self.SHADOW_WAVES)
+        direction = rng.uniform(0.0, 2 * np.pi, self.SHADOW_WAVES)
+        self.k_x = 2 * np.pi / wavelength * np.cos(direction)
+        self.k_y = 2 * np.pi / wavelength * np.sin(direction)
+        self.phase = rng.uniform(0.0, 2 * np.pi, self.SHADOW_WAVES)
+        self.amplitude = config["shadowing_db"] * math.sqrt(2.0 / self.SHADOW_WAVES)
+
+    def to_lonlat(self, x, y):
+        lon = self.config["pit_center_lon"] + x / (METERS_PER_DEG_LON * math.cos(self.lat0))
+        lat = self.config["pit_center_lat"] + y / METERS_PER_DEG_LAT
+        return lon, lat
+
+    def bench_radius(self, bench):
+        """Радиус уступа: 0 - дно (0.2 R), benches - 1 - верхний (0.9 R)."""
+        return self.radius * (0.2 + 0.7 * bench / max(self.config["benches"] - 1, 1))
+
+    def shadowing(self, x, y):
+        waves = np.cos(np.outer(x, self.k_x) + np.outer(y, self.k_y) + self.phase)
+        return self.amplitude * waves.sum(axis=1)
+
+    def rssi(self, x, y, rng):
+        """
+        RSSI (дБм, float) и индекс обслуживающей AP для массивов координат:
+        AP с самым сильным средним сигналом, затем быстрые замирания.
+        """
+        config = self.config
+        distance = np.hypot(x[:, None] - self.ap_x, y[:, None] - self.ap_y)
+        depth = np.clip(1.0 - np.hypot(x, y) / self.radius, 0.0, 1.0)
+        mean = (config["rssi_100m_dbm"] - 10.0 * config["path_loss_exp"] * np.log10(np.maximum(distance, 10.0) / 100.0)
+                - (config["depth_loss_db"] * depth)[:, None])
+        ap_index = mean.argmax(axis=1)
+        best = mean[np.arange(len(x)), ap_index] + self.shadowing(x, y)
+        return best + rng.normal(0.0, config["fading_db"], len(x)), ap_index
+
+
+def mcs_rate(rssi, step_down=0):
+    """Индекс строки MCS_TABLE по RSSI (step_down - на сколько ступеней ниже)."""
+    thresholds = -np.array([threshold for threshold, _ in MCS_TABLE[:-1]])
+    index = np.searchsorted(thresholds, -np.asarray(rssi), side='left')
+    return np.minimum(index + step_down, len(MCS_TABLE) - 1)
+
+# ------------------------------------------------------------------------------
+# 2. ТРАЕКТОРИИ УСТАНОВОК
+# ------------------------------------------------------------------------------
+
+def rig_waypoints(model, config, duration_sec, rng):
+    """
+    Кусочно-линейная траектория установки на [0, duration_sec]: массивы
+    (t, x, y). Стоянка на скважине - две точки с одинаковыми координатами.
+    """
+    spacing, speed = config["hole_spacing_m"], config["tram_mps"]
+    holes = max(int(config["pattern_holes"]), 1)
+    cols = math.ceil(holes / 3)
+    t, points = 0.0, []
+    position = None
+    while t <= duration_sec:
+        # Новый блок: уступ и направление на нем
+        radius = model.bench_radius(int(rng.integers(0, config["benches"])))
+        angle = rng.uniform(0.0, 2 * np.pi)
+        radial = np.array([math.cos(angle), math.sin(angle)])
+        tangent = np.array([-radial[1], radial[0]])
+        origin = radial * radius - tangent * spacing * cols / 2
+        pattern = [origin + tangent * spacing * (i % cols) + radial * spacing * (i // cols) for i in range(holes)]
+        for hole in pattern:
+            if position is not None:
+                t += float(np.hypot(*(hole - position))) / speed
+            points.append((t, hole[0], hole[1]))
+            t += max(rng.normal(config["drill_min"], config["drill_min"] * 0.25), 1.0) * 60.0
+            points.append((t, hole[0], hole[1]))
+            position = hole
+            if t > duration_sec:
+                break
+    track = np.array(points)
+    return track[:, 0], track[:, 1], track[:, 2]
+
+
+def outage_windows(config, duration_sec, rng):
+    """Периоды, когда установка выключена: массивы (start, end), сек от начала."""
+    count = rng.poisson(config["outages_per_day"] * duration_sec / 86400.0)
+    starts = np.sort(rng.uniform(0.0, duration_sec, count))
+    return starts, starts + rng.exponential(config["outage_min"] * 60.0, count)
+
+# ------------------------------------------------------------------------------
+# 3. ЗАМЕРЫ ПАРКА УСТАНОВОК
+# ------------------------------------------------------------------------------
+
+class SyntheticFleet:
+    """
+    Замеры всех установок за [start, end) в формате кортежа сборщика
+    (mikrotik_storage.write_sample): 8 базовых полей и OPTIONAL_COLUMNS.
+
+        fleet = SyntheticFleet(load_synthetic_config(), start, end)
+        for tick_time, rows in fleet.ticks():
+            ...
+
+    Замеры одного тика (опрос всех установок) идут вместе, как при --fanout.
+    """
+
+    # Сутки генерируются одним блоком (векторно по каждой установке)
+    CHUNK_SEC = 86400
+
+    def __init__(self, config, start, end, rigs=None):
+        self.config = config
+        self.start, self.end = start, end
+        self.interval = int(config["interval_sec"])
+        rng = np.random.default_rng(config["seed"])
+        self.model = PitModel(config, rng)
+        self.rig_ids = list(rigs) if rigs else rig_names(config["rigs"])
+        duration = (end - start).total_seconds()
+
+        self.rigs = []
+        for index, rig_id in enumerate(self.rig_ids):
+            rig_rng = np.random.default_rng([config["seed"], index])
+            self.rigs.append({
+                "rig_id": rig_id,
+                "mac": f"02:00:00:00:{index // 256:02X}:{index % 256:02X}",
+                "rng": rig_rng,
+                "track": rig_waypoints(self.model, config, duration, rig_rng),
+                "outages": outage_windows(config, duration, rig_rng),
+                # Опрос установок в тике расходится на пару секунд
+                "offset": int(rig_rng.integers(0, min(self.interval, 3))),
+                "bytes": np.zeros(2, dtype=np.int64),
+            })
+
+    def _rig_columns(self, rig, chunk_start, chunk_end):
+        """Столбцы замеров установки за [chunk_start, chunk_end) (сек от start) или None."""
+        rng, config = rig["rng"], self.config
+        first = math.ceil(chunk_start / self.interval) * self.interval
+        t = np.arange(first, chunk_end, self.interval, dtype=float)
+        starts, ends = rig["outages"]
+        if starts.size:
+            window = np.searchsorted(starts, t, side='right') - 1
+            t = t[~((window >= 0) & (t < ends[np.maximum(window, 0)]))]
+        if not t.size:
+            return None
+
+        track_t, track_x, track_y = rig["track"]
+        x = np.interp(t, track_t, track_x) + rng.normal(0.0, 0.3, t.size)
+        y = np.interp(t, track_t, track_y) + rng.normal(0.0, 0.3, t.size)
+        rssi, ap_index = self.model.rssi(x, y, rng)
+        lon, lat = self.model.to_lonlat(x, y)
+
+        link = rssi >= config["link_floor_dbm"]
+        tx_index = mcs_rate(rssi)
+        rx_index = mcs_rate(rssi, rng.integers(0, 2, t.size))
+        traffic = np.where(link[:, None], rng.integers(20_000, 400_000, (t.size, 2)), 0)
+        counters = rig["bytes"] + np.cumsum(traffic, axis=0)
+        rig["bytes"] = counters[-1]
+        cpe_rssi = np.round(rssi - 3.0 + rng.normal(0.0, 1.5, t.size))
+        ccq = np.clip(100.0 - 3.0 * np.maximum(-55.0 - rssi, 0.0), 10.0, 100.0)
+        return {"t": t + rig["offset"], "lon": lon, "lat": lat, "gps": rng.random(t.size) >= config["gps_loss"],
+                "link": link, "rssi": np.round(rssi), "tx": tx_index, "rx": rx_index, "ap": ap_index,
+                "cpe_rssi": cpe_rssi, "ccq": np.round(ccq), "tx_bytes": counters[:, 0], "rx_bytes": counters[:, 1]}
+
+    def _rig_rows(self, rig, columns):
+        """Кортежи замеров установки из столбцов (нет ассоциации - метрики None)."""
+        labels = [f"{rate:g}Mbps" for _, rate in MCS_TABLE]
+        ap_ids = self.model.ap_ids
+        base = np.datetime64(self.start.replace(microsecond=0), 's')
+        stamps = np.datetime_as_string(base + columns["t"].astype('timedelta64[s]'), unit='s')
+        rows = []
+        for i, (stamp, has_gps, link) in enumerate(zip(stamps.tolist(), columns["gps"].tolist(),
+                                                       columns["link"].tolist())):
+            lon = float(columns["lon"][i]) if has_gps else None
+            lat = float(columns["lat"][i]) if has_gps else None
+            if link:
+                rows.append((stamp.replace('T', ' '), rig["rig_id"], rig["mac"], lon, lat, int(columns["rssi"][i]),
+                             labels[columns["tx"][i]], labels[columns["rx"][i]], int(columns["cpe_rssi"][i]),
+                             int(columns["ccq"][i]), int(columns["tx_bytes"][i]), int(columns["rx_bytes"][i]),
+                             ap_ids[columns["ap"][i]]))
+            else:
+                rows.append((stamp.replace('T', ' '), rig["rig_id"], rig["mac"], lon, lat, None, None, None))
+        return rows
+
+    def chunks(self):
+        """Замеры по суткам: списки кортежей в порядке времени (и установки внутри тика)."""
+        duration = (self.end - self.start).total_seconds()
+        chunk_start = 0.0
+        while chunk_start < duration:
+            chunk_end = min(chunk_start + self.CHUNK_SEC, duration)
+            keyed = []
+            for order, rig in enumerate(self.rigs):
+                columns = self._rig_columns(rig, chunk_start, chunk_end)
+                if columns is None:
+                    continue
+                tick = (columns["t"] // self.interval).astype(np.int64).tolist()
+                keyed.extend(zip(tick, [order] * len(tick), self._rig_rows(rig, columns)))
+            keyed.sort(key=lambda item: (item[0], item[1]))
+            yield [row for _, _, row in keyed], [tick for tick, _, _ in keyed]
+            chunk_start = chunk_end
+
+    def ticks(self):
+        """(время тика, замеры тика) по порядку."""
+        for rows, ticks in self.chunks():
+            begin = 0
+            for i in range(1, len(rows) + 1):
+                if i == len(rows) or ticks[i] != ticks[begin]:
+                    yield self.start + timedelta(seconds=ticks[begin] * self.interval), rows[begin:i]
+                    begin = i
+
+    def rows(self):
+        for rows, _ in self.chunks():
+            yield from rows
+
+# ------------------------------------------------------------------------------
+# 4. ПОТОК RTCM3 БАЗОВОЙ СТАНЦИИ
+# ------------------------------------------------------------------------------
+
+def _crc24q_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+        table.append(crc & 0xFFFFFF)
+    return table
+
+
+_CRC24Q = _crc24q_table()
+
+
+def crc24q(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFF) ^ _CRC24Q[(crc >> 16) ^ byte]
+    return crc
+
+
+def rtcm_frame(payload):
+    """Кадр RTCM3: преамбула D3, 10 бит длины, payload, CRC24Q."""
+    head = bytes((0xD3, (len(payload) >> 8) & 0x03, len(payload) & 0xFF)) + payload
+    return head + crc24q(head).to_bytes(3, 'big')
+
+
+class _BitWriter:
+    """Сборка payload из битовых полей (отрицательные - в дополнительном коде)."""
+
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+
+    def add(self, value, width):
+        self.value = (self.value << width) | (int(value) & ((1 << width) - 1))
+        self.bits += width
+
+    def add_array(self, values, width):
+        for value in values:
+            self.add(value, width)
+
+    def payload(self):
+        padding = -self.bits % 8
+        return (self.value << padding).to_bytes((self.bits + padding) // 8, 'big')
+
+
+def station_payload(station_id, ecef_m):
+    """1005: координаты ARP базовой станции (ECEF, м)."""
+    writer = _BitWriter()
+    writer.add(1005, 12)
+    writer.add(station_id, 12)
+    writer.add(0, 6)                     # ITRF
+    writer.add(0b1111, 4)                # GPS, GLONASS, Galileo, эталонная станция
+    writer.add(round(ecef_m[0] * 10000), 38)
+    writer.add(0, 2)                     # Одиночный генератор, резерв
+    writer.add(round(ecef_m[1] * 10000), 38)
+    writer.add(0, 2)                     # Четверть цикла
+    writer.add(round(ecef_m[2] * 10000), 38)
+    return writer.payload()
+
+
+# Номер типа MSM по системе (107x, 108x, ...) и сигналы в маске (ID сигнала RTCM)
+MSM_BASE = {name: base * 10 for base, name in msm_decoder.MSM_CONSTELLATIONS.items()}
+MSM_SIGNALS = {"GPS": (2, 15), "GLONASS": (2, 8), "GALILEO": (2, 14), "BeiDou": (2, 8)}
+SATELLITES = {"GPS": 32, "GLONASS": 24, "GALILEO": 30, "BeiDou": 40}
+
+
+def msm_payload(msg_type, station_id, epoch_ms, sats, signals, cnr, lock_ind, multiple, rng):
+    """
+    Payload MSM4-MSM7 с полной маской ячеек (каждый спутник на всех сигналах):
+    sats - PRN, cnr и lock_ind - по ячейкам (спутник x сигнал), CNR в дБГц.
+    """
+    subtype = msg_type % 10
+    writer = _BitWriter()
+    writer.add(msg_type, 12)
+    writer.add(station_id, 12)
+    writer.add(epoch_ms, 30)
+    writer.add(multiple, 1)
+    writer.add(0, 3 + 7 + 2 + 2 + 1 + 3)   # IODS, резерв, clock steering, ext clock, сглаживание
+    sat_mask = np.zeros(64, dtype=np.uint8)
+    sat_mask[np.asarray(sats) - 1] = 1
+    sig_mask = np.zeros(32, dtype=np.uint8)
+    sig_mask[np.asarray(signals) - 1] = 1
+    writer.add_array(sat_mask, 1)
+    writer.add_array(sig_mask, 1)
+    n_cells = len(sats) * len(signals)
+    writer.add_array(np.ones(n_cells, dtype=np.uint8), 1)
+
+    # Спутниковый блок: грубая дальность (мс) 67-86, остальное - малые значения
+    for field, width in enumerate(msm_decoder.SAT_FIELDS[subtype]):
+        if field == 0:
+            writer.add_array(rng.integers(67, 87, len(sats)), width)
+        else:
+            writer.add_array(rng.integers(0, 1 << (width - 2), len(sats)), width)
+
+    # Блок сигналов: поля по порядку msm_decoder.SIGNAL_FIELDS
+    for name, width in msm_decoder.SIGNAL_FIELDS[subtype]:
+        if name == 'cnr':
+            values = np.round(np.asarray(cnr) / msm_decoder.CNR_SCALE[subtype])
+        elif name == 'lock':
+            values = lock_ind
+        elif name == 'half':
+            values = np.zeros(n_cells, dtype=np.int64)
+        else:
+            values = rng.integers(-(1 << (width - 3)), 1 << (width - 3), n_cells)
+        writer.add_array(values, width)
+    return writer.payload()
+
+
+def lock_indicator(lock_ms, subtype):
+    """Индикатор времени захвата (DF402/DF407) для времени захвата в мс."""
+    table = msm_decoder.lock_time_ms(np.arange(705 if subtype >= 6 else 16), subtype)
+    return np.searchsorted(table, lock_ms, side='right') - 1
+
+
+class RtcmSky:
+    """
+    Видимость спутников над базовой станцией: у каждого спутника - синусоида
+    высоты со своим периодом и фазой; виден при высоте выше маски. CNR растет
+    с высотой; время захвата считается от восхода, редкие срывы его сбрасывают.
+    """
+
+    def __init__(self, constellations, rng):
+        self.rng = rng
+        self.sats = {}
+        for name in constellations:
+            count = SATELLITES[name]
+            self.sats[name] = {
+                "period": rng.uniform(11.0, 14.0, count) * 3600.0,
+                "phase": rng.uniform(0.0, 2 * np.pi, count),
+                "lock_since": np.full(count, np.nan),
+            }
+
+    def epoch(self, name, t):
+        """Видимые спутники системы в момент t (сек): PRN, высота (0..1), захват (мс)."""
+        sats = self.sats[name]
+        elevation = np.sin(2 * np.pi * t / sats["period"] + sats["phase"])
+        visible = elevation > 0.35
+        slips = visible & (self.rng.random(visible.size) < 0.0005)
+        rising = visible & (np.isnan(sats["lock_since"]) | slips)
+        sats["lock_since"][rising] = t
+        sats["lock_since"][~visible] = np.nan
+        prn = np.flatnonzero(visible) + 1
+        lock_ms = (t - sats["lock_since"][visible]) * 1000.0
+        return prn, elevation[visible], lock_ms
+
+
+def rtcm_frames(rtcm_config, start, seconds, seed=1):
+    """
+    Кадры потока базовой станции за seconds секунд от start: (смещение, кадр).
+    Каждую секунду - MSM по всем системам (бит multiple у всех, кроме последней),
+    раз в arp_interval_sec - 1005. В перерывы потока кадров нет; доля
+    crc_error_rate кадров приходит с испорченным байтом.
+    """
+    rng = np.random.default_rng([seed, 1005])
+    constellations = rtcm_config["constellations"]
+    subtype = int(rtcm_config["msm"])
+    station_id = rtcm_config["station_id"]
+    sky = RtcmSky(constellations, rng)
+    ecef = (1_574_000.0, 3_674_000.0, 4_990_000.0)
+
+    gaps = rng.poisson(rtcm_config["gaps_per_hour"] * seconds / 3600.0)
+    gap_starts = np.sort(rng.uniform(0.0, seconds, gaps))
+    gap_ends = gap_starts + rng.uniform(5.0, 30.0, gaps)
+    week_sec = (start - datetime(1980, 1, 6)).total_seconds() % (7 * 86400)
+
+    for second in range(int(seconds)):
+        window = np.searchsorted(gap_starts, second, side='right') - 1
+        if window >= 0 and second < gap_ends[window]:
+            continue
+        frames = []
+        if second % rtcm_config["arp_interval_sec"] == 0:
+            frames.append(rtcm_frame(station_payload(station_id, ecef)))
+        epoch_ms = int((week_sec + second) * 1000) % (1 << 30)
+        for i, name in enumerate(constellations):
+            prn, elevation, lock_ms = sky.epoch(name, second)
+            if not prn.size:
+                continue
+            signals = MSM_SIGNALS[name]
+            cnr = np.repeat(32.0 + 18.0 * elevation, len(signals)) + rng.normal(0.0, 1.5, prn.size * len(signals))
+            lock = lock_indicator(np.repeat(lock_ms, len(signals)), subtype)
+            payload = msm_payload(MSM_BASE[name] + subtype, station_id, epoch_ms, prn, signals,
+                                  np.clip(cnr, 1.0, 60.0), lock, int(i < len(constellations) - 1), rng)
+            frames.append(rtcm_frame(payload))
+        for frame in frames:
+            if rng.random() < rtcm_config["crc_error_rate"]:
+                damaged = bytearray(frame)
+                damaged[3 + int(rng.integers(0, len(frame) - 6))] ^= 0xFF
+                frame = bytes(damaged)
+            yield second, frame
+
+
+def rtcm_stream(rtcm_config, start, seconds, seed=1):
+    """Поток целиком (bytes)."""
+    return b"".join(frame for _, frame in rtcm_frames(rtcm_config, start, seconds, seed))
+
+# ------------------------------------------------------------------------------
+# 5. ЗАПИСЬ В БД И CSV
+# ------------------------------------------------------------------------------
+
+def load_db(db_path, fleet, deadband=None, on_tick=None):
+    """
+    Пишет замеры в mikrotik_log через mikrotik_storage.write_sample: один
+    commit на тик (опрос всех установок), как сборщик в режиме --fanout.
+    Возвращает {"samples", "ticks", "write_sec"} (write_sec - только запись, без генерации).
+    """
+    mikrotik_storage.initialize_db(db_path)
+    mikrotik_storage.reset_state()
+    conn = sqlite3.connect(db_path)
+    samples = ticks = 0
+    write_sec = 0.0
+    try:
+        cursor = conn.cursor()
+        for tick_time, rows in fleet.ticks():
+            started = time.perf_counter()
+            for row in rows:
+                mikrotik_storage.write_sample(cursor, row, deadband)
+            conn.commit()
+            write_sec += time.perf_counter() - started
+            samples += len(rows)
+            ticks += 1
+            if on_tick is not None:
+                on_tick(tick_time, samples)
+    finally:
+        conn.close()
+        mikrotik_storage.reset_state()
+    return {"samples": samples, "ticks": ticks, "write_sec": write_sec}
+
+
+def write_csv(path, fleet):
+    """Замеры в формате старых CSV-логов (для csv_importer). Возвращает число строк."""
+    import csv_importer
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(csv_importer.LEGACY_COLUMNS)
+        for row in fleet.rows():
+            writer.writerow(["" if value is None else value for value in row[:len(csv_importer.LEGACY_COLUMNS)]])
+            count += 1
+    return count
+
+
+def default_period(days, interval_sec):
+    """Период длиной days суток, заканчивающийся текущим тиком."""
+    now = datetime.now().replace(microsecond=0)
+    end = now - timedelta(seconds=now.timestamp() % interval_sec)
+    return end - timedelta(days=days), end
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетические замеры установок и поток RTCM для нагрузочных прогонов")
+    parser.add_argument('--db', help="Записать замеры в эту БД (не рабочую mikrotik_log.db!)")
+    parser.add_argument('--csv', help="Записать замеры в CSV старого формата")
+    parser.add_argument('--rtcm', help="Записать поток RTCM3 базовой станции в файл")
+    parser.add_argument('--rigs', type=int, help="Число установок")
+    parser.add_argument('--days', type=float, default=1.0, help="Длина периода, сутки (до текущего момента)")
+    parser.add_argument('--interval', type=int, help="Интервал замеров, сек")
+    parser.add_argument('--rtcm-sec', type=int, default=600, help="Длина потока RTCM, сек")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    if not (args.db or args.csv or args.rtcm):
+        parser.error("нужно указать хотя бы одно из --db, --csv, --rtcm")
+
+    synthetic_config = load_synthetic_config()
+    for key, value in (("rigs", args.rigs), ("interval_sec", args.interval), ("seed", args.seed)):
+        if value is not None:
+            synthetic_config[key] = value
+    start_time, end_time = default_period(args.days, synthetic_config["interval_sec"])
+
+    if args.db or args.csv:
+        fleet = SyntheticFleet(synthetic_config, start_time, end_time)
+        if args.db:
+            started = time.perf_counter()
+            result = load_db(args.db, fleet)
+            print(f"[SYNTH] {args.db}: {result['samples']} замеров {len(fleet.rig_ids)} установок "
+                  f"за {time.perf_counter() - started:.1f} с (запись {result['write_sec']:.1f} с).")
+        if args.csv:
+            fleet = SyntheticFleet(synthetic_config, start_time, end_time)
+            print(f"[SYNTH] {args.csv}: {write_csv(args.csv, fleet)} строк.")
+    if args.rtcm:
+        stream = rtcm_stream(synthetic_config["rtcm"], end_time, args.rtcm_sec, synthetic_config["seed"])
+        with open(args.rtcm, 'wb') as f:
+            f.write(stream)
+        print(f"[SYNTH] {args.rtcm}: {len(stream)} байт RTCM3 за {args.rtcm_sec} с.")
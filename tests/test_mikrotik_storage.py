@@ -0,0 +1,122 @@
+# ==============================================================================
+# Тесты mikrotik_storage: запись замеров с deadband-сжатием
+# ==============================================================================
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import mikrotik_storage
+import shift_calendar
+
+MAC = "AA:BB:CC:DD:EE:01"
+DEADBAND = {"enabled": True}
+START = datetime(2026, 10, 3, 9, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def default_calendar(monkeypatch):
+    """Календарь по умолчанию (20:00/08:00) и чистое состояние сжатия в каждом тесте."""
+    monkeypatch.setattr(shift_calendar, "_CALENDAR", shift_calendar.ShiftCalendar())
+    mikrotik_storage.reset_state()
+    yield
+    mikrotik_storage.reset_state()
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / "mikrotik_log.db")
+    mikrotik_storage.initialize_db(path)
+    connection = sqlite3.connect(path)
+    yield connection
+    connection.close()
+
+
+def write(conn, rig_id, seconds, rssi, deadband=DEADBAND, start=START):
+    """Замеры установки в моменты start + seconds (RSSI - число или список по замерам)."""
+    values = rssi if isinstance(rssi, list) else [rssi] * len(seconds)
+    cursor = conn.cursor()
+    for offset, value in zip(seconds, values):
+        timestamp = (start + timedelta(seconds=offset)).strftime(mikrotik_storage.TIMESTAMP_FORMAT)
+        mikrotik_storage.write_sample(cursor, (timestamp, rig_id, MAC, 67.5, 51.9, value, "54Mbps", "6.5Mbps"), deadband)
+    conn.commit()
+
+
+def rows(conn, rig_id):
+    cursor = conn.execute(
+        """SELECT timestamp, last_timestamp, sample_count, duration_sec, rssi_sum, rssi_wsum, shift_id
+           FROM mikrotik_log WHERE rig_id = ? ORDER BY id""",
+        (rig_id,)
+    )
+    keys = ("timestamp", "last_timestamp", "sample_count", "duration_sec", "rssi_sum", "rssi_wsum", "shift_id")
+    return [dict(zip(keys, row)) for row in cursor]
+
+
+def test_constant_signal_collapses_to_one_row(conn):
+    write(conn, "RIG-1", range(0, 50, 10), -60)
+    [row] = rows(conn, "RIG-1")
+    assert row["sample_count"] == 5
+    assert row["timestamp"] == "2026-10-03 09:00:00"
+    assert row["last_timestamp"] == "2026-10-03 09:00:40"
+    assert row["duration_sec"] == 40                          # Интервал последнего замера еще открыт
+    assert row["rssi_sum"] == -300
+    assert row["rssi_wsum"] == -60 * 40
+
+    day = shift_calendar.get_calendar().day_id_range("2026-10-03")
+    stats = mikrotik_storage.query_wifi_stats(conn, "RIG-1", *day)
+    assert (stats["samples"], stats["rows"], stats["rssi_avg"], stats["rssi_tw_avg"]) == (5, 1, -60, -60)
+
+
+def test_step_above_deadband_opens_new_row(conn):
+    write(conn, "RIG-1", [0, 10, 20, 30], [-60, -61, -70, -70])
+    first, second = rows(conn, "RIG-1")
+    assert (first["sample_count"], first["rssi_sum"]) == (2, -121)
+    assert first["duration_sec"] == 20                        # Закрыт моментом нового замера
+    assert first["rssi_wsum"] == -60 * 10 + -61 * 10
+    assert (second["timestamp"], second["sample_count"], second["duration_sec"]) == ("2026-10-03 09:00:20", 2, 10)
+
+
+def test_change_within_deadband_keeps_row(conn):
+    write(conn, "RIG-1", [0, 10, 20], [-60, -62, -58])        # Отклонение от опорного замера <= 2 дБ
+    [row] = rows(conn, "RIG-1")
+    assert row["sample_count"] == 3
+    assert row["rssi_wsum"] == -60 * 10 + -62 * 10
+
+
+def test_state_is_kept_per_rig(conn):
+    cursor = conn.cursor()
+    for offset in range(0, 40, 10):
+        timestamp = (START + timedelta(seconds=offset)).strftime(mikrotik_storage.TIMESTAMP_FORMAT)
+        mikrotik_storage.write_sample(cursor, (timestamp, "RIG-1", MAC, 67.5, 51.9, -60, "54Mbps", "6.5Mbps"), DEADBAND)
+        mikrotik_storage.write_sample(cursor, (timestamp, "RIG-2", MAC, 67.6, 51.8, -75, "24Mbps", "6.5Mbps"), DEADBAND)
+    conn.commit()
+    [rig1] = rows(conn, "RIG-1")
+    [rig2] = rows(conn, "RIG-2")
+    assert (rig1["sample_count"], rig1["duration_sec"], rig1["rssi_wsum"]) == (4, 30, -60 * 30)
+    assert (rig2["sample_count"], rig2["duration_sec"], rig2["rssi_wsum"]) == (4, 30, -75 * 30)
+
+    mikrotik_storage.reset_state("RIG-1")                     # Сброс одной установки не трогает другую
+    assert "RIG-1" not in mikrotik_storage._LAST_RECORD
+    assert "RIG-2" in mikrotik_storage._LAST_RECORD
+
+
+def test_row_does_not_cross_shift_boundary(conn):
+    start = datetime(2026, 10, 3, 7, 59, 40)                  # Ночная смена заканчивается в 08:00
+    write(conn, "RIG-1", [0, 10, 20, 30], -60, start=start)
+    night, day = rows(conn, "RIG-1")
+    assert (night["shift_id"], night["sample_count"], night["duration_sec"]) == (202610030, 2, 20)
+    assert (day["shift_id"], day["sample_count"]) == (202610031, 2)
+
+
+def test_long_gap_is_not_counted(conn):
+    write(conn, "RIG-1", [0, 10, 10 + 600], -60)              # Разрыв больше max_gap_sec
+    first, second = rows(conn, "RIG-1")
+    assert (first["sample_count"], first["duration_sec"]) == (2, 10)
+    assert second["sample_count"] == 1
+
+
+def test_disabled_deadband_writes_every_sample(conn):
+    write(conn, "RIG-1", range(0, 30, 10), -60, deadband=None)
+    written = rows(conn, "RIG-1")
+    assert [row["sample_count"] for row in written] == [1, 1, 1]
+    assert [row["duration_sec"] for row in written] == [10, 10, 0]
@@ -0,0 +1,157 @@
+# ==============================================================================
+# Тесты routeros_api на локальной заглушке RouterOS API (сокет в потоке)
+# ==============================================================================
+import socket
+import threading
+
+import pytest
+
+import routeros_api
+
+
+class FakeRouterOS:
+    """
+    Минимальная заглушка API: /login, print registration-table (=.proplist=,
+    ?mac-address=), команда с ошибкой (!trap). drop_after_login - закрыть первое
+    соединение при первой команде после входа (обрыв сессии).
+    """
+
+    ROWS = [
+        {"mac-address": "AA:BB:CC:DD:EE:01", "signal-strength": "-63@HT20-7",
+         "tx-rate": "130Mbps-20MHz/2S/SGI", "rx-rate": "6.5Mbps", "uptime": "1h"},
+        {"mac-address": "AA:BB:CC:DD:EE:02", "signal-strength": "-81dBm",
+         "tx-rate": "1Gbps", "rx-rate": "54Mbps", "uptime": "2h"},
+    ]
+
+    def __init__(self, drop_after_login=False):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.drop_after_login = drop_after_login
+        self.connections = 0
+        self.commands = []
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _send(self, conn, *words):
+        conn.sendall(routeros_api.encode_sentence(list(words)))
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            with conn:
+                self._session(conn, drop=self.drop_after_login and self.connections == 1)
+
+    def _session(self, conn, drop):
+        while True:
+            try:
+                words = routeros_api.read_sentence(conn)
+            except ConnectionError:
+                return
+            self.commands.append(words)
+            command = words[0]
+            if command == '/login':
+                self._send(conn, '!done')
+            elif drop:
+                return
+            elif command == '/interface/wireless/registration-table/print':
+                proplist = next((w.split('=', 2)[2].split(',') for w in words if w.startswith('=.proplist=')), None)
+                mac = next((w.split('=', 1)[1] for w in words if w.startswith('?mac-address=')), None)
+                for row in self.ROWS:
+                    if mac is None or row["mac-address"] == mac:
+                        self._send(conn, '!re', *(f"={k}={v}" for k, v in row.items() if proplist is None or k in proplist))
+                self._send(conn, '!done')
+            else:
+                self._send(conn, '!trap', '=message=no such command')
+                self._send(conn, '!done')
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def fake():
+    server = FakeRouterOS()
+    yield server
+    server.close()
+
+
+def _client(server):
+    return routeros_api.RouterOSApiClient("127.0.0.1", "monitor", "secret", port=server.port, timeout=2)
+
+
+@pytest.mark.parametrize("length", [0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, 0xFFFFFFF, 0x10000000])
+def test_word_length_round_trip(length):
+    encoded = routeros_api.encode_length(length)
+    expected_size = 1 if length < 0x80 else 2 if length < 0x4000 else 3 if length < 0x200000 else \
+        4 if length < 0x10000000 else 5
+    assert len(encoded) == expected_size
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encoded)
+        assert routeros_api.read_length(right) == length
+
+
+def test_long_word_sentence():
+    word = "=comment=" + "x" * 300
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(routeros_api.encode_sentence(['!re', word]))
+        assert routeros_api.read_sentence(right) == ['!re', word]
+
+
+def test_registration_table_proplist_and_types(fake):
+    client = _client(fake)
+    try:
+        rows = client.registration_table()
+    finally:
+        client.close()
+    login, query = fake.commands
+    assert login == ['/login', '=name=monitor', '=password=secret']
+    assert f"=.proplist={routeros_api.REGISTRATION_PROPLIST}" in query
+    # Поля вне proplist заглушка не отдает
+    assert all("uptime" not in row for row in rows)
+    metrics = [routeros_api.registration_to_metrics(row) for row in rows]
+    assert metrics == [
+        {"RSSI": -63, "TxRate": "130Mbps", "RxRate": "6.5Mbps"},
+        {"RSSI": -81, "TxRate": "1000Mbps", "RxRate": "54Mbps"},
+    ]
+
+
+def test_registration_table_by_mac(fake):
+    client = _client(fake)
+    try:
+        rows = client.registration_table("AA:BB:CC:DD:EE:02")
+    finally:
+        client.close()
+    assert [row["mac-address"] for row in rows] == ["AA:BB:CC:DD:EE:02"]
+    assert "?mac-address=AA:BB:CC:DD:EE:02" in fake.commands[-1]
+
+
+def test_trap_raises_and_keeps_session(fake):
+    client = _client(fake)
+    try:
+        with pytest.raises(routeros_api.RouterOSApiError, match="no such command"):
+            client.talk(['/no/such/command'])
+        # !done после !trap дочитан - следующий ответ не сдвинут
+        assert len(client.registration_table()) == 2
+    finally:
+        client.close()
+    assert fake.connections == 1
+
+
+def test_reconnect_after_dropped_connection():
+    server = FakeRouterOS(drop_after_login=True)
+    client = _client(server)
+    try:
+        rows = client.registration_table()
+    finally:
+        client.close()
+        server.close()
+    assert len(rows) == 2
+    assert server.connections == 2
@@ -0,0 +1,78 @@
+# ==============================================================================
+# Тесты watchdog потока RTCM (rtk_collector_service) на локальной TCP-станции
+# ==============================================================================
+import socket
+import threading
+import time
+
+import pytest
+
+import rtk_collector_service
+import rtk_storage
+
+STATION = "test_base"
+
+
+class FakeBase:
+    """
+    Станция, отдающая пачки байт по расписанию: schedule - паузы перед пачками, с.
+    После расписания выставляет stop и закрывает соединение.
+    """
+
+    def __init__(self, schedule, stop):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.schedule = schedule
+        self.stop = stop
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        conn, _ = self.server.accept()
+        with conn:
+            for pause in self.schedule:
+                time.sleep(pause)
+                conn.sendall(b'\xd3' + b'\x00' * 199)     # Пачка сообщений одной эпохи
+            self.stop.set()
+        self.server.close()
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    """События и статусы watchdog вместо записи в журнал/БД."""
+    log = {"events": [], "statuses": []}
+    monkeypatch.setattr(rtk_collector_service, "log_rtk_event", log["events"].append)
+    monkeypatch.setattr(rtk_collector_service, "log_rtk_status",
+                        lambda station, status, message: log["statuses"].append(status))
+    return log
+
+
+def run_watchdog(schedule, **overrides):
+    stop = threading.Event()
+    base = FakeBase(schedule, stop)
+    config = dict(rtk_collector_service.DEFAULT_WATCHDOG, **overrides)
+    watcher = threading.Thread(target=rtk_collector_service.watch_rtk_stream,
+                               args=("127.0.0.1", base.port, 2, STATION, config, stop), daemon=True)
+    watcher.start()
+    watcher.join(timeout=sum(schedule) + 5)
+    assert not watcher.is_alive()
+
+
+def test_default_threshold_above_epoch_period():
+    assert rtk_collector_service.DEFAULT_WATCHDOG["stall_threshold_sec"] > rtk_collector_service.RTCM_EPOCH_SEC
+
+
+def test_1hz_stream_has_no_outages(recorded):
+    run_watchdog([0.0, 1.0, 1.0, 1.0, 1.0])
+    assert recorded["events"] == []
+    assert recorded["statuses"] == []
+
+
+def test_stall_opens_and_closes_outage(recorded):
+    run_watchdog([0.0, 0.1, 0.1, 0.6, 0.1], stall_threshold_sec=0.3)
+    assert [row[1] for row in recorded["events"]] == [rtk_storage.EVENT_OUTAGE_START, rtk_storage.EVENT_OUTAGE_END]
+    assert recorded["events"][0][5] == "stall"
+    assert recorded["events"][1][4] >= 600 - 150                # Длительность от последних данных, мс
+    assert recorded["statuses"] == ["ERROR", "OK"]
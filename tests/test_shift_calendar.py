@@ -0,0 +1,132 @@
+# ==============================================================================
+# Тесты shift_calendar: shift_id = YYYYMMDD * 10 + номер смены, границы смен и дней
+# ==============================================================================
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from shift_calendar import ShiftCalendar, load_calendar
+
+# Площадка с рабочим днем от 07:00 и тремя сменами (в config.json - не по порядку)
+THREE_SHIFTS = {
+    "day_start": "07:00",
+    "shifts": [
+        {"code": "C", "name": "Ночная", "start": "23:00"},
+        {"code": "A", "name": "Утренняя", "start": "07:00"},
+        {"code": "B", "name": "Вечерняя", "start": "15:00"},
+    ]
+}
+
+# (время, shift_id, рабочий день) для календаря по умолчанию: день 20:00-20:00,
+# ночная смена 20:00-08:00, дневная 08:00-20:00, день назван по дате его конца
+DEFAULT_CASES = [
+    ("2026-10-02 20:00:00", 202610030, "2026-10-03"),
+    ("2026-10-02 23:59:59", 202610030, "2026-10-03"),
+    ("2026-10-03 00:00:00", 202610030, "2026-10-03"),
+    ("2026-10-03 07:59:59", 202610030, "2026-10-03"),
+    ("2026-10-03 08:00:00", 202610031, "2026-10-03"),
+    ("2026-10-03 19:59:59", 202610031, "2026-10-03"),
+    ("2026-10-03 20:00:00", 202610040, "2026-10-04"),
+    ("2026-10-03 23:59:59", 202610040, "2026-10-04"),
+    ("2026-12-31 20:00:00", 202701010, "2027-01-01"),   # Переход года
+    ("2028-02-28 20:00:00", 202802290, "2028-02-29"),   # Високосный год
+]
+
+# То же для площадки с днем от 07:00: день назван по дате начала
+THREE_SHIFT_CASES = [
+    ("2026-10-03 06:59:59", 202610022, "2026-10-02"),
+    ("2026-10-03 07:00:00", 202610030, "2026-10-03"),
+    ("2026-10-03 14:59:59", 202610030, "2026-10-03"),
+    ("2026-10-03 15:00:00", 202610031, "2026-10-03"),
+    ("2026-10-03 22:59:59", 202610031, "2026-10-03"),
+    ("2026-10-03 23:00:00", 202610032, "2026-10-03"),
+    ("2026-10-03 23:59:59", 202610032, "2026-10-03"),
+    ("2026-10-04 00:00:00", 202610032, "2026-10-03"),
+]
+
+CALENDARS = [(ShiftCalendar(), case) for case in DEFAULT_CASES] + \
+            [(ShiftCalendar(THREE_SHIFTS), case) for case in THREE_SHIFT_CASES]
+
+
+def _dt(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+
+
+@pytest.mark.parametrize("calendar, case", CALENDARS)
+def test_shift_id_and_work_day(calendar, case):
+    timestamp, shift_id, work_day = case
+    assert calendar.shift_id(timestamp) == shift_id
+    assert calendar.shift_id(_dt(timestamp)) == shift_id
+    assert calendar.current(_dt(timestamp)) == shift_id
+    assert calendar.work_day(timestamp) == work_day
+    assert calendar.day_of(shift_id) == work_day
+
+
+@pytest.mark.parametrize("calendar, case", CALENDARS)
+def test_moment_inside_its_bounds(calendar, case):
+    timestamp, shift_id, work_day = case
+    start, end = calendar.shift_bounds(shift_id)
+    assert start <= _dt(timestamp) < end
+    day_start, day_end = calendar.day_bounds(work_day)
+    assert day_start <= start < end <= day_end
+    first, last = calendar.day_id_range(work_day)
+    assert first <= shift_id <= last
+    assert shift_id in calendar.shift_ids(work_day)
+
+
+@pytest.mark.parametrize("calendar, case", CALENDARS)
+def test_sql_matches_python(calendar, case):
+    timestamp, shift_id, work_day = case
+    conn = sqlite3.connect(":memory:")
+    try:
+        row = conn.execute(f"SELECT {calendar.shift_id_sql('ts')}, {calendar.day_sql('ts')} FROM (SELECT ? AS ts)",
+                           (timestamp,)).fetchone()
+    finally:
+        conn.close()
+    assert row == (shift_id, work_day)
+
+
+def test_default_day_bounds_and_ids():
+    calendar = ShiftCalendar()
+    assert calendar.day_bounds("2026-10-03") == (_dt("2026-10-02 20:00:00"), _dt("2026-10-03 20:00:00"))
+    assert calendar.day_id_range("2026-10-03") == (202610030, 202610039)
+    assert calendar.shift_ids("2026-10-03") == [202610030, 202610031]
+    assert calendar.shift_bounds(202610030) == (_dt("2026-10-02 20:00:00"), _dt("2026-10-03 08:00:00"))
+    assert calendar.shift_bounds(202610031) == (_dt("2026-10-03 08:00:00"), _dt("2026-10-03 20:00:00"))
+    assert calendar.describe(202610031) == "Дневная смена (2026-10-03 08:00 - 2026-10-03 20:00)"
+
+
+def test_three_shift_calendar_order_and_bounds():
+    calendar = ShiftCalendar(THREE_SHIFTS)
+    assert [shift["code"] for shift in calendar.shifts] == ["A", "B", "C"]
+    assert calendar.day_bounds("2026-10-03") == (_dt("2026-10-03 07:00:00"), _dt("2026-10-04 07:00:00"))
+    assert calendar.shift_ids("2026-10-03") == [202610030, 202610031, 202610032]
+    assert calendar.shift_bounds(202610032) == (_dt("2026-10-03 23:00:00"), _dt("2026-10-04 07:00:00"))
+
+
+def test_shift_ids_follow_time_order():
+    """shift_id растут вместе со временем: порядок по shift_id совпадает с порядком по времени."""
+    for calendar in (ShiftCalendar(), ShiftCalendar(THREE_SHIFTS)):
+        ids = [calendar.shift_id(f"2026-10-{day:02d} {hour:02d}:30:00") for day in (2, 3, 4) for hour in range(24)]
+        assert ids == sorted(ids)
+
+
+@pytest.mark.parametrize("section", [
+    {"day_start": "20:00", "shifts": [{"code": "D", "name": "Дневная", "start": "08:00"}]},
+    {"day_start": "00:00", "shifts": [{"code": str(i), "name": str(i), "start": f"{i:02d}:00"} for i in range(11)]},
+    {"day_start": "20:00", "shifts": []},
+])
+def test_invalid_calendar_rejected(section):
+    with pytest.raises(ValueError):
+        ShiftCalendar(section)
+
+
+def test_load_calendar_falls_back_to_default(tmp_path, capsys):
+    broken = tmp_path / "config.json"
+    broken.write_text('{"shift_calendar": {"day_start": "20:00", "shifts": []}}', encoding="utf-8")
+    assert load_calendar(str(broken)).fingerprint == ShiftCalendar().fingerprint
+    assert "[WARN]" in capsys.readouterr().out
+
+    assert load_calendar(str(tmp_path / "missing.json")).fingerprint == ShiftCalendar().fingerprint
+    assert "[WARN]" in capsys.readouterr().out
@@ -0,0 +1,158 @@
+# ==============================================================================
+# Тесты snmp_poller на локальном UDP-агенте (ответы GETBULK из потока)
+# ==============================================================================
+import bisect
+import socket
+import threading
+
+import pytest
+
+import snmp_poller
+from snmp_poller import _decode_oid, _encode_integer, _encode_oid, _read_tlv, _tlv
+
+TAG_GAUGE32 = 0x42
+GEN_ERR = 5
+
+
+def _mac_index(n):
+    return (0xAA, 0xBB, 0xCC, 0xDD, 0xEE, n, 7)     # 6 октетов MAC + ifIndex
+
+
+def _gauge(value):
+    return _tlv(TAG_GAUGE32, value.to_bytes(value.bit_length() // 8 + 1, 'big'))
+
+
+class FakeAgent:
+    """
+    Минимальный SNMPv2c-агент: отвечает на GETBULK по таблице mtxrWlRtab.
+
+    answer_limit - сколько запросов обслужить полностью; дальше агент молчит
+    (stall) или отвечает error-status genErr (error), имитируя прерванный обход.
+    """
+
+    def __init__(self, rows=30, answer_limit=None, after_limit="stall"):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.answer_limit = answer_limit
+        self.after_limit = after_limit
+        self.requests = 0
+        mib = []
+        for n in range(1, rows + 1):
+            index = _mac_index(n)
+            mib.append((snmp_poller.RTAB_COLUMNS["strength"] + index, _encode_integer(-50 - n)))
+            mib.append((snmp_poller.RTAB_COLUMNS["tx_rate"] + index, _gauge(54_000_000)))
+            mib.append((snmp_poller.RTAB_COLUMNS["rx_rate"] + index, _gauge(6_500_000)))
+        mib.sort()
+        self.oids = [oid for oid, _ in mib]
+        self.values = [value for _, value in mib]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _parse_getbulk(data):
+        _, pos, _ = _read_tlv(data, 0)
+        _, _, pos = _read_tlv(data, pos)                     # version
+        _, start, pos = _read_tlv(data, pos)                 # community
+        community = data[start:pos]
+        tag, pos, _ = _read_tlv(data, pos)
+        assert tag == snmp_poller.TAG_GET_BULK
+        fields = []
+        for _ in range(3):                                   # request-id, non-repeaters, max-repetitions
+            _, start, pos = _read_tlv(data, pos)
+            fields.append(int.from_bytes(data[start:pos], 'big', signed=True))
+        _, pos, end = _read_tlv(data, pos)
+        oids = []
+        while pos < end:
+            _, vb_pos, pos = _read_tlv(data, pos)
+            _, oid_start, oid_end = _read_tlv(data, vb_pos)
+            oids.append(_decode_oid(data[oid_start:oid_end]))
+        return community, fields[0], fields[2], oids
+
+    def _bulk(self, oids, max_repetitions):
+        varbinds = b''
+        for r in range(max_repetitions):
+            for oid in oids:
+                i = bisect.bisect_right(self.oids, oid) + r
+                if i < len(self.oids):
+                    vb = _encode_oid(self.oids[i]) + self.values[i]
+                else:
+                    vb = _encode_oid(oid) + _tlv(snmp_poller.TAG_END_OF_MIB_VIEW, b'')
+                varbinds += _tlv(snmp_poller.TAG_SEQUENCE, vb)
+        return varbinds
+
+    def _serve(self):
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(65535)
+            except OSError:
+                return
+            community, request_id, max_repetitions, oids = self._parse_getbulk(data)
+            self.requests += 1
+            error_status, varbinds = 0, b''
+            if self.answer_limit is not None and self.requests > self.answer_limit:
+                if self.after_limit == "stall":
+                    continue
+                error_status = GEN_ERR
+            else:
+                varbinds = self._bulk(oids, max_repetitions)
+            pdu = _tlv(snmp_poller.TAG_GET_RESPONSE, _encode_integer(request_id) + _encode_integer(error_status)
+                       + _encode_integer(0) + _tlv(snmp_poller.TAG_SEQUENCE, varbinds))
+            self.sock.sendto(_tlv(snmp_poller.TAG_SEQUENCE, _encode_integer(1)
+                                  + _tlv(snmp_poller.TAG_OCTET_STRING, community) + pdu), peer)
+
+    def close(self):
+        self.sock.close()
+
+
+def _config(agent):
+    return {"port": agent.port, "max_repetitions": 4, "timeout_sec": 0.1, "retries": 1}
+
+
+@pytest.fixture
+def make_agent():
+    agents = []
+
+    def factory(**kwargs):
+        agents.append(FakeAgent(**kwargs))
+        return agents[-1]
+    yield factory
+    for agent in agents:
+        agent.close()
+
+
+def test_complete_walk(make_agent):
+    agent = make_agent(rows=30)
+    snapshot = snmp_poller.registration_snapshots(["127.0.0.1"], _config(agent))["127.0.0.1"]
+    assert len(snapshot) == 30
+    assert snapshot["AA:BB:CC:DD:EE:01"] == {"RSSI": -51, "TxRate": "54Mbps", "RxRate": "6.5Mbps", "Iface": 7}
+    assert snapshot["AA:BB:CC:DD:EE:1E"]["RSSI"] == -80
+    assert agent.requests > 1                                # Таблица пришла за несколько GETBULK
+
+
+def test_walk_stalled_midway_is_error(make_agent):
+    agent = make_agent(rows=30, answer_limit=2, after_limit="stall")
+    result = snmp_poller.registration_snapshots(["127.0.0.1"], _config(agent))["127.0.0.1"]
+    assert isinstance(result, snmp_poller.SnmpError)
+    assert "обход прерван" in str(result)
+
+
+def test_error_status_midway_is_error(make_agent):
+    agent = make_agent(rows=30, answer_limit=2, after_limit="error")
+    result = snmp_poller.registration_snapshots(["127.0.0.1"], _config(agent))["127.0.0.1"]
+    assert isinstance(result, snmp_poller.SnmpError)
+    assert "error-status 5" in str(result)
+
+
+def test_silent_agent_is_error(make_agent):
+    agent = make_agent(answer_limit=0, after_limit="stall")
+    result = snmp_poller.registration_snapshots(["127.0.0.1"], _config(agent))["127.0.0.1"]
+    assert isinstance(result, snmp_poller.SnmpError)
+    assert agent.requests == 2                               # Первая попытка и один повтор
+
+
+def test_cache_raises_on_interrupted_walk(make_agent):
+    agent = make_agent(rows=30, answer_limit=1, after_limit="error")
+    cache = snmp_poller.RegistrationCache("127.0.0.1", _config(agent))
+    with pytest.raises(snmp_poller.SnmpError):
+        cache.get()
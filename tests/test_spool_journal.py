@@ -0,0 +1,220 @@
+# ==============================================================================
+# Тесты spool_journal: формат записей, ротация, восстановление после сбоя
+# ==============================================================================
+import json
+import os
+import sqlite3
+
+import pytest
+
+import spool_journal
+from spool_journal import RECORD_SIZE
+
+KIND = spool_journal.KIND_MIKROTIK
+NAME = "test"
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {"dir": str(tmp_path / "spool"), "segment_records": 4, "fsync_batch": 1, "drain_batch": 3}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "target.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _insert(cursor, values):
+    if values[0] < 0:
+        raise ValueError("отрицательное значение")
+    cursor.execute("INSERT INTO t (v) VALUES (?)", (values[0],))
+
+
+HANDLERS = {KIND: _insert}
+
+
+def write(config, values):
+    writer = spool_journal.SpoolWriter(NAME, config)
+    for value in values:
+        writer.append(KIND, [value])
+    writer.close()
+
+
+def drain(db_path, config):
+    return spool_journal.drain_spool(NAME, db_path, HANDLERS, config)
+
+
+def loaded(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT v FROM t ORDER BY rowid")]
+    finally:
+        conn.close()
+
+
+def segments(config):
+    return [os.path.basename(p) for p in spool_journal._segment_paths(config["dir"], NAME)]
+
+
+def segment_path(config, number):
+    return spool_journal._segment_path(config["dir"], NAME, number)
+
+
+def corrupt(path, index):
+    """Портит один байт payload записи index (CRC перестает сходиться)."""
+    with open(path, 'r+b') as f:
+        f.seek(index * RECORD_SIZE + spool_journal.HEADER.size)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def rejected(config):
+    path = os.path.join(config["dir"], f"{NAME}.rejected.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+# ------------------------------------------------------------------------------
+# Формат записи
+# ------------------------------------------------------------------------------
+
+def test_record_roundtrip():
+    record = spool_journal.encode_record(KIND, 7, ["2026-01-01 00:00:00", -61, None, "Ж"], written_at=1.5)
+    assert len(record) == RECORD_SIZE
+    assert spool_journal.decode_record(record) == (KIND, 7, 1.5, ["2026-01-01 00:00:00", -61, None, "Ж"])
+
+
+def test_crc_mismatch_and_short_record_rejected():
+    record = bytearray(spool_journal.encode_record(KIND, 1, [1]))
+    record[spool_journal.HEADER.size] ^= 0xFF
+    assert spool_journal.decode_record(bytes(record)) is None
+    assert spool_journal.decode_record(spool_journal.encode_record(KIND, 1, [1])[:-1]) is None
+
+
+def test_payload_too_long():
+    with pytest.raises(ValueError):
+        spool_journal.encode_record(KIND, 1, ["x" * RECORD_SIZE])
+
+# ------------------------------------------------------------------------------
+# Ротация и загрузка
+# ------------------------------------------------------------------------------
+
+def test_rotation_and_full_drain(config, db_path):
+    write(config, range(10))
+    assert segments(config) == ["test.00000000.spool", "test.00000001.spool", "test.00000002.spool"]
+    assert spool_journal.spool_backlog(NAME, db_path, config) == 10
+
+    assert drain(db_path, config) == 10
+    assert loaded(db_path) == list(range(10))
+    assert segments(config) == ["test.00000002.spool"]       # Текущий сегмент остается
+    assert spool_journal.spool_backlog(NAME, db_path, config) == 0
+
+
+def test_partial_drain_resumes_without_duplicates(config, db_path):
+    write(config, range(5))
+    assert drain(db_path, config) == 5
+    write(config, range(5, 11))                              # Писатель продолжает после перезапуска
+    assert spool_journal.spool_backlog(NAME, db_path, config) == 6
+    assert drain(db_path, config) == 6
+    assert loaded(db_path) == list(range(11))
+    assert drain(db_path, config) == 0
+
+
+def test_handler_error_quarantined(config, db_path):
+    write(config, [1, -2, 3])
+    assert drain(db_path, config) == 3
+    assert loaded(db_path) == [1, 3]
+    assert [entry["values"] for entry in rejected(config)] == [[-2]]
+
+
+def test_locked_db_retries_later(config, db_path, monkeypatch):
+    write(config, range(3))
+    connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, "connect", lambda *args, **kwargs: connect(*args, **dict(kwargs, timeout=0.1)))
+    blocker = connect(db_path)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        assert drain(db_path, config) == 0
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert drain(db_path, config) == 3
+    assert loaded(db_path) == [0, 1, 2]
+
+# ------------------------------------------------------------------------------
+# Повреждения и восстановление после сбоя
+# ------------------------------------------------------------------------------
+
+def test_corrupt_record_in_closed_segment_is_skipped(config, db_path):
+    write(config, range(10))
+    corrupt(segment_path(config, 0), 1)                      # Значение 1
+
+    assert drain(db_path, config) == 9
+    assert loaded(db_path) == [0, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert [(e["segment"], e["offset"]) for e in rejected(config)] == [("test.00000000.spool", RECORD_SIZE)]
+    assert segments(config) == ["test.00000002.spool"]
+
+
+def test_corrupt_record_in_live_segment_is_skipped(config, db_path):
+    write(config, range(3))
+    corrupt(segment_path(config, 0), 0)
+    assert drain(db_path, config) == 2
+    assert loaded(db_path) == [1, 2]
+    write(config, [3])                                       # Сегмент дописывается дальше
+    assert drain(db_path, config) == 1
+    assert loaded(db_path) == [1, 2, 3]
+    assert len(rejected(config)) == 1                        # Повреждение не попадает в карантин дважды
+
+
+def test_writer_restart_keeps_records_after_corruption(config, db_path):
+    write(config, range(3))
+    corrupt(segment_path(config, 0), 1)
+    write(config, [3])                                       # Перезапуск писателя: ничего не отрезано
+    assert os.path.getsize(segment_path(config, 0)) == 4 * RECORD_SIZE
+
+    assert drain(db_path, config) == 3
+    assert loaded(db_path) == [0, 2, 3]
+
+
+def test_writer_restart_truncates_partial_tail_only(config, db_path):
+    write(config, range(3))
+    path = segment_path(config, 0)
+    with open(path, 'ab') as f:
+        f.write(spool_journal.encode_record(KIND, 99, [99])[:100])    # Сбой посреди write()
+    assert spool_journal.spool_backlog(NAME, db_path, config) == 3
+
+    write(config, [3])
+    assert os.path.getsize(path) == 4 * RECORD_SIZE
+    assert drain(db_path, config) == 4
+    assert loaded(db_path) == [0, 1, 2, 3]
+    assert rejected(config) == []
+
+
+def test_partial_tail_of_live_segment_waits(config, db_path):
+    write(config, range(2))
+    path = segment_path(config, 0)
+    record = spool_journal.encode_record(KIND, 3, [2])
+    with open(path, 'ab') as f:
+        f.write(record[:200])                                # Запись еще дописывается
+    assert drain(db_path, config) == 2
+    with open(path, 'ab') as f:
+        f.write(record[200:])
+    assert drain(db_path, config) == 1
+    assert loaded(db_path) == [0, 1, 2]
+
+
+def test_partial_tail_of_closed_segment_quarantined(config, db_path):
+    write(config, range(6))
+    path = segment_path(config, 0)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 100)
+    assert drain(db_path, config) == 6
+    assert [(e["segment"], e["error"]) for e in rejected(config)] == [("test.00000000.spool", "неполная запись")]
+    assert segments(config) == ["test.00000001.spool"]
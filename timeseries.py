@@ -0,0 +1,367 @@
+# ==============================================================================
+# TIMESERIES.PY - Временные ряды RSSI/TxRate по установке для графиков GUI
+# ==============================================================================
+# Неделя замеров с интервалом в секунды - сотни тысяч точек; Tk зависнет,
+# если рисовать их все. Ряд всегда прореживается до ширины графика в пикселях:
+#   - линия среднего - LTTB (Largest-Triangle-Three-Buckets): сохраняет форму
+#     ряда, включая короткие провалы, при числе точек ~ ширине графика;
+#   - огибающая min/max по столбцам пикселей - провалы RSSI не теряются.
+#
+# Источник зависит от длины окна: короткие окна читаются из mikrotik_log
+# (сырые строки), длинные - из rollup-таблицы mikrotik_rollup (итоги по
+# минутам и часам). Rollup пополняется инкрементально: в него попадают только
+# закрытые строки - deadband (mikrotik_storage.write_sample) дописывает лишь
+# последнюю строку установки, поэтому строка, после которой уже есть следующая,
+# больше не меняется. Открытый хвост добавляется к ряду из mikrotik_log.
+#
+# Время в рядах - секунды от 1970-01-01 по локальному времени записей
+# (strftime('%s') SQLite без перевода зоны), см. to_epoch / from_epoch.
+# ==============================================================================
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+MIKROTIK_DB = 'mikrotik_log.db'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+
+# Уровни rollup: размер корзины, сек, и формат начала корзины для strftime
+ROLLUP_LEVELS = {
+    60: '%Y-%m-%d %H:%M:00',
+    3600: '%Y-%m-%d %H:00:00',
+}
+LEVEL_RAW = 0
+
+# Сырые строки читаются, пока их в окне не больше RAW_LIMIT; иначе - самый
+# мелкий уровень rollup, у которого в окне не больше ROLLUP_LIMIT корзин
+RAW_LIMIT = 20000
+ROLLUP_LIMIT = 20000
+
+# Rollup обновляется при чтении не чаще раза в REFRESH_SEC
+REFRESH_SEC = 60
+
+SERIES_FIELDS = ("rssi", "tx")
+
+
+def to_epoch(dt):
+    return (dt - EPOCH).total_seconds()
+
+
+def from_epoch(seconds):
+    return EPOCH + timedelta(seconds=float(seconds))
+
+# ------------------------------------------------------------------------------
+# 1. ROLLUP: ТАБЛИЦА mikrotik_rollup
+# ------------------------------------------------------------------------------
+
+def initialize_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mikrotik_rollup (
+            rig_id TEXT NOT NULL,
+            bucket_sec INTEGER NOT NULL,
+            bucket_start TEXT NOT NULL,
+            sample_count INTEGER NOT NULL,
+            rssi_count INTEGER NOT NULL,
+            rssi_sum REAL NOT NULL,
+            rssi_min REAL,
+            rssi_max REAL,
+            tx_count INTEGER NOT NULL,
+            tx_sum REAL NOT NULL,
+            tx_min REAL,
+            tx_max REAL,
+            PRIMARY KEY (rig_id, bucket_sec, bucket_start)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mikrotik_rollup_state (
+            rig_id TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def refresh_rollup(conn, rig_id):
+    """
+    Добавляет в mikrotik_rollup закрытые строки установки, появившиеся с
+    прошлого обновления. Возвращает число обновленных минутных корзин.
+    """
+    initialize_table(conn)
+    state = conn.execute("SELECT last_id FROM mikrotik_rollup_state WHERE rig_id = ?", (rig_id,)).fetchone()
+    last_id = state[0] if state else 0
+    # Последняя строка установки еще может дописываться - она не учитывается
+    open_id = conn.execute("SELECT MAX(id) FROM mikrotik_log WHERE rig_id = ?", (rig_id,)).fetchone()[0]
+    if open_id is None or open_id <= last_id + 1:
+        return 0
+
+    buckets = 0
+    for bucket_sec, bucket_format in ROLLUP_LEVELS.items():
+        # Значение строки - среднее ее замеров; min/max корзины - по средним строк
+        cursor = conn.execute(
+            f"""INSERT INTO mikrotik_rollup
+                    (rig_id, bucket_sec, bucket_start, sample_count, rssi_count, rssi_sum, rssi_min, rssi_max,
+                     tx_count, tx_sum, tx_min, tx_max)
+                SELECT rig_id, ?, strftime('{bucket_format}', timestamp),
+                       SUM(sample_count),
+                       SUM(CASE WHEN rssi_sum IS NOT NULL THEN sample_count ELSE 0 END),
+                       TOTAL(rssi_sum),
+                       MIN(rssi_sum / sample_count), MAX(rssi_sum / sample_count),
+                       SUM(CASE WHEN tx_sum IS NOT NULL THEN sample_count ELSE 0 END),
+                       TOTAL(tx_sum),
+                       MIN(tx_sum / sample_count), MAX(tx_sum / sample_count)
+                FROM mikrotik_log
+                WHERE rig_id = ? AND id > ? AND id < ?
+                GROUP BY 3
+                ON CONFLICT (rig_id, bucket_sec, bucket_start) DO UPDATE SET
+                    sample_count = sample_count + excluded.sample_count,
+                    rssi_count = rssi_count + excluded.rssi_count,
+                    rssi_sum = rssi_sum + excluded.rssi_sum,
+                    rssi_min = MIN(COALESCE(rssi_min, excluded.rssi_min), COALESCE(excluded.rssi_min, rssi_min)),
+                    rssi_max = MAX(COALESCE(rssi_max, excluded.rssi_max), COALESCE(excluded.rssi_max, rssi_max)),
+                    tx_count = tx_count + excluded.tx_count,
+                    tx_sum = tx_sum + excluded.tx_sum,
+                    tx_min = MIN(COALESCE(tx_min, excluded.tx_min), COALESCE(excluded.tx_min, tx_min)),
+                    tx_max = MAX(COALESCE(tx_max, excluded.tx_max), COALESCE(excluded.tx_max, tx_max))""",
+            (bucket_sec, rig_id, last_id, open_id)
+        )
+        if bucket_sec == min(ROLLUP_LEVELS):
+            buckets = cursor.rowcount
+    conn.execute(
+        """INSERT INTO mikrotik_rollup_state (rig_id, last_id) VALUES (?, ?)
+           ON CONFLICT (rig_id) DO UPDATE SET last_id = excluded.last_id""",
+        (rig_id, open_id - 1)
+    )
+    conn.commit()
+    return buckets
+
+
+def _rollup_watermark(conn, rig_id):
+    try:
+        row = conn.execute("SELECT last_id FROM mikrotik_rollup_state WHERE rig_id = ?", (rig_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+# ------------------------------------------------------------------------------
+# 2. ЧТЕНИЕ РЯДА
+# ------------------------------------------------------------------------------
+
+def _empty_series(level):
+    series = {"level": level, "x": np.zeros(0)}
+    for field in SERIES_FIELDS:
+        series[field] = np.zeros(0)
+        series[field + "_min"] = np.zeros(0)
+        series[field + "_max"] = np.zeros(0)
+    return series
+
+
+def choose_level(conn, rig_id, start_time, end_time):
+    """Уровень для окна: LEVEL_RAW или размер корзины rollup, сек."""
+    raw_rows = conn.execute(
+        """SELECT COUNT(*) FROM (
+               SELECT 1 FROM mikrotik_log WHERE rig_id = ? AND timestamp >= ? AND timestamp < ? LIMIT ?
+           )""",
+        (rig_id, start_time.strftime(TIMESTAMP_FORMAT), end_time.strftime(TIMESTAMP_FORMAT), RAW_LIMIT + 1)
+    ).fetchone()[0]
+    if raw_rows <= RAW_LIMIT:
+        return LEVEL_RAW
+    span = (end_time - start_time).total_seconds()
+    for bucket_sec in sorted(ROLLUP_LEVELS):
+        if span / bucket_sec <= ROLLUP_LIMIT:
+            return bucket_sec
+    return max(ROLLUP_LEVELS)
+
+
+def read_raw(conn, rig_id, start_time, end_time, min_id=0):
+    """
+    Сырые строки окна. Сжатая строка (deadband) дает две точки - в начале и в
+    конце интервала, который она покрывает.
+    """
+    rows = conn.execute(
+        """SELECT CAST(strftime('%s', timestamp) AS INTEGER),
+                  CAST(strftime('%s', COALESCE(last_timestamp, timestamp)) AS INTEGER),
+                  COALESCE(rssi_sum / sample_count, rssi), tx_sum / sample_count
+           FROM mikrotik_log
+           WHERE rig_id = ? AND timestamp >= ? AND timestamp < ? AND id > ?
+           ORDER BY timestamp, id""",
+        (rig_id, start_time.strftime(TIMESTAMP_FORMAT), end_time.strftime(TIMESTAMP_FORMAT), min_id)
+    ).fetchall()
+    if not rows:
+        return _empty_series(LEVEL_RAW)
+    data = np.array(rows, dtype=float)
+    first, last, rssi, tx = data.T
+    held = last > first
+    # Точки начала и (для сжатых строк) конца: порядок по времени сохраняется
+    x = np.column_stack([first, np.where(held, last, np.nan)]).ravel()
+    keep = ~np.isnan(x)
+    series = {"level": LEVEL_RAW, "x": x[keep]}
+    for field, values in (("rssi", rssi), ("tx", tx)):
+        doubled = np.repeat(values, 2)[keep]
+        series[field] = doubled
+        series[field + "_min"] = doubled
+        series[field + "_max"] = doubled
+    return series
+
+
+def read_rollup(conn, rig_id, start_time, end_time, bucket_sec):
+    """Корзины rollup окна (среднее, min, max) и открытый хвост из mikrotik_log."""
+    rows = conn.execute(
+        """SELECT CAST(strftime('%s', bucket_start) AS INTEGER) + ? / 2,
+                  rssi_sum / NULLIF(rssi_count, 0), rssi_min, rssi_max,
+                  tx_sum / NULLIF(tx_count, 0), tx_min, tx_max
+           FROM mikrotik_rollup
+           WHERE rig_id = ? AND bucket_sec = ? AND bucket_start >= ? AND bucket_start < ?
+           ORDER BY bucket_start""",
+        (bucket_sec, rig_id, bucket_sec,
+         start_time.strftime(TIMESTAMP_FORMAT), end_time.strftime(TIMESTAMP_FORMAT))
+    ).fetchall()
+    series = _empty_series(bucket_sec)
+    if rows:
+        data = np.array(rows, dtype=float)
+        series["x"] = data[:, 0]
+        for i, field in enumerate(SERIES_FIELDS):
+            series[field], series[field + "_min"], series[field + "_max"] = data[:, 1 + 3 * i:4 + 3 * i].T
+
+    # Строки после последнего rollup (открытый хвост) - как сырые точки
+    watermark = _rollup_watermark(conn, rig_id) or 0
+    tail = read_raw(conn, rig_id, start_time, end_time, min_id=watermark)
+    if len(tail["x"]):
+        order = np.argsort(np.concatenate([series["x"], tail["x"]]), kind="stable")
+        for key in ("x",) + tuple(f + s for f in SERIES_FIELDS for s in ("", "_min", "_max")):
+            series[key] = np.concatenate([series[key], tail[key]])[order]
+    return series
+
+
+def read_series(conn, rig_id, start_time, end_time, level=None):
+    """Ряд окна: dict x, rssi, rssi_min, rssi_max, tx, tx_min, tx_max и level."""
+    if level is None:
+        level = choose_level(conn, rig_id, start_time, end_time)
+    if level == LEVEL_RAW:
+        return read_raw(conn, rig_id, start_time, end_time)
+    return read_rollup(conn, rig_id, start_time, end_time, level)
+
+# ------------------------------------------------------------------------------
+# 3. ПРОРЕЖИВАНИЕ ДО ШИРИНЫ ГРАФИКА
+# ------------------------------------------------------------------------------
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: индексы n_out точек ряда (x по возрастанию).
+    Первая и последняя точки сохраняются; из каждой корзины берется точка,
+    образующая наибольший треугольник с выбранной точкой предыдущей корзины и
+    средним следующей. NaN в y пропускаются.
+    """
+    valid = np.nonzero(~np.isnan(y))[0]
+    if len(valid) <= n_out or n_out < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+    edges = np.linspace(1, len(valid) - 1, n_out - 1).astype(np.int64)
+    # Средние корзин - заранее, одним проходом
+    bucket_x = np.add.reduceat(xv[1:-1], edges[:-1] - 1) / np.diff(edges)
+    bucket_y = np.add.reduceat(yv[1:-1], edges[:-1] - 1) / np.diff(edges)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, len(valid) - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_x = bucket_x[i + 1] if i + 1 < len(bucket_x) else xv[-1]
+        next_y = bucket_y[i + 1] if i + 1 < len(bucket_y) else yv[-1]
+        area = np.abs((xv[a] - next_x) * (yv[lo:hi] - yv[a]) - (xv[a] - xv[lo:hi]) * (next_y - yv[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return valid[selected]
+
+
+def minmax_envelope(x, y_min, y_max, start, end, columns):
+    """
+    Огибающая по столбцам пикселей: (x_center, low, high) для столбцов, в
+    которые попали точки. Вычисляется целиком на массивах.
+    """
+    inside = (x >= start) & (x < end) & ~np.isnan(y_min) & ~np.isnan(y_max)
+    if not inside.any() or columns <= 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    column = ((x[inside] - start) / (end - start) * columns).astype(np.int64)
+    low = np.full(columns, np.inf)
+    high = np.full(columns, -np.inf)
+    np.minimum.at(low, column, y_min[inside])
+    np.maximum.at(high, column, y_max[inside])
+    used = np.isfinite(low)
+    centers = start + (np.arange(columns) + 0.5) * (end - start) / columns
+    return centers[used], low[used], high[used]
+
+
+def downsample(series, start, end, width):
+    """
+    Ряд окна [start, end) (секунды to_epoch), прореженный до width пикселей:
+    dict field -> (x, y) линии LTTB и field + '_band' -> (x, low, high).
+    """
+    x = series["x"]
+    window = (x >= start) & (x < end)
+    # Точки сразу за краями окна нужны, чтобы линия доходила до границ графика
+    idx = np.nonzero(window)[0]
+    if len(idx):
+        idx = np.arange(max(idx[0] - 1, 0), min(idx[-1] + 2, len(x)))
+    result = {}
+    for field in SERIES_FIELDS:
+        y = series[field][idx]
+        chosen = lttb(x[idx], y, max(3, width))
+        result[field] = (x[idx][chosen], y[chosen])
+        result[field + "_band"] = minmax_envelope(x, series[field + "_min"], series[field + "_max"], start, end, width)
+    return result
+
+# ------------------------------------------------------------------------------
+# 4. КЭШ ОКНА ДЛЯ ПРОКРУТКИ И МАСШТАБА
+# ------------------------------------------------------------------------------
+
+class SeriesCache:
+    """
+    Держит ряд, прочитанный с запасом вокруг видимого окна (по ширине окна с
+    каждой стороны). Прокрутка и масштаб внутри запаса на том же уровне не
+    обращаются к БД - только прореживание в памяти.
+    """
+
+    def __init__(self, db_path=MIKROTIK_DB):
+        self.db_path = db_path
+        self.key = None          # (rig_id, level)
+        self.span = (0.0, 0.0)   # Границы прочитанного ряда, to_epoch
+        self.series = None
+        self.loaded_at = None
+        self.last_refresh = {}   # rig_id -> время последнего refresh_rollup
+
+    def invalidate(self):
+        self.series = None
+
+    def _refresh(self, conn, rig_id, now):
+        last = self.last_refresh.get(rig_id)
+        if last is not None and (now - last).total_seconds() < REFRESH_SEC:
+            return
+        try:
+            refresh_rollup(conn, rig_id)
+        except sqlite3.OperationalError as e:
+            # БД занята сборщиком - используем rollup как есть, обновим позже
+            print(f"[WARN] Rollup рядов для {rig_id} не обновлен: {e}")
+        self.last_refresh[rig_id] = now
+
+    def get(self, rig_id, start, end, width, max_age_sec=10):
+        """Прореженный ряд окна [start, end) (to_epoch) шириной width пикселей."""
+        now = datetime.now()
+        conn = sqlite3.connect(self.db_path, timeout=1)
+        try:
+            start_time, end_time = from_epoch(start), from_epoch(end)
+            level = choose_level(conn, rig_id, start_time, end_time)
+            stale = self.loaded_at is None or (now - self.loaded_at).total_seconds() > max_age_sec
+            covered = self.span[0] <= start and end <= self.span[1]
+            if self.series is None or self.key != (rig_id, level) or not covered or stale:
+                margin = end - start
+                if level != LEVEL_RAW:
+                    self._refresh(conn, rig_id, now)
+                self.series = read_series(conn, rig_id, from_epoch(start - margin), from_epoch(end + margin), level)
+                self.key = (rig_id, level)
+                self.span = (start - margin, end + margin)
+                self.loaded_at = now
+        finally:
+            conn.close()
+        result = downsample(self.series, start, end, width)
+        result["level"] = level
+        return result
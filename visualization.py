@@ -1,13 +1,28 @@
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
+import sqlite3
+import sys
+
+import archive_catalog
+import coverage_diff
+import coverage_grid
+import coverage_holes
+import data_access
+import shift_calendar
 
 # --- Файлы проекта ---
 CONFIG_FILE = 'config.json'
 DATA_PATH = 'coverage_log.csv'
 OUTPUT_IMAGE_PATH = 'coverage_heatmap.png'
+SURFACE_IMAGE_PATH = 'coverage_surface.png'
+DIFF_IMAGE_PATH = 'coverage_diff.png'
+MIKROTIK_DB = data_access.load_db_paths(CONFIG_FILE)[data_access.DB_MIKROTIK]
+# Привязка пикселей карты к координатам (для просмотра замеров по клику в GUI)
+EXTENT_PATH = 'coverage_heatmap.json'
 
 # ==============================================================================
 # КОНФИГУРАЦИЯ И УТИЛИТЫ
@@ -31,31 +46,40 @@ def define_quality_color(rssi):
     else:
         return 'maroon' # Очень слабый сигнал
 
+def quality_legend_elements():
+    """Элементы легенды шкалы качества RSSI (для scatter-карт)."""
+    return [
+        plt.scatter([], [], color='green', label=f'Отлично (> {RSSI_THRESHOLDS["Excellent (Зеленый)"]} дБм)'),
+        plt.scatter([], [], color='gold', label=f'Хорошо ({RSSI_THRESHOLDS["Good (Желтый)"]} до {RSSI_THRESHOLDS["Excellent (Зеленый)"]} дБм)'),
+        plt.scatter([], [], color='red', label=f'Низкое ({RSSI_THRESHOLDS["Poor (Красный)"]} до {RSSI_THRESHOLDS["Good (Желтый)"]} дБм)'),
+        plt.scatter([], [], color='maroon', label=f'Критическое (< {RSSI_THRESHOLDS["Poor (Красный)"]} дБм)'),
+    ]
+
 def get_current_shift_period():
-    """Определяет временной диапазон текущей смены."""
-    now = datetime.now()
-    
-    shift2_start = now.replace(hour=8, minute=0, second=0, microsecond=0)
-    shift2_end = now.replace(hour=20, minute=0, second=0, microsecond=0)
-    
-    if now >= shift2_start and now < shift2_end:
-        # Дневная смена
-        start_time = shift2_start
-        end_time = shift2_end
-        shift_info = "Дневная Смена (08:00 - 20:00)"
-    else:
-        if now >= shift2_end:
-            # Ночная смена (началась сегодня)
-            start_time = shift2_end
-            end_time = (now + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
-        else:
-            # Ночная смена (началась вчера)
-            start_time = (now - timedelta(days=1)).replace(hour=20, minute=0, second=0, microsecond=0)
-            end_time = shift2_start
-        
-        shift_info = "Ночная Смена (20:00 - 08:00)"
-
-    return start_time, end_time, shift_info
+    """Определяет временной диапазон текущей смены (по календарю смен площадки)."""
+    calendar = shift_calendar.load_calendar(CONFIG_FILE)
+    shift_id = calendar.current()
+    start_time, end_time = calendar.shift_bounds(shift_id)
+    return start_time, end_time, calendar.describe(shift_id)
+
+def save_map_extent(ax, start_time, end_time, path=EXTENT_PATH):
+    """
+    Сохраняет положение осей на картинке (пиксели, начало - левый верхний угол)
+    и их пределы по долготе/широте, а также период карты.
+    """
+    fig = ax.figure
+    width, height = fig.canvas.get_width_height()
+    bbox = ax.get_window_extent()
+    extent = {
+        "image_size": [width, height],
+        "axes_px": [bbox.x0, height - bbox.y1, bbox.x1, height - bbox.y0],
+        "xlim": list(ax.get_xlim()),
+        "ylim": list(ax.get_ylim()),
+        "start": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "end": end_time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    with open(path, 'w') as f:
+        json.dump(extent, f)
 
 # ==============================================================================
 # ОСНОВНАЯ ФУНКЦИЯ ГЕНЕРАЦИИ КАРТЫ
@@ -89,6 +113,8 @@ def generate_heatmap():
         plt.text(0.5, 0.5, f"НЕТ ДАННЫХ ДЛЯ {shift_info}", ha='center', va='center', fontsize=16)
         plt.title("Карта Покрытия (Нет данных)", fontsize=18)
         plt.savefig(OUTPUT_IMAGE_PATH)
+        if os.path.exists(EXTENT_PATH):
+            os.remove(EXTENT_PATH)
         return
 
     # 2. Определение цвета
@@ -97,12 +123,7 @@ def generate_heatmap():
     # 3. Построение scatter plot
     plt.figure(figsize=(14, 10))
     
-    legend_elements = [
-        plt.scatter([], [], color='green', label=f'Отлично (> {RSSI_THRESHOLDS["Excellent (Зеленый)"]} дБм)'),
-        plt.scatter([], [], color='gold', label=f'Хорошо ({RSSI_THRESHOLDS["Good (Желтый)"]} до {RSSI_THRESHOLDS["Excellent (Зеленый)"]} дБм)'),
-        plt.scatter([], [], color='red', label=f'Низкое ({RSSI_THRESHOLDS["Poor (Красный)"]} до {RSSI_THRESHOLDS["Good (Желтый)"]} дБм)'),
-        plt.scatter([], [], color='maroon', label=f'Критическое (< {RSSI_THRESHOLDS["Poor (Красный)"]} дБм)'),
-    ]
+    legend_elements = quality_legend_elements()
 
     plt.scatter(
         df_filtered['Longitude_X'], 
@@ -124,7 +145,116 @@ def generate_heatmap():
     
     # 4. Сохранение результата
     plt.savefig(OUTPUT_IMAGE_PATH)
+    save_map_extent(plt.gca(), start_time, end_time)
     print(f"Карта успешно сохранена: {OUTPUT_IMAGE_PATH} (Данные за {shift_info})")
 
+# ==============================================================================
+# ИНТЕРПОЛИРОВАННАЯ ПОВЕРХНОСТЬ (IDW) ПО СМЕНЕ
+# ==============================================================================
+
+def generate_surface_map(shift_date=None):
+    """
+    Рисует оценку RSSI по всему карьеру (IDW по сетке покрытия смены) с
+    изолиниями порогов качества и найденными зонами слабого сигнала.
+    Поверхность берется из кэша coverage_grid и пересчитывается только вокруг
+    новых замеров; зоны сохраняются в coverage_holes.
+    """
+    shift_date = shift_date or archive_catalog.shift_date_for(datetime.now())
+    grid_config = coverage_grid.load_grid_config(CONFIG_FILE)
+    conn = sqlite3.connect(MIKROTIK_DB)
+    try:
+        raster, _, holes = coverage_holes.analyze_shift(conn, shift_date, grid_config)
+    finally:
+        conn.close()
+
+    if draw_surface(raster, holes, grid_config, shift_date, SURFACE_IMAGE_PATH):
+        print(f"Поверхность покрытия сохранена: {SURFACE_IMAGE_PATH} (смена {shift_date})")
+
+def draw_surface(raster, holes, grid_config, shift_date, path):
+    """
+    Рисует растр смены (поверхность IDW, изолинии порогов, зоны слабого
+    сигнала) в файл path. Возвращает False, если в смене нет замеров.
+    """
+    plt.figure(figsize=(14, 10))
+    if not raster.count.size:
+        plt.text(0.5, 0.5, f"НЕТ ДАННЫХ ЗА {shift_date}", ha='center', va='center', fontsize=16)
+        plt.title("Оценка покрытия (Нет данных)", fontsize=18)
+        plt.savefig(path)
+        plt.close()
+        return False
+
+    extent = raster.extent(grid_config)
+    image = plt.imshow(raster.surface, origin='lower', extent=extent, cmap='RdYlGn',
+                       vmin=RSSI_THRESHOLDS["Poor (Красный)"] - 10, vmax=RSSI_THRESHOLDS["Excellent (Зеленый)"] + 10,
+                       aspect='auto', interpolation='nearest')
+    levels = sorted(RSSI_THRESHOLDS.values())
+    plt.contour(raster.surface, levels=levels, origin='lower', extent=extent, colors='black', linewidths=0.7)
+    plt.colorbar(image, label='RSSI, дБм (IDW)')
+    for hole in holes[:20]:
+        lon_min, lat_min, lon_max, lat_max = hole["bbox"]
+        plt.gca().add_patch(plt.Rectangle((lon_min, lat_min), lon_max - lon_min, lat_max - lat_min,
+                                          fill=False, edgecolor='blue', linewidth=1.2))
+        plt.text(lon_max, lat_max, f"#{hole['hole_id']} {hole['area_m2']:.0f} м²", color='blue', fontsize=8)
+
+    plt.xlabel('Долгота (Longitude X)')
+    plt.ylabel('Широта (Latitude Y)')
+    plt.title(f'Оценка покрытия Wi-Fi по карьеру, смена {shift_date}\n'
+              f'(ячеек с замерами: {int((raster.count > 0).sum())}, ячейка {grid_config["cell_m"]:g} м, '
+              f'радиус IDW {grid_config["idw_radius_m"]:g} м, зон слабого сигнала: {len(holes)})')
+    plt.savefig(path)
+    plt.close()
+    return True
+
+# ==============================================================================
+# СРАВНЕНИЕ СМЕН/ПЕРИОДОВ (ПРИРОСТ И ПОТЕРЯ)
+# ==============================================================================
+
+def generate_diff_map(before, after):
+    """
+    Карта изменения RSSI между сменами или периодами ('YYYY-MM-DD' или
+    'YYYY-MM-DD..YYYY-MM-DD'): значимые прирост/потеря в цвете, изменения
+    без достаточного числа замеров - серым. Строится по кэшированным
+    растрам coverage_grid, сырые замеры не читаются.
+    """
+    grid_config = coverage_grid.load_grid_config(CONFIG_FILE)
+    conn = sqlite3.connect(MIKROTIK_DB)
+    try:
+        diff = coverage_diff.compare_periods(conn, before, after, grid_config)
+    finally:
+        conn.close()
+
+    plt.figure(figsize=(14, 10))
+    if not diff.delta.size or np.isnan(diff.delta).all():
+        plt.text(0.5, 0.5, f"НЕТ ОБЩИХ ДАННЫХ: {before} / {after}", ha='center', va='center', fontsize=16)
+        plt.title("Сравнение покрытия (Нет данных)", fontsize=18)
+        plt.savefig(DIFF_IMAGE_PATH)
+        return
+
+    extent = diff.extent(grid_config)
+    # Шкала симметрична: не уже 10 дБ, чтобы шум не выглядел как сильное изменение
+    limit = 10.0
+    if diff.significant.any():
+        limit = max(limit, float(np.percentile(np.abs(diff.delta[diff.significant]), 95)))
+    compared = np.where(np.isnan(diff.delta) | diff.significant, np.nan, 0.0)
+    plt.imshow(compared, origin='lower', extent=extent, cmap='Greys', vmin=-1, vmax=1,
+               aspect='auto', interpolation='nearest')
+    image = plt.imshow(np.where(diff.significant, diff.delta, np.nan), origin='lower', extent=extent,
+                       cmap='RdYlGn', vmin=-limit, vmax=limit, aspect='auto', interpolation='nearest')
+    plt.colorbar(image, label='Изменение RSSI, дБ (после - до)')
+
+    summary = diff.summary(grid_config)
+    plt.xlabel('Долгота (Longitude X)')
+    plt.ylabel('Широта (Latitude Y)')
+    plt.title(f'Изменение покрытия: {before} -> {after}\n'
+              f'(прирост {summary["gain_area_m2"]:.0f} м², потеря {summary["loss_area_m2"]:.0f} м²; '
+              f'серым - изменения без достаточного числа замеров)')
+    plt.savefig(DIFF_IMAGE_PATH)
+    print(f"Карта изменений сохранена: {DIFF_IMAGE_PATH} ({before} -> {after})")
+
 if __name__ == "__main__":
-    generate_heatmap()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "--surface":
+        generate_surface_map(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif len(sys.argv) > 3 and sys.argv[1] == "--diff":
+        generate_diff_map(sys.argv[2], sys.argv[3])
+    else:
+        generate_heatmap()
\ No newline at end of file